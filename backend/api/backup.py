@@ -4,14 +4,19 @@
 """
 import os
 import sys
-from flask import jsonify, request, send_file
+from flask import jsonify, request, send_file, Response
 
 # 将utils目录添加到Python路径
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
 from . import api_bp
-from utils.export_database import export_database, get_database_info
-from utils.backup_system import backup_system, list_backups, delete_old_backups
+from utils.export_database import (
+    export_database, get_database_info, start_export, is_exporting, iter_export_file
+)
+from utils.backup_system import (
+    backup_system, list_backups, delete_old_backups, delete_backup as remove_backup,
+    load_manifest, restore_snapshot, iter_snapshot_tar, SNAPSHOT_SUFFIX
+)
 from config import Config
 
 
@@ -20,11 +25,30 @@ def create_database_export():
     """
     导出数据库
     POST /api/backup/database-export
+
+    Body参数：
+    - background: 是否在后台导出（默认false）；为true时立即返回文件名，
+      导出完成前即可通过 /backup/download/<filename> 边生成边下载
     """
     try:
+        data = request.get_json(silent=True) or {}
+
         # 获取数据库信息
         db_info = get_database_info()
 
+        if data.get('background'):
+            output_file = start_export()
+            return jsonify({
+                'code': 0,
+                'message': '数据库导出已开始',
+                'data': {
+                    'filename': os.path.basename(output_file),
+                    'filepath': output_file,
+                    'status': 'running',
+                    'database_info': db_info
+                }
+            })
+
         # 执行导出
         output_file = export_database()
 
@@ -74,9 +98,9 @@ def create_system_backup():
             include_execution_spaces=include_execution_spaces
         )
 
-        # 获取文件信息
-        file_size = os.path.getsize(backup_file)
+        # 获取快照信息
         filename = os.path.basename(backup_file)
+        stats = load_manifest(filename)['stats']
 
         return jsonify({
             'code': 0,
@@ -84,7 +108,11 @@ def create_system_backup():
             'data': {
                 'filename': filename,
                 'filepath': backup_file,
-                'size': file_size
+                'size': stats['new_bytes'],
+                'total_size': stats['total_bytes'],
+                'files': stats['files'],
+                'reused_files': stats['reused_files'],
+                'elapsed': stats['elapsed']
             }
         })
     except Exception as e:
@@ -106,14 +134,24 @@ def get_backup_list():
         # 格式化返回数据
         backup_list = []
         for backup in backups:
-            backup_list.append({
+            item = {
                 'name': backup['name'],
                 'path': backup['path'],
                 'size': backup['size'],
                 'size_mb': round(backup['size'] / (1024 * 1024), 2),
                 'created': backup['created'].strftime('%Y-%m-%d %H:%M:%S'),
-                'type': 'database' if backup['name'].endswith('.sql') else 'system'
-            })
+                'type': 'database' if backup['name'].endswith(('.sql', '.tar')) else 'system'
+            }
+            if backup.get('snapshot'):
+                # 快照的 size 为新增数据块大小，total_size 为快照包含的文件总大小
+                item.update({
+                    'snapshot': True,
+                    'total_size': backup['total_size'],
+                    'total_size_mb': round(backup['total_size'] / (1024 * 1024), 2),
+                    'files': backup['files'],
+                    'parent': backup['parent']
+                })
+            backup_list.append(item)
 
         return jsonify({
             'code': 0,
@@ -135,6 +173,9 @@ def download_backup(filename):
     """
     下载备份文件
     GET /api/backup/download/<filename>
+
+    Query参数（仅快照）：
+    - path: 只下载快照中的该路径，例如 execution_spaces/execution_12
     """
     try:
         # 安全检查：防止路径遍历攻击
@@ -146,6 +187,14 @@ def download_backup(filename):
 
         file_path = os.path.join(Config.BACKUPS_DIR, filename)
 
+        # 正在导出的数据库归档：跟随文件增长直到导出完成
+        if is_exporting(file_path):
+            return Response(
+                iter_export_file(file_path),
+                mimetype='application/x-tar',
+                headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+            )
+
         # 检查文件是否存在
         if not os.path.exists(file_path):
             return jsonify({
@@ -153,6 +202,15 @@ def download_backup(filename):
                 'message': '备份文件不存在'
             }), 404
 
+        # 快照按需打包为 tar.gz 流，可用 path 参数只下载某个目录
+        if filename.endswith(SNAPSHOT_SUFFIX):
+            archive_name = f'{filename[:-len(SNAPSHOT_SUFFIX)]}.tar.gz'
+            return Response(
+                iter_snapshot_tar(filename, request.args.get('path')),
+                mimetype='application/gzip',
+                headers={'Content-Disposition': f'attachment; filename="{archive_name}"'}
+            )
+
         # 发送文件
         return send_file(
             file_path,
@@ -166,6 +224,52 @@ def download_backup(filename):
         }), 500
 
 
+@api_bp.route('/backup/restore', methods=['POST'])
+def restore_backup():
+    """
+    从快照恢复文件到 backups/restore/<快照名称>（不覆盖当前数据）
+    POST /api/backup/restore
+
+    Body参数：
+    - filename: 快照文件名
+    - path: 只恢复该路径（可选），例如 execution_spaces/execution_12
+    """
+    try:
+        data = request.get_json() or {}
+        filename = data.get('filename') or ''
+
+        # 安全检查：防止路径遍历攻击
+        if not filename.endswith(SNAPSHOT_SUFFIX) or '..' in filename or '/' in filename or '\\' in filename:
+            return jsonify({
+                'code': 1,
+                'message': '非法的快照文件名'
+            }), 400
+
+        if not os.path.exists(os.path.join(Config.BACKUPS_DIR, filename)):
+            return jsonify({
+                'code': 1,
+                'message': '快照不存在'
+            }), 404
+
+        result = restore_snapshot(filename, path=data.get('path'))
+
+        return jsonify({
+            'code': 0,
+            'message': '恢复成功',
+            'data': result
+        })
+    except ValueError as e:
+        return jsonify({
+            'code': 1,
+            'message': str(e)
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'code': 1,
+            'message': f'操作失败: {str(e)}'
+        }), 500
+
+
 @api_bp.route('/backup/<filename>', methods=['DELETE'])
 def delete_backup(filename):
     """
@@ -189,8 +293,8 @@ def delete_backup(filename):
                 'message': '备份文件不存在'
             }), 404
 
-        # 删除文件
-        os.remove(file_path)
+        # 删除文件（快照同时清理不再引用的数据块）
+        remove_backup(filename)
 
         return jsonify({
             'code': 0,
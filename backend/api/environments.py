@@ -4,10 +4,27 @@
 from flask import request, jsonify
 from . import api_bp
 from models import db, Environment
+from services.warm_pool import warm_pool_manager
 import subprocess
 import os
 
 
+WARM_POOL_FIELDS = ['warm_pool_size', 'warm_pool_modules', 'warm_pool_max_runs']
+
+
+def validate_warm_pool(data):
+    """校验预热池配置，返回错误信息，合法时返回 None"""
+    for key in ['warm_pool_size', 'warm_pool_max_runs']:
+        value = data.get(key)
+        if value is None:
+            continue
+        if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+            return f'{key} 必须为非负整数'
+    if data.get('warm_pool_size') and data.get('type', 'python') != 'python':
+        return '仅 Python 环境支持预热池'
+    return None
+
+
 @api_bp.route('/environments', methods=['GET'])
 def get_environments():
     """获取所有环境"""
@@ -51,6 +68,10 @@ def create_environment():
         if not os.path.exists(executable_path):
             return jsonify({'code': 1, 'message': '可执行文件路径不存在'}), 400
 
+        error = validate_warm_pool(data)
+        if error:
+            return jsonify({'code': 1, 'message': error}), 400
+
         # 检测版本
         version = detect_version(executable_path, data.get('type'))
 
@@ -67,11 +88,15 @@ def create_environment():
             executable_path=executable_path,
             description=data.get('description', ''),
             is_default=data.get('is_default', False),
-            version=version
+            version=version,
+            warm_pool_size=data.get('warm_pool_size') or 0,
+            warm_pool_modules=data.get('warm_pool_modules', ''),
+            warm_pool_max_runs=data.get('warm_pool_max_runs')
         )
 
         db.session.add(environment)
         db.session.commit()
+        warm_pool_manager.prewarm([environment])
 
         return jsonify({
             'code': 0,
@@ -95,6 +120,10 @@ def update_environment(env_id):
             if Environment.query.filter_by(name=data.get('name')).first():
                 return jsonify({'code': 1, 'message': '环境名称已存在'}), 400
 
+        error = validate_warm_pool(dict(data, type=environment.type))
+        if error:
+            return jsonify({'code': 1, 'message': error}), 400
+
         # 如果修改了可执行文件路径，检查有效性并更新版本
         if data.get('executable_path') and data.get('executable_path') != environment.executable_path:
             if not os.path.exists(data.get('executable_path')):
@@ -109,11 +138,13 @@ def update_environment(env_id):
             ).update({'is_default': False})
 
         # 更新字段
-        for key in ['name', 'description', 'executable_path', 'is_default']:
+        for key in ['name', 'description', 'executable_path', 'is_default'] + WARM_POOL_FIELDS:
             if key in data:
                 setattr(environment, key, data[key])
 
         db.session.commit()
+        # 按新配置重建或关闭预热池
+        warm_pool_manager.prewarm([environment])
 
         return jsonify({
             'code': 0,
@@ -140,6 +171,7 @@ def delete_environment(env_id):
 
         db.session.delete(environment)
         db.session.commit()
+        warm_pool_manager.remove(env_id)
 
         return jsonify({
             'code': 0,
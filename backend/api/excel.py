@@ -10,6 +10,9 @@ import openpyxl
 from openpyxl.utils import get_column_letter
 from datetime import datetime
 from utils import safe_filename
+from services.excel_reader import excel_reader
+from services.excel_journal import excel_journal
+from services.excel_collab import excel_collab
 
 # 文件大小限制 (10MB)
 MAX_EXCEL_SIZE = 10 * 1024 * 1024
@@ -159,18 +162,14 @@ def get_excel_file_info():
             except ImportError:
                 return jsonify({'code': 1, 'message': '服务器未安装 xlrd 库，不支持 .xls 格式'}), 500
         else:
-            # xlsx 格式
-            workbook = openpyxl.load_workbook(full_path, read_only=True)
-            for idx, sheet_name in enumerate(workbook.sheetnames):
-                sheet = workbook[sheet_name]
-                sheets_info.append({
-                    'name': sheet_name,
-                    'index': idx,
-                    'rows': sheet.max_row,
-                    'cols': sheet.max_column
-                })
-            sheet_count = len(workbook.sheetnames)
-            workbook.close()
+            # xlsx 格式，使用缓存的只读工作簿，行列数包含尚未写入文件的编辑
+            extent = excel_journal.pending_extent(full_path)
+            sheets_info = []
+            for sheet_info in excel_reader.get_info(full_path):
+                rows, cols = extent.get(sheet_info['name'], (0, 0))
+                sheets_info.append(dict(sheet_info, rows=max(sheet_info['rows'], rows),
+                                        cols=max(sheet_info['cols'], cols)))
+            sheet_count = len(sheets_info)
 
         return jsonify({
             'code': 0,
@@ -290,65 +289,29 @@ def get_excel_sheet_data():
             except ImportError:
                 return jsonify({'code': 1, 'message': '服务器未安装 xlrd 库，不支持 .xls 格式'}), 500
         else:
-            # xlsx 格式
-            workbook = openpyxl.load_workbook(full_path, read_only=True, data_only=True)
-
-            # 获取工作表
-            if sheet_identifier.isdigit():
-                sheet_idx = int(sheet_identifier)
-                if sheet_idx < 0 or sheet_idx >= len(workbook.sheetnames):
-                    workbook.close()
-                    return jsonify({'code': 1, 'message': '工作表索引超出范围'}), 400
-                sheet_name = workbook.sheetnames[sheet_idx]
-                sheet = workbook[sheet_name]
-            else:
-                if sheet_identifier not in workbook.sheetnames:
-                    workbook.close()
-                    return jsonify({'code': 1, 'message': f'工作表 "{sheet_identifier}" 不存在'}), 400
-                sheet = workbook[sheet_identifier]
-                sheet_name = sheet_identifier
-
-            total_rows = sheet.max_row
-            total_cols = sheet.max_column
-
-            # 读取数据
-            rows = []
-            end_row = min(offset + limit + 1, total_rows + 1)  # openpyxl 使用 1-based 索引
-            actual_cols = min(total_cols, max_cols)
+            # xlsx 格式，读取缓存的工作簿或列式快照，并叠加尚未写入文件的编辑
+            try:
+                page = excel_reader.read_page(full_path, sheet_identifier, offset, limit, max_cols)
+            except ValueError as e:
+                return jsonify({'code': 1, 'message': str(e)}), 400
+            page = excel_journal.apply_to_page(full_path, page, offset, limit, max_cols)
 
-            for row_idx in range(offset + 1, end_row):  # openpyxl 使用 1-based 索引
-                row_data = []
-                for col_idx in range(1, actual_cols + 1):
-                    cell = sheet.cell(row=row_idx, column=col_idx)
-                    value = cell.value
-                    # 处理日期类型
+            # 处理日期类型
+            for row_data in page['rows']:
+                for col_idx, value in enumerate(row_data):
                     if isinstance(value, datetime):
-                        value = value.strftime('%Y-%m-%d %H:%M:%S')
-                    row_data.append(value)
-                rows.append(row_data)
-
-            # 获取合并单元格信息
-            merge_cells = []
-            for merge_range in sheet.merged_cells.ranges:
-                merge_cells.append({
-                    'r': merge_range.min_row - 1,  # 转换为 0-based 索引
-                    'c': merge_range.min_col - 1,
-                    'rs': merge_range.max_row - merge_range.min_row + 1,
-                    'cs': merge_range.max_col - merge_range.min_col + 1
-                })
-
-            workbook.close()
+                        row_data[col_idx] = value.strftime('%Y-%m-%d %H:%M:%S')
 
             return jsonify({
                 'code': 0,
                 'data': {
-                    'sheet_name': sheet_name,
-                    'total_rows': total_rows,
-                    'total_cols': total_cols,
+                    'sheet_name': page['sheet_name'],
+                    'total_rows': page['total_rows'],
+                    'total_cols': page['total_cols'],
                     'offset': offset,
                     'limit': limit,
-                    'rows': rows,
-                    'merge_cells': merge_cells
+                    'rows': page['rows'],
+                    'merge_cells': page['merge_cells']
                 }
             })
 
@@ -380,10 +343,14 @@ def save_excel_editor_file():
             ]
         }
 
+    只包含 cells 的增量更新追加到编辑日志后立即返回，由后台合并写入文件（见 services.excel_journal）；
+    完整更新或修改合并单元格时先写入日志中的编辑，再加载完整工作簿保存。
+
     Returns:
         {
             "code": 0,
-            "message": "保存成功"
+            "message": "保存成功",
+            "data": {"seq": 12, "pending": true}  // 增量更新时返回日志序号
         }
     """
     try:
@@ -412,64 +379,81 @@ def save_excel_editor_file():
         if ext == '.xls':
             return jsonify({'code': 1, 'message': '.xls 格式文件暂不支持编辑，请转换为 .xlsx 格式'}), 400
 
-        # 加载工作簿
-        workbook = openpyxl.load_workbook(full_path)
+        # 增量更新：追加到编辑日志，日志落盘后即返回
+        if cells and merge_cells is None:
+            try:
+                seq = excel_journal.append(full_path, sheet_identifier, cells)
+            except ValueError as e:
+                return jsonify({'code': 1, 'message': str(e)}), 400
+            return jsonify({
+                'code': 0,
+                'message': '保存成功',
+                'data': {'seq': seq, 'pending': True}
+            })
 
-        # 获取工作表
-        if sheet_identifier.isdigit():
-            sheet_idx = int(sheet_identifier)
-            if sheet_idx < 0 or sheet_idx >= len(workbook.sheetnames):
-                workbook.close()
-                return jsonify({'code': 1, 'message': '工作表索引超出范围'}), 400
-            sheet = workbook.worksheets[sheet_idx]
-            sheet_name = sheet.title
-        else:
-            if sheet_identifier not in workbook.sheetnames:
-                workbook.close()
-                return jsonify({'code': 1, 'message': f'工作表 "{sheet_identifier}" 不存在'}), 400
-            sheet = workbook[sheet_identifier]
-            sheet_name = sheet_identifier
-
-        # 增量更新：更新指定单元格
-        if cells:
-            for cell_data in cells:
-                row = cell_data.get('row', 0)
-                col = cell_data.get('col', 0)
-                value = cell_data.get('value')
-                # openpyxl 使用 1-based 索引
-                sheet.cell(row=row + 1, column=col + 1, value=value)
-
-        # 完整更新：替换整个工作表数据
-        elif rows is not None:
-            # 清除现有数据
-            for row in sheet.iter_rows():
-                for cell in row:
-                    cell.value = None
-
-            # 写入新数据
-            for row_idx, row_data in enumerate(rows):
-                for col_idx, value in enumerate(row_data):
-                    sheet.cell(row=row_idx + 1, column=col_idx + 1, value=value)
-
-        # 更新合并单元格
-        if merge_cells is not None:
-            # 先清除现有合并单元格
-            existing_merges = list(sheet.merged_cells.ranges)
-            for merge_range in existing_merges:
-                sheet.unmerge_cells(str(merge_range))
-
-            # 添加新的合并单元格
-            for merge in merge_cells:
-                start_row = merge.get('r', 0) + 1
-                start_col = merge.get('c', 0) + 1
-                end_row = start_row + merge.get('rs', 1) - 1
-                end_col = start_col + merge.get('cs', 1) - 1
-                sheet.merge_cells(start_row=start_row, start_column=start_col,
-                                  end_row=end_row, end_column=end_col)
-
-        # 保存文件
-        workbook.save(full_path)
-        workbook.close()
+        # 完整保存期间持有写入锁（跨进程），进入时先写入日志中尚未写入文件的编辑
+        with excel_journal.exclusive(full_path):
+            # 加载工作簿
+            workbook = openpyxl.load_workbook(full_path)
+
+            # 获取工作表
+            if sheet_identifier.isdigit():
+                sheet_idx = int(sheet_identifier)
+                if sheet_idx < 0 or sheet_idx >= len(workbook.sheetnames):
+                    workbook.close()
+                    return jsonify({'code': 1, 'message': '工作表索引超出范围'}), 400
+                sheet = workbook.worksheets[sheet_idx]
+                sheet_name = sheet.title
+            else:
+                if sheet_identifier not in workbook.sheetnames:
+                    workbook.close()
+                    return jsonify({'code': 1, 'message': f'工作表 "{sheet_identifier}" 不存在'}), 400
+                sheet = workbook[sheet_identifier]
+                sheet_name = sheet_identifier
+
+            # 增量更新：更新指定单元格
+            if cells:
+                for cell_data in cells:
+                    row = cell_data.get('row', 0)
+                    col = cell_data.get('col', 0)
+                    value = cell_data.get('value')
+                    # openpyxl 使用 1-based 索引
+                    sheet.cell(row=row + 1, column=col + 1, value=value)
+
+            # 完整更新：替换整个工作表数据
+            elif rows is not None:
+                # 清除现有数据
+                for row in sheet.iter_rows():
+                    for cell in row:
+                        cell.value = None
+
+                # 写入新数据
+                for row_idx, row_data in enumerate(rows):
+                    for col_idx, value in enumerate(row_data):
+                        sheet.cell(row=row_idx + 1, column=col_idx + 1, value=value)
+
+            # 更新合并单元格
+            if merge_cells is not None:
+                # 先清除现有合并单元格
+                existing_merges = list(sheet.merged_cells.ranges)
+                for merge_range in existing_merges:
+                    sheet.unmerge_cells(str(merge_range))
+
+                # 添加新的合并单元格
+                for merge in merge_cells:
+                    start_row = merge.get('r', 0) + 1
+                    start_col = merge.get('c', 0) + 1
+                    end_row = start_row + merge.get('rs', 1) - 1
+                    end_col = start_col + merge.get('cs', 1) - 1
+                    sheet.merge_cells(start_row=start_row, start_column=start_col,
+                                      end_row=end_row, end_column=end_col)
+
+            # 保存文件（先释放缓存中的只读工作簿）
+            excel_reader.invalidate(full_path)
+            workbook.save(full_path)
+            workbook.close()
+        # 文件被整体改写，协同编辑房间中的编辑状态不再适用
+        excel_collab.reset(full_path)
 
         return jsonify({
             'code': 0,
@@ -535,25 +519,30 @@ def add_excel_sheet():
         if ext == '.xls':
             return jsonify({'code': 1, 'message': '.xls 格式文件暂不支持编辑，请转换为 .xlsx 格式'}), 400
 
-        # 加载工作簿
-        workbook = openpyxl.load_workbook(full_path)
+        # 修改期间持有写入锁（跨进程），进入时先写入编辑日志中尚未写入文件的编辑
+        with excel_journal.exclusive(full_path):
+            # 加载工作簿
+            workbook = openpyxl.load_workbook(full_path)
 
-        # 检查工作表名称是否已存在
-        if sheet_name in workbook.sheetnames:
-            workbook.close()
-            return jsonify({'code': 1, 'message': f'工作表 "{sheet_name}" 已存在'}), 400
+            # 检查工作表名称是否已存在
+            if sheet_name in workbook.sheetnames:
+                workbook.close()
+                return jsonify({'code': 1, 'message': f'工作表 "{sheet_name}" 已存在'}), 400
 
-        # 创建新工作表
-        if position is not None and isinstance(position, int) and 0 <= position <= len(workbook.sheetnames):
-            new_sheet = workbook.create_sheet(title=sheet_name, index=position)
-            sheet_index = position
-        else:
-            new_sheet = workbook.create_sheet(title=sheet_name)
-            sheet_index = len(workbook.sheetnames) - 1
+            # 创建新工作表
+            if position is not None and isinstance(position, int) and 0 <= position <= len(workbook.sheetnames):
+                new_sheet = workbook.create_sheet(title=sheet_name, index=position)
+                sheet_index = position
+            else:
+                new_sheet = workbook.create_sheet(title=sheet_name)
+                sheet_index = len(workbook.sheetnames) - 1
 
-        # 保存文件
-        workbook.save(full_path)
-        workbook.close()
+            # 保存文件（先释放缓存中的只读工作簿）
+            excel_reader.invalidate(full_path)
+            workbook.save(full_path)
+            workbook.close()
+        # 文件被整体改写，协同编辑房间中的编辑状态不再适用
+        excel_collab.reset(full_path)
 
         return jsonify({
             'code': 0,
@@ -608,33 +597,38 @@ def delete_excel_sheet():
         if ext == '.xls':
             return jsonify({'code': 1, 'message': '.xls 格式文件暂不支持编辑，请转换为 .xlsx 格式'}), 400
 
-        # 加载工作簿
-        workbook = openpyxl.load_workbook(full_path)
+        # 修改期间持有写入锁（跨进程），进入时先写入编辑日志中尚未写入文件的编辑
+        with excel_journal.exclusive(full_path):
+            # 加载工作簿
+            workbook = openpyxl.load_workbook(full_path)
 
-        # 检查是否只有一个工作表
-        if len(workbook.sheetnames) <= 1:
-            workbook.close()
-            return jsonify({'code': 1, 'message': '无法删除最后一个工作表'}), 400
-
-        # 获取工作表
-        if sheet_identifier.isdigit():
-            sheet_idx = int(sheet_identifier)
-            if sheet_idx < 0 or sheet_idx >= len(workbook.sheetnames):
-                workbook.close()
-                return jsonify({'code': 1, 'message': '工作表索引超出范围'}), 400
-            sheet_name = workbook.sheetnames[sheet_idx]
-        else:
-            if sheet_identifier not in workbook.sheetnames:
+            # 检查是否只有一个工作表
+            if len(workbook.sheetnames) <= 1:
                 workbook.close()
-                return jsonify({'code': 1, 'message': f'工作表 "{sheet_identifier}" 不存在'}), 400
-            sheet_name = sheet_identifier
+                return jsonify({'code': 1, 'message': '无法删除最后一个工作表'}), 400
 
-        # 删除工作表
-        del workbook[sheet_name]
+            # 获取工作表
+            if sheet_identifier.isdigit():
+                sheet_idx = int(sheet_identifier)
+                if sheet_idx < 0 or sheet_idx >= len(workbook.sheetnames):
+                    workbook.close()
+                    return jsonify({'code': 1, 'message': '工作表索引超出范围'}), 400
+                sheet_name = workbook.sheetnames[sheet_idx]
+            else:
+                if sheet_identifier not in workbook.sheetnames:
+                    workbook.close()
+                    return jsonify({'code': 1, 'message': f'工作表 "{sheet_identifier}" 不存在'}), 400
+                sheet_name = sheet_identifier
+
+            # 删除工作表
+            del workbook[sheet_name]
 
-        # 保存文件
-        workbook.save(full_path)
-        workbook.close()
+            # 保存文件（先释放缓存中的只读工作簿）
+            excel_reader.invalidate(full_path)
+            workbook.save(full_path)
+            workbook.close()
+        # 文件被整体改写，协同编辑房间中的编辑状态不再适用
+        excel_collab.reset(full_path)
 
         return jsonify({
             'code': 0,
@@ -699,33 +693,38 @@ def rename_excel_sheet():
         if ext == '.xls':
             return jsonify({'code': 1, 'message': '.xls 格式文件暂不支持编辑，请转换为 .xlsx 格式'}), 400
 
-        # 加载工作簿
-        workbook = openpyxl.load_workbook(full_path)
-
-        # 检查新名称是否已存在
-        if new_name in workbook.sheetnames:
-            workbook.close()
-            return jsonify({'code': 1, 'message': f'工作表 "{new_name}" 已存在'}), 400
+        # 修改期间持有写入锁（跨进程），进入时先写入编辑日志中尚未写入文件的编辑
+        with excel_journal.exclusive(full_path):
+            # 加载工作簿
+            workbook = openpyxl.load_workbook(full_path)
 
-        # 获取工作表
-        if sheet_identifier.isdigit():
-            sheet_idx = int(sheet_identifier)
-            if sheet_idx < 0 or sheet_idx >= len(workbook.sheetnames):
+            # 检查新名称是否已存在
+            if new_name in workbook.sheetnames:
                 workbook.close()
-                return jsonify({'code': 1, 'message': '工作表索引超出范围'}), 400
-            sheet = workbook.worksheets[sheet_idx]
-        else:
-            if sheet_identifier not in workbook.sheetnames:
-                workbook.close()
-                return jsonify({'code': 1, 'message': f'工作表 "{sheet_identifier}" 不存在'}), 400
-            sheet = workbook[sheet_identifier]
+                return jsonify({'code': 1, 'message': f'工作表 "{new_name}" 已存在'}), 400
 
-        # 重命名工作表
-        sheet.title = new_name
+            # 获取工作表
+            if sheet_identifier.isdigit():
+                sheet_idx = int(sheet_identifier)
+                if sheet_idx < 0 or sheet_idx >= len(workbook.sheetnames):
+                    workbook.close()
+                    return jsonify({'code': 1, 'message': '工作表索引超出范围'}), 400
+                sheet = workbook.worksheets[sheet_idx]
+            else:
+                if sheet_identifier not in workbook.sheetnames:
+                    workbook.close()
+                    return jsonify({'code': 1, 'message': f'工作表 "{sheet_identifier}" 不存在'}), 400
+                sheet = workbook[sheet_identifier]
 
-        # 保存文件
-        workbook.save(full_path)
-        workbook.close()
+            # 重命名工作表
+            sheet.title = new_name
+
+            # 保存文件（先释放缓存中的只读工作簿）
+            excel_reader.invalidate(full_path)
+            workbook.save(full_path)
+            workbook.close()
+        # 文件被整体改写，协同编辑房间中的编辑状态不再适用
+        excel_collab.reset(full_path)
 
         return jsonify({
             'code': 0,
@@ -1,14 +1,20 @@
 """
 执行记录API
 """
-from flask import request, jsonify, Response, stream_with_context
+from flask import request, jsonify, Response, send_file, stream_with_context
 from utils import safe_filename
 from . import api_bp
 from models import db, Execution, Script
-from services.executor import execute_script
+from services.dispatcher import execution_dispatcher
+from services.executor import commit_status
+from services import execution_stats
+from services.excel_journal import excel_journal
+from services.log_bus import log_bus, read_log_from
+from services.log_reader import read_range, read_lines, read_tail, ensure_gzip, remove_log_files
+from sqlalchemy import select, union_all, literal, null, cast, and_, or_, Integer, String
+import base64
 import json
 import os
-import time
 from datetime import datetime
 
 
@@ -153,83 +159,255 @@ def execute_script_api(script_id):
             'created_at': execution.created_at.isoformat() if execution.created_at else None
         }
 
-        # 异步执行脚本
-        from threading import Thread
-        from flask import current_app
-
-        # 获取当前应用实例
-        app = current_app._get_current_object()
-
-        def run_script_with_context():
-            with app.app_context():
-                execute_script(execution.id)
-
-        thread = Thread(target=run_script_with_context)
-        thread.start()
+        # 文件就绪后再入队，由调度器按并发上限执行
+        execution.priority = Execution.PRIORITY_INTERACTIVE
+        db.session.commit()
+        execution_dispatcher.submit(execution.id)
 
         return jsonify({
             'code': 0,
             'data': execution_data,
-            'message': '脚本执行已启动'
+            'message': '脚本执行已加入队列'
         })
     except Exception as e:
         db.session.rollback()
         return jsonify({'code': 1, 'message': str(e)}), 500
 
 
+# 行数超过该值时，无过滤条件的总数改用 PostgreSQL 统计信息估算
+COUNT_ESTIMATE_THRESHOLD = 100000
+
+
+def _encode_cursor(created_at, execution_type, execution_id):
+    """编码翻页游标 (created_at, execution_type, id)"""
+    raw = json.dumps([created_at.isoformat() if created_at else None, execution_type, execution_id])
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def _decode_cursor(cursor):
+    """解码翻页游标，格式错误时抛出 ValueError"""
+    try:
+        created_at, execution_type, execution_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return datetime.fromisoformat(created_at), execution_type, int(execution_id)
+    except Exception:
+        raise ValueError('无效的游标')
+
+
+def _keyset_filter(created_col, id_col, branch_type, cursor):
+    """
+    构造单个分支的游标过滤条件
+
+    全局排序为 (created_at, execution_type, id) 降序，分支内 execution_type 为常量，
+    因此条件可以下推到各自的表上，走 created_at 索引。
+    """
+    cursor_created, cursor_type, cursor_id = cursor
+    if branch_type < cursor_type:
+        return created_col <= cursor_created
+    if branch_type > cursor_type:
+        return created_col < cursor_created
+    # 冗余的 created_at <= 条件让索引可以直接定位到游标位置（只有 OR 条件时需要从头扫描索引）
+    return and_(
+        created_col <= cursor_created,
+        or_(
+            created_col < cursor_created,
+            and_(created_col == cursor_created, id_col < cursor_id)
+        )
+    )
+
+
+def _history_branches(script_id, exec_type, cursor, limit):
+    """
+    构造脚本执行和工作流执行两个分支的列投影查询
+
+    名称通过 JOIN 取出，不加载 ORM 对象，也不带 output/error 等大字段。
+    每个分支各自排序并限制行数，UNION 后只需合并少量行。
+    """
+    from models import Environment
+    from models.workflow import Workflow, WorkflowExecution
+
+    branches = []
+    if exec_type != 'workflow':
+        query = select(
+            Execution.id.label('id'),
+            literal('script').label('execution_type'),
+            Execution.script_id.label('script_id'),
+            cast(null(), Integer).label('workflow_id'),
+            Script.name.label('name'),
+            Execution.environment_id.label('environment_id'),
+            Environment.name.label('environment_name'),
+            Execution.status.label('status'),
+            Execution.progress.label('progress'),
+            Execution.stage.label('stage'),
+            Execution.params.label('params'),
+            Execution.start_time.label('start_time'),
+            Execution.end_time.label('end_time'),
+            Execution.created_at.label('created_at')
+        ).select_from(Execution).outerjoin(
+            Script, Script.id == Execution.script_id
+        ).outerjoin(
+            Environment, Environment.id == Execution.environment_id
+        )
+        if script_id:
+            query = query.where(Execution.script_id == script_id)
+        if cursor:
+            query = query.where(_keyset_filter(Execution.created_at, Execution.id, 'script', cursor))
+        branches.append(query.order_by(Execution.created_at.desc(), Execution.id.desc()).limit(limit))
+
+    if exec_type != 'script':
+        query = select(
+            WorkflowExecution.id.label('id'),
+            literal('workflow').label('execution_type'),
+            cast(null(), Integer).label('script_id'),
+            WorkflowExecution.workflow_id.label('workflow_id'),
+            Workflow.name.label('name'),
+            cast(null(), Integer).label('environment_id'),
+            cast(null(), String).label('environment_name'),
+            WorkflowExecution.status.label('status'),
+            cast(null(), Integer).label('progress'),
+            cast(null(), String).label('stage'),
+            WorkflowExecution.params.label('params'),
+            WorkflowExecution.start_time.label('start_time'),
+            WorkflowExecution.end_time.label('end_time'),
+            WorkflowExecution.created_at.label('created_at')
+        ).select_from(WorkflowExecution).outerjoin(
+            Workflow, Workflow.id == WorkflowExecution.workflow_id
+        )
+        if cursor:
+            query = query.where(_keyset_filter(WorkflowExecution.created_at, WorkflowExecution.id, 'workflow', cursor))
+        branches.append(query.order_by(WorkflowExecution.created_at.desc(), WorkflowExecution.id.desc()).limit(limit))
+
+    return branches
+
+
+def _count_rows(model, filters):
+    """
+    统计行数
+
+    无过滤条件且表很大时使用 pg_class.reltuples 估算，避免全表 COUNT。
+
+    Returns:
+        (count, is_estimate)
+    """
+    if not filters and db.engine.dialect.name == 'postgresql':
+        estimate = db.session.execute(
+            db.text('SELECT reltuples::bigint FROM pg_class WHERE relname = :name'),
+            {'name': model.__tablename__}
+        ).scalar()
+        if estimate and estimate > COUNT_ESTIMATE_THRESHOLD:
+            return int(estimate), True
+
+    query = db.session.query(db.func.count(model.id))
+    for condition in filters:
+        query = query.filter(condition)
+    return query.scalar() or 0, False
+
+
+def _history_item(row):
+    """将投影行转换为列表项（字段与原 to_dict 输出保持兼容）"""
+    item = {
+        'id': row.id,
+        'execution_type': row.execution_type,
+        'status': row.status,
+        'params': row.params,
+        'start_time': row.start_time.isoformat() if row.start_time else None,
+        'end_time': row.end_time.isoformat() if row.end_time else None,
+        'created_at': row.created_at.isoformat() if row.created_at else None
+    }
+    if row.execution_type == 'script':
+        item.update({
+            'type_name': '脚本执行',
+            'script_id': row.script_id,
+            'script_name': row.name,
+            'environment_id': row.environment_id,
+            'environment_name': row.environment_name,
+            'progress': row.progress or 0,
+            'stage': row.stage or 'pending'
+        })
+    else:
+        item.update({
+            'type_name': '工作流执行',
+            'workflow_id': row.workflow_id,
+            'params': json.loads(row.params) if row.params else {},
+            # 工作流名称作为 script_name，保持前端兼容
+            'script_name': row.name or '未知工作流',
+            'duration': (row.end_time - row.start_time).total_seconds() if row.end_time and row.start_time else None
+        })
+    return item
+
+
 @api_bp.route('/executions', methods=['GET'])
 def get_executions():
-    """获取执行历史列表（包括脚本执行和工作流执行）"""
+    """
+    获取执行历史列表（包括脚本执行和工作流执行）
+
+    查询参数：
+    - page/per_page: 页码分页
+    - cursor: 上一页返回的 next_cursor，提供时按游标翻页（忽略 page），深翻页代价恒定
+    - script_id: 按脚本过滤脚本执行记录
+    - type: 'script'、'workflow' 或空字符串表示全部
+    """
     try:
         from models.workflow import WorkflowExecution
 
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 20, type=int)
+        page = max(request.args.get('page', 1, type=int), 1)
+        per_page = min(max(request.args.get('per_page', 20, type=int), 1), 500)
         script_id = request.args.get('script_id', type=int)
         exec_type = request.args.get('type', '')  # 'script', 'workflow', 或空字符串表示全部
+        cursor_param = request.args.get('cursor')
 
-        # 获取脚本执行记录
-        script_executions = []
+        cursor = None
+        if cursor_param:
+            try:
+                cursor = _decode_cursor(cursor_param)
+            except ValueError as e:
+                return jsonify({'code': 1, 'message': str(e)}), 400
+            offset = 0
+        else:
+            offset = (page - 1) * per_page
+
+        # 各分支最多需要 offset + per_page + 1 行（多取一行用于判断是否还有下一页）
+        branches = _history_branches(script_id, exec_type, cursor, offset + per_page + 1)
+        combined = union_all(*[select(branch.subquery()) for branch in branches]).subquery()
+        rows = db.session.execute(
+            select(combined).order_by(
+                combined.c.created_at.desc(),
+                combined.c.execution_type.desc(),
+                combined.c.id.desc()
+            ).offset(offset).limit(per_page + 1)
+        ).all()
+
+        has_more = len(rows) > per_page
+        rows = rows[:per_page]
+        items = [_history_item(row) for row in rows]
+
+        next_cursor = None
+        if has_more and rows:
+            last = rows[-1]
+            next_cursor = _encode_cursor(last.created_at, last.execution_type, last.id)
+
+        # 统计总数
+        total = 0
+        total_is_estimate = False
         if exec_type != 'workflow':
-            query = Execution.query
-            if script_id:
-                query = query.filter_by(script_id=script_id)
-
-            for execution in query.all():
-                item = execution.to_dict()
-                item['execution_type'] = 'script'
-                item['type_name'] = '脚本执行'
-                script_executions.append(item)
-
-        # 获取工作流执行记录
-        workflow_executions = []
+            filters = [Execution.script_id == script_id] if script_id else []
+            count, estimated = _count_rows(Execution, filters)
+            total += count
+            total_is_estimate = total_is_estimate or estimated
         if exec_type != 'script':
-            for wf_execution in WorkflowExecution.query.all():
-                item = wf_execution.to_dict()
-                item['execution_type'] = 'workflow'
-                item['type_name'] = '工作流执行'
-                # 添加工作流名称作为 script_name，保持前端兼容
-                item['script_name'] = item.get('workflow', {}).get('name', '未知工作流')
-                workflow_executions.append(item)
-
-        # 合并并按创建时间排序
-        all_executions = script_executions + workflow_executions
-        all_executions.sort(key=lambda x: x.get('created_at', ''), reverse=True)
-
-        # 手动分页
-        total = len(all_executions)
-        start = (page - 1) * per_page
-        end = start + per_page
-        items = all_executions[start:end]
+            count, estimated = _count_rows(WorkflowExecution, [])
+            total += count
+            total_is_estimate = total_is_estimate or estimated
 
         return jsonify({
             'code': 0,
             'data': {
                 'items': items,
                 'total': total,
+                'total_is_estimate': total_is_estimate,
                 'page': page,
                 'per_page': per_page,
-                'pages': (total + per_page - 1) // per_page
+                'pages': (total + per_page - 1) // per_page,
+                'next_cursor': next_cursor
             }
         })
     except Exception as e:
@@ -249,10 +427,32 @@ def get_execution(execution_id):
         return jsonify({'code': 1, 'message': str(e)}), 500
 
 
+def _int_arg(name):
+    """读取非负整数查询参数，未提供时返回 None"""
+    value = request.args.get(name)
+    if value is None or value == '':
+        return None
+    value = int(value)
+    if value < 0:
+        raise ValueError(f'参数 {name} 不能为负数')
+    return value
+
+
 @api_bp.route('/executions/<int:execution_id>/logs', methods=['GET'])
 def get_execution_logs(execution_id):
-    """获取执行日志"""
+    """
+    获取执行日志
+
+    查询参数（三选一，均未提供时返回整个日志，超过 LOG_MAX_READ_BYTES 时只返回末尾部分）：
+    - offset, length: 按字节范围读取，返回的 end 可作为下一次的 offset
+    - line, lines: 从第 line 行（从0计）开始读取 lines 行，默认 100 行
+    - tail: 读取最后 N 行
+
+    返回内容超过 LOG_MAX_READ_BYTES 时会被截断，truncated 表示范围外还有内容。
+    """
     try:
+        from config import Config
+
         execution = Execution.query.get_or_404(execution_id)
 
         if not execution.log_file or not os.path.exists(execution.log_file):
@@ -264,84 +464,197 @@ def get_execution_logs(execution_id):
                 }
             })
 
-        # 读取日志文件
-        with open(execution.log_file, 'r', encoding='utf-8') as f:
-            logs = f.read()
+        try:
+            offset = _int_arg('offset')
+            length = _int_arg('length')
+            line = _int_arg('line')
+            lines = _int_arg('lines')
+            tail = _int_arg('tail')
+        except ValueError as e:
+            return jsonify({'code': 1, 'message': f'参数错误: {str(e)}'}), 400
+
+        if tail is not None:
+            if tail == 0 or tail > Config.LOG_MAX_TAIL_LINES:
+                return jsonify({'code': 1, 'message': f'tail 取值范围为 1-{Config.LOG_MAX_TAIL_LINES}'}), 400
+            result = read_tail(execution.log_file, tail)
+        elif line is not None:
+            result = read_lines(execution.log_file, line, lines if lines is not None else 100)
+        elif offset is not None or length is not None:
+            result = read_range(execution.log_file, offset or 0, length)
+        else:
+            size = os.path.getsize(execution.log_file)
+            result = read_range(execution.log_file, max(size - Config.LOG_MAX_READ_BYTES, 0))
+            result['truncated'] = result['offset'] > 0
 
         return jsonify({
             'code': 0,
             'data': {
-                'logs': logs,
-                'error': execution.error or ''
+                'logs': result['content'],
+                'error': execution.error or '',
+                'offset': result['offset'],
+                'end': result['end'],
+                'size': result['size'],
+                'truncated': result['truncated'],
+                'start_line': result.get('start_line'),
+                'total_lines': execution.log_lines
             }
         })
     except Exception as e:
         return jsonify({'code': 1, 'message': str(e)}), 500
 
 
+@api_bp.route('/executions/<int:execution_id>/logs/download', methods=['GET'])
+def download_execution_logs(execution_id):
+    """
+    下载完整执行日志
+
+    查询参数 compress=gzip 时下载 gzip 压缩副本（仅限已结束的执行，首次请求时生成并缓存）。
+    支持 If-None-Match / If-Modified-Since 条件请求和 Range 断点续传。
+    """
+    try:
+        execution = Execution.query.get_or_404(execution_id)
+
+        if not execution.log_file or not os.path.exists(execution.log_file):
+            return jsonify({'code': 1, 'message': '日志文件不存在'}), 404
+
+        download_name = f'execution_{execution_id}.log'
+        if request.args.get('compress') == 'gzip':
+            if execution.status not in log_bus.FINAL_STATUSES:
+                return jsonify({'code': 1, 'message': '执行尚未结束，暂不支持压缩下载'}), 400
+            return send_file(
+                ensure_gzip(execution.log_file),
+                mimetype='application/gzip',
+                as_attachment=True,
+                download_name=f'{download_name}.gz',
+                conditional=True
+            )
+
+        return send_file(
+            execution.log_file,
+            mimetype='text/plain',
+            as_attachment=True,
+            download_name=download_name,
+            conditional=True
+        )
+    except Exception as e:
+        return jsonify({'code': 1, 'message': str(e)}), 500
+
+
+# SSE 心跳间隔（秒），心跳时顺带补读文件，兼容执行发生在其他进程的情况
+LOG_STREAM_KEEPALIVE = 15
+
+def _sse_event(data, event_id=None):
+    """格式化一条 SSE 消息"""
+    prefix = f"id: {event_id}\n" if event_id is not None else ''
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+
 @api_bp.route('/executions/<int:execution_id>/logs/stream', methods=['GET'])
 def stream_execution_logs(execution_id):
-    """实时流式传输执行日志 (Server-Sent Events)"""
+    """
+    实时流式传输执行日志 (Server-Sent Events)
+
+    日志与进度由日志总线推送，连接期间不轮询数据库。
+    每条日志消息的 id 为其在日志文件中的结束字节偏移，
+    断线重连时通过 Last-Event-ID 请求头（或 offset 查询参数）从该位置续传。
+    """
+    from config import Config
+
+    resume_from = request.headers.get('Last-Event-ID') or request.args.get('offset')
+    try:
+        sent_upto = max(int(resume_from), 0) if resume_from else 0
+    except ValueError:
+        sent_upto = 0
+
+    # 先订阅再读取状态，避免错过两者之间发布的事件
+    subscription = log_bus.subscribe(execution_id)
+
+    execution = Execution.query.get(execution_id)
+    snapshot = None
+    if execution:
+        snapshot = {
+            'status': execution.status,
+            'progress': execution.progress,
+            'stage': execution.stage,
+            'error': execution.error,
+            'log_file': execution.log_file or os.path.join(Config.LOGS_DIR, f'execution_{execution_id}.log')
+        }
+    # 释放数据库连接，流式传输期间不再占用
+    db.session.remove()
+
     def generate():
-        execution = Execution.query.get(execution_id)
-        if not execution:
-            yield f"data: {json.dumps({'error': '执行记录不存在'})}\n\n"
-            return
-
-        # 等待日志文件创建
-        max_wait = 10  # 最多等待10秒
-        waited = 0
-        while not execution.log_file or not os.path.exists(execution.log_file):
-            if waited >= max_wait:
-                yield f"data: {json.dumps({'error': '日志文件未创建'})}\n\n"
+        nonlocal sent_upto
+        try:
+            if not snapshot:
+                yield _sse_event({'error': '执行记录不存在'})
                 return
-            time.sleep(0.5)
-            waited += 0.5
-            db.session.refresh(execution)
 
-        # 流式读取日志
-        with open(execution.log_file, 'r', encoding='utf-8') as f:
-            # 发送已有内容
-            content = f.read()
-            if content:
-                yield f"data: {json.dumps({'type': 'log', 'content': content})}\n\n"
+            log_file = snapshot['log_file']
 
-            # 持续读取新内容
-            while True:
-                db.session.refresh(execution)
+            # 补齐文件中已有的内容
+            for content, end in read_log_from(log_file, sent_upto):
+                sent_upto = end
+                yield _sse_event({'type': 'log', 'content': content}, end)
 
-                # 发送进度更新
-                progress_data = {
-                    'type': 'progress',
-                    'progress': execution.progress or 0,
-                    'stage': execution.stage or 'pending'
-                }
-                yield f"data: {json.dumps(progress_data)}\n\n"
-
-                # 检查执行状态
-                if execution.status in ['success', 'failed']:
-                    # 读取剩余内容
-                    new_content = f.read()
-                    if new_content:
-                        yield f"data: {json.dumps({'type': 'log', 'content': new_content})}\n\n"
-
-                    # 发送完成信息
-                    completion_data = {
-                        'type': 'status',
-                        'status': execution.status,
-                        'progress': execution.progress or 100,
-                        'stage': execution.stage or ('completed' if execution.status == 'success' else 'failed'),
-                        'error': execution.error or ''
-                    }
-                    yield f"data: {json.dumps(completion_data)}\n\n"
-                    break
+            if snapshot['status'] in ['success', 'failed']:
+                yield _sse_event({
+                    'type': 'status',
+                    'status': snapshot['status'],
+                    'progress': snapshot['progress'] or 100,
+                    'stage': snapshot['stage'] or ('completed' if snapshot['status'] == 'success' else 'failed'),
+                    'error': snapshot['error'] or ''
+                })
+                return
+
+            yield _sse_event({
+                'type': 'progress',
+                'progress': snapshot['progress'] or 0,
+                'stage': snapshot['stage'] or 'pending'
+            })
 
-                # 读取新内容
-                new_content = f.read()
-                if new_content:
-                    yield f"data: {json.dumps({'type': 'log', 'content': new_content})}\n\n"
+            while True:
+                event = subscription.get(timeout=LOG_STREAM_KEEPALIVE)
+
+                if event is None:
+                    # 心跳：补读文件，并确认执行是否已在其他进程中结束
+                    for content, end in read_log_from(log_file, sent_upto):
+                        sent_upto = end
+                        yield _sse_event({'type': 'log', 'content': content}, end)
+                    status_row = db.session.query(
+                        Execution.status, Execution.progress, Execution.stage, Execution.error
+                    ).filter(Execution.id == execution_id).first()
+                    db.session.remove()
+                    if not status_row or status_row.status in ['success', 'failed']:
+                        yield _sse_event({
+                            'type': 'status',
+                            'status': status_row.status if status_row else 'failed',
+                            'progress': (status_row.progress if status_row else None) or 100,
+                            'stage': (status_row.stage if status_row else None) or 'failed',
+                            'error': (status_row.error if status_row else '执行记录丢失') or ''
+                        })
+                        return
+                    yield ": keepalive\n\n"
+                    continue
 
-                time.sleep(0.5)  # 每0.5秒检查一次
+                if event['type'] == 'log':
+                    if event['end'] <= sent_upto:
+                        continue
+                    content = event['content']
+                    if event['offset'] < sent_upto:
+                        # 与已从文件读取的内容部分重叠，只发送未发送的部分
+                        content = content.encode('utf-8')[sent_upto - event['offset']:].decode('utf-8', errors='ignore')
+                    sent_upto = event['end']
+                    yield _sse_event({'type': 'log', 'content': content}, sent_upto)
+
+                elif event['type'] == 'progress':
+                    yield _sse_event(event)
+
+                elif event['type'] == 'status':
+                    yield _sse_event(event)
+                    if event['status'] in log_bus.FINAL_STATUSES:
+                        return
+        finally:
+            log_bus.unsubscribe(subscription)
 
     return Response(
         stream_with_context(generate()),
@@ -363,8 +676,7 @@ def delete_execution(execution_id):
         execution = Execution.query.get_or_404(execution_id)
 
         # 删除日志文件
-        if execution.log_file and os.path.exists(execution.log_file):
-            os.remove(execution.log_file)
+        remove_log_files(execution.log_file)
 
         # 删除执行空间（包含所有上传的文件和输出文件）
         execution_space = Config.get_execution_space(execution_id)
@@ -372,6 +684,7 @@ def delete_execution(execution_id):
             shutil.rmtree(execution_space)
             print(f"删除执行 {execution_id} 的执行空间: {execution_space}")
 
+        execution_stats.forget([execution.id])
         db.session.delete(execution)
         db.session.commit()
 
@@ -431,14 +744,14 @@ def batch_manage_executions():
             for execution in executions:
                 try:
                     # 删除日志文件
-                    if execution.log_file and os.path.exists(execution.log_file):
-                        os.remove(execution.log_file)
+                    remove_log_files(execution.log_file)
 
                     # 删除执行空间
                     execution_space = Config.get_execution_space(execution.id)
                     if os.path.exists(execution_space):
                         shutil.rmtree(execution_space)
 
+                    execution_stats.forget([execution.id])
                     db.session.delete(execution)
                     result['success'] += 1
                     result['details'].append({
@@ -463,13 +776,25 @@ def batch_manage_executions():
             import signal
             import psutil
 
+            cancelled = []
             for execution in executions:
+                # 排队中的执行直接出队（条件更新，与调度器认领互斥），并调用完成回调
+                if execution.status == 'pending' and execution_dispatcher.cancel_pending(
+                        execution.id, '执行已被批量取消'):
+                    result['success'] += 1
+                    result['details'].append({
+                        'id': execution.id,
+                        'status': 'success',
+                        'message': '取消成功'
+                    })
+                    continue
+                db.session.refresh(execution)
                 if execution.status != 'running':
                     result['failed'] += 1
                     result['details'].append({
                         'id': execution.id,
                         'status': 'failed',
-                        'message': f'只能取消正在运行的执行，当前状态: {execution.status}'
+                        'message': f'只能取消排队中或正在运行的执行，当前状态: {execution.status}'
                     })
                     continue
 
@@ -511,6 +836,7 @@ def batch_manage_executions():
                     execution.progress = 100
                     execution.error = '执行已被批量取消'
                     execution.end_time = datetime.utcnow()
+                    cancelled.append(execution)
 
                     result['success'] += 1
                     result['details'].append({
@@ -528,10 +854,15 @@ def batch_manage_executions():
                     })
 
             if result['success'] > 0:
+                execution_stats.record(cancelled)
                 db.session.commit()
+                for execution in cancelled:
+                    log_bus.publish_status(execution.id, execution.status, execution.progress,
+                                           execution.stage, execution.error)
 
         elif action == 'retry':
             # 批量重试
+            retried_ids = []
             for execution in executions:
                 if execution.status not in ['failed', 'cancelled']:
                     result['failed'] += 1
@@ -575,17 +906,9 @@ def batch_manage_executions():
                             else:
                                 shutil.copy2(s, d)
 
-                    # 异步执行
-                    from threading import Thread
-                    from flask import current_app
-                    app = current_app._get_current_object()
-
-                    def run_script_with_context():
-                        with app.app_context():
-                            execute_script(new_execution.id)
-
-                    thread = Thread(target=run_script_with_context)
-                    thread.start()
+                    # 文件复制完成后再入队
+                    new_execution.priority = Execution.PRIORITY_INTERACTIVE
+                    retried_ids.append(new_execution.id)
 
                     result['success'] += 1
                     result['details'].append({
@@ -604,6 +927,8 @@ def batch_manage_executions():
 
             if result['success'] > 0:
                 db.session.commit()
+                for new_execution_id in retried_ids:
+                    execution_dispatcher.submit(new_execution_id)
 
         else:
             return jsonify({
@@ -624,99 +949,29 @@ def batch_manage_executions():
 
 @api_bp.route('/executions/statistics', methods=['GET'])
 def get_executions_statistics():
-    """获取执行记录统计信息"""
+    """
+    获取执行记录统计信息（读取执行统计汇总表）
+
+    Query参数：
+    - start_date: 起始日期（YYYY-MM-DD，含），可选
+    - end_date: 结束日期（YYYY-MM-DD，含），可选
+    未指定日期范围时统计全部执行，by_date 返回最近7天
+    """
     try:
-        # 基本统计
-        total_executions = Execution.query.count()
-        success_executions = Execution.query.filter_by(status='success').count()
-        failed_executions = Execution.query.filter_by(status='failed').count()
-        running_executions = Execution.query.filter_by(status='running').count()
-        pending_executions = Execution.query.filter_by(status='pending').count()
-
-        # 按脚本统计
-        from sqlalchemy import case
-        script_stats = db.session.query(
-            Script.name,
-            db.func.count(Execution.id).label('total'),
-            db.func.sum(
-                case(
-                    (Execution.status == 'success', 1),
-                    else_=0
-                )
-            ).label('success'),
-            db.func.sum(
-                case(
-                    (Execution.status == 'failed', 1),
-                    else_=0
-                )
-            ).label('failed')
-        ).join(Execution, Script.id == Execution.script_id).group_by(Script.name).all()
-
-        # 按日期统计（最近7天）
-        from datetime import datetime, timedelta
-        seven_days_ago = datetime.utcnow() - timedelta(days=7)
-
-        daily_stats = db.session.query(
-            db.func.date(Execution.created_at).label('date'),
-            db.func.count(Execution.id).label('total'),
-            db.func.sum(
-                case(
-                    (Execution.status == 'success', 1),
-                    else_=0
-                )
-            ).label('success'),
-            db.func.sum(
-                case(
-                    (Execution.status == 'failed', 1),
-                    else_=0
-                )
-            ).label('failed')
-        ).filter(Execution.created_at >= seven_days_ago).group_by(db.func.date(Execution.created_at)).all()
-
-        # 按状态统计
-        status_stats = db.session.query(
-            Execution.status,
-            db.func.count(Execution.id).label('count')
-        ).group_by(Execution.status).all()
+        try:
+            start_date = request.args.get('start_date')
+            end_date = request.args.get('end_date')
+            start_date = datetime.strptime(start_date, '%Y-%m-%d').date() if start_date else None
+            end_date = datetime.strptime(end_date, '%Y-%m-%d').date() if end_date else None
+        except ValueError:
+            return jsonify({'code': 1, 'message': '日期格式错误，应为 YYYY-MM-DD'}), 400
+
+        if start_date and end_date and start_date > end_date:
+            return jsonify({'code': 1, 'message': '起始日期不能晚于结束日期'}), 400
 
         return jsonify({
             'code': 0,
-            'data': {
-                'summary': {
-                    'total': total_executions,
-                    'success': success_executions,
-                    'failed': failed_executions,
-                    'running': running_executions,
-                    'pending': pending_executions,
-                    'success_rate': round(success_executions / max(1, total_executions) * 100, 2)
-                },
-                'by_script': [
-                    {
-                        'script_name': stat.name,
-                        'total': stat.total,
-                        'success': stat.success or 0,
-                        'failed': stat.failed or 0,
-                        'success_rate': round((stat.success or 0) / max(1, stat.total) * 100, 2)
-                    }
-                    for stat in script_stats
-                ],
-                'by_date': [
-                    {
-                        'date': stat.date.isoformat() if hasattr(stat.date, 'isoformat') else str(stat.date),
-                        'total': stat.total,
-                        'success': stat.success or 0,
-                        'failed': stat.failed or 0
-                    }
-                    for stat in daily_stats
-                ],
-                'by_status': [
-                    {
-                        'status': stat.status,
-                        'count': stat.count
-                    }
-                    for stat in status_stats
-                ]
-            }
+            'data': execution_stats.get_statistics(start_date, end_date)
         })
 
     except Exception as e:
@@ -732,10 +987,19 @@ def cancel_execution(execution_id):
 
         execution = Execution.query.get_or_404(execution_id)
 
+        # 排队中的执行直接出队（条件更新，与调度器认领互斥），并调用完成回调
+        if execution.status == 'pending':
+            if execution_dispatcher.cancel_pending(execution_id, '执行已被用户取消'):
+                return jsonify({
+                    'code': 0,
+                    'message': '执行已取消'
+                })
+            db.session.refresh(execution)
+
         if execution.status != 'running':
             return jsonify({
                 'code': 1,
-                'message': '只能中断正在运行的执行'
+                'message': '只能中断排队中或正在运行的执行'
             }), 400
 
         if not execution.pid:
@@ -786,7 +1050,7 @@ def cancel_execution(execution_id):
         execution.progress = 100
         execution.error = '执行已被用户中断'
         execution.end_time = datetime.utcnow()
-        db.session.commit()
+        commit_status(execution)
 
         return jsonify({
             'code': 0,
@@ -970,8 +1234,6 @@ def re_execute_script(execution_id):
     """重新执行脚本（支持所有非运行状态）"""
     try:
         import shutil
-        from threading import Thread
-        from flask import current_app
         from config import Config
 
         execution = Execution.query.get_or_404(execution_id)
@@ -996,6 +1258,7 @@ def re_execute_script(execution_id):
             script_id=execution.script_id,
             environment_id=execution.environment_id,
             status='pending',
+            priority=Execution.PRIORITY_INTERACTIVE,
             params=json.dumps(original_params) if original_params else None
         )
         db.session.add(new_execution)
@@ -1014,23 +1277,14 @@ def re_execute_script(execution_id):
                 else:
                     shutil.copy2(src, dst)
 
-        # 在 commit 前提取返回值，避免 commit 后懒加载与新线程竞争会话
+        # 在 commit 前提取返回值，避免 commit 后懒加载与工作线程竞争会话
         new_exec_id = new_execution.id
         original_exec_id = execution.id
         script_name = execution.script.name if execution.script else None
 
-        # 先提交，确保新线程能查到这条记录
+        # 先提交，确保调度器能查到这条记录
         db.session.commit()
-
-        # 异步执行脚本
-        app = current_app._get_current_object()
-
-        def run_script_with_context():
-            with app.app_context():
-                execute_script(new_exec_id)
-
-        thread = Thread(target=run_script_with_context)
-        thread.start()
+        execution_dispatcher.submit(new_exec_id)
 
         return jsonify({
             'code': 0,
@@ -1039,7 +1293,7 @@ def re_execute_script(execution_id):
                 'original_execution_id': original_exec_id,
                 'script_name': script_name
             },
-            'message': '已创建新执行记录并启动执行'
+            'message': '已创建新执行记录并加入执行队列'
         })
     except Exception as e:
         db.session.rollback()
@@ -1047,10 +1301,17 @@ def re_execute_script(execution_id):
 
 
 def _get_excel_file_internal(execution_id, file_path):
-    """内部函数：获取 Excel 文件内容（Luckysheet 格式）"""
+    """
+    内部函数：获取 Excel 文件内容（Luckysheet 格式）
+
+    查询参数:
+        mode: sparse 时只返回 celldata（行列数为实际有值的范围），并逐个工作表流式输出
+        sheet: 只返回指定的工作表（名称或索引）
+    """
     try:
         from config import Config
-        from utils.excel_converter import excel_to_luckysheet, get_excel_info
+        from utils.excel_converter import (excel_to_luckysheet, get_excel_info,
+                                           iter_luckysheet_sheets, stream_luckysheet_json)
 
         execution = Execution.query.get_or_404(execution_id)
         execution_space = Config.get_execution_space(execution_id)
@@ -1073,9 +1334,51 @@ def _get_excel_file_internal(execution_id, file_path):
         if ext not in ['.xlsx', '.xls']:
             return jsonify({'code': 1, 'message': '不是有效的 Excel 文件'}), 400
 
+        # 通过 /excel 接口编辑过的文件，先写入尚未落盘的编辑
+        excel_journal.flush(full_path)
+
+        sparse = request.args.get('mode') == 'sparse'
+        sheet = request.args.get('sheet') or None
+
+        if sparse:
+            info = get_excel_info(full_path)
+            try:
+                sheets = iter_luckysheet_sheets(full_path, sheet)
+            except ValueError as e:
+                return jsonify({'code': 1, 'message': str(e)}), 400
+            except Exception as e:
+                return jsonify({'code': 1, 'message': f'Excel 文件解析失败: {str(e)}'}), 500
+
+            head = json.dumps({
+                'code': 0,
+                'data': {
+                    'filename': info.get('filename', os.path.basename(full_path)),
+                    'sheets': info.get('sheets', []),
+                    'sheet_count': info.get('sheet_count', 0),
+                    'size': info.get('size', 0),
+                    'mode': 'sparse'
+                }
+            }, ensure_ascii=False)
+
+            def generate():
+                # 在 data 对象末尾拼接逐个工作表输出的 gridData
+                yield head[:-2] + ', "gridData": '
+                try:
+                    yield from stream_luckysheet_json(sheets)
+                except Exception as e:
+                    # 响应已开始发送，无法再返回错误状态码，客户端会收到不完整的 JSON
+                    print(f'[Excel] 流式转换 {full_path} 失败: {str(e)}')
+                    return
+                yield '}}'
+
+            return Response(stream_with_context(generate()), mimetype='application/json')
+
         # 转换为 Luckysheet 格式
         try:
-            grid_data = excel_to_luckysheet(full_path)
+            try:
+                grid_data = excel_to_luckysheet(full_path, sheet=sheet)
+            except ValueError as e:
+                return jsonify({'code': 1, 'message': str(e)}), 400
             info = get_excel_info(full_path)
 
             return jsonify({
@@ -1139,32 +1442,34 @@ def save_excel_file(execution_id, file_path):
         if not grid_data:
             return jsonify({'code': 1, 'message': '无数据'}), 400
 
-        # 备份原文件
-        backup_path = full_path + '.bak'
-        if os.path.exists(full_path):
-            shutil.copy2(full_path, backup_path)
+        # 整体覆盖期间持有写入锁（跨进程），进入时先写入编辑日志中的编辑，避免之后被旧编辑覆盖
+        with excel_journal.exclusive(full_path):
+            # 备份原文件
+            backup_path = full_path + '.bak'
+            if os.path.exists(full_path):
+                shutil.copy2(full_path, backup_path)
 
-        # 保存
-        try:
-            luckysheet_to_excel(grid_data, full_path)
+            # 保存
+            try:
+                luckysheet_to_excel(grid_data, full_path)
 
-            # 删除备份
-            if os.path.exists(backup_path):
-                os.remove(backup_path)
+                # 删除备份
+                if os.path.exists(backup_path):
+                    os.remove(backup_path)
 
-            return jsonify({
-                'code': 0,
-                'message': '保存成功'
-            })
-        except Exception as e:
-            # 恢复备份
-            if os.path.exists(backup_path):
-                shutil.move(backup_path, full_path)
+                return jsonify({
+                    'code': 0,
+                    'message': '保存成功'
+                })
+            except Exception as e:
+                # 恢复备份
+                if os.path.exists(backup_path):
+                    shutil.move(backup_path, full_path)
 
-            return jsonify({
-                'code': 1,
-                'message': f'保存失败: {str(e)}'
-            }), 500
+                return jsonify({
+                    'code': 1,
+                    'message': f'保存失败: {str(e)}'
+                }), 500
 
     except Exception as e:
         return jsonify({'code': 1, 'message': str(e)}), 500
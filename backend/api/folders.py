@@ -10,27 +10,29 @@ from models import db, Folder, Script, Tag
 def get_folder_tree():
     """获取完整文件夹树"""
     try:
-        root_folders = Folder.query.filter(Folder.parent_id.is_(None)).order_by(Folder.sort_order, Folder.name).all()
-        tree = [folder.to_tree_dict() for folder in root_folders]
-        return jsonify({'code': 0, 'data': tree})
+        return jsonify({'code': 0, 'data': Folder.tree()})
     except Exception as e:
         return jsonify({'code': 1, 'message': str(e)}), 500
 
 
 @api_bp.route('/folders/<int:folder_id>/contents', methods=['GET'])
 def get_folder_contents(folder_id):
-    """获取文件夹内容（子文件夹 + 脚本）"""
+    """获取文件夹内容（子文件夹 + 脚本），fields 参数同脚本列表"""
     try:
+        try:
+            fields = Script.parse_fields(request.args.get('fields'))
+        except ValueError as e:
+            return jsonify({'code': 1, 'message': str(e)}), 400
         folder = Folder.query.get_or_404(folder_id)
         sub_folders = Folder.query.filter_by(parent_id=folder_id).order_by(Folder.sort_order, Folder.name).all()
-        scripts = Script.query.filter_by(folder_id=folder_id).order_by(Script.name).all()
+        scripts = Script.query_for(fields).filter_by(folder_id=folder_id).order_by(Script.name).all()
 
         return jsonify({
             'code': 0,
             'data': {
                 'folder': folder.to_dict(),
                 'folders': [f.to_dict() for f in sub_folders],
-                'scripts': [s.to_dict() for s in scripts]
+                'scripts': [s.to_dict(fields) for s in scripts]
             }
         })
     except Exception as e:
@@ -39,17 +41,21 @@ def get_folder_contents(folder_id):
 
 @api_bp.route('/folders/root/contents', methods=['GET'])
 def get_root_contents():
-    """获取根目录内容"""
+    """获取根目录内容，fields 参数同脚本列表"""
     try:
+        try:
+            fields = Script.parse_fields(request.args.get('fields'))
+        except ValueError as e:
+            return jsonify({'code': 1, 'message': str(e)}), 400
         root_folders = Folder.query.filter(Folder.parent_id.is_(None)).order_by(Folder.sort_order, Folder.name).all()
-        root_scripts = Script.query.filter(Script.folder_id.is_(None)).order_by(Script.name).all()
+        root_scripts = Script.query_for(fields).filter(Script.folder_id.is_(None)).order_by(Script.name).all()
 
         return jsonify({
             'code': 0,
             'data': {
                 'folder': None,
                 'folders': [f.to_dict() for f in root_folders],
-                'scripts': [s.to_dict() for s in root_scripts]
+                'scripts': [s.to_dict(fields) for s in root_scripts]
             }
         })
     except Exception as e:
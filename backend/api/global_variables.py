@@ -4,6 +4,7 @@
 from flask import request, jsonify
 from models import db, GlobalVariable
 from sqlalchemy.exc import IntegrityError
+from services.env_builder import env_builder
 from . import api_bp
 
 
@@ -64,6 +65,7 @@ def create_global_variable():
 
         db.session.add(variable)
         db.session.commit()
+        env_builder.invalidate()
 
         return jsonify({
             'code': 0,
@@ -99,6 +101,7 @@ def update_global_variable(variable_id):
             variable.is_encrypted = data['is_encrypted']
 
         db.session.commit()
+        env_builder.invalidate()
 
         return jsonify({
             'code': 0,
@@ -123,6 +126,7 @@ def delete_global_variable(variable_id):
 
         db.session.delete(variable)
         db.session.commit()
+        env_builder.invalidate()
 
         return jsonify({'code': 0, 'message': '删除成功'}), 200
     except Exception as e:
@@ -134,8 +138,6 @@ def delete_global_variable(variable_id):
 def get_variables_dict():
     """获取全局变量字典（用于脚本执行时注入）"""
     try:
-        variables = GlobalVariable.query.all()
-        var_dict = {var.key: var.value for var in variables}
-        return jsonify({'code': 0, 'data': var_dict}), 200
+        return jsonify({'code': 0, 'data': env_builder.get_global_variables()}), 200
     except Exception as e:
         return jsonify({'code': 1, 'message': f'获取全局变量字典失败: {str(e)}'}), 500
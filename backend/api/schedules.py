@@ -177,21 +177,20 @@ def run_schedule_now(schedule_id):
     try:
         schedule = Schedule.query.get_or_404(schedule_id)
 
-        # 创建执行记录并执行
-        from ..models import Execution
-        from ..services.executor import execute_script
-        from threading import Thread
+        # 创建执行记录并加入执行队列（手动触发按交互优先级调度）
+        from models import Execution
+        from services.dispatcher import execution_dispatcher
 
         execution = Execution(
             script_id=schedule.script_id,
             status='pending',
+            priority=Execution.PRIORITY_INTERACTIVE,
             params=schedule.params
         )
         db.session.add(execution)
         db.session.commit()
 
-        thread = Thread(target=execute_script, args=(execution.id,))
-        thread.start()
+        execution_dispatcher.submit(execution.id)
 
         return jsonify({
             'code': 0,
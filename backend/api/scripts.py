@@ -3,7 +3,10 @@
 """
 from flask import request, jsonify
 from . import api_bp
-from models import db, Script, ScriptVersion, Tag
+from models import db, Script, ScriptVersion, Tag, Environment
+from services import execution_stats
+from services.dependency_manager import dependency_manager
+from services.log_reader import remove_log_files
 from config import Config
 from datetime import datetime
 import json
@@ -13,16 +16,25 @@ import shutil
 
 @api_bp.route('/scripts', methods=['GET'])
 def get_scripts():
-    """获取脚本列表，支持过滤和搜索"""
+    """
+    获取脚本列表，支持过滤和搜索
+
+    fields 参数：summary（默认，不含代码、依赖与参数定义）、detail 或逗号分隔的字段名
+    """
     try:
+        try:
+            fields = Script.parse_fields(request.args.get('fields'))
+        except ValueError as e:
+            return jsonify({'code': 1, 'message': str(e)}), 400
+
         # 获取过滤参数
         folder_id = request.args.get('folder_id', type=str)
         tag_ids = request.args.get('tags', '')  # 逗号分隔的标签ID
         is_favorite = request.args.get('is_favorite', type=str)
         search = request.args.get('search', '').strip()
 
-        # 构建查询
-        query = Script.query
+        # 构建查询（只加载返回字段需要的列，预加载文件夹与标签）
+        query = Script.query_for(fields)
 
         # 按文件夹过滤
         if folder_id is not None:
@@ -56,7 +68,7 @@ def get_scripts():
         scripts = query.order_by(Script.created_at.desc()).all()
         return jsonify({
             'code': 0,
-            'data': [script.to_dict() for script in scripts]
+            'data': [script.to_dict(fields) for script in scripts]
         })
     except Exception as e:
         return jsonify({'code': 1, 'message': str(e)}), 500
@@ -250,6 +262,8 @@ def delete_script(script_id):
             shutil.rmtree(workspace_path)
             print(f"删除脚本 {script_id} 的工作目录: {workspace_path}")
 
+        # 执行记录随脚本级联删除，统计汇总一并清除
+        execution_stats.forget_script(script_id)
         db.session.delete(script)
         db.session.commit()
 
@@ -353,6 +367,40 @@ def toggle_favorite(script_id):
         return jsonify({'code': 1, 'message': str(e)}), 500
 
 
+@api_bp.route('/scripts/<int:script_id>/dependencies/prebuild', methods=['POST'])
+def prebuild_script_dependencies(script_id):
+    """
+    预构建脚本依赖
+
+    提前安装脚本依赖到依赖缓存，之后的执行直接复用，不再在执行时安装
+    """
+    try:
+        script = Script.query.get_or_404(script_id)
+        if not script.dependencies:
+            return jsonify({'code': 1, 'message': '脚本未配置依赖'}), 400
+
+        # 与执行时一致：使用脚本绑定的执行环境，否则使用默认解释器
+        executable = Config.PYTHON_EXECUTABLE if script.type == 'python' else Config.NODE_EXECUTABLE
+        if script.environment_id:
+            environment = Environment.query.get(script.environment_id)
+            if environment and environment.type == script.type:
+                executable = environment.executable_path
+
+        env_additions = dependency_manager.prepare(script.type, executable, script.dependencies)
+
+        return jsonify({
+            'code': 0,
+            'data': {
+                'script_id': script.id,
+                'env': env_additions
+            },
+            'message': '依赖已就绪'
+        })
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'code': 1, 'message': str(e)}), 500
+
+
 @api_bp.route('/scripts/<int:script_id>/versions/clean', methods=['DELETE'])
 def clean_script_versions(script_id):
     """清理脚本版本历史"""
@@ -477,13 +525,14 @@ def clean_script_executions(script_id):
         executions_to_keep = all_executions[:keep_latest]
         executions_to_delete = all_executions[keep_latest:]
 
-        # 删除多余的执行记录
+        # 删除多余的执行记录（先扣除其统计汇总）
+        execution_stats.forget([execution.id for execution in executions_to_delete])
         deleted_count = 0
         for execution in executions_to_delete:
             # 删除日志文件
             if execution.log_file and os.path.exists(execution.log_file):
                 try:
-                    os.remove(execution.log_file)
+                    remove_log_files(execution.log_file)
                     print(f"删除日志文件: {execution.log_file}")
                 except Exception as log_error:
                     print(f"删除日志文件失败: {log_error}")
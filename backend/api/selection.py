@@ -4,6 +4,8 @@
 from flask import request, jsonify
 from . import api_bp
 from models import db, SelectionSession, Execution
+from services import execution_stats
+from services.log_reader import remove_log_files
 import uuid
 import json
 import os
@@ -192,14 +194,14 @@ def delete_selection_batch(session_id):
 
             try:
                 # 删除日志文件
-                if execution.log_file and os.path.exists(execution.log_file):
-                    os.remove(execution.log_file)
+                remove_log_files(execution.log_file)
 
                 # 删除执行空间
                 execution_space = Config.get_execution_space(eid)
                 if os.path.exists(execution_space):
                     shutil.rmtree(execution_space)
 
+                execution_stats.forget([eid])
                 db.session.delete(execution)
                 result['success'] += 1
                 result['details'].append({
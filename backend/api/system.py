@@ -4,6 +4,12 @@
 from flask import jsonify, request
 from api import api_bp
 from utils.cleanup import get_cleanup_stats, run_cleanup
+from services.dispatcher import execution_dispatcher
+from services.warm_pool import warm_pool_manager
+from services.dependency_manager import dependency_manager
+from services.excel_reader import excel_reader
+from services.excel_journal import excel_journal
+from services.excel_collab import excel_collab
 from config import Config
 
 
@@ -49,6 +55,19 @@ def execute_cleanup():
         }), 500
 
 
+# 清理配置参数 -> (Config 属性, 最小值, 最大值)
+CLEANUP_CONFIG_FIELDS = {
+    'threshold': ('CLEANUP_THRESHOLD', 50, 10000),
+    'max_age_days': ('CLEANUP_MAX_AGE_DAYS', 0, 3650),
+    'max_total_mb': ('CLEANUP_MAX_TOTAL_MB', 0, 10 * 1024 * 1024),
+    'script_quota_mb': ('CLEANUP_SCRIPT_QUOTA_MB', 0, 10 * 1024 * 1024),
+}
+
+
+def _cleanup_config():
+    return {key: getattr(Config, attr) for key, (attr, _, _) in CLEANUP_CONFIG_FIELDS.items()}
+
+
 @api_bp.route('/system/cleanup/config', methods=['GET'])
 def get_cleanup_config():
     """
@@ -59,9 +78,7 @@ def get_cleanup_config():
         return jsonify({
             'code': 0,
             'message': '获取成功',
-            'data': {
-                'threshold': Config.CLEANUP_THRESHOLD
-            }
+            'data': _cleanup_config()
         })
     except Exception as e:
         return jsonify({
@@ -76,44 +93,158 @@ def update_cleanup_config():
     更新清理配置
     PUT /api/system/cleanup/config
 
-    Body参数：
+    Body参数（均为可选，至少提供一个）：
     - threshold: 清理阈值（50-10000）
+    - max_age_days: 执行记录最长保留天数（0-3650，0 表示不限）
+    - max_total_mb: 执行空间与日志总大小上限（MB，0 表示不限）
+    - script_quota_mb: 单个脚本的执行空间与日志大小上限（MB，0 表示不限）
     """
     try:
         data = request.get_json() or {}
-        threshold = data.get('threshold')
-
-        # 验证参数
-        if threshold is None:
+        updates = {}
+
+        for key, (attr, low, high) in CLEANUP_CONFIG_FIELDS.items():
+            if key not in data:
+                continue
+            value = data[key]
+            # 验证参数
+            if not isinstance(value, int) or isinstance(value, bool):
+                return jsonify({
+                    'code': 1,
+                    'message': f'{key}必须是整数'
+                }), 400
+            if value < low or value > high:
+                return jsonify({
+                    'code': 1,
+                    'message': f'{key}必须在{low}-{high}范围内'
+                }), 400
+            updates[attr] = value
+
+        if not updates:
             return jsonify({
                 'code': 1,
-                'message': '缺少threshold参数'
-            }), 400
-
-        if not isinstance(threshold, int):
-            return jsonify({
-                'code': 1,
-                'message': 'threshold必须是整数'
-            }), 400
-
-        if threshold < 50 or threshold > 10000:
-            return jsonify({
-                'code': 1,
-                'message': 'threshold必须在50-10000范围内'
+                'message': '缺少清理配置参数'
             }), 400
 
         # 更新配置（仅运行时生效）
-        Config.CLEANUP_THRESHOLD = threshold
+        for attr, value in updates.items():
+            setattr(Config, attr, value)
 
         return jsonify({
             'code': 0,
             'message': '配置更新成功',
-            'data': {
-                'threshold': Config.CLEANUP_THRESHOLD
-            }
+            'data': _cleanup_config()
         })
     except Exception as e:
         return jsonify({
             'code': 1,
             'message': f'更新配置失败: {str(e)}'
-        }), 500
\ No newline at end of file
+        }), 500
+
+
+@api_bp.route('/system/execution-queue', methods=['GET'])
+def get_execution_queue_metrics():
+    """
+    获取执行队列指标
+    GET /api/system/execution-queue
+
+    返回并发上限、运行中任务数、各优先级的队列深度和排队等待时间统计
+    """
+    try:
+        return jsonify({
+            'code': 0,
+            'message': '获取成功',
+            'data': execution_dispatcher.get_metrics()
+        })
+    except Exception as e:
+        return jsonify({
+            'code': 1,
+            'message': f'获取执行队列指标失败: {str(e)}'
+        }), 500
+
+
+@api_bp.route('/system/warm-pools', methods=['GET'])
+def get_warm_pool_metrics():
+    """
+    获取解释器预热池状态
+    GET /api/system/warm-pools
+
+    返回各执行环境预热池的进程数量、预热命中次数、回退冷启动次数和回收次数
+    """
+    try:
+        return jsonify({
+            'code': 0,
+            'message': '获取成功',
+            'data': warm_pool_manager.get_metrics()
+        })
+    except Exception as e:
+        return jsonify({
+            'code': 1,
+            'message': f'获取预热池状态失败: {str(e)}'
+        }), 500
+
+
+@api_bp.route('/system/dependency-cache', methods=['GET'])
+def get_dependency_cache_metrics():
+    """
+    获取依赖缓存指标
+    GET /api/system/dependency-cache
+
+    返回依赖安装的命中/未命中次数、命中率和已缓存的依赖集合数量
+    """
+    try:
+        return jsonify({
+            'code': 0,
+            'message': '获取成功',
+            'data': dependency_manager.get_metrics()
+        })
+    except Exception as e:
+        return jsonify({
+            'code': 1,
+            'message': f'获取依赖缓存指标失败: {str(e)}'
+        }), 500
+
+
+@api_bp.route('/system/dependency-cache', methods=['DELETE'])
+def clear_dependency_cache():
+    """
+    清空依赖缓存
+    DELETE /api/system/dependency-cache
+
+    删除所有依赖集合记录和独立依赖目录，下次执行时重新安装
+    """
+    try:
+        cleared = dependency_manager.clear()
+        return jsonify({
+            'code': 0,
+            'message': f'已清除 {cleared} 个依赖集合',
+            'data': {'cleared': cleared}
+        })
+    except Exception as e:
+        return jsonify({
+            'code': 1,
+            'message': f'清空依赖缓存失败: {str(e)}'
+        }), 500
+
+
+@api_bp.route('/system/excel-cache', methods=['GET'])
+def get_excel_cache_metrics():
+    """
+    获取 Excel 分页读取缓存指标
+    GET /api/system/excel-cache
+
+    返回工作簿缓存的命中率、淘汰次数、列式快照的生成与读取次数、内存占用估算，
+    以及编辑日志（journal）的追加、写入次数和待写入的操作数、协同编辑（collab）的房间与同步统计
+    """
+    try:
+        return jsonify({
+            'code': 0,
+            'message': '获取成功',
+            'data': dict(excel_reader.get_metrics(), journal=excel_journal.get_stats(),
+                         collab=excel_collab.get_stats())
+        })
+    except Exception as e:
+        return jsonify({
+            'code': 1,
+            'message': f'获取 Excel 缓存指标失败: {str(e)}'
+        }), 500
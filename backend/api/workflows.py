@@ -6,6 +6,7 @@ from models import db
 from models.workflow import Workflow, WorkflowNode, WorkflowEdge, WorkflowExecution, WorkflowNodeExecution
 from models.script import Script
 from models.execution import Execution
+from services.workflow_events import workflow_events
 from datetime import datetime
 import json
 import time
@@ -17,7 +18,7 @@ from . import api_bp
 def get_workflows():
     """获取工作流列表"""
     try:
-        workflows = Workflow.query.order_by(Workflow.created_at.desc()).all()
+        workflows = Workflow.load_nodes_counts(Workflow.query.order_by(Workflow.created_at.desc()))
         return jsonify({
             'code': 0,
             'data': [w.to_dict() for w in workflows]
@@ -229,12 +230,9 @@ def execute_workflow(workflow_id):
         db.session.add(execution)
         db.session.commit()
 
-        # 异步执行工作流
-        from threading import Thread
-        from services.workflow_executor import execute_workflow_async
-        execution_id = execution.id  # 先获取ID,避免在线程中访问ORM对象
-        thread = Thread(target=lambda: execute_workflow_async(execution_id))
-        thread.start()
+        # 异步执行工作流（复用当前应用实例）
+        from services.workflow_executor import start_workflow_execution
+        start_workflow_execution(execution.id)
 
         return jsonify({
             'code': 0,
@@ -278,9 +276,10 @@ def get_workflow_executions():
         if workflow_id:
             query = query.filter_by(workflow_id=workflow_id)
 
-        pagination = query.order_by(WorkflowExecution.created_at.desc()).paginate(
-            page=page, per_page=per_page, error_out=False
-        )
+        pagination = query.options(db.joinedload(WorkflowExecution.workflow)).order_by(
+            WorkflowExecution.created_at.desc()
+        ).paginate(page=page, per_page=per_page, error_out=False)
+        Workflow.load_nodes_counts({e.workflow for e in pagination.items if e.workflow})
 
         return jsonify({
             'code': 0,
@@ -330,6 +329,7 @@ def cancel_workflow_execution(execution_id):
         execution.status = 'cancelled'
         execution.end_time = datetime.utcnow()
         db.session.commit()
+        workflow_events.publish_status(execution_id, 'cancelled')
 
         return jsonify({
             'code': 0,
@@ -341,93 +341,160 @@ def cancel_workflow_execution(execution_id):
         return jsonify({'code': 1, 'message': str(e)}), 500
 
 
+# 工作流状态推送的心跳间隔（秒）；本进程执行的工作流由事件推送，心跳时顺带核对状态
+WORKFLOW_STREAM_KEEPALIVE = 15
+
+
+def _workflow_status(execution_id):
+    """工作流执行的状态列（不加载 ORM 对象）"""
+    return db.session.query(
+        WorkflowExecution.status, WorkflowExecution.start_time, WorkflowExecution.end_time, WorkflowExecution.error
+    ).filter(WorkflowExecution.id == execution_id).first()
+
+
+def _node_states(execution_id):
+    """
+    各节点的状态指纹 {node_id: (节点执行ID, 状态, 结束时间, 脚本执行状态, 进度, 阶段)}
+
+    一次查询关联脚本执行记录，只取判断变化所需的列，不读取输出等大字段。
+    同一节点有多条执行记录时以最新的一条为准。
+    """
+    rows = db.session.query(
+        WorkflowNodeExecution.id,
+        WorkflowNodeExecution.node_id,
+        WorkflowNodeExecution.status,
+        WorkflowNodeExecution.end_time,
+        Execution.status,
+        Execution.progress,
+        Execution.stage
+    ).outerjoin(
+        Execution, Execution.id == WorkflowNodeExecution.execution_id
+    ).filter(
+        WorkflowNodeExecution.workflow_execution_id == execution_id
+    ).order_by(WorkflowNodeExecution.id).all()
+    return {row[1]: (row[0],) + tuple(row[2:]) for row in rows}
+
+
+def _node_payloads(node_execution_ids):
+    """发生变化的节点的完整数据（含节点与脚本执行的输出），一次查询"""
+    rows = db.session.query(
+        WorkflowNodeExecution.node_id,
+        WorkflowNodeExecution.status,
+        WorkflowNodeExecution.start_time,
+        WorkflowNodeExecution.end_time,
+        WorkflowNodeExecution.error,
+        WorkflowNodeExecution.output,
+        Execution.id.label('script_execution_id'),
+        Execution.status.label('script_status'),
+        Execution.output.label('script_output'),
+        Execution.error.label('script_error'),
+        Execution.progress.label('script_progress'),
+        Execution.stage.label('script_stage')
+    ).outerjoin(
+        Execution, Execution.id == WorkflowNodeExecution.execution_id
+    ).filter(
+        WorkflowNodeExecution.id.in_(node_execution_ids)
+    ).order_by(WorkflowNodeExecution.id).all()
+
+    nodes = []
+    for row in rows:
+        node_data = {
+            'node_id': row.node_id,
+            'status': row.status,
+            'start_time': row.start_time.isoformat() if row.start_time else None,
+            'end_time': row.end_time.isoformat() if row.end_time else None,
+            'error': row.error,
+            'output': row.output
+        }
+        if row.script_execution_id:
+            node_data['execution'] = {
+                'id': row.script_execution_id,
+                'status': row.script_status,
+                'output': row.script_output or '',
+                'error': row.script_error or '',
+                'progress': row.script_progress or 0,
+                'stage': row.script_stage or 'pending'
+            }
+        nodes.append(node_data)
+    return nodes
+
+
 @api_bp.route('/workflow-executions/<int:execution_id>/stream', methods=['GET'])
 def stream_workflow_execution(execution_id):
-    """实时流式传输工作流执行状态 (Server-Sent Events)"""
-    def generate():
-        execution = WorkflowExecution.query.get(execution_id)
-        if not execution:
-            yield f"data: {json.dumps({'error': '执行记录不存在'})}\n\n"
-            return
-
-        # 持续推送状态更新
-        last_status = None
-        node_statuses = {}
-
-        while True:
-            # 刷新会话以获取最新数据
-            db.session.expire_all()
-            execution = WorkflowExecution.query.get(execution_id)
-            if not execution:
-                yield f"data: {json.dumps({'error': '执行记录丢失'})}\n\n"
-                break
-
-            # 获取所有节点执行状态
-            node_executions = WorkflowNodeExecution.query.filter_by(
-                workflow_execution_id=execution_id
-            ).all()
-
-            # 检查节点状态是否有变化
-            current_node_statuses = {}
-            for ne in node_executions:
-                node_data = {
-                    'node_id': ne.node_id,
-                    'status': ne.status,
-                    'start_time': ne.start_time.isoformat() if ne.start_time else None,
-                    'end_time': ne.end_time.isoformat() if ne.end_time else None,
-                    'error': ne.error,
-                    'output': ne.output
-                }
+    """
+    实时流式传输工作流执行状态 (Server-Sent Events)
 
-                # 如果有关联的脚本执行记录，获取详细日志
-                if ne.execution_id:
-                    script_execution = Execution.query.get(ne.execution_id)
-                    if script_execution:
-                        node_data['execution'] = {
-                            'id': script_execution.id,
-                            'status': script_execution.status,
-                            'output': script_execution.output or '',
-                            'error': script_execution.error or '',
-                            'progress': script_execution.progress or 0,
-                            'stage': script_execution.stage or 'pending'
-                        }
-
-                current_node_statuses[ne.node_id] = node_data
-
-            # 如果节点状态有变化，推送更新
-            if current_node_statuses != node_statuses:
-                node_statuses = current_node_statuses
-                yield f"data: {json.dumps({'type': 'nodes', 'nodes': list(node_statuses.values())})}\n\n"
-
-            # 推送总体状态
-            current_status = {
-                'type': 'status',
-                'status': execution.status,
-                'start_time': execution.start_time.isoformat() if execution.start_time else None,
-                'end_time': execution.end_time.isoformat() if execution.end_time else None,
-                'error': execution.error
-            }
+    工作流引擎在本进程执行时由事件总线推送变化，工作流在其他进程执行时按
+    Config.WORKFLOW_STREAM_POLL_INTERVAL 查询。每次检查只用一条查询取各节点的状态指纹，
+    再一次性读取发生变化的节点的完整数据，nodes 消息只包含这些节点（前端按 node_id 合并）。
+    """
+    from config import Config
 
-            if current_status != last_status:
-                last_status = current_status
-                yield f"data: {json.dumps(current_status)}\n\n"
-
-            # 如果执行完成，发送最终状态并结束
-            if execution.status in ['success', 'failed', 'cancelled']:
-                # 发送最终节点状态
-                yield f"data: {json.dumps({'type': 'nodes', 'nodes': list(node_statuses.values())})}\n\n"
-
-                # 发送完成信息
-                completion_data = {
-                    'type': 'complete',
-                    'status': execution.status,
-                    'error': execution.error or '',
-                    'end_time': execution.end_time.isoformat() if execution.end_time else None
-                }
-                yield f"data: {json.dumps(completion_data)}\n\n"
-                break
+    # 先订阅再读取状态，避免错过两者之间发布的事件
+    subscription = workflow_events.subscribe(execution_id)
 
-            time.sleep(0.5)  # 每0.5秒检查一次
+    def generate():
+        try:
+            node_states = {}
+            last_status = None
+            last_sent = time.monotonic()
+
+            while True:
+                # 先读工作流状态再读节点：引擎先提交节点再提交最终状态，读到最终状态时节点也已是最终状态
+                status_row = _workflow_status(execution_id)
+                if not status_row:
+                    error = '执行记录不存在' if last_status is None else '执行记录丢失'
+                    yield f"data: {json.dumps({'error': error})}\n\n"
+                    break
+
+                states = _node_states(execution_id)
+                changed = [state[0] for node_id, state in states.items() if node_states.get(node_id) != state]
+                node_states = states
+                if changed:
+                    yield f"data: {json.dumps({'type': 'nodes', 'nodes': _node_payloads(changed)})}\n\n"
+                    last_sent = time.monotonic()
+
+                current_status = {
+                    'type': 'status',
+                    'status': status_row.status,
+                    'start_time': status_row.start_time.isoformat() if status_row.start_time else None,
+                    'end_time': status_row.end_time.isoformat() if status_row.end_time else None,
+                    'error': status_row.error
+                }
+                if current_status != last_status:
+                    last_status = current_status
+                    yield f"data: {json.dumps(current_status)}\n\n"
+                    last_sent = time.monotonic()
+
+                # 释放数据库连接，等待期间不占用
+                db.session.remove()
+
+                # 如果执行完成，发送完成信息并结束
+                if status_row.status in ['success', 'failed', 'cancelled']:
+                    completion_data = {
+                        'type': 'complete',
+                        'status': status_row.status,
+                        'error': status_row.error or '',
+                        'end_time': current_status['end_time']
+                    }
+                    yield f"data: {json.dumps(completion_data)}\n\n"
+                    break
+
+                if workflow_events.is_active(execution_id):
+                    timeout = WORKFLOW_STREAM_KEEPALIVE
+                else:
+                    timeout = Config.WORKFLOW_STREAM_POLL_INTERVAL
+                event = subscription.get(timeout=timeout)
+                # 合并已到达的事件，一次检查处理
+                while event is not None:
+                    event = subscription.get(timeout=0)
+
+                if time.monotonic() - last_sent >= WORKFLOW_STREAM_KEEPALIVE:
+                    yield ": keepalive\n\n"
+                    last_sent = time.monotonic()
+        finally:
+            workflow_events.unsubscribe(subscription)
+            db.session.remove()
 
     return Response(
         stream_with_context(generate()),
@@ -8,9 +8,13 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 from flask import Flask, jsonify
 from flask_cors import CORS
 from config import Config
-from models import db
+from models import db, Environment
 from api import api_bp
 from services.scheduler import scheduler_manager
+from services.dispatcher import execution_dispatcher
+from services.warm_pool import warm_pool_manager
+from services import execution_stats
+from services.excel_journal import excel_journal
 from utils.cleanup import run_cleanup_if_needed
 from websocket import socketio
 
@@ -60,10 +64,24 @@ def create_app(config_class=Config):
         db.create_all()
         # 设置调度器的应用实例
         scheduler_manager.set_app(app)
-        # 重新加载定时任务
-        scheduler_manager.reload_schedules()
-        # 执行清理检查
-        run_cleanup_if_needed()
+        # 多个工作进程时，定时任务与清理只在主进程中运行
+        if config_class.SERVER_PRIMARY_WORKER:
+            # 重新加载定时任务
+            scheduler_manager.reload_schedules()
+            scheduler_manager.start_sync(config_class.SCHEDULER_SYNC_INTERVAL)
+            # 执行清理检查
+            run_cleanup_if_needed()
+            # 补齐尚未计入统计汇总的执行（升级前的历史记录）
+            execution_stats.start_backfill(app)
+        # 为开启预热的环境启动解释器预热池
+        warm_pool_manager.prewarm(Environment.query.filter(Environment.warm_pool_size > 0).all())
+
+    # 启动执行调度器
+    execution_dispatcher.start(app)
+
+    # 写入上次退出前尚未写入 Excel 文件的编辑
+    if config_class.SERVER_PRIMARY_WORKER:
+        excel_journal.recover()
 
     return app
 
@@ -77,6 +95,7 @@ if __name__ == '__main__':
     print(f'API地址: http://localhost:5001/api')
     print(f'健康检查: http://localhost:5001/health')
     print(f'WebSocket: ws://localhost:5001/excel')
+    print('生产环境请使用 server.py 启动（gevent/eventlet 工作模型，支持多进程与平滑退出）')
     print('=' * 60)
     # 使用 use_reloader=False 防止定时任务在调试模式下被多次初始化
     # allow_unsafe_werkzeug=True 用于开发环境
@@ -0,0 +1,107 @@
+"""
+系统备份基准测试
+
+在临时目录中生成若干执行空间（文本输出、随机二进制、各执行相同的依赖文件），对比：
+- 旧方式：整个目录单线程打包为 tar.gz
+- 新方式：首次快照（全部数据块入库）与修改少量文件后的增量快照
+- 从快照恢复单个执行空间
+
+测试数据写入临时目录，结束后删除。
+
+使用方法：
+    python benchmark_backup.py [执行空间数] [每个执行空间的大小MB]
+
+示例：
+    python benchmark_backup.py            # 200 个执行空间，每个 2MB
+    python benchmark_backup.py 1000 5
+"""
+import os
+import shutil
+import sys
+import tarfile
+import tempfile
+import time
+
+# 添加父目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config import Config
+
+
+def make_tree(root, spaces, size_mb):
+    """生成执行空间：一半文本输出、一半随机数据，另加一个各执行相同的文件"""
+    shared = os.urandom(512 * 1024)
+    half = size_mb * 1024 * 1024 // 2
+    for i in range(spaces):
+        path = Config.get_execution_space(i)
+        os.makedirs(os.path.join(path, 'output'), exist_ok=True)
+        with open(os.path.join(path, 'output', 'result.csv'), 'w') as f:
+            line = f'{i},row,value,{i * 7}\n'
+            f.write(line * (half // len(line)))
+        with open(os.path.join(path, 'output', 'image.bin'), 'wb') as f:
+            f.write(os.urandom(half))
+        with open(os.path.join(path, 'vendor.whl'), 'wb') as f:
+            f.write(shared)
+    for name in ('a.py', 'b.py'):
+        with open(os.path.join(Config.SCRIPTS_DIR, name), 'w') as f:
+            f.write('print("hello")\n' * 100)
+
+
+def legacy_backup(output):
+    with tarfile.open(output, 'w:gz') as tar:
+        tar.add(Config.SCRIPTS_DIR, arcname='scripts')
+        tar.add(Config.EXECUTION_SPACES_DIR, arcname='execution_spaces')
+    return os.path.getsize(output)
+
+
+def main():
+    spaces = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    size_mb = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+
+    root = tempfile.mkdtemp(prefix='backup_bench_')
+    try:
+        for attr, name in (('SCRIPTS_DIR', 'scripts'), ('DATA_DIR', 'data'), ('EXECUTION_SPACES_DIR', 'execution_spaces'),
+                           ('WORKFLOW_EXECUTION_SPACES_DIR', 'workflow_execution_spaces'),
+                           ('WORKSPACES_DIR', 'workspaces'), ('BACKUPS_DIR', 'backups')):
+            setattr(Config, attr, os.path.join(root, name))
+            os.makedirs(getattr(Config, attr), exist_ok=True)
+
+        from utils import backup_system as backup
+
+        make_tree(root, spaces, size_mb)
+        print('=' * 80)
+        print(f'系统备份基准测试: {spaces} 个执行空间，每个 {size_mb}MB，{Config.BACKUP_WORKERS} 个线程')
+        print('=' * 80)
+
+        started = time.time()
+        legacy_size = legacy_backup(os.path.join(root, 'legacy.tar.gz'))
+        legacy = time.time() - started
+        print(f'旧方式 tar.gz:    {legacy:8.2f}s  写入 {legacy_size / 1024 / 1024:8.1f}MB')
+
+        started = time.time()
+        backup.backup_system('full')
+        full = time.time() - started
+        full_stats = backup.load_manifest('full')['stats']
+        print(f'首次快照:         {full:8.2f}s  写入 {full_stats["new_bytes"] / 1024 / 1024:8.1f}MB  ({legacy / full:.1f}x)')
+
+        # 修改 1% 的执行空间
+        for i in range(0, spaces, 100):
+            with open(os.path.join(Config.get_execution_space(i), 'output', 'result.csv'), 'a') as f:
+                f.write('appended\n')
+        started = time.time()
+        backup.backup_system('incremental')
+        incremental = time.time() - started
+        stats = backup.load_manifest('incremental')['stats']
+        print(f'增量快照:         {incremental:8.2f}s  写入 {stats["new_bytes"] / 1024 / 1024:8.1f}MB  '
+              f'({legacy / incremental:.0f}x，未变化文件 {stats["reused_files"]}/{stats["files"]})')
+
+        started = time.time()
+        result = backup.restore_execution_space('incremental', spaces // 2, os.path.join(root, 'restore'))
+        restore = time.time() - started
+        print(f'恢复单个执行空间: {restore:8.2f}s  {result["files"]} 个文件')
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""
+执行环境变量构建基准测试
+
+对比为参数很多的脚本构建执行环境变量的开销：
+- 旧方式：每次执行查询全部全局变量、复制系统环境变量、解析参数定义 JSON，并为每个参数线性查找定义
+- 新方式：env_builder 缓存全局变量与基础环境，参数定义按 (脚本ID, 版本) 预编译
+
+只读取数据库中已有的全局变量，基准脚本对象不会写入数据库。
+
+使用方法：
+    python benchmark_env_builder.py [参数个数] [执行次数] [数据库URI]
+
+示例：
+    python benchmark_env_builder.py                               # 300个参数，执行200次
+    python benchmark_env_builder.py 500 100 sqlite:////tmp/bench.db
+"""
+import json
+import os
+import sys
+import time
+
+# 添加父目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config import Config
+from app import create_app
+from models import GlobalVariable, Script
+from services.env_builder import env_builder
+from services.scheduler import scheduler_manager
+
+PARAM_TYPES = ['text', 'number', 'switch', 'multiselect', 'date', 'file', 'select']
+
+
+def make_config(database_uri):
+    """生成基准测试使用的配置类"""
+    if not database_uri:
+        return Config
+
+    class BenchmarkConfig(Config):
+        SQLALCHEMY_DATABASE_URI = database_uri
+        SQLALCHEMY_ENGINE_OPTIONS = {} if database_uri.startswith('sqlite') else Config.SQLALCHEMY_ENGINE_OPTIONS
+
+    return BenchmarkConfig
+
+
+def make_script(param_count):
+    """构造带大量参数定义的脚本与对应的执行参数"""
+    definitions = []
+    params = {}
+    for i in range(param_count):
+        param_type = PARAM_TYPES[i % len(PARAM_TYPES)]
+        key = f'PARAM_{i}'
+        definitions.append({'key': key, 'type': param_type, 'description': f'参数 {i}'})
+        if param_type == 'switch':
+            params[key] = i % 2 == 0
+        elif param_type == 'multiselect':
+            params[key] = ['a', 'b', str(i)]
+        else:
+            params[key] = f'value-{i}'
+    script = Script(id=-1, name='benchmark', type='python', code='', version=1,
+                    parameters=json.dumps(definitions, ensure_ascii=False))
+    return script, params
+
+
+def legacy_build(script, params, execution_files):
+    """原 execute_script 中的环境变量构建逻辑"""
+    env = os.environ.copy()
+    global_vars = {var.key: var.value for var in GlobalVariable.query.all()}
+    for key, value in global_vars.items():
+        env[key] = str(value)
+
+    script_params = json.loads(script.parameters) if script.parameters else []
+    for key, value in params.items():
+        param_def = next((p for p in script_params if p['key'] == key), None)
+        param_type = param_def.get('type', 'text') if param_def else 'text'
+        if param_type == 'file':
+            env[key] = str(value)
+        elif param_type in ['multiselect', 'checkbox']:
+            if isinstance(value, list):
+                env[key] = ','.join(str(v) for v in value)
+            else:
+                env[key] = str(value)
+        elif param_type == 'switch':
+            env[key] = 'true' if value else 'false'
+        elif param_type == 'number':
+            env[key] = str(value)
+        else:
+            env[key] = str(value) if value else ''
+
+    if execution_files:
+        env['FILES'] = json.dumps([f['name'] for f in execution_files])
+    return env
+
+
+def measure(label, build, runs):
+    durations = []
+    env = None
+    for _ in range(runs):
+        started = time.perf_counter()
+        env = build()
+        durations.append(time.perf_counter() - started)
+    durations.sort()
+    avg = sum(durations) / len(durations)
+    p95 = durations[min(len(durations) - 1, int(len(durations) * 0.95))]
+    print(f"{label:<12} 平均 {avg * 1000:9.3f}ms  p95 {p95 * 1000:9.3f}ms  总计 {sum(durations) * 1000:9.2f}ms")
+    return avg, env
+
+
+def main():
+    param_count = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    config_class = make_config(sys.argv[3] if len(sys.argv) > 3 else None)
+
+    app = create_app(config_class)
+    script, params = make_script(param_count)
+    execution_files = [{'name': 'input.xlsx', 'path': 'input.xlsx'}]
+
+    with app.app_context():
+        global_count = GlobalVariable.query.count()
+        print('=' * 80)
+        print(f'环境变量构建基准测试: {param_count} 个参数, 全局变量 {global_count} 个, '
+              f'系统环境变量 {len(os.environ)} 个, 执行 {runs} 次')
+        print('=' * 80)
+
+        before_avg, before_env = measure('旧方式', lambda: legacy_build(script, params, execution_files), runs)
+        env_builder.invalidate()
+        after_avg, after_env = measure('env_builder', lambda: env_builder.build(script, params, execution_files), runs)
+
+    print('-' * 80)
+    print(f'结果一致: {"是" if before_env == after_env else "否"}')
+    print(f'每次执行节省 {(before_avg - after_avg) * 1000:.3f}ms '
+          f'({before_avg / after_avg if after_avg else float("inf"):.1f}x)')
+    print(f'构建器统计: {env_builder.get_stats()}')
+
+    scheduler_manager.scheduler.shutdown(wait=False)
+
+
+if __name__ == '__main__':
+    main()
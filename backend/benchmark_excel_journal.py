@@ -0,0 +1,120 @@
+"""
+Excel 单元格编辑保存基准测试
+
+对比 /excel/save 增量更新（cells）的两种保存方式：
+- 旧方式：openpyxl 加载完整工作簿，修改单元格后重写整个文件，请求线程全程等待
+- 新方式：编辑追加到编辑日志（fsync 后即返回），后台合并后只改写受影响工作表的 XML 部件
+
+分别测量请求耗时（旧方式为完整保存耗时，新方式为日志追加耗时）和后台写入耗时，
+并用 openpyxl 读取结果文件校验编辑已写入。测试文件与日志写入临时目录，结束后删除。
+
+使用方法：
+    python benchmark_excel_journal.py [行数列表] [每次编辑的单元格数]
+
+示例：
+    python benchmark_excel_journal.py                  # 10000,100000 行，每次编辑 1 个单元格
+    python benchmark_excel_journal.py 50000 100
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+# 添加父目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import openpyxl
+from config import Config
+from services.excel_reader import excel_reader
+from services.excel_journal import excel_journal
+
+COLUMNS = 8
+
+
+def make_fixture(directory, rows):
+    """生成测试文件：数字、文本混合的 COLUMNS 列数据，另有一个小工作表"""
+    path = os.path.join(directory, f'journal_{rows}.xlsx')
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.title = 'Data'
+    sheet.append([f'列{c + 1}' for c in range(COLUMNS)])
+    for i in range(1, rows):
+        sheet.append([i, i * 1.5, f'文本-{i}', i % 7, f'类别{i % 13}', None, i * 2, f'备注{i}'])
+    workbook.create_sheet('Summary')['A1'] = '汇总'
+    workbook.save(path)
+    return path
+
+
+def make_cells(rows, count, tag):
+    """在整个工作表范围内均匀分布的单元格编辑"""
+    step = max(rows // count, 1)
+    return [{'row': (i * step) % rows, 'col': i % COLUMNS, 'value': f'{tag}-{i}'} for i in range(count)]
+
+
+def legacy_save(path, cells):
+    """原 save_excel_editor_file 中的增量更新逻辑"""
+    workbook = openpyxl.load_workbook(path)
+    sheet = workbook.worksheets[0]
+    for cell in cells:
+        sheet.cell(row=cell['row'] + 1, column=cell['col'] + 1, value=cell['value'])
+    workbook.save(path)
+    workbook.close()
+
+
+def verify(path, cells):
+    workbook = openpyxl.load_workbook(path, read_only=True)
+    sheet = workbook.worksheets[0]
+    expected = {(cell['row'], cell['col']): cell['value'] for cell in cells}
+    found = 0
+    for row_idx, row in enumerate(sheet.iter_rows(values_only=True)):
+        for col_idx, value in enumerate(row):
+            if (row_idx, col_idx) in expected and expected[(row_idx, col_idx)] == value:
+                found += 1
+    workbook.close()
+    return found == len(expected)
+
+
+def main():
+    sizes = [int(s) for s in sys.argv[1].split(',')] if len(sys.argv) > 1 else [10000, 100000]
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+
+    directory = tempfile.mkdtemp(prefix='excel_journal_bench_')
+    Config.EXCEL_SNAPSHOT_DIR = os.path.join(directory, 'snapshots')
+    Config.EXCEL_JOURNAL_DIR = os.path.join(directory, 'journals')
+    # 由基准测试手动触发写入
+    Config.EXCEL_JOURNAL_FLUSH_DELAY = Config.EXCEL_JOURNAL_MAX_DELAY = 3600
+    try:
+        print('=' * 80)
+        print(f'Excel 单元格编辑保存基准测试: 每次编辑 {count} 个单元格')
+        print('=' * 80)
+        for rows in sizes:
+            path = make_fixture(directory, rows)
+            print(f'\n[{rows} 行] 文件 {os.path.getsize(path) / 1024 / 1024:.1f}MB')
+
+            cells = make_cells(rows, count, 'legacy')
+            started = time.perf_counter()
+            legacy_save(path, cells)
+            legacy = time.perf_counter() - started
+            print(f'  旧方式 请求耗时（完整保存）: {legacy * 1000:10.2f}ms  校验: {"通过" if verify(path, cells) else "失败"}')
+
+            # 工作表名称来自缓存的工作簿，首次编辑前由查看页面的请求预先打开
+            excel_reader.get_info(path)
+            cells = make_cells(rows, count, 'journal')
+            started = time.perf_counter()
+            excel_journal.append(path, '0', cells)
+            append = time.perf_counter() - started
+            started = time.perf_counter()
+            excel_journal.flush(path)
+            flush = time.perf_counter() - started
+            print(f'  新方式 请求耗时（日志追加）: {append * 1000:10.2f}ms  ({legacy / append:.0f}x)')
+            print(f'  新方式 后台写入（部件改写）: {flush * 1000:10.2f}ms  ({legacy / flush:.1f}x)  '
+                  f'校验: {"通过" if verify(path, cells) else "失败"}')
+        print(f'\n编辑日志统计: {excel_journal.get_stats()}')
+    finally:
+        excel_reader.clear()
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
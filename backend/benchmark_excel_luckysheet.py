@@ -0,0 +1,156 @@
+"""
+Excel 转 Luckysheet 内存基准测试
+
+对比 excel_to_luckysheet 两种模式的峰值内存（RSS）与耗时：
+- 完整模式：二维数组 data + celldata，行列数取 dimension，整体序列化为 JSON（与原接口一致）
+- 稀疏模式：只输出 celldata，行列数按实际有值的范围计算，逐个工作表流式输出 JSON
+- 稀疏模式（快照）：已生成列式快照时的稀疏模式
+
+测试文件：
+- wide:     行数 × 200 列的稠密数据
+- sparse:   行数 × 4 列数据，另有一个带格式的空单元格把 dimension 撑大到 (行数 × 10) 行 × 1000 列
+- inflated: 少量数据，带格式的空单元格位于 XFD1048576（完整模式需要分配 1048576 × 16384 的数组，跳过）
+
+每次转换在独立子进程中执行，峰值内存互不影响。
+
+使用方法：
+    python benchmark_excel_luckysheet.py [测试文件列表] [行数]
+
+示例：
+    python benchmark_excel_luckysheet.py                      # wide,sparse,inflated，2000 行
+    python benchmark_excel_luckysheet.py wide,sparse 5000
+"""
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+# 添加父目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import openpyxl
+from openpyxl.styles import PatternFill
+from openpyxl.utils import get_column_letter
+
+MODES = [('dense', '完整模式'), ('sparse', '稀疏模式'), ('snapshot', '稀疏模式（快照）')]
+
+
+def make_fixture(directory, kind, rows):
+    """生成测试文件"""
+    path = os.path.join(directory, f'{kind}_{rows}.xlsx')
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.title = kind
+    fill = PatternFill('solid', fgColor='FFFF00')
+    if kind == 'wide':
+        for i in range(rows):
+            sheet.append([i * 200 + c if c % 2 else f'r{i}c{c}' for c in range(200)])
+    elif kind == 'sparse':
+        for i in range(rows):
+            sheet.append([i, f'文本-{i}', i * 1.5, None])
+        sheet[f'{get_column_letter(1000)}{rows * 10}'].fill = fill
+    elif kind == 'inflated':
+        for i in range(20):
+            sheet.append([i, f'文本-{i}'])
+        sheet['XFD1048576'].fill = fill
+    else:
+        raise ValueError(f'未知的测试文件类型: {kind}')
+    workbook.save(path)
+    return path
+
+
+def run_child(mode, path):
+    """在子进程中执行一次转换，输出耗时与峰值内存"""
+    from services.excel_reader import excel_reader
+    from utils.excel_converter import excel_to_luckysheet, iter_luckysheet_sheets, stream_luckysheet_json
+
+    # 只测量转换本身，不在后台生成快照
+    excel_reader._start_snapshot = lambda *args: None
+
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    size = 0
+    if mode == 'dense':
+        size = len(json.dumps(excel_to_luckysheet(path), ensure_ascii=False, default=str))
+    else:
+        for chunk in stream_luckysheet_json(iter_luckysheet_sheets(path)):
+            size += len(chunk)
+    print(json.dumps({
+        'seconds': time.perf_counter() - started,
+        'peak_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'baseline_kb': baseline,
+        'json_chars': size
+    }))
+
+
+def measure(mode, path, snapshot_dir):
+    env = dict(os.environ, BENCH_SNAPSHOT_DIR=snapshot_dir)
+    result = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', mode, path],
+                            capture_output=True, text=True, env=env)
+    if result.returncode != 0:
+        return None
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def build_snapshot(path, snapshot_dir):
+    """生成列式快照，返回耗时（秒）"""
+    from config import Config
+    from services.excel_reader import excel_reader
+
+    Config.EXCEL_SNAPSHOT_DIR = snapshot_dir
+    started = time.perf_counter()
+    excel_reader.get_snapshot(path)
+    while not excel_reader.get_snapshot(path, build=False):
+        time.sleep(0.05)
+    excel_reader.clear()
+    return time.perf_counter() - started
+
+
+def main():
+    kinds = sys.argv[1].split(',') if len(sys.argv) > 1 else ['wide', 'sparse', 'inflated']
+    rows = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+
+    directory = tempfile.mkdtemp(prefix='luckysheet_bench_')
+    try:
+        print('=' * 80)
+        print(f'Excel 转 Luckysheet 内存基准测试: {rows} 行')
+        print('=' * 80)
+        for kind in kinds:
+            path = make_fixture(directory, kind, rows)
+            workbook = openpyxl.load_workbook(path, read_only=True)
+            dimension = workbook.active.calculate_dimension()
+            workbook.close()
+            print(f'\n[{kind}] 文件 {os.path.getsize(path) / 1024:.0f}KB，dimension {dimension}')
+
+            empty_dir = os.path.join(directory, f'{kind}_empty')
+            snapshot_dir = os.path.join(directory, f'{kind}_snapshots')
+            print(f'  生成快照耗时 {build_snapshot(path, snapshot_dir):.2f}s')
+
+            print(f'  {"模式":<16}{"耗时":>10}{"峰值RSS":>12}{"转换增量":>12}{"JSON长度":>12}')
+            for mode, label in MODES:
+                if mode == 'dense' and kind == 'inflated':
+                    print(f'  {label:<16}{"跳过（需要分配 1048576 × 16384 的二维数组）":>30}')
+                    continue
+                result = measure(mode, path, snapshot_dir if mode == 'snapshot' else empty_dir)
+                if result is None:
+                    print(f'  {label:<16}{"失败（可能内存不足）":>20}')
+                    continue
+                print(f'  {label:<16}{result["seconds"]:9.2f}s'
+                      f'{result["peak_kb"] / 1024:10.1f}MB'
+                      f'{(result["peak_kb"] - result["baseline_kb"]) / 1024:10.1f}MB'
+                      f'{result["json_chars"]:12d}')
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--child':
+        from config import Config
+        Config.EXCEL_SNAPSHOT_DIR = os.environ['BENCH_SNAPSHOT_DIR']
+        run_child(sys.argv[2], sys.argv[3])
+    else:
+        main()
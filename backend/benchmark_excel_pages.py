@@ -0,0 +1,132 @@
+"""
+Excel 分页读取基准测试
+
+生成指定行数的 xlsx 测试文件，对比 /excel/sheet 接口的两种读取方式：
+- 旧方式：每次请求 load_workbook(read_only=True)，再逐个 sheet.cell() 读取。
+  只读模式下每次 cell() 都从头解析工作表，深页耗时按 (行号 × 单元格数) 增长；
+  为避免单页运行数分钟，旧方式按「打开耗时 + 单个 cell() 耗时 × 单元格数」估算
+- 新方式：excel_reader 首次访问后在后台生成列式快照，分别测量首次请求、快照生成、重新打开快照
+  （模拟进程重启）和读取快照时首页/中间页/末页的耗时
+
+快照写入临时目录，测试结束后删除。
+
+使用方法：
+    python benchmark_excel_pages.py [行数列表] [每页行数] [重复次数]
+
+示例：
+    python benchmark_excel_pages.py                          # 10000,100000,1000000 行，每页100行，重复20次
+    python benchmark_excel_pages.py 10000,50000 100 10
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# 添加父目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import openpyxl
+from config import Config
+from services.excel_reader import excel_reader
+
+COLUMNS = 8
+
+
+def make_fixture(directory, rows):
+    """生成测试文件：数字、文本、日期混合的 COLUMNS 列数据"""
+    path = os.path.join(directory, f'bench_{rows}.xlsx')
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet('Sheet1')
+    sheet.append([f'列{c + 1}' for c in range(COLUMNS)])
+    base = datetime(2024, 1, 1)
+    for i in range(1, rows):
+        sheet.append([i, i * 1.5, f'文本-{i}', base + timedelta(minutes=i), i % 7, f'类别{i % 13}', None, i * 2])
+    workbook.save(path)
+    return path
+
+
+def estimate_legacy(path, rows, offset, limit, cols):
+    """
+    估算旧方式读取一页的耗时（秒）
+
+    write_only 生成的文件没有 dimension 信息（旧接口会直接报错），行数使用生成时的值。
+    """
+    started = time.perf_counter()
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    sheet = workbook[workbook.sheetnames[0]]
+    open_cost = time.perf_counter() - started
+
+    last_row = min(offset + limit, sheet.max_row or rows)
+    cells = max(last_row - offset, 0) * min(cols, sheet.max_column or cols)
+    # 页内行号差异很小，使用页中间一行的 cell() 耗时代表每个单元格
+    started = time.perf_counter()
+    sheet.cell(row=(offset + last_row) // 2 + 1, column=1).value
+    cell_cost = time.perf_counter() - started
+    workbook.close()
+    return open_cost + cell_cost * cells
+
+
+def timed(func, repeat):
+    durations = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        durations.append(time.perf_counter() - started)
+    return sum(durations) / len(durations), result
+
+
+def wait_for_snapshot(path):
+    """等待后台快照生成完成，返回耗时（秒）"""
+    started = time.perf_counter()
+    while not excel_reader.read_page(path, '0', 0, 1, COLUMNS)['snapshot']:
+        time.sleep(0.05)
+    return time.perf_counter() - started
+
+
+def main():
+    sizes = [int(s) for s in sys.argv[1].split(',')] if len(sys.argv) > 1 else [10000, 100000, 1000000]
+    limit = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    repeat = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+
+    directory = tempfile.mkdtemp(prefix='excel_bench_')
+    Config.EXCEL_SNAPSHOT_DIR = os.path.join(directory, 'snapshots')
+    try:
+        print('=' * 96)
+        print(f'Excel 分页读取基准测试: 每页 {limit} 行 × {COLUMNS} 列, 重复 {repeat} 次取平均')
+        print('=' * 96)
+        for rows in sizes:
+            started = time.perf_counter()
+            path = make_fixture(directory, rows)
+            print(f'\n[{rows} 行] 文件 {os.path.getsize(path) / 1024 / 1024:.1f}MB，'
+                  f'生成耗时 {time.perf_counter() - started:.1f}s')
+
+            excel_reader.clear()
+            started = time.perf_counter()
+            excel_reader.read_page(path, '0', 0, limit, COLUMNS)
+            print(f'  首次请求（打开工作簿 + 直接读取首页）: {(time.perf_counter() - started) * 1000:9.2f}ms')
+            print(f'  后台生成快照:                         {wait_for_snapshot(path) * 1000:9.2f}ms')
+            excel_reader.clear()
+            started = time.perf_counter()
+            excel_reader.read_page(path, '0', 0, limit, COLUMNS)
+            print(f'  重新打开快照并读取首页:               {(time.perf_counter() - started) * 1000:9.2f}ms')
+
+            print(f'  {"页位置":<10}{"旧方式(估算)":>16}{"新方式":>14}{"加速":>10}')
+            for label, offset in (('首页', 0), ('中间页', rows // 2), ('末页', max(rows - limit, 0))):
+                legacy = estimate_legacy(path, rows, offset, limit, COLUMNS)
+                current, page = timed(lambda: excel_reader.read_page(path, '0', offset, limit, COLUMNS), repeat)
+                assert len(page['rows']) == min(limit, rows - offset)
+                print(f'  {label:<10}{legacy * 1000:14.2f}ms{current * 1000:12.3f}ms{legacy / current:9.0f}x')
+
+            snapshot = excel_reader.get_snapshot(path, build=False)
+            snapshot_size = sum(entry.stat().st_size for entry in os.scandir(snapshot.directory))
+            print(f'  快照大小 {snapshot_size / 1024 / 1024:.1f}MB')
+    finally:
+        excel_reader.clear()
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,305 @@
+"""
+并发 SSE 流承载能力基准测试
+
+分别以 server.py 的各个工作模型（threading / gevent / eventlet，未安装的跳过）启动完整的后端应用
+（server.serve：打补丁、create_app、调度器与执行引擎），在临时目录中使用独立的数据库与日志目录。
+测试进程通过接口创建并执行一个脚本，用非阻塞 socket 同时打开大量该执行的日志流
+（/api/executions/<id>/logs/stream），然后：
+- 统计在超时时间内建立成功（收到首个事件）的连接数
+- 让脚本逐行输出带时间戳的日志，测量每行从脚本输出到全部连接收到的延迟
+- 确认日志文件完整、执行状态为成功（冷启动执行的输出经由工作模型下的管道读取）
+- 读取服务进程的线程数与常驻内存
+
+数据库默认为临时目录中的 SQLite 文件，设置 BENCHMARK_DATABASE_URL 可改用其他数据库（需为空库）。
+
+使用方法：
+    python benchmark_server_streams.py [连接数列表] [工作模型列表] [日志行数]
+
+示例：
+    python benchmark_server_streams.py                          # 500,2000 个连接，全部工作模型，各 10 行日志
+    python benchmark_server_streams.py 5000 gevent,threading 20
+"""
+import json
+import os
+import re
+import resource
+import selectors
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+# 添加父目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+LINE_INTERVAL = 0.1  # 脚本输出两行日志之间的间隔（秒）
+MARKER = re.compile(rb'bench-(\d+) ([\d.]+)')
+
+SCRIPT_CODE = '''import os
+import time
+
+go = {go!r}
+while not os.path.exists(go):
+    time.sleep(0.05)
+for i in range({lines}):
+    print(f'bench-{{i}} {{time.time():.6f}}')
+    time.sleep({interval})
+'''
+
+
+def configure(workdir):
+    """把数据库与所有数据目录指向临时目录"""
+    from config import Config
+
+    database_url = os.environ.get('BENCHMARK_DATABASE_URL') or f'sqlite:///{os.path.join(workdir, "bench.db")}'
+    Config.SQLALCHEMY_DATABASE_URI = database_url
+    if database_url.startswith('sqlite'):
+        Config.SQLALCHEMY_ENGINE_OPTIONS = {}
+    for name in ('SCRIPTS_DIR', 'WORKSPACES_DIR', 'EXECUTION_SPACES_DIR', 'WORKFLOW_EXECUTION_SPACES_DIR',
+                 'LOGS_DIR', 'DATA_DIR', 'BACKUPS_DIR', 'DEPENDENCY_CACHE_DIR'):
+        setattr(Config, name, os.path.join(workdir, name.lower()))
+    Config.UPLOAD_FOLDER = os.path.join(Config.DATA_DIR, 'uploads')
+    Config.EXCEL_SNAPSHOT_DIR = os.path.join(Config.DATA_DIR, 'excel_snapshots')
+    Config.EXCEL_JOURNAL_DIR = os.path.join(Config.DATA_DIR, 'excel_journals')
+
+
+def run_worker(worker_class, port, workdir):
+    """子进程：以 server.py 的方式运行完整应用"""
+    import argparse
+    import logging
+    import server
+
+    configure(workdir)
+    logging.disable(logging.WARNING)
+    server.serve(argparse.Namespace(host='127.0.0.1', port=port, worker_class=worker_class,
+                                    workers=1, drain_timeout=5))
+
+
+def available_worker_classes():
+    classes = ['threading']
+    for name in ('gevent', 'eventlet'):
+        try:
+            __import__(name)
+            classes.append(name)
+        except ImportError:
+            pass
+    return classes
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def process_usage(pid):
+    """服务进程的线程数与常驻内存（MB），读取 /proc，其他平台返回 None"""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            fields = dict(line.split(':', 1) for line in f if ':' in line)
+        return int(fields['Threads']), int(fields['VmRSS'].split()[0]) / 1024
+    except (OSError, KeyError, ValueError):
+        return None, None
+
+
+def start_worker(worker_class, workdir):
+    port = free_port()
+    output = open(os.path.join(workdir, 'server.log'), 'wb')
+    process = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--worker', worker_class, str(port), workdir],
+                               stdout=output, stderr=subprocess.STDOUT)
+    output.close()
+    deadline = time.time() + 60
+    while True:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return process, port
+        except OSError:
+            if time.time() > deadline or process.poll() is not None:
+                process.kill()
+                raise RuntimeError(f'{worker_class} 服务进程启动失败，输出见 {workdir}/server.log')
+            time.sleep(0.1)
+
+
+def start_execution(port, go_file, lines):
+    """通过接口创建脚本并执行，返回执行ID"""
+    import requests
+
+    base = f'http://127.0.0.1:{port}/api'
+    code = SCRIPT_CODE.format(go=go_file, lines=lines, interval=LINE_INTERVAL)
+    response = requests.post(f'{base}/scripts', json={
+        'name': f'bench-stream-{os.getpid()}-{time.time()}', 'type': 'python', 'code': code
+    }, timeout=30).json()
+    if response['code'] != 0:
+        raise RuntimeError(f'创建脚本失败: {response["message"]}')
+    response = requests.post(f'{base}/scripts/{response["data"]["id"]}/execute', timeout=30).json()
+    if response['code'] != 0:
+        raise RuntimeError(f'执行脚本失败: {response["message"]}')
+    return response['data']['id']
+
+
+def open_streams(port, execution_id, count, timeout):
+    """打开 count 个日志流，返回 (selector, {已收到首个事件的连接: 缓冲})"""
+    selector = selectors.DefaultSelector()
+    request = (f'GET /api/executions/{execution_id}/logs/stream HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\n'
+               f'Accept: text/event-stream\r\n\r\n').encode()
+    pending = {}
+    for _ in range(count):
+        sock = socket.socket()
+        sock.setblocking(False)
+        sock.connect_ex(('127.0.0.1', port))
+        pending[sock] = b''
+        selector.register(sock, selectors.EVENT_WRITE)
+
+    ready = {}
+    deadline = time.time() + timeout
+    while pending and time.time() < deadline:
+        for key, mask in selector.select(timeout=0.5):
+            sock = key.fileobj
+            if sock not in pending:
+                continue
+            if mask & selectors.EVENT_WRITE:
+                try:
+                    sock.send(request)
+                except OSError:
+                    selector.unregister(sock)
+                    sock.close()
+                    del pending[sock]
+                    continue
+                selector.modify(sock, selectors.EVENT_READ)
+                continue
+            try:
+                data = sock.recv(65536)
+            except OSError:
+                data = b''
+            if not data:
+                selector.unregister(sock)
+                sock.close()
+                del pending[sock]
+                continue
+            pending[sock] += data
+            if b'data:' in pending[sock]:
+                ready[sock] = pending.pop(sock)
+
+    for sock in pending:
+        selector.unregister(sock)
+        sock.close()
+    return selector, ready
+
+
+def collect_lines(selector, streams, lines, timeout):
+    """
+    读取日志流直到执行结束
+
+    Returns:
+        (每行日志全部连接收到的延迟（秒）, 未收到全部日志行的连接数)
+    """
+    latest = {}  # 行号 -> 最后一个连接收到的时间 - 脚本输出的时间
+    seen = {sock: set() for sock in streams}
+    open_socks = set(streams)
+    deadline = time.time() + timeout
+    while open_socks and time.time() < deadline:
+        for key, _ in selector.select(timeout=0.5):
+            sock = key.fileobj
+            try:
+                data = sock.recv(65536)
+            except OSError:
+                data = b''
+            received = time.time()
+            if not data:
+                selector.unregister(sock)
+                open_socks.discard(sock)
+                continue
+            buffer = streams[sock] + data
+            # 只解析完整的事件，不完整的部分留到下次
+            complete, _, streams[sock] = buffer.rpartition(b'\n\n')
+            for match in MARKER.finditer(complete):
+                index = int(match.group(1))
+                if index not in seen[sock]:
+                    seen[sock].add(index)
+                    latest[index] = max(latest.get(index, 0.0), received - float(match.group(2)))
+            if b'"type": "status"' in complete and (b'"success"' in complete or b'"failed"' in complete):
+                selector.unregister(sock)
+                open_socks.discard(sock)
+    incomplete = sum(1 for indexes in seen.values() if len(indexes) < lines)
+    return sorted(latest.values()), incomplete
+
+
+def check_execution(port, execution_id, lines, timeout=30):
+    """等待执行结束，返回 (状态, 日志文件中的日志行数)"""
+    import requests
+
+    base = f'http://127.0.0.1:{port}/api/executions/{execution_id}'
+    deadline = time.time() + timeout
+    while True:
+        execution = requests.get(base, timeout=30).json()['data']
+        if execution['status'] in ('success', 'failed') or time.time() > deadline:
+            break
+        time.sleep(0.2)
+    logs = requests.get(f'{base}/logs', timeout=30).json()['data']['logs']
+    return execution['status'], len(MARKER.findall(logs.encode('utf-8')))
+
+
+def measure(worker_class, count, lines):
+    workdir = tempfile.mkdtemp(prefix='bench_streams_')
+    go_file = os.path.join(workdir, 'go')
+    process, port = start_worker(worker_class, workdir)
+    selector, streams = None, {}
+    try:
+        execution_id = start_execution(port, go_file, lines)
+        started = time.perf_counter()
+        selector, streams = open_streams(port, execution_id, count, timeout=60)
+        connect_seconds = time.perf_counter() - started
+        threads, rss = process_usage(process.pid)
+        line = f'  {worker_class:<10} {count:>6} 个连接: 建立 {len(streams):>6} 个（{connect_seconds:5.1f}s）'
+        if threads is not None:
+            line += f'，服务进程 {threads} 个线程，{rss:.0f}MB'
+        print(line)
+
+        open(go_file, 'w').close()
+        latencies, incomplete = collect_lines(selector, streams, lines, timeout=60 + lines * LINE_INTERVAL)
+        status, logged = check_execution(port, execution_id, lines)
+        if latencies:
+            print(f'             全部连接收到日志  p50 {latencies[len(latencies) // 2] * 1000:8.1f}ms'
+                  f'  最大 {latencies[-1] * 1000:8.1f}ms  日志不完整的连接 {incomplete}')
+        print(f'             执行状态 {status}，日志文件 {logged}/{lines} 行')
+        if status != 'success' or logged != lines:
+            print(f'             执行输出丢失，服务进程输出见 {workdir}/server.log')
+            workdir = None
+    finally:
+        for sock in streams:
+            sock.close()
+        if selector:
+            selector.close()
+        process.terminate()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    counts = [int(n) for n in sys.argv[1].split(',')] if len(sys.argv) > 1 else [500, 2000]
+    classes = sys.argv[2].split(',') if len(sys.argv) > 2 else available_worker_classes()
+    lines = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+
+    # 每个连接占用一个文件描述符
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (max(soft, min(hard, max(counts) * 2 + 1024)), hard))
+
+    print('=' * 80)
+    print(f'并发 SSE 日志流承载能力: 工作模型 {", ".join(classes)}，每次执行输出 {lines} 行日志')
+    print('=' * 80)
+    for count in counts:
+        for worker_class in classes:
+            measure(worker_class, count, lines)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--worker':
+        run_worker(sys.argv[2], int(sys.argv[3]), sys.argv[4])
+    else:
+        main()
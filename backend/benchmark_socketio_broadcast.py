@@ -0,0 +1,231 @@
+"""
+Socket.IO 房间广播延迟负载测试
+
+启动若干个独立的后端 WebSocket 进程（/excel 命名空间），连接大量客户端加入同一个 Excel 文件房间，
+由一个客户端连续发送 cursor_move，测量其余每个客户端收到 cursor_update 的延迟：
+- 单进程：进程内广播 + 内存会话存储（默认配置）
+- 多进程：SQLite 消息队列 + SQLite 会话存储，客户端按轮询方式分配到各个进程，
+  发送者所在进程之外的客户端经由消息队列收到广播
+
+客户端与发送者在同一个测试进程中，延迟用同一个时钟计算。
+未安装 websocket-client 时客户端使用 HTTP 长轮询传输，延迟包含长轮询的往返开销。
+测试文件、数据库与日志写入临时目录，结束后删除。
+
+使用方法：
+    python benchmark_socketio_broadcast.py [客户端数] [进程数列表] [消息数]
+
+示例：
+    python benchmark_socketio_broadcast.py                 # 500 个客户端，1,2 个进程，各 20 条消息
+    python benchmark_socketio_broadcast.py 200 1,2,4 50
+"""
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# 添加父目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+FILE_ID = 'broadcast.xlsx'
+NAMESPACE = '/excel'
+
+
+def run_worker(port, data_dir):
+    """子进程：只提供 WebSocket 的最小应用（消息队列与会话存储由环境变量配置）"""
+    import logging
+    from flask import Flask
+    from config import Config
+
+    Config.UPLOAD_FOLDER = data_dir
+    Config.EXCEL_SNAPSHOT_DIR = os.path.join(data_dir, 'snapshots')
+    Config.EXCEL_JOURNAL_DIR = os.path.join(data_dir, 'journals')
+    logging.disable(logging.WARNING)
+
+    from websocket import socketio
+    app = Flask(__name__)
+    socketio.init_app(app)
+    socketio.run(app, host='127.0.0.1', port=port, allow_unsafe_werkzeug=True, log_output=False)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_workers(count, directory):
+    """启动 count 个后端进程，多于一个时共享 SQLite 消息队列与会话存储"""
+    import requests
+
+    env = dict(os.environ)
+    if count > 1:
+        env['SOCKETIO_MESSAGE_QUEUE'] = 'sqlite:///' + os.path.join(directory, f'queue_{count}.db')
+        env['SOCKETIO_SESSION_STORE'] = 'sqlite:///' + os.path.join(directory, f'sessions_{count}.db')
+    else:
+        env.pop('SOCKETIO_MESSAGE_QUEUE', None)
+        env.pop('SOCKETIO_SESSION_STORE', None)
+
+    workers = []
+    for _ in range(count):
+        port = free_port()
+        process = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--worker', str(port), directory],
+                                   env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        workers.append((process, f'http://127.0.0.1:{port}'))
+
+    deadline = time.time() + 30
+    for process, url in workers:
+        while True:
+            try:
+                requests.get(f'{url}/socket.io/?EIO=4&transport=polling', timeout=1)
+                break
+            except requests.RequestException:
+                if time.time() > deadline or process.poll() is not None:
+                    raise RuntimeError(f'后端进程启动失败: {url}')
+                time.sleep(0.1)
+    return workers
+
+
+class Receiver:
+    """记录每条消息被各个客户端收到的时间"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sent = {}
+        self.received = {}  # 消息序号 -> [收到时间]
+        self.joined = 0
+
+    def on_join(self, data):
+        with self.lock:
+            self.joined += 1
+
+    def on_cursor(self, data):
+        now = time.perf_counter()
+        seq = int(data['cell'][1:])
+        with self.lock:
+            self.received.setdefault(seq, []).append(now)
+
+    def count(self, seq):
+        with self.lock:
+            return len(self.received.get(seq, []))
+
+
+def connect_clients(workers, count, receiver):
+    import socketio
+    from engineio import client as engineio_client
+    from engineio.payload import Payload
+
+    # 长轮询响应会合并排队中的全部广播（例如 500 个 user_joined），Python 客户端默认最多解析 16 个，
+    # 超出后断开连接；浏览器客户端没有这个限制
+    Payload.max_decode_packets = 100000
+
+    # websocket-client 的模块名与后端的 websocket 包相同，按其接口判断是否已安装
+    transports = ['websocket'] if hasattr(engineio_client.websocket, 'create_connection') else ['polling']
+
+    def connect(index):
+        # 开发服务器在大量连接同时建立时偶尔会拒绝连接，重试几次
+        for attempt in range(3):
+            client = socketio.Client(reconnection=False)
+            client.on('joined', receiver.on_join, namespace=NAMESPACE)
+            if index:
+                client.on('cursor_update', receiver.on_cursor, namespace=NAMESPACE)
+            try:
+                client.connect(workers[index % len(workers)][1], namespaces=[NAMESPACE], transports=transports,
+                               wait_timeout=30)
+            except socketio.exceptions.ConnectionError:
+                time.sleep(0.5 * (attempt + 1))
+                continue
+            client.emit('join', {'file_id': FILE_ID, 'user_id': f'bench-{index}'}, namespace=NAMESPACE)
+            return client
+        return None
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        clients = [client for client in pool.map(connect, range(count)) if client]
+
+    deadline = time.time() + 120
+    while receiver.joined < len(clients) and time.time() < deadline:
+        time.sleep(0.1)
+    time.sleep(1)
+    return clients
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def measure(worker_count, client_count, messages, directory):
+    workers = start_workers(worker_count, directory)
+    receiver = Receiver()
+    clients = []
+    try:
+        started = time.perf_counter()
+        clients = connect_clients(workers, client_count, receiver)
+        connect_seconds = time.perf_counter() - started
+        # 连接失败或加入后被断开的客户端不计入
+        clients = [client for client in clients if client.connected]
+        if len(clients) < 2:
+            print(f'  {worker_count} 个进程: 没有足够的客户端连接成功')
+            return
+
+        sender = clients[0]
+        expected = len(clients) - 1
+        latencies, complete, lost = [], [], 0
+        for seq in range(messages):
+            receiver.sent[seq] = time.perf_counter()
+            sender.emit('cursor_move', {'file_id': FILE_ID, 'user_id': 'bench-0', 'sheet': '0', 'cell': f'A{seq}'},
+                        namespace=NAMESPACE)
+            deadline = time.time() + 10
+            while receiver.count(seq) < expected and time.time() < deadline:
+                time.sleep(0.001)
+            times = receiver.received.get(seq, [])
+            lost += expected - len(times)
+            if times:
+                latencies.extend(t - receiver.sent[seq] for t in times)
+                complete.append(max(times) - receiver.sent[seq])
+
+        print(f'  {worker_count} 个进程: 连接并加入 {connect_seconds:.1f}s，'
+              f'{len(clients)}/{client_count} 个客户端在线，收到 {len(latencies)}/{expected * messages} 条（丢失 {lost}）')
+        print(f'    单个客户端延迟  p50 {percentile(latencies, 0.5) * 1000:8.1f}ms'
+              f'  p95 {percentile(latencies, 0.95) * 1000:8.1f}ms  p99 {percentile(latencies, 0.99) * 1000:8.1f}ms')
+        print(f'    全部客户端收到  p50 {percentile(complete, 0.5) * 1000:8.1f}ms'
+              f'  p95 {percentile(complete, 0.95) * 1000:8.1f}ms  最大 {max(complete) * 1000:8.1f}ms')
+    finally:
+        with ThreadPoolExecutor(max_workers=32) as pool:
+            list(pool.map(lambda client: client.disconnect(), clients))
+        for process, _ in workers:
+            process.terminate()
+            process.wait()
+
+
+def main():
+    import openpyxl
+
+    client_count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    worker_counts = [int(n) for n in sys.argv[2].split(',')] if len(sys.argv) > 2 else [1, 2]
+    messages = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+
+    directory = tempfile.mkdtemp(prefix='socketio_bench_')
+    try:
+        workbook = openpyxl.Workbook()
+        workbook.active['A1'] = 'broadcast'
+        workbook.save(os.path.join(directory, FILE_ID))
+
+        print('=' * 80)
+        print(f'Socket.IO 房间广播延迟: {client_count} 个客户端，每种配置 {messages} 条消息')
+        print('=' * 80)
+        for worker_count in worker_counts:
+            measure(worker_count, client_count, messages, directory)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--worker':
+        run_worker(int(sys.argv[2]), sys.argv[3])
+    else:
+        main()
@@ -0,0 +1,106 @@
+"""
+工作流启动开销基准测试
+
+对比每次工作流执行的启动开销：
+- 旧方式：每次执行调用 create_app()（注册蓝图、db.create_all()、重新加载所有定时任务、清理检查）
+- 新方式：复用已创建的应用实例，仅进入应用上下文
+
+使用方法：
+    python benchmark_workflow_startup.py [执行次数] [数据库URI]
+
+示例：
+    python benchmark_workflow_startup.py                          # 使用配置中的数据库，执行10次
+    python benchmark_workflow_startup.py 20 sqlite:////tmp/bench.db
+"""
+import os
+import sys
+import time
+
+# 添加父目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config import Config
+from app import create_app
+from models import db, Schedule
+from services.scheduler import scheduler_manager
+
+
+def make_config(database_uri):
+    """生成基准测试使用的配置类"""
+    if not database_uri:
+        return Config
+
+    class BenchmarkConfig(Config):
+        SQLALCHEMY_DATABASE_URI = database_uri
+        SQLALCHEMY_ENGINE_OPTIONS = {} if database_uri.startswith('sqlite') else Config.SQLALCHEMY_ENGINE_OPTIONS
+
+    return BenchmarkConfig
+
+
+def count_calls(obj, name, counter):
+    """统计对象方法的调用次数"""
+    original = getattr(obj, name)
+
+    def wrapper(*args, **kwargs):
+        counter[name] = counter.get(name, 0) + 1
+        return original(*args, **kwargs)
+
+    setattr(obj, name, wrapper)
+
+
+def summarize(label, durations, counter):
+    durations = sorted(durations)
+    avg = sum(durations) / len(durations)
+    p95 = durations[min(len(durations) - 1, int(len(durations) * 0.95))]
+    print(f"{label:<12} 平均 {avg * 1000:9.2f}ms  p95 {p95 * 1000:9.2f}ms  "
+          f"总计 {sum(durations) * 1000:9.2f}ms  定时任务重载 {counter.get('reload_schedules', 0)} 次")
+    return avg
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    config_class = make_config(sys.argv[2] if len(sys.argv) > 2 else None)
+
+    app = create_app(config_class)
+    with app.app_context():
+        schedule_count = Schedule.query.count()
+
+    counter = {}
+    count_calls(scheduler_manager, 'reload_schedules', counter)
+
+    print('=' * 80)
+    print(f'工作流启动开销基准测试: {runs} 次执行, 定时任务 {schedule_count} 个')
+    print(f'数据库: {config_class.SQLALCHEMY_DATABASE_URI.split("@")[-1]}')
+    print('=' * 80)
+
+    # 旧方式：每次执行都创建新的应用
+    before = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        run_app = create_app(config_class)
+        with run_app.app_context():
+            db.session.execute(db.select(Schedule.id).limit(1))
+        before.append(time.perf_counter() - started)
+    before_avg = summarize('create_app', before, counter)
+
+    # 新方式：复用已有应用，只进入应用上下文
+    counter.clear()
+    after = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        with app.app_context():
+            db.session.execute(db.select(Schedule.id).limit(1))
+        after.append(time.perf_counter() - started)
+    after_avg = summarize('app_context', after, counter)
+
+    print('-' * 80)
+    print(f'每次执行节省 {(before_avg - after_avg) * 1000:.2f}ms '
+          f'({before_avg / after_avg if after_avg else float("inf"):.1f}x)')
+
+    # 恢复调度器使用的应用实例
+    scheduler_manager.set_app(app)
+    scheduler_manager.scheduler.shutdown(wait=False)
+
+
+if __name__ == '__main__':
+    main()
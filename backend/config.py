@@ -49,12 +49,34 @@ class Config:
     # 日志存储路径
     LOGS_DIR = os.path.join(BASE_DIR, 'logs')
 
+    # 执行日志写入：按时间/大小批量落盘
+    LOG_READ_CHUNK_SIZE = 64 * 1024  # 每次从进程管道读取的最大字节数
+    LOG_FLUSH_INTERVAL = 0.2  # 缓冲内容最长停留时间（秒）
+    LOG_FLUSH_BYTES = 64 * 1024  # 缓冲达到该大小立即写出
+
+    # 日志持久化模式: none（不主动fsync）, periodic（定期fsync）, completion（结束时fsync）
+    LOG_DURABILITY = os.environ.get('LOG_DURABILITY', 'periodic')
+    LOG_FSYNC_INTERVAL = 1.0  # periodic 模式下的 fsync 间隔（秒）
+
+    # 执行日志读取：行偏移索引与分段读取上限
+    LOG_INDEX_STRIDE = 1000  # 每隔多少行在 .idx 索引文件中记录一次字节偏移
+    LOG_MAX_READ_BYTES = 1024 * 1024  # 单次接口返回的最大日志字节数
+    LOG_MAX_TAIL_LINES = 10000  # tail 参数允许的最大行数
+
     # 数据文件路径
     DATA_DIR = os.path.join(BASE_DIR, 'data')
 
     # 备份文件路径
     BACKUPS_DIR = os.path.join(BASE_DIR, 'backups')
 
+    # 依赖缓存路径（isolated 模式下每个依赖集合一个目录）
+    DEPENDENCY_CACHE_DIR = os.path.join(BASE_DIR, 'dependency_cache')
+
+    # 依赖安装模式: shared（默认，安装到解释器自身的环境 / npm -g，其他脚本也可使用，与早期行为一致）,
+    # isolated（按依赖集合安装到独立目录，只通过 PYTHONPATH/NODE_PATH 提供给声明了这些依赖的脚本，需显式开启）
+    DEPENDENCY_INSTALL_MODE = os.environ.get('DEPENDENCY_INSTALL_MODE', 'shared')
+    DEPENDENCY_INSTALL_TIMEOUT = 600  # 单次依赖安装超时时间（秒）
+
     # 支持的脚本类型
     SUPPORTED_SCRIPT_TYPES = ['python', 'javascript']
 
@@ -67,9 +89,94 @@ class Config:
     # 脚本执行超时时间（秒）
     EXECUTION_TIMEOUT = 300
 
+    # 执行环境变量中的全局变量缓存：超过该时间（秒）后查询数据库确认是否被其他工作进程修改
+    GLOBAL_VARIABLES_CHECK_INTERVAL = 2
+
+    # 脚本执行并发上限（同时运行的脚本进程数）
+    EXECUTION_MAX_WORKERS = int(os.environ.get('EXECUTION_MAX_WORKERS', 4))
+
+    # 执行队列轮询间隔（秒），用于接续其他进程或重启前遗留的待执行记录
+    EXECUTION_QUEUE_POLL_INTERVAL = 2
+
+    # 调度器进程的租约：定期续约其认领（或带完成回调提交）的执行，超过租约未续约的执行由任意进程回收
+    EXECUTION_OWNER_HEARTBEAT_INTERVAL = 10  # 续约间隔（秒）
+    EXECUTION_OWNER_LEASE = 60  # 租约时长（秒）
+
+    # 工作流中同时执行的节点数上限（可在工作流配置 max_parallel 中单独设置）
+    WORKFLOW_MAX_PARALLEL = 4
+
+    # 工作流状态推送（SSE）：本进程执行的工作流由事件推送；在其他进程执行时按此间隔（秒）查询节点状态
+    WORKFLOW_STREAM_POLL_INTERVAL = 1
+
+    # Python 解释器预热池（按执行环境开启，见 Environment.warm_pool_size）
+    WARM_POOL_MAX_RUNS = 50  # 单个预热进程默认最多执行次数，之后回收
+    WARM_POOL_MAX_RSS_GROWTH_MB = 256  # 预热进程内存较启动时增长超过该值后回收
+    WARM_POOL_START_TIMEOUT = 60  # 等待预热进程完成模块预加载的超时时间（秒）
+
+    # Excel 分页读取缓存
+    EXCEL_CACHE_MAX_BYTES = 256 * 1024 * 1024  # 已打开工作簿占用内存的上限（估算值）
+    EXCEL_CACHE_MAX_WORKBOOKS = 16  # 同时缓存的工作簿数量上限
+
+    # Excel 列式快照（首次访问后在后台生成，文件变化后自动失效）
+    EXCEL_SNAPSHOT_DIR = os.path.join(DATA_DIR, 'excel_snapshots')
+    EXCEL_SNAPSHOT_MAX_BYTES = 2 * 1024 * 1024 * 1024  # 快照目录总大小上限，超出后删除最久未访问的快照
+
+    # Excel 单元格编辑日志（编辑先追加到日志，停止编辑后批量写入 xlsx）
+    EXCEL_JOURNAL_DIR = os.path.join(DATA_DIR, 'excel_journals')
+    EXCEL_JOURNAL_FLUSH_DELAY = 2  # 最后一次编辑后等待多久写入（秒）
+    EXCEL_JOURNAL_MAX_DELAY = 10  # 持续编辑时最长多久写入一次（秒）
+
+    # Excel 协同编辑（/excel WebSocket 命名空间的服务端文档状态）
+    EXCEL_COLLAB_HISTORY = 1000  # 每个房间保留的最近编辑数，重连时据此增量补发
+    EXCEL_COLLAB_IDLE_TIMEOUT = 600  # 房间没有成员后保留的时间（秒）
+    EXCEL_COLLAB_SHARED_DB = os.path.join(DATA_DIR, 'excel_collab.db')  # 多进程部署未配置共享存储时使用的 SQLite 文件
+
+    # Socket.IO 多进程部署
+    # 消息队列：为空时只在本进程内广播；sqlite:///路径 使用 SQLite 消息表（单机多进程，用于测试）；
+    # redis:// amqp:// kafka:// zmq+tcp:// 使用 python-socketio 自带的消息队列（需安装对应的依赖包）
+    SOCKETIO_MESSAGE_QUEUE = os.environ.get('SOCKETIO_MESSAGE_QUEUE', '')
+    SOCKETIO_CHANNEL = os.environ.get('SOCKETIO_CHANNEL', 'flask-socketio')
+    SOCKETIO_QUEUE_POLL_INTERVAL = 0.01  # SQLite 消息队列的轮询间隔（秒）
+    SOCKETIO_QUEUE_RETENTION = 60  # SQLite 消息队列中消息的保留时间（秒）
+    # 会话与房间成员存储：memory（进程内，默认）或 sqlite:///路径（多个进程共享）
+    SOCKETIO_SESSION_STORE = os.environ.get('SOCKETIO_SESSION_STORE', 'memory')
+    # Excel 协同编辑的文档状态存储（版本号与编辑历史），同上；多个工作进程必须共享，默认与会话存储相同
+    EXCEL_COLLAB_STORE = os.environ.get('EXCEL_COLLAB_STORE') or SOCKETIO_SESSION_STORE
+    # Socket.IO 异步模式：gevent、eventlet、threading，为空时自动选择（由 server.py 按工作模型设置）
+    SOCKETIO_ASYNC_MODE = os.environ.get('SOCKETIO_ASYNC_MODE') or None
+
+    # 生产服务入口（server.py）
+    SERVER_HOST = os.environ.get('SERVER_HOST', '0.0.0.0')
+    SERVER_PORT = int(os.environ.get('SERVER_PORT', 5001))
+    SERVER_WORKER_CLASS = os.environ.get('SERVER_WORKER_CLASS', 'gevent')  # gevent, eventlet, threading
+    SERVER_WORKERS = int(os.environ.get('SERVER_WORKERS', 1))  # 工作进程数，多于一个时依次使用 SERVER_PORT 之后的端口
+    SERVER_DRAIN_TIMEOUT = int(os.environ.get('SERVER_DRAIN_TIMEOUT', 300))  # 退出时等待正在运行的执行结束的时间（秒）
+    SERVER_STOP_TIMEOUT = 5  # 退出时等待已有 HTTP/SSE 连接结束的时间（秒）
+    # 主工作进程负责只能运行一份的后台任务：定时任务、Excel 编辑日志恢复、启动清理
+    SERVER_PRIMARY_WORKER = os.environ.get('SERVER_PRIMARY_WORKER', '1') != '0'
+    # 定时任务与数据库同步的间隔（秒，0 为不同步）；多进程时其他进程修改的定时任务据此生效
+    SCHEDULER_SYNC_INTERVAL = int(os.environ.get('SCHEDULER_SYNC_INTERVAL', 0))
+
     # 清理阈值：保留最近N条执行记录
     CLEANUP_THRESHOLD = 500
 
+    # 其他清理策略（0 表示不启用），白名单脚本的执行记录不受影响
+    CLEANUP_MAX_AGE_DAYS = 0  # 删除早于该天数的执行记录
+    CLEANUP_MAX_TOTAL_MB = 0  # 执行空间与日志总大小上限，超出时从最早的执行开始删除
+    CLEANUP_SCRIPT_QUOTA_MB = 0  # 单个脚本的执行空间与日志大小上限，超出时删除该脚本最早的执行
+    CLEANUP_DELETE_CHUNK = 500  # 每个数据库事务删除的记录数
+    CLEANUP_DELETE_WORKERS = 4  # 并行删除执行空间目录的线程数
+    CLEANUP_LEDGER_BACKFILL_BATCH = 2000  # 每次清理为升级前的记录补齐空间账本的数量
+
+    # 执行统计汇总：每批补齐的执行记录数
+    STATS_BACKFILL_BATCH = 5000
+
+    # 系统备份：文件切分为内容寻址的数据块存入 BACKUPS_DIR/store，每次备份只写入新数据块
+    BACKUP_CHUNK_SIZE = 4 * 1024 * 1024  # 数据块大小（字节）
+    BACKUP_WORKERS = int(os.environ.get('BACKUP_WORKERS', os.cpu_count() or 2))  # 并行计算哈希与压缩的线程数
+    BACKUP_COMPRESS_LEVEL = 6  # zlib 压缩级别（1-9）
+    DB_EXPORT_WORKERS = int(os.environ.get('DB_EXPORT_WORKERS', 4))  # 数据库导出时并行导出的表数
+
     # 跨域配置
     CORS_ORIGINS = ['http://localhost:5173', 'http://localhost:5174', 'http://localhost:5175', 'http://localhost:5176', 'http://localhost:3000']
 
@@ -89,6 +196,7 @@ class Config:
         os.makedirs(Config.DATA_DIR, exist_ok=True)
         os.makedirs(Config.UPLOAD_FOLDER, exist_ok=True)
         os.makedirs(Config.BACKUPS_DIR, exist_ok=True)
+        os.makedirs(Config.DEPENDENCY_CACHE_DIR, exist_ok=True)
 
     @staticmethod
     def get_script_workspace(script_id):
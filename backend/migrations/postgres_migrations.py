@@ -82,6 +82,43 @@ def create_table(table_name, columns_def):
     return True
 
 
+def check_index_exists(index_name):
+    """检查索引是否存在"""
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT indexname FROM pg_indexes
+        WHERE schemaname = 'public' AND indexname = %s
+    """, (index_name,))
+    exists = cur.fetchone() is not None
+    conn.close()
+    return exists
+
+
+def create_index(index_name, table_name, columns, where=None):
+    """
+    创建索引
+
+    使用 CREATE INDEX CONCURRENTLY，建索引期间不阻塞对表的写入（不能在事务中执行，连接需自动提交）。
+    并发建索引中途失败会留下无效索引，再次迁移前需先删除该索引。
+    """
+    if check_index_exists(index_name):
+        print(f'[SKIP] Index {index_name} already exists')
+        return False
+
+    conn = get_connection()
+    conn.autocommit = True
+    cur = conn.cursor()
+    sql = f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {index_name} ON {table_name} ({columns})'
+    if where:
+        sql += f' WHERE {where}'
+    print(f'[ADD] Creating index {index_name} on {table_name} ({columns})...')
+    cur.execute(sql)
+    conn.close()
+    print(f'[OK] Index {index_name} created')
+    return True
+
+
 def migrate_preserve_fields():
     """迁移 preserve 字段到 scripts 和 schedules 表"""
     print('\n=== Migrating preserve fields ===')
@@ -96,6 +133,16 @@ def migrate_execution_fields():
     add_column('executions', 'stage', "VARCHAR(50) DEFAULT 'pending'")
     add_column('executions', 'pid', 'INTEGER')
     add_column('executions', 'environment_id', 'INTEGER REFERENCES environments(id)')
+    add_column('executions', 'priority', 'INTEGER')
+    add_column('executions', 'owner', 'VARCHAR(100)')
+    add_column('executions', 'owner_heartbeat', 'TIMESTAMP')
+    add_column('executions', 'log_bytes', 'BIGINT')
+    add_column('executions', 'log_lines', 'INTEGER')
+    add_column('executions', 'launch_mode', 'VARCHAR(10)')
+    add_column('executions', 'run_ms', 'INTEGER')
+    add_column('executions', 'space_bytes', 'BIGINT')
+    add_column('executions', 'space_files', 'INTEGER')
+    add_column('executions', 'rolled_up', 'BOOLEAN DEFAULT FALSE NOT NULL')
 
 
 def migrate_script_fields():
@@ -107,12 +154,62 @@ def migrate_script_fields():
     add_column('scripts', 'is_favorite', 'BOOLEAN DEFAULT FALSE')
 
 
+def migrate_environment_fields():
+    """迁移执行环境相关字段"""
+    print('\n=== Migrating environment fields ===')
+    add_column('environments', 'warm_pool_size', 'INTEGER DEFAULT 0')
+    add_column('environments', 'warm_pool_modules', 'TEXT')
+    add_column('environments', 'warm_pool_max_runs', 'INTEGER')
+
+
+def migrate_workflow_fields():
+    """迁移工作流相关字段"""
+    print('\n=== Migrating workflow fields ===')
+    add_column('workflow_executions', 'run_report', 'TEXT')
+    add_column('workflow_executions', 'space_bytes', 'BIGINT')
+    add_column('workflow_executions', 'space_files', 'INTEGER')
+
+
 def migrate_schedule_fields():
     """迁移定时任务相关字段"""
     print('\n=== Migrating schedule fields ===')
     add_column('schedules', 'description', 'TEXT')
 
 
+def migrate_dependency_set_fields():
+    """迁移依赖缓存相关字段（表由 db.create_all 创建，尚不存在时跳过）"""
+    print('\n=== Migrating dependency set fields ===')
+    if check_table_exists('dependency_sets'):
+        add_column('dependency_sets', 'fingerprint', 'VARCHAR(500)')
+
+
+def migrate_indexes():
+    """
+    迁移热点查询的索引（与模型 __table_args__ 中声明的索引一致）
+
+    可用 benchmark_query_plans.py 检查这些查询是否都走索引。
+    """
+    print('\n=== Migrating indexes ===')
+    # 执行历史分页、按脚本筛选与清理的保留窗口
+    create_index('ix_executions_created_at', 'executions', 'created_at, id')
+    create_index('ix_executions_script_created', 'executions', 'script_id, created_at, id')
+    # 调度队列与实时计数
+    create_index('ix_executions_pending_queue', 'executions', 'priority, created_at, id',
+                 where="status = 'pending' AND priority IS NOT NULL")
+    create_index('ix_executions_live_status', 'executions', 'status',
+                 where="status IN ('pending', 'running')")
+    # 执行统计与空间账本的补齐
+    create_index('ix_executions_not_rolled_up', 'executions', 'id', where='rolled_up = false')
+    create_index('ix_executions_unmeasured', 'executions', 'id', where='space_bytes IS NULL')
+    create_index('ix_workflow_executions_created_at', 'workflow_executions', 'created_at, id')
+    create_index('ix_workflow_executions_unmeasured', 'workflow_executions', 'id', where='space_bytes IS NULL')
+    # 外键（PostgreSQL 不会为外键自动建索引）
+    create_index('ix_workflow_node_executions_workflow_execution', 'workflow_node_executions', 'workflow_execution_id')
+    create_index('ix_workflow_node_executions_execution', 'workflow_node_executions', 'execution_id')
+    create_index('ix_webhook_logs_webhook_created', 'webhook_logs', 'webhook_id, created_at')
+    create_index('ix_webhook_logs_execution', 'webhook_logs', 'execution_id')
+
+
 def run_all_migrations():
     """执行所有迁移"""
     print('=' * 60)
@@ -123,7 +220,11 @@ def run_all_migrations():
     migrate_preserve_fields()
     migrate_execution_fields()
     migrate_script_fields()
+    migrate_environment_fields()
+    migrate_workflow_fields()
     migrate_schedule_fields()
+    migrate_dependency_set_fields()
+    migrate_indexes()
 
     print('\n' + '=' * 60)
     print('[DONE] All migrations completed')
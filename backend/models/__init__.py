@@ -17,10 +17,12 @@ from .global_variable import GlobalVariable
 from .ai_config import AIConfig
 from .webhook import Webhook, WebhookLog
 from .selection_session import SelectionSession
+from .dependency_set import DependencySet
+from .execution_rollup import ExecutionRollup
 
 __all__ = [
     'db', 'Script', 'ScriptVersion', 'Execution', 'Schedule', 'Environment',
     'Folder', 'Tag', 'script_tags', 'Workflow', 'WorkflowNode', 'WorkflowEdge',
     'WorkflowExecution', 'WorkflowNodeExecution', 'WorkflowTemplate', 'GlobalVariable',
-    'AIConfig', 'Webhook', 'WebhookLog', 'SelectionSession'
+    'AIConfig', 'Webhook', 'WebhookLog', 'SelectionSession', 'DependencySet', 'ExecutionRollup'
 ]
@@ -0,0 +1,40 @@
+"""
+依赖缓存数据模型
+"""
+from datetime import datetime
+from models import db
+
+
+class DependencySet(db.Model):
+    """已安装的依赖集合（按解释器与规范化后的依赖列表哈希）"""
+    __tablename__ = 'dependency_sets'
+
+    id = db.Column(db.Integer, primary_key=True)
+    hash = db.Column(db.String(64), nullable=False, unique=True, index=True)  # sha256(类型, 解释器, 依赖列表)
+    type = db.Column(db.String(20), nullable=False)  # python 或 javascript
+    executable = db.Column(db.String(500), nullable=False)  # 解释器路径
+    packages = db.Column(db.Text, nullable=False)  # JSON格式的规范化依赖列表
+    mode = db.Column(db.String(20), nullable=False)  # isolated（独立目录）或 shared（安装到解释器）
+    install_dir = db.Column(db.String(500))  # isolated 模式下的依赖目录
+    fingerprint = db.Column(db.String(500))  # shared 模式下安装或确认时解释器环境的指纹（安装目录的修改时间）
+    install_ms = db.Column(db.Integer)  # 安装耗时（毫秒）
+    hit_count = db.Column(db.Integer, default=0)  # 命中次数
+    last_used_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        """转换为字典"""
+        return {
+            'id': self.id,
+            'hash': self.hash,
+            'type': self.type,
+            'executable': self.executable,
+            'packages': self.packages,
+            'mode': self.mode,
+            'install_dir': self.install_dir,
+            'fingerprint': self.fingerprint,
+            'install_ms': self.install_ms,
+            'hit_count': self.hit_count or 0,
+            'last_used_at': self.last_used_at.isoformat() if self.last_used_at else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
@@ -12,6 +12,9 @@ class Environment(db.Model):
     description = db.Column(db.Text)  # 描述
     is_default = db.Column(db.Boolean, default=False)  # 是否为默认环境
     version = db.Column(db.String(50))  # 版本信息（自动检测）
+    warm_pool_size = db.Column(db.Integer, default=0)  # 预热进程数量，0 表示不开启（仅 Python 环境）
+    warm_pool_modules = db.Column(db.Text)  # 预热进程预先导入的模块，逗号分隔
+    warm_pool_max_runs = db.Column(db.Integer)  # 单个预热进程最多执行次数，为空使用系统默认值
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -24,6 +27,9 @@ class Environment(db.Model):
             'description': self.description,
             'is_default': self.is_default,
             'version': self.version,
+            'warm_pool_size': self.warm_pool_size or 0,
+            'warm_pool_modules': self.warm_pool_modules or '',
+            'warm_pool_max_runs': self.warm_pool_max_runs,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
@@ -8,6 +8,32 @@ from . import db
 class Execution(db.Model):
     """执行记录表"""
     __tablename__ = 'executions'
+    __table_args__ = (
+        # 执行历史分页（created_at DESC, id DESC 的键集分页与清理的保留窗口）
+        db.Index('ix_executions_created_at', 'created_at', 'id'),
+        # 按脚本筛选的执行历史、脚本配额清理的分区窗口
+        db.Index('ix_executions_script_created', 'script_id', 'created_at', 'id'),
+        # 调度队列：认领排队中的执行（ORDER BY priority, created_at, id）
+        db.Index('ix_executions_pending_queue', 'priority', 'created_at', 'id',
+                 postgresql_where=db.text("status = 'pending' AND priority IS NOT NULL"),
+                 sqlite_where=db.text("status = 'pending' AND priority IS NOT NULL")),
+        # 排队中/运行中的实时计数
+        db.Index('ix_executions_live_status', 'status',
+                 postgresql_where=db.text("status IN ('pending', 'running')"),
+                 sqlite_where=db.text("status IN ('pending', 'running')")),
+        # 执行统计与空间账本的补齐（只包含尚未处理的记录，处理完后索引几乎为空）
+        db.Index('ix_executions_not_rolled_up', 'id',
+                 postgresql_where=db.text('rolled_up = false'),
+                 sqlite_where=db.text('rolled_up = 0')),
+        db.Index('ix_executions_unmeasured', 'id',
+                 postgresql_where=db.text('space_bytes IS NULL'),
+                 sqlite_where=db.text('space_bytes IS NULL')),
+    )
+
+    # 调度优先级（数值越小越优先）
+    PRIORITY_INTERACTIVE = 0
+    PRIORITY_WEBHOOK = 1
+    PRIORITY_SCHEDULE = 2
 
     id = db.Column(db.Integer, primary_key=True)
     script_id = db.Column(db.Integer, db.ForeignKey('scripts.id'), nullable=False)
@@ -16,10 +42,20 @@ class Execution(db.Model):
     progress = db.Column(db.Integer, default=0)  # 执行进度 0-100
     stage = db.Column(db.String(50), default='pending')  # 执行阶段: pending, preparing, installing_deps, running, finishing
     pid = db.Column(db.Integer)  # 进程ID，用于中断执行
+    priority = db.Column(db.Integer)  # 调度优先级，为空表示不经过调度队列（如工作流节点内联执行）
+    owner = db.Column(db.String(100))  # 所属调度器进程（主机名:进程ID）：认领时写入，带完成回调的执行在提交时写入且只由该进程认领
+    owner_heartbeat = db.Column(db.DateTime)  # 所属进程最近一次续约的时间，超过 EXECUTION_OWNER_LEASE 未续约视为已退出
     params = db.Column(db.Text)  # JSON格式存储参数
     output = db.Column(db.Text)  # 执行输出
     error = db.Column(db.Text)  # 错误信息
     log_file = db.Column(db.String(255))  # 日志文件路径
+    log_bytes = db.Column(db.BigInteger)  # 日志写入字节数
+    log_lines = db.Column(db.Integer)  # 日志写入行数
+    launch_mode = db.Column(db.String(10))  # 启动方式: cold（新建解释器进程）, warm（预热池进程）
+    run_ms = db.Column(db.Integer)  # 从启动解释器到脚本结束的耗时（毫秒）
+    space_bytes = db.Column(db.BigInteger)  # 执行结束时执行空间的字节数（空间账本，为空表示尚未统计）
+    space_files = db.Column(db.Integer)  # 执行结束时执行空间的文件数
+    rolled_up = db.Column(db.Boolean, default=False, nullable=False)  # 是否已计入执行统计汇总（ExecutionRollup）
     start_time = db.Column(db.DateTime)
     end_time = db.Column(db.DateTime)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -39,10 +75,17 @@ class Execution(db.Model):
             'progress': self.progress or 0,
             'stage': self.stage or 'pending',
             'pid': self.pid,
+            'priority': self.priority,
             'params': self.params,
             'output': self.output,
             'error': self.error,
             'log_file': self.log_file,
+            'log_bytes': self.log_bytes,
+            'log_lines': self.log_lines,
+            'launch_mode': self.launch_mode,
+            'run_ms': self.run_ms,
+            'space_bytes': self.space_bytes,
+            'space_files': self.space_files,
             'start_time': self.start_time.isoformat() if self.start_time else None,
             'end_time': self.end_time.isoformat() if self.end_time else None,
             'created_at': self.created_at.isoformat() if self.created_at else None
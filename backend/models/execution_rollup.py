@@ -0,0 +1,37 @@
+"""
+执行统计汇总模型
+"""
+from models import db
+
+
+class ExecutionRollup(db.Model):
+    """
+    按脚本、日期、状态与耗时区间汇总的已结束执行数
+
+    每个已结束的执行计入一行（script_id, day, status, bucket）的 count；
+    bucket 为耗时的对数区间（见 services.execution_stats），合并各行的区间计数即可得到任意日期范围的耗时分位数。
+    """
+    __tablename__ = 'execution_rollups'
+    __table_args__ = (
+        db.UniqueConstraint('script_id', 'day', 'status', 'bucket', name='uq_execution_rollups_key'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    script_id = db.Column(db.Integer, nullable=False)  # 不设外键，脚本删除时由 execution_stats.forget_script 清除
+    day = db.Column(db.Date, nullable=False, index=True)  # 执行创建日期（UTC）
+    status = db.Column(db.String(20), nullable=False)
+    bucket = db.Column(db.Integer, nullable=False)  # 耗时区间，没有耗时的执行为 NO_DURATION_BUCKET
+    count = db.Column(db.Integer, nullable=False, default=0)
+    duration_ms_sum = db.Column(db.BigInteger, nullable=False, default=0)  # 区间内执行耗时之和（毫秒）
+
+    def to_dict(self):
+        """转换为字典"""
+        return {
+            'id': self.id,
+            'script_id': self.script_id,
+            'day': self.day.isoformat() if self.day else None,
+            'status': self.status,
+            'bucket': self.bucket,
+            'count': self.count,
+            'duration_ms_sum': self.duration_ms_sum
+        }
@@ -3,6 +3,7 @@
 """
 from datetime import datetime
 from . import db
+from .script import Script
 
 
 class Folder(db.Model):
@@ -31,14 +32,36 @@ class Folder(db.Model):
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
 
-    def to_tree_dict(self):
-        """转换为树形字典（含子文件夹）"""
+    def to_tree_dict(self, children_by_parent=None, script_counts=None):
+        """
+        转换为树形字典（含子文件夹）
+
+        children_by_parent / script_counts 由 Folder.tree() 一次查询得到；未提供时逐层查询。
+        """
+        if children_by_parent is None:
+            children = self.children.order_by(Folder.sort_order, Folder.name).all()
+            script_count = db.session.query(db.func.count(Script.id)).filter(Script.folder_id == self.id).scalar()
+        else:
+            children = children_by_parent.get(self.id, [])
+            script_count = script_counts.get(self.id, 0)
         return {
             'id': self.id,
             'name': self.name,
             'parent_id': self.parent_id,
             'color': self.color,
             'sort_order': self.sort_order,
-            'children': [child.to_tree_dict() for child in self.children.order_by(Folder.sort_order, Folder.name).all()],
-            'script_count': len(self.scripts) if hasattr(self, 'scripts') else 0
+            'children': [child.to_tree_dict(children_by_parent, script_counts) for child in children],
+            'script_count': script_count
         }
+
+    @classmethod
+    def tree(cls):
+        """完整文件夹树：一次查询全部文件夹，一次分组查询各文件夹的脚本数"""
+        children_by_parent = {}
+        for folder in cls.query.order_by(cls.sort_order, cls.name).all():
+            children_by_parent.setdefault(folder.parent_id, []).append(folder)
+        script_counts = dict(db.session.query(Script.folder_id, db.func.count(Script.id)).filter(
+            Script.folder_id.isnot(None)
+        ).group_by(Script.folder_id).all())
+        return [folder.to_tree_dict(children_by_parent, script_counts)
+                for folder in children_by_parent.get(None, [])]
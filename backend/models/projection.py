@@ -0,0 +1,66 @@
+"""
+模型字段投影
+
+列表接口只需要部分字段：按请求的字段序列化，并且只加载这些字段需要的列与关系，
+避免为每一行读取脚本代码等大字段、逐行延迟加载关联对象。
+
+模型声明：
+- SERIALIZERS: {字段名: 函数(对象) -> 值}，detail 按声明顺序输出全部字段
+- SUMMARY_FIELDS: 列表接口默认返回的字段
+- FIELD_COLUMNS: {字段名: (所需的列名, ...)}，未声明的字段按同名列处理
+- FIELD_LOADERS: {字段名: 函数() -> 加载选项}，关系字段的预加载策略
+"""
+from sqlalchemy.orm import load_only
+
+
+class Projection:
+    """字段投影混入类"""
+
+    SERIALIZERS = {}
+    SUMMARY_FIELDS = ()
+    FIELD_COLUMNS = {}
+    FIELD_LOADERS = {}
+
+    @classmethod
+    def parse_fields(cls, value, default='summary'):
+        """
+        解析 fields 参数
+
+        Args:
+            value: summary（摘要字段）、detail（全部字段）或逗号分隔的字段名，为空时使用 default
+            default: 未指定时使用的字段集
+
+        Returns:
+            tuple: 字段名（总是包含 id）
+
+        Raises:
+            ValueError: 包含未知字段
+        """
+        value = (value or default).strip()
+        if value == 'summary':
+            return tuple(cls.SUMMARY_FIELDS)
+        if value == 'detail':
+            return tuple(cls.SERIALIZERS)
+        fields = tuple(dict.fromkeys(name.strip() for name in value.split(',') if name.strip()))
+        unknown = [name for name in fields if name not in cls.SERIALIZERS]
+        if unknown:
+            raise ValueError(f'未知字段: {", ".join(unknown)}')
+        return fields if 'id' in fields else ('id',) + fields
+
+    @classmethod
+    def query_for(cls, fields):
+        """只加载 fields 需要的列，并按字段预加载关系"""
+        columns = {'id'}
+        options = []
+        for name in fields:
+            if name in cls.FIELD_COLUMNS:
+                columns.update(cls.FIELD_COLUMNS[name])
+            elif name in cls.__table__.columns:
+                columns.add(name)
+            if name in cls.FIELD_LOADERS:
+                options.append(cls.FIELD_LOADERS[name]())
+        return cls.query.options(load_only(*[getattr(cls, column) for column in columns]), *options)
+
+    def to_dict(self, fields=None):
+        """转换为字典，fields 为空时返回全部字段"""
+        return {name: self.SERIALIZERS[name](self) for name in (fields or self.SERIALIZERS)}
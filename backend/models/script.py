@@ -3,9 +3,10 @@
 """
 from datetime import datetime
 from . import db
+from .projection import Projection
 
 
-class Script(db.Model):
+class Script(Projection, db.Model):
     """脚本表"""
     __tablename__ = 'scripts'
 
@@ -32,26 +33,37 @@ class Script(db.Model):
     executions = db.relationship('Execution', backref='script', lazy='dynamic', cascade='all, delete-orphan')
     schedules = db.relationship('Schedule', backref='script', lazy='dynamic', cascade='all, delete-orphan')
 
-    def to_dict(self):
-        """转换为字典"""
-        return {
-            'id': self.id,
-            'name': self.name,
-            'description': self.description,
-            'type': self.type,
-            'code': self.code,
-            'dependencies': self.dependencies,
-            'parameters': self.parameters,
-            'environment_id': self.environment_id,
-            'folder_id': self.folder_id,
-            'is_favorite': self.is_favorite,
-            'preserve': self.preserve,
-            'folder': self.folder.to_dict() if self.folder else None,
-            'tags': [tag.to_dict() for tag in self.tags] if self.tags else [],
-            'version': self.version,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        }
+    # 字段投影：详情返回全部字段，列表默认返回摘要（不含代码、依赖与参数定义）
+    SERIALIZERS = {
+        'id': lambda s: s.id,
+        'name': lambda s: s.name,
+        'description': lambda s: s.description,
+        'type': lambda s: s.type,
+        'code': lambda s: s.code,
+        'dependencies': lambda s: s.dependencies,
+        'parameters': lambda s: s.parameters,
+        'environment_id': lambda s: s.environment_id,
+        'folder_id': lambda s: s.folder_id,
+        'is_favorite': lambda s: s.is_favorite,
+        'preserve': lambda s: s.preserve,
+        'folder': lambda s: s.folder.to_dict() if s.folder else None,
+        'tags': lambda s: [tag.to_dict() for tag in s.tags] if s.tags else [],
+        'version': lambda s: s.version,
+        'created_at': lambda s: s.created_at.isoformat() if s.created_at else None,
+        'updated_at': lambda s: s.updated_at.isoformat() if s.updated_at else None
+    }
+    SUMMARY_FIELDS = (
+        'id', 'name', 'description', 'type', 'environment_id', 'folder_id', 'is_favorite', 'preserve',
+        'folder', 'tags', 'version', 'created_at', 'updated_at'
+    )
+    FIELD_COLUMNS = {
+        'folder': ('folder_id',),
+        'tags': ()
+    }
+    FIELD_LOADERS = {
+        'folder': lambda: db.joinedload(Script.folder),
+        'tags': lambda: db.selectinload(Script.tags)
+    }
 
 
 class ScriptVersion(db.Model):
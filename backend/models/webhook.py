@@ -87,6 +87,11 @@ class Webhook(db.Model):
 class WebhookLog(db.Model):
     """Webhook调用日志表"""
     __tablename__ = 'webhook_logs'
+    __table_args__ = (
+        # Webhook 调用日志（按 webhook 筛选，created_at 倒序分页）
+        db.Index('ix_webhook_logs_webhook_created', 'webhook_id', 'created_at'),
+        db.Index('ix_webhook_logs_execution', 'execution_id'),  # 清理执行记录时解除关联
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     webhook_id = db.Column(db.Integer, db.ForeignKey('webhooks.id'), nullable=False)
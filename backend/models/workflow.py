@@ -23,6 +23,8 @@ class Workflow(db.Model):
     edges = db.relationship('WorkflowEdge', backref='workflow', lazy='dynamic', cascade='all, delete-orphan')
     executions = db.relationship('WorkflowExecution', backref='workflow', lazy='dynamic', cascade='all, delete-orphan')
 
+    _nodes_count = None  # load_nodes_counts() 预先查询的节点数
+
     def to_dict(self):
         """转换为字典"""
         config = json.loads(self.config) if self.config else {}
@@ -34,9 +36,26 @@ class Workflow(db.Model):
             'enabled': self.enabled,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
-            'nodes_count': self.nodes.count()
+            'nodes_count': self._nodes_count if self._nodes_count is not None else self.nodes.count()
         }
 
+    @classmethod
+    def load_nodes_counts(cls, workflows):
+        """
+        一次分组查询得到各工作流的节点数，供 to_dict 使用（列表中不再逐个工作流计数）
+
+        Returns:
+            list: 传入的工作流
+        """
+        workflows = list(workflows)
+        ids = {workflow.id for workflow in workflows}
+        counts = dict(db.session.query(
+            WorkflowNode.workflow_id, db.func.count(WorkflowNode.id)
+        ).filter(WorkflowNode.workflow_id.in_(ids)).group_by(WorkflowNode.workflow_id).all()) if ids else {}
+        for workflow in workflows:
+            workflow._nodes_count = counts.get(workflow.id, 0)
+        return workflows
+
 
 class WorkflowNode(db.Model):
     """工作流节点模型"""
@@ -103,6 +122,14 @@ class WorkflowEdge(db.Model):
 class WorkflowExecution(db.Model):
     """工作流执行记录模型"""
     __tablename__ = 'workflow_executions'
+    __table_args__ = (
+        # 执行历史分页（created_at DESC, id DESC）
+        db.Index('ix_workflow_executions_created_at', 'created_at', 'id'),
+        # 空间账本补齐
+        db.Index('ix_workflow_executions_unmeasured', 'id',
+                 postgresql_where=db.text('space_bytes IS NULL'),
+                 sqlite_where=db.text('space_bytes IS NULL')),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     workflow_id = db.Column(db.Integer, db.ForeignKey('workflows.id'), nullable=False)
@@ -111,6 +138,9 @@ class WorkflowExecution(db.Model):
     start_time = db.Column(db.DateTime)
     end_time = db.Column(db.DateTime)
     error = db.Column(db.Text)
+    run_report = db.Column(db.Text)  # JSON格式的执行报告（各节点耗时与关键路径）
+    space_bytes = db.Column(db.BigInteger)  # 执行结束时工作流执行空间的字节数（空间账本，为空表示尚未统计）
+    space_files = db.Column(db.Integer)  # 执行结束时工作流执行空间的文件数
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     # 关系
@@ -128,6 +158,9 @@ class WorkflowExecution(db.Model):
             'start_time': self.start_time.isoformat() if self.start_time else None,
             'end_time': self.end_time.isoformat() if self.end_time else None,
             'error': self.error,
+            'run_report': json.loads(self.run_report) if self.run_report else None,
+            'space_bytes': self.space_bytes,
+            'space_files': self.space_files,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'duration': (self.end_time - self.start_time).total_seconds() if self.end_time and self.start_time else None
         }
@@ -136,6 +169,10 @@ class WorkflowExecution(db.Model):
 class WorkflowNodeExecution(db.Model):
     """工作流节点执行记录模型"""
     __tablename__ = 'workflow_node_executions'
+    __table_args__ = (
+        db.Index('ix_workflow_node_executions_workflow_execution', 'workflow_execution_id'),
+        db.Index('ix_workflow_node_executions_execution', 'execution_id'),  # 清理执行记录时解除关联
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     workflow_execution_id = db.Column(db.Integer, db.ForeignKey('workflow_executions.id'), nullable=False)
@@ -0,0 +1,217 @@
+"""
+生产环境服务入口
+
+app.py 的 __main__ 使用 Werkzeug 开发服务器：每个 SSE 日志流、Socket.IO 长连接和同步 Webhook
+都占用一个系统线程。本入口在协程工作模型上运行同一个应用：
+- gevent（默认）/ eventlet：启动前打 monkey patch，连接、SSE 流与调度器的工作线程都变成协程，
+  数千个并发连接只占用少量内存；psycopg2 通过 psycogreen 在等待查询结果时让出（必须安装，
+  否则每次查询都会阻塞整个进程）
+- threading：Werkzeug 多线程服务器，与开发服务器相同，用于对比或排查问题
+
+多进程（--workers N）：主控进程在 端口..端口+N-1 上各启动一个工作进程，由 Nginx 以 ip_hash
+（或其他会话保持方式）分发，Socket.IO 的长轮询要求同一客户端始终落在同一个进程上；
+进程间的广播需要配置 SOCKETIO_MESSAGE_QUEUE，协同编辑的版本号与编辑历史保存在 EXCEL_COLLAB_STORE 中
+（未配置共享存储时使用数据目录下的 SQLite 文件）。定时任务、Excel 编辑日志恢复与启动清理只在第一个
+工作进程中运行（SERVER_PRIMARY_WORKER）。
+
+平滑退出：收到 SIGTERM/SIGINT 后停止接收新连接，已有连接最多等待 SERVER_STOP_TIMEOUT 秒，
+然后停止认领新的执行、等待正在运行的执行结束（最多 SERVER_DRAIN_TIMEOUT 秒），写入未保存的
+Excel 编辑后退出。未开始的执行留在数据库队列中，下次启动时接续；等待超时仍在运行的执行
+由下次启动的调度器或租约过期后由其他工作进程回收（标记为失败，尚未启动脚本进程的重新排队）。
+再次收到信号则立即退出。
+
+使用方法：
+    python server.py [--host 0.0.0.0] [--port 5001] [--worker-class gevent|eventlet|threading]
+                     [--workers N] [--drain-timeout 秒]
+
+各参数的默认值来自 config.py 中的 SERVER_* 配置（可用同名环境变量设置）。
+"""
+import argparse
+import os
+import signal
+import sys
+
+# 添加当前目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+WORKER_CLASSES = ('gevent', 'eventlet', 'threading')
+
+
+def parse_args(argv=None):
+    # config 不依赖其他模块，在打 monkey patch 之前导入是安全的
+    from config import Config
+
+    parser = argparse.ArgumentParser(description='脚本工具管理系统后端服务（生产环境）')
+    parser.add_argument('--host', default=Config.SERVER_HOST)
+    parser.add_argument('--port', type=int, default=Config.SERVER_PORT)
+    parser.add_argument('--worker-class', choices=WORKER_CLASSES, default=Config.SERVER_WORKER_CLASS)
+    parser.add_argument('--workers', type=int, default=Config.SERVER_WORKERS)
+    parser.add_argument('--drain-timeout', type=int, default=Config.SERVER_DRAIN_TIMEOUT)
+    return parser.parse_args(argv)
+
+
+def patch_worker_class(worker_class):
+    """在导入应用之前切换到协程工作模型"""
+    if worker_class == 'gevent':
+        try:
+            from gevent import monkey
+        except ImportError:
+            sys.exit('未安装 gevent，请执行 pip install gevent gevent-websocket，或使用 --worker-class threading')
+        monkey.patch_all()
+        try:
+            from psycogreen.gevent import patch_psycopg
+        except ImportError:
+            sys.exit('未安装 psycogreen，请执行 pip install psycogreen，或使用 --worker-class threading')
+        patch_psycopg()
+    elif worker_class == 'eventlet':
+        try:
+            import eventlet
+        except ImportError:
+            sys.exit('未安装 eventlet，请执行 pip install eventlet，或使用 --worker-class threading')
+        eventlet.monkey_patch()
+        try:
+            from psycogreen.eventlet import patch_psycopg
+        except ImportError:
+            sys.exit('未安装 psycogreen，请执行 pip install psycogreen，或使用 --worker-class threading')
+        patch_psycopg()
+    # Socket.IO 的异步模式必须与工作模型一致（在导入 websocket 模块之前设置）
+    from config import Config
+    Config.SOCKETIO_ASYNC_MODE = worker_class
+
+
+def drain(timeout):
+    """停止后台任务，等待正在运行的执行结束"""
+    from services.dispatcher import execution_dispatcher
+    from services.scheduler import scheduler_manager
+    from services.excel_journal import excel_journal
+    from services.warm_pool import warm_pool_manager
+
+    print(f'[服务] 停止认领新的执行，等待正在运行的执行结束（最多 {timeout} 秒）')
+    scheduler_manager.shutdown(wait=False)
+    still_running = execution_dispatcher.shutdown(timeout)
+    if still_running:
+        print(f'[服务] 等待超时，仍在运行的执行将在下次启动或租约过期后回收: {still_running}')
+    written = excel_journal.flush_all()
+    if written:
+        print(f'[服务] 已写入 {written} 条未保存的 Excel 编辑')
+    warm_pool_manager.shutdown()
+    print('[服务] 已退出')
+
+
+def serve(args):
+    """在当前进程中运行一个工作进程"""
+    patch_worker_class(args.worker_class)
+
+    from config import Config
+    from app import create_app
+    from websocket import socketio
+
+    app = create_app()
+    stopping = []
+
+    def restore_default_handlers():
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, signal.SIG_DFL)
+
+    if args.worker_class == 'gevent':
+        import gevent
+
+        def stop():
+            # 在独立的协程中调用，serve_forever() 在连接关闭后返回
+            if stopping:
+                return
+            stopping.append(True)
+            for handle in handles:
+                handle.cancel()
+            restore_default_handlers()
+            socketio.wsgi_server.stop(timeout=Config.SERVER_STOP_TIMEOUT)
+
+        handles = [gevent.signal_handler(signum, stop) for signum in (signal.SIGTERM, signal.SIGINT)]
+    else:
+        def stop(signum, frame):
+            # eventlet 与 Werkzeug 的服务循环在主线程中，抛出 SystemExit 即可退出
+            restore_default_handlers()
+            raise SystemExit(0)
+
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, stop)
+
+    print(f'[服务] 工作进程 {os.getpid()} 监听 http://{args.host}:{args.port}（{args.worker_class}）')
+    options = {'allow_unsafe_werkzeug': True} if args.worker_class == 'threading' else {}
+    try:
+        socketio.run(app, host=args.host, port=args.port, use_reloader=False, log_output=False, **options)
+    except SystemExit:
+        pass
+    finally:
+        drain(args.drain_timeout)
+
+
+def supervise(args):
+    """启动多个工作进程，转发退出信号并重启异常退出的进程"""
+    import subprocess
+    import time
+    from config import Config
+
+    if not Config.SOCKETIO_MESSAGE_QUEUE:
+        sys.exit('多个工作进程之间的 Socket.IO 广播需要消息队列，请设置 SOCKETIO_MESSAGE_QUEUE')
+    # 同一文件的协同编辑者可能落在不同的工作进程上，版本号必须在进程间共享
+    collab_store = Config.EXCEL_COLLAB_STORE
+    if collab_store == 'memory':
+        collab_store = f'sqlite:///{Config.EXCEL_COLLAB_SHARED_DB}'
+        print(f'[服务] EXCEL_COLLAB_STORE 未配置共享存储，工作进程使用 {collab_store}')
+
+    def spawn(index):
+        env = dict(os.environ, SERVER_PRIMARY_WORKER='1' if index == 0 else '0', EXCEL_COLLAB_STORE=collab_store)
+        if index == 0:
+            env.setdefault('SCHEDULER_SYNC_INTERVAL', '60')
+        command = [sys.executable, os.path.abspath(__file__), '--workers', '1',
+                   '--host', args.host, '--port', str(args.port + index),
+                   '--worker-class', args.worker_class, '--drain-timeout', str(args.drain_timeout)]
+        # 独立的进程组：终端的 Ctrl+C 只发给主控进程，由其统一转发，避免工作进程在退出过程中被二次中断
+        return subprocess.Popen(command, env=env, start_new_session=True)
+
+    workers = [spawn(index) for index in range(args.workers)]
+    stopping = []
+
+    def forward(signum, frame):
+        stopping.append(signum)
+        for process in workers:
+            if process.poll() is None:
+                process.send_signal(signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, forward)
+
+    print('=' * 60)
+    print(f'[服务] 已启动 {args.workers} 个工作进程（{args.worker_class}），Nginx 配置示例:')
+    print('    upstream backend_server {')
+    print('        ip_hash;')
+    for index in range(args.workers):
+        print(f'        server 127.0.0.1:{args.port + index};')
+    print('    }')
+    print('=' * 60)
+
+    while True:
+        for index, process in enumerate(workers):
+            if process.poll() is not None and not stopping:
+                print(f'[服务] 工作进程 {process.pid} 异常退出（{process.returncode}），重新启动')
+                time.sleep(1)
+                workers[index] = spawn(index)
+        if stopping:
+            break
+        time.sleep(1)
+
+    for process in workers:
+        process.wait()
+
+
+def main():
+    args = parse_args()
+    if args.workers > 1:
+        supervise(args)
+    else:
+        serve(args)
+
+
+if __name__ == '__main__':
+    main()
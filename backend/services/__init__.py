@@ -3,5 +3,6 @@
 """
 from .executor import execute_script
 from .scheduler import scheduler_manager
+from .dispatcher import execution_dispatcher
 
-__all__ = ['execute_script', 'scheduler_manager']
+__all__ = ['execute_script', 'scheduler_manager', 'execution_dispatcher']
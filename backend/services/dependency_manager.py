@@ -0,0 +1,332 @@
+"""
+依赖管理器
+
+按 (脚本类型, 解释器, 规范化后的依赖列表, 安装模式) 计算哈希，记录已满足的依赖集合：
+- 哈希已满足时跳过安装，不再每次执行都调用 pip / npm
+- 未满足时把所有包合并为一次安装调用
+- shared 模式（默认）安装到解释器自身的环境（npm -g），与早期行为一致；包可能在记录之后被卸载
+  或环境被重建，记录安装时环境的指纹（site-packages / 全局 node_modules 的修改时间），
+  指纹变化后先确认各个包仍已安装，不在时重新安装
+- isolated 模式（DEPENDENCY_INSTALL_MODE=isolated）下每个依赖集合安装到独立目录（site-packages / node_modules），
+  执行时通过 PYTHONPATH / NODE_PATH 引用，不同脚本的依赖互不影响，并可提前预构建
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import threading
+import time
+import uuid
+from datetime import datetime
+from sqlalchemy.exc import IntegrityError
+from models import db, DependencySet
+from config import Config
+
+
+INSTALL_MODES = ('isolated', 'shared')
+
+
+def parse_dependencies(dependencies):
+    """解析脚本依赖配置（JSON 列表、{'packages': [...]} 或逗号分隔字符串）"""
+    if not dependencies:
+        return []
+    try:
+        deps = json.loads(dependencies) if isinstance(dependencies, str) else dependencies
+    except json.JSONDecodeError:
+        deps = dependencies
+    if isinstance(deps, dict):
+        deps = deps.get('packages', [])
+    elif isinstance(deps, str):
+        deps = [d.strip() for d in deps.split(',') if d.strip()]
+    return list(deps or [])
+
+
+def normalize_dependencies(script_type, deps):
+    """
+    规范化依赖列表：去除空白、去重并排序
+
+    Python 包名按 PEP 503 规范化（大小写以及 - _ . 视为相同），版本约束保持原样。
+    """
+    normalized = set()
+    for dep in deps:
+        dep = re.sub(r'\s+', '', str(dep))
+        if not dep:
+            continue
+        if script_type == 'python':
+            match = re.match(r'^([A-Za-z0-9][A-Za-z0-9._-]*)(.*)$', dep)
+            if match:
+                dep = re.sub(r'[-_.]+', '-', match.group(1)).lower() + match.group(2)
+        normalized.add(dep)
+    return sorted(normalized)
+
+
+def _package_name(script_type, dep):
+    """从依赖声明中取出包名（如 requests>=2.0 -> requests，@scope/pkg@1.2 -> @scope/pkg），无法识别时返回 None"""
+    if script_type == 'python':
+        match = re.match(r'^([A-Za-z0-9][A-Za-z0-9._-]*)(\[[^\]]*\])?([<>=!~;].*)?$', dep)
+        return match.group(1) if match else None
+    match = re.match(r'^(@?[^@/\s]+(?:/[^@\s]+)?)(@.*)?$', dep)
+    return match.group(1) if match and ':' not in dep else None
+
+
+def _resolve_executable(executable):
+    """
+    解析解释器的绝对路径，使 'python' 与其绝对路径得到同一个哈希
+
+    不解析符号链接：虚拟环境中的 python 是指向基础解释器的链接，解析后会错当成基础解释器的环境。
+    """
+    path = shutil.which(executable) or executable
+    return os.path.abspath(path) if os.path.exists(path) else executable
+
+
+class DependencyManager:
+    """依赖管理器"""
+
+    def __init__(self):
+        self._locks = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'failures': 0}
+        self._package_dirs = {}  # (脚本类型, 解释器) -> shared 模式下的包安装目录
+
+    def prepare(self, script_type, executable, dependencies):
+        """
+        确保依赖已安装
+
+        Args:
+            script_type: python 或 javascript
+            executable: 解释器路径
+            dependencies: 脚本的依赖配置
+
+        Returns:
+            dict: 需要加入执行环境变量的路径（如 {'PYTHONPATH': ...}），无需额外路径时为空
+        """
+        packages = normalize_dependencies(script_type, parse_dependencies(dependencies))
+        if not packages:
+            return {}
+
+        mode = Config.DEPENDENCY_INSTALL_MODE
+        if mode not in INSTALL_MODES:
+            raise ValueError(f'不支持的依赖安装模式: {mode}')
+        executable = _resolve_executable(executable)
+        digest = hashlib.sha256(json.dumps(
+            [script_type, executable, packages, mode], ensure_ascii=False
+        ).encode('utf-8')).hexdigest()
+
+        with self._key_lock(digest):
+            record = DependencySet.query.filter_by(hash=digest).first()
+            if record and self._satisfied(record):
+                record.hit_count = (record.hit_count or 0) + 1
+                record.last_used_at = datetime.utcnow()
+                db.session.commit()
+                self._count('hits')
+                return self._env_for(record)
+
+            self._count('misses')
+            started = time.monotonic()
+            try:
+                install_dir = self._install(script_type, executable, packages, mode, digest)
+            except Exception:
+                self._count('failures')
+                raise
+            install_ms = int((time.monotonic() - started) * 1000)
+
+            if record is None:
+                record = DependencySet(hash=digest, hit_count=0)
+                db.session.add(record)
+            record.fingerprint = self._fingerprint(script_type, executable) if mode == 'shared' else None
+            record.type = script_type
+            record.executable = executable
+            record.packages = json.dumps(packages, ensure_ascii=False)
+            record.mode = mode
+            record.install_dir = install_dir
+            record.install_ms = install_ms
+            record.last_used_at = datetime.utcnow()
+            try:
+                db.session.commit()
+            except IntegrityError:
+                # 其他进程同时安装了同一集合，以已提交的记录为准
+                db.session.rollback()
+                record = DependencySet.query.filter_by(hash=digest).first()
+            print(f'[依赖管理] 已安装 {script_type} 依赖 {", ".join(packages)}，耗时 {install_ms}ms')
+            return self._env_for(record)
+
+    @staticmethod
+    def apply_env(env, additions):
+        """把依赖路径加到执行环境变量的最前面"""
+        for key, path in additions.items():
+            env[key] = f'{path}{os.pathsep}{env[key]}' if env.get(key) else path
+        return env
+
+    def get_metrics(self):
+        """
+        获取依赖缓存指标
+
+        Returns:
+            dict: 本进程的命中/未命中/失败次数与命中率，以及已缓存的依赖集合数量
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses']
+        rows = db.session.query(
+            DependencySet.type, db.func.count(DependencySet.id), db.func.sum(DependencySet.hit_count)
+        ).group_by(DependencySet.type).all()
+        return dict(
+            stats,
+            hit_rate=round(stats['hits'] / lookups, 4) if lookups else None,
+            install_mode=Config.DEPENDENCY_INSTALL_MODE,
+            cached_sets={row[0]: row[1] for row in rows},
+            total_hits={row[0]: int(row[2] or 0) for row in rows}
+        )
+
+    def clear(self):
+        """
+        清空依赖缓存记录及 isolated 模式的依赖目录
+
+        Returns:
+            int: 清除的依赖集合数量
+        """
+        records = DependencySet.query.all()
+        for record in records:
+            if record.install_dir and os.path.isdir(record.install_dir):
+                shutil.rmtree(record.install_dir, ignore_errors=True)
+            db.session.delete(record)
+        db.session.commit()
+        return len(records)
+
+    def _satisfied(self, record):
+        """
+        记录的依赖集合是否仍然可用
+
+        shared 模式：环境指纹与记录一致时直接命中；不一致（其他依赖安装、卸载或环境重建）时
+        确认各个包仍已安装，确认通过则更新指纹（由调用方提交），否则重新安装。
+        """
+        if record.mode == 'isolated':
+            return bool(record.install_dir) and os.path.isdir(record.install_dir)
+        fingerprint = self._fingerprint(record.type, record.executable)
+        if fingerprint and fingerprint == record.fingerprint:
+            return True
+        if not self._verify(record):
+            return False
+        record.fingerprint = fingerprint
+        return True
+
+    def _package_dirs_for(self, script_type, executable):
+        """shared 模式下包的安装目录（Python 的 site-packages、npm 的全局 node_modules），失败时返回空列表"""
+        key = (script_type, executable)
+        with self._lock:
+            if key in self._package_dirs:
+                return self._package_dirs[key]
+        if script_type == 'python':
+            cmd = [executable, '-c', "import json, sysconfig; "
+                   "print(json.dumps(sorted({sysconfig.get_path('purelib'), sysconfig.get_path('platlib')})))"]
+        else:
+            cmd = ['npm', 'root', '-g']
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
+            output = result.stdout.strip()
+            dirs = json.loads(output) if script_type == 'python' else [output]
+        except (OSError, subprocess.SubprocessError, ValueError):
+            return []
+        if result.returncode != 0 or not all(dirs):
+            return []
+        with self._lock:
+            self._package_dirs[key] = dirs
+        return dirs
+
+    def _fingerprint(self, script_type, executable):
+        """
+        shared 模式下解释器环境的指纹：解释器与包安装目录的修改时间
+
+        安装、卸载包会增删安装目录中的条目，重建虚拟环境会重新创建目录，指纹随之变化。
+        无法取得时返回 None（每次都确认各个包）。
+        """
+        dirs = self._package_dirs_for(script_type, executable)
+        if not dirs:
+            return None
+        parts = []
+        for path in [executable] + dirs:
+            try:
+                parts.append(str(os.stat(path).st_mtime_ns))
+            except OSError:
+                parts.append('-')
+        return ':'.join(parts)
+
+    def _verify(self, record):
+        """确认 shared 模式记录中的各个包仍已安装（只检查包是否存在，版本约束由依赖集合的哈希区分）"""
+        names = [_package_name(record.type, dep) for dep in json.loads(record.packages)]
+        if not all(names):
+            return False
+        if record.type == 'python':
+            cmd = [record.executable, '-c', "import sys, importlib.metadata as m\n"
+                   "for name in sys.argv[1:]:\n    m.distribution(name)"] + names
+            try:
+                return subprocess.run(cmd, capture_output=True, timeout=30).returncode == 0
+            except (OSError, subprocess.SubprocessError):
+                return False
+        dirs = self._package_dirs_for(record.type, record.executable)
+        return bool(dirs) and all(os.path.isfile(os.path.join(dirs[0], name, 'package.json')) for name in names)
+
+    def _env_for(self, record):
+        if record.mode != 'isolated' or not record.install_dir:
+            return {}
+        if record.type == 'python':
+            return {'PYTHONPATH': record.install_dir}
+        return {'NODE_PATH': os.path.join(record.install_dir, 'node_modules')}
+
+    def _install(self, script_type, executable, packages, mode, digest):
+        """
+        一次调用安装全部依赖
+
+        isolated 模式先安装到临时目录，成功后原子重命名为正式目录，
+        安装失败或中断不会留下不完整的依赖目录。
+
+        Returns:
+            str: isolated 模式的依赖目录，shared 模式为 None
+        """
+        if mode == 'shared':
+            if script_type == 'python':
+                cmd = [executable, '-m', 'pip', 'install', '--disable-pip-version-check'] + packages
+            else:
+                cmd = ['npm', 'install', '-g', '--no-audit', '--no-fund'] + packages
+            self._run(cmd)
+            return None
+
+        target = os.path.join(Config.DEPENDENCY_CACHE_DIR, script_type, digest)
+        tmp_dir = f'{target}.tmp-{uuid.uuid4().hex[:8]}'
+        os.makedirs(tmp_dir)
+        try:
+            if script_type == 'python':
+                cmd = [executable, '-m', 'pip', 'install', '--disable-pip-version-check',
+                       '--no-input', '--target', tmp_dir] + packages
+            else:
+                cmd = ['npm', 'install', '--no-audit', '--no-fund', '--no-save', '--prefix', tmp_dir] + packages
+            self._run(cmd)
+            # 其他进程可能已完成同一集合的安装，此时沿用已有目录
+            if not os.path.isdir(target):
+                os.rename(tmp_dir, target)
+        finally:
+            if os.path.isdir(tmp_dir):
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+        return target
+
+    @staticmethod
+    def _run(cmd):
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=Config.DEPENDENCY_INSTALL_TIMEOUT)
+        if result.returncode != 0:
+            output = (result.stderr or result.stdout or '').strip()
+            raise Exception(f'依赖安装失败: {output[-2000:]}')
+
+    def _key_lock(self, digest):
+        """同一依赖集合的安装串行执行"""
+        with self._lock:
+            return self._locks.setdefault(digest, threading.Lock())
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+
+# 创建全局依赖管理器实例
+dependency_manager = DependencyManager()
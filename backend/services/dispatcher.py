@@ -0,0 +1,418 @@
+"""
+脚本执行调度器
+
+所有脚本执行统一通过调度器排队，由固定数量的工作线程按优先级消费，
+避免突发的 Webhook 调用或定时任务风暴同时拉起大量解释器进程。
+
+队列以数据库为准：status='pending' 且 priority 非空的 Execution 记录即为待执行任务，
+服务重启后未执行的任务会被自动接续。认领时在记录上写入调度器进程（owner）与续约时间
+（owner_heartbeat），进程定期为其名下的记录续约。所属进程已退出（同一主机上按进程ID确认）或
+超过 EXECUTION_OWNER_LEASE 未续约（例如容器重启后主机名已变化）的记录，由启动时与定期的回收处理：
+运行中的尚未启动脚本进程的重新排队，已启动的标记为失败；排队中的清除 owner，由任意进程认领。
+
+多个工作进程共享同一个队列，但完成回调只存在于提交它的进程中：带回调的执行在提交时
+写入 owner，只能由该进程认领，其他进程只认领 owner 为空的记录。
+
+排队中的执行可以取消（cancel_pending）：以 status='pending' 为条件更新，与认领互斥。
+没有经过工作线程就已结束的执行，其完成回调由所属进程的续约线程发现后调用。
+"""
+import os
+import socket
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from sqlalchemy import bindparam, or_
+from models import db, Execution
+from config import Config
+
+
+PRIORITY_NAMES = {
+    Execution.PRIORITY_INTERACTIVE: 'interactive',
+    Execution.PRIORITY_WEBHOOK: 'webhook',
+    Execution.PRIORITY_SCHEDULE: 'schedule',
+}
+
+
+def _queued_filter():
+    """
+    调度队列中的执行
+
+    与部分索引 ix_executions_pending_queue 的条件一致；状态以常量内联到 SQL 中，
+    SQLite 只有在条件为常量（而不是绑定参数）时才会使用部分索引。
+    """
+    return (
+        Execution.status == bindparam('queued_status', 'pending', literal_execute=True),
+        Execution.priority.isnot(None)
+    )
+
+
+class ExecutionDispatcher:
+    """执行调度器"""
+
+    def __init__(self, max_workers=None, poll_interval=None):
+        self.max_workers = max_workers or Config.EXECUTION_MAX_WORKERS
+        self.poll_interval = poll_interval or Config.EXECUTION_QUEUE_POLL_INTERVAL
+        self.app = None
+        self._workers = []
+        self._heartbeat = None
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._callbacks = {}  # execution_id -> 执行完成后的回调
+        self.owner_id = None  # 本进程的调度器标识（主机名:进程ID），start() 时确定
+        self._lock = threading.Lock()
+        self._running = set()
+        self._wait_times = {name: deque(maxlen=500) for name in PRIORITY_NAMES.values()}
+        self._dispatched = {name: 0 for name in PRIORITY_NAMES.values()}
+
+    def start(self, app):
+        """启动工作线程（重复调用无副作用）"""
+        if self._workers:
+            return
+        self.app = app
+        self.owner_id = f'{socket.gethostname()}:{os.getpid()}'
+        self._stop.clear()
+        try:
+            with app.app_context():
+                self._recover_orphans(startup=True)
+        except Exception as e:
+            print(f'[调度器] 回收中断的执行失败: {str(e)}')
+        if not (self._heartbeat and self._heartbeat.is_alive()):
+            self._heartbeat = threading.Thread(target=self._heartbeat_loop, name='execution-owner-heartbeat',
+                                               daemon=True)
+            self._heartbeat.start()
+        for i in range(self.max_workers):
+            worker = threading.Thread(target=self._worker_loop, name=f'execution-worker-{i}', daemon=True)
+            worker.start()
+            self._workers.append(worker)
+        print(f'[调度器] 执行调度器已启动，并发上限: {self.max_workers}')
+
+    def submit(self, execution_id, priority=None, on_complete=None):
+        """
+        通知调度器有新的待执行记录
+
+        调用前执行记录必须已以 status='pending' 提交到数据库，并已设置 priority；
+        也可以通过 priority 参数在此处设置，这样回调一定先于记录可被认领之前注册。
+        带回调的执行同时写入本进程的 owner，只有本进程会认领（回调不能跨进程调用）。
+
+        Args:
+            execution_id: 执行记录ID
+            priority: 调度优先级（Execution.PRIORITY_*），为空时沿用记录上已有的值
+            on_complete: 执行结束后在工作线程（应用上下文内）调用的回调，参数为 execution_id
+        """
+        if on_complete:
+            with self._lock:
+                self._callbacks[execution_id] = on_complete
+        values = {}
+        if priority is not None:
+            values['priority'] = priority
+        if on_complete:
+            values['owner'] = self.owner_id
+            values['owner_heartbeat'] = datetime.utcnow()
+        if values:
+            Execution.query.filter_by(id=execution_id).update(values, synchronize_session=False)
+            db.session.commit()
+        with self._cond:
+            self._cond.notify()
+
+    def shutdown(self, timeout=None):
+        """
+        停止接收新任务，等待正在运行的执行结束
+
+        尚未认领的待执行记录留在数据库中，下次启动（或其他进程）会接续执行。
+
+        Args:
+            timeout: 总的等待时间（秒），为空时一直等待
+
+        Returns:
+            list: 超时后仍在运行的执行ID
+        """
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for worker in self._workers:
+            worker.join(None if deadline is None else max(deadline - time.monotonic(), 0))
+        self._workers = [worker for worker in self._workers if worker.is_alive()]
+        with self._lock:
+            return sorted(self._running)
+
+    def _worker_loop(self):
+        """工作线程主循环"""
+        from services.executor import execute_script
+
+        while not self._stop.is_set():
+            try:
+                with self.app.app_context():
+                    execution_id = self._claim_next()
+            except Exception as e:
+                print(f'[调度器] 获取待执行任务失败: {str(e)}')
+                execution_id = None
+
+            if execution_id is None:
+                with self._cond:
+                    self._cond.wait(timeout=self.poll_interval)
+                continue
+
+            with self._lock:
+                self._running.add(execution_id)
+            try:
+                with self.app.app_context():
+                    try:
+                        execute_script(execution_id)
+                    except Exception as e:
+                        print(f'[调度器] 执行 {execution_id} 时发生错误: {str(e)}')
+                        self._fail_unfinished(execution_id, str(e))
+                    finally:
+                        # 无论执行是否异常都要回调，等待结果的一方（如同步 Webhook）不会一直等到超时
+                        callback = self._pop_callback(execution_id)
+                        if callback:
+                            callback(execution_id)
+            except Exception as e:
+                print(f'[调度器] 执行 {execution_id} 的完成回调失败: {str(e)}')
+            finally:
+                with self._lock:
+                    self._running.discard(execution_id)
+
+    def cancel_pending(self, execution_id, error):
+        """
+        取消尚未被认领的排队执行
+
+        以 status='pending' 为条件的 UPDATE 与 _claim_next 互斥，已被工作线程认领的返回 False，
+        由调用方按运行中的执行处理。本进程提交的执行立即调用完成回调，其他进程提交的由其续约线程调用。
+
+        Returns:
+            bool: 是否取消成功
+        """
+        from services.executor import commit_status
+
+        cancelled = Execution.query.filter(
+            Execution.id == execution_id, *_queued_filter()
+        ).update({
+            'status': 'failed', 'stage': 'cancelled', 'progress': 100, 'error': error,
+            'end_time': datetime.utcnow()
+        }, synchronize_session=False)
+        db.session.commit()
+        if not cancelled:
+            return False
+        commit_status(Execution.query.get(execution_id))
+        callback = self._pop_callback(execution_id)
+        if callback:
+            try:
+                callback(execution_id)
+            except Exception as e:
+                print(f'[调度器] 执行 {execution_id} 的完成回调失败: {str(e)}')
+        return True
+
+    def _finish_unclaimed(self):
+        """调用未经工作线程就已结束（排队中被其他进程取消）的执行的完成回调"""
+        with self._lock:
+            waiting = [execution_id for execution_id in self._callbacks if execution_id not in self._running]
+        if not waiting:
+            return
+        finished = [row.id for row in db.session.query(Execution.id).filter(
+            Execution.id.in_(waiting), Execution.status.notin_(('pending', 'running'))
+        )]
+        for execution_id in finished:
+            callback = self._pop_callback(execution_id)
+            if callback:
+                try:
+                    callback(execution_id)
+                except Exception as e:
+                    print(f'[调度器] 执行 {execution_id} 的完成回调失败: {str(e)}')
+
+    def _heartbeat_loop(self):
+        """
+        续约线程：为本进程名下的记录续约，调用已结束的排队执行的完成回调，并回收租约已过期的记录
+
+        退出时等待正在运行的执行结束期间仍继续续约，进程退出后租约随之过期。
+        """
+        while True:
+            time.sleep(Config.EXECUTION_OWNER_HEARTBEAT_INTERVAL)
+            try:
+                with self.app.app_context():
+                    Execution.query.filter(
+                        Execution.owner == self.owner_id, Execution.status.in_(('pending', 'running'))
+                    ).update({'owner_heartbeat': datetime.utcnow()}, synchronize_session=False)
+                    db.session.commit()
+                    self._finish_unclaimed()
+                    if not self._stop.is_set():
+                        self._recover_orphans()
+            except Exception as e:
+                print(f'[调度器] 续约或回收执行失败: {str(e)}')
+
+    def _fail_unfinished(self, execution_id, error):
+        """执行引擎抛出异常时，把仍未结束的执行记录标记为失败（回调据此得到失败结果）"""
+        from services.executor import commit_status
+
+        try:
+            db.session.rollback()
+            execution = Execution.query.get(execution_id)
+            if execution and execution.status in ('pending', 'running'):
+                execution.status = 'failed'
+                execution.progress = 100
+                execution.stage = 'failed'
+                execution.error = error
+                execution.end_time = datetime.utcnow()
+                commit_status(execution)
+        except Exception as e:
+            db.session.rollback()
+            print(f'[调度器] 标记执行 {execution_id} 失败时发生错误: {str(e)}')
+
+    def _claim_next(self):
+        """
+        按优先级认领下一条待执行记录
+
+        通过带状态条件的 UPDATE 认领，多个工作线程（或多个进程）竞争同一条记录时只有一个会成功。
+        已写入 owner 的记录（带完成回调）只由所属进程认领。
+
+        Returns:
+            int: 认领到的执行记录ID，队列为空时返回 None
+        """
+        candidates = db.session.query(
+            Execution.id, Execution.priority, Execution.created_at
+        ).filter(*_queued_filter(), self._claimable()).order_by(
+            Execution.priority, Execution.created_at, Execution.id
+        ).limit(self.max_workers).all()
+
+        for candidate in candidates:
+            claimed = Execution.query.filter(
+                Execution.id == candidate.id,
+                Execution.status == 'pending',
+                self._claimable()
+            ).update({'status': 'running', 'stage': 'preparing', 'owner': self.owner_id,
+                      'owner_heartbeat': datetime.utcnow()}, synchronize_session=False)
+            db.session.commit()
+            if claimed:
+                self._record_dispatch(candidate.priority, candidate.created_at)
+                return candidate.id
+        return None
+
+    def _claimable(self):
+        """本进程可以认领的记录：没有所属进程，或属于本进程"""
+        return or_(Execution.owner.is_(None), Execution.owner == self.owner_id)
+
+    def _owner_alive(self, execution, startup=False):
+        """
+        记录所属的调度器进程是否仍在运行
+
+        租约过期即视为已退出，不论主机；租约内的同一主机进程再按进程ID确认，其他主机的以租约为准。
+        """
+        if execution.owner == self.owner_id:
+            # 启动时本进程尚未认领任何执行，同一标识的记录来自已退出的旧进程（进程ID被复用）
+            return not startup
+        lease_start = datetime.utcnow() - timedelta(seconds=Config.EXECUTION_OWNER_LEASE)
+        if execution.owner_heartbeat is None or execution.owner_heartbeat < lease_start:
+            return False
+        host, _, pid = execution.owner.rpartition(':')
+        if host != socket.gethostname():
+            return True
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return False
+        except (PermissionError, ValueError):
+            return True
+        return True
+
+    def _recover_orphans(self, startup=False):
+        """
+        回收所属调度器进程已退出的记录（进程崩溃、退出时等待超时、容器重启后主机名变化）
+
+        运行中的记录：尚未启动脚本进程（pid 为空）的重新排队；脚本已经开始运行的无法确认
+        执行到了哪一步，标记为失败而不是重复执行。
+        排队中的记录（带完成回调，回调已随进程丢失）：清除 owner，由任意进程认领。
+
+        Args:
+            startup: 是否为启动时的回收（此时记录上的本进程标识来自进程ID相同的旧进程）
+
+        Returns:
+            (int, int): 重新排队的数量，标记为失败的数量
+        """
+        from services.executor import commit_status
+
+        orphans = [execution for execution in Execution.query.filter(
+            Execution.status.in_(('pending', 'running')), Execution.owner.isnot(None), Execution.priority.isnot(None)
+        ).all() if not self._owner_alive(execution, startup)]
+
+        requeued, failed = 0, 0
+        for execution in orphans:
+            if execution.status == 'pending':
+                execution.owner = None
+                requeued += 1
+            elif execution.pid is None:
+                execution.status = 'pending'
+                execution.stage = 'pending'
+                execution.progress = 0
+                execution.owner = None
+                requeued += 1
+            else:
+                execution.status = 'failed'
+                execution.progress = 100
+                execution.stage = 'failed'
+                execution.error = f'执行所在的服务进程（{execution.owner}）已退出，执行被中断'
+                execution.end_time = execution.end_time or datetime.utcnow()
+                failed += 1
+            commit_status(execution)
+        if orphans:
+            print(f'[调度器] 回收中断的执行: 重新排队 {requeued} 个，标记为失败 {failed} 个')
+        return requeued, failed
+
+    def _record_dispatch(self, priority, created_at):
+        """记录排队等待时间"""
+        name = PRIORITY_NAMES.get(priority, 'interactive')
+        wait = (datetime.utcnow() - created_at).total_seconds() if created_at else 0.0
+        with self._lock:
+            self._wait_times[name].append(max(wait, 0.0))
+            self._dispatched[name] += 1
+
+    def _pop_callback(self, execution_id):
+        with self._lock:
+            return self._callbacks.pop(execution_id, None)
+
+    def get_metrics(self):
+        """
+        获取调度器指标
+
+        Returns:
+            dict: 并发上限、运行中任务、各优先级队列深度与等待时间统计
+        """
+        rows = db.session.query(
+            Execution.priority, db.func.count(Execution.id)
+        ).filter(*_queued_filter()).group_by(Execution.priority).all()
+        depth = {name: 0 for name in PRIORITY_NAMES.values()}
+        for priority, count in rows:
+            depth[PRIORITY_NAMES.get(priority, 'interactive')] += count
+
+        with self._lock:
+            running = sorted(self._running)
+            waits = {name: list(values) for name, values in self._wait_times.items()}
+            dispatched = dict(self._dispatched)
+
+        wait_stats = {}
+        for name, values in waits.items():
+            if not values:
+                wait_stats[name] = {'samples': 0, 'avg_seconds': 0, 'p95_seconds': 0, 'max_seconds': 0}
+                continue
+            values.sort()
+            wait_stats[name] = {
+                'samples': len(values),
+                'avg_seconds': round(sum(values) / len(values), 3),
+                'p95_seconds': round(values[min(len(values) - 1, int(len(values) * 0.95))], 3),
+                'max_seconds': round(values[-1], 3),
+            }
+
+        return {
+            'max_workers': self.max_workers,
+            'running': len(running),
+            'running_ids': running,
+            'queue_depth': sum(depth.values()),
+            'queue_depth_by_priority': depth,
+            'dispatched': dispatched,
+            'wait_time': wait_stats,
+            'timestamp': time.time(),
+        }
+
+
+# 创建全局调度器实例
+execution_dispatcher = ExecutionDispatcher()
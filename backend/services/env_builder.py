@@ -0,0 +1,217 @@
+"""
+执行环境变量构建器
+
+脚本执行时的环境变量由三部分组成（优先级从低到高）：
+系统环境变量 < 全局变量 < 执行参数，最后再加上 FILES 和依赖目录路径。
+
+- 全局变量缓存在内存中并带版本号，api/global_variables.py 的写接口调用 invalidate() 后
+  下一次构建时重新加载；系统环境变量与全局变量合并后的基础环境也随版本缓存，
+  每次执行只需复制一次字典
+- 其他工作进程的修改只会使它自己的缓存失效：缓存超过 GLOBAL_VARIABLES_CHECK_INTERVAL 秒后，
+  用一次聚合查询（行数与最大 updated_at）确认全局变量表是否变化，变化后重新加载
+- 参数定义按 (脚本ID, 版本) 预编译为 {参数名: 转换函数}，每个参数 O(1) 查找，
+  不再每次执行都解析 script.parameters 并线性查找
+"""
+import json
+import os
+import threading
+import time
+from models import db, GlobalVariable
+from config import Config
+from services.dependency_manager import dependency_manager
+
+
+def _to_text(value):
+    return str(value)
+
+
+def _to_text_or_empty(value):
+    return str(value) if value else ''
+
+
+def _to_list_text(value):
+    # 多选类型 - 值为数组，转为逗号分隔字符串
+    if isinstance(value, list):
+        return ','.join(str(v) for v in value)
+    return str(value)
+
+
+def _to_switch_text(value):
+    # 开关类型 - 值为布尔，转为true/false字符串
+    return 'true' if value else 'false'
+
+
+# 参数类型对应的值转换函数，未列出的类型按文本处理
+PARAM_CONVERTERS = {
+    'file': _to_text,
+    'multiselect': _to_list_text,
+    'checkbox': _to_list_text,
+    'switch': _to_switch_text,
+    'number': _to_text,
+    'date': _to_text_or_empty,
+}
+
+DEFAULT_CONVERTER = _to_text_or_empty
+
+
+def compile_parameters(parameters):
+    """
+    把参数定义编译为 {参数名: 转换函数}
+
+    Args:
+        parameters: script.parameters（JSON 字符串）
+
+    Returns:
+        dict: 参数名到值转换函数的映射，重复定义的参数以第一个为准
+    """
+    definitions = json.loads(parameters) if parameters else []
+    compiled = {}
+    for definition in definitions:
+        key = definition.get('key')
+        if key and key not in compiled:
+            compiled[key] = PARAM_CONVERTERS.get(definition.get('type', 'text'), DEFAULT_CONVERTER)
+    return compiled
+
+
+class EnvBuilder:
+    """执行环境变量构建器"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = 0
+        self._loaded_version = -1
+        self._global_vars = {}
+        self._base_env = {}
+        self._fingerprint = None  # 已加载的全局变量表指纹 (行数, 最大 updated_at)
+        self._checked_at = 0.0  # 上次确认指纹的时间（time.monotonic）
+        self._param_cache = {}  # script_id -> (version, parameters 原文, 编译结果)
+        self._stats = {'global_loads': 0, 'global_checks': 0, 'param_compiles': 0, 'builds': 0}
+
+    def invalidate(self):
+        """全局变量已变化，下一次构建时重新加载"""
+        with self._lock:
+            self._version += 1
+
+    def get_global_variables(self):
+        """
+        获取全局变量字典（只读，调用方不要修改）
+
+        Returns:
+            dict: {变量名: 变量值}
+        """
+        return self._ensure_loaded()[0]
+
+    def build(self, script, params, execution_files=None, dependency_env=None):
+        """
+        构建脚本执行的环境变量
+
+        Args:
+            script: 脚本对象（使用 id、version、parameters）
+            params: 执行参数 {参数名: 值}
+            execution_files: 工作目录中的文件列表 [{'name', 'path'}]
+            dependency_env: 依赖管理器返回的依赖目录路径
+
+        Returns:
+            dict: 完整的环境变量
+        """
+        _, base_env = self._ensure_loaded()
+        env = dict(base_env)
+
+        # 注入执行参数（执行参数优先级高于全局变量）
+        converters = self._compiled_parameters(script)
+        for key, value in params.items():
+            env[key] = converters.get(key, DEFAULT_CONVERTER)(value)
+
+        # 添加文件路径环境变量（使用相对路径）
+        if execution_files:
+            env['FILES'] = json.dumps([f['name'] for f in execution_files])
+
+        # 引用依赖缓存中的独立依赖目录
+        if dependency_env:
+            dependency_manager.apply_env(env, dependency_env)
+
+        with self._lock:
+            self._stats['builds'] += 1
+        return env
+
+    def get_stats(self):
+        with self._lock:
+            return dict(
+                self._stats,
+                global_version=self._version,
+                global_variables=len(self._global_vars),
+                cached_scripts=len(self._param_cache)
+            )
+
+    @staticmethod
+    def _query_fingerprint():
+        """全局变量表指纹：增删改都会改变行数或最大 updated_at"""
+        count, latest = db.session.query(
+            db.func.count(GlobalVariable.id), db.func.max(GlobalVariable.updated_at)
+        ).one()
+        return count, latest
+
+    def _ensure_loaded(self):
+        """按版本号加载全局变量，返回 (全局变量, 基础环境)"""
+        with self._lock:
+            fresh = self._loaded_version == self._version
+            if fresh and time.monotonic() - self._checked_at < Config.GLOBAL_VARIABLES_CHECK_INTERVAL:
+                return self._global_vars, self._base_env
+            version = self._version
+
+        if fresh:
+            # 本进程没有修改过，确认其他进程是否修改过
+            try:
+                fingerprint = self._query_fingerprint()
+            except Exception as e:
+                print(f'检查全局变量是否变化失败: {str(e)}')
+                fingerprint = None
+            with self._lock:
+                self._stats['global_checks'] += 1
+                self._checked_at = time.monotonic()
+                if fingerprint is None or fingerprint == self._fingerprint:
+                    return self._global_vars, self._base_env
+                self._version += 1
+                version = self._version
+
+        # 查询在锁外进行；查询期间发生的 invalidate 会让版本号前进，下一次构建时再次加载
+        try:
+            variables = GlobalVariable.query.all()
+        except Exception as e:
+            print(f'获取全局变量失败: {str(e)}')
+            return {}, os.environ.copy()
+        global_vars = {var.key: var.value for var in variables}
+        fingerprint = (len(variables), max((var.updated_at for var in variables if var.updated_at), default=None))
+
+        base_env = os.environ.copy()
+        for key, value in global_vars.items():
+            base_env[key] = str(value)
+
+        with self._lock:
+            self._stats['global_loads'] += 1
+            # 只接受不比当前缓存旧的结果
+            if version >= self._loaded_version:
+                self._global_vars = global_vars
+                self._base_env = base_env
+                self._fingerprint = fingerprint
+                self._checked_at = time.monotonic()
+                self._loaded_version = version
+        return global_vars, base_env
+
+    def _compiled_parameters(self, script):
+        """获取脚本的预编译参数定义"""
+        with self._lock:
+            cached = self._param_cache.get(script.id)
+        # 参数定义的修改不一定会提升脚本版本号，版本相同时再比较一次参数原文
+        if cached and cached[0] == script.version and cached[1] == script.parameters:
+            return cached[2]
+
+        compiled = compile_parameters(script.parameters)
+        with self._lock:
+            self._param_cache[script.id] = (script.version, script.parameters, compiled)
+            self._stats['param_compiles'] += 1
+        return compiled
+
+
+# 创建全局环境变量构建器实例
+env_builder = EnvBuilder()
@@ -0,0 +1,424 @@
+"""
+Excel 协同编辑的服务端文档状态
+
+/excel WebSocket 命名空间中的每个文件（房间）在服务端维护一份文档状态，编辑以服务端为准：
+
+- 编辑在文档状态的锁内依次获得递增的版本号，按版本顺序写入编辑日志（services.excel_journal）并广播，
+  所有成员看到的编辑顺序一致；广播的编辑带有 epoch，客户端据此发现房间已重建或漏掉了编辑，主动同步
+- 冲突处理：编辑可以带上客户端已知的版本 base_version，如果同一单元格在该版本之后已被
+  其他用户修改，拒绝这次编辑并返回服务端的当前值；不带 base_version 时按到达顺序以后到者为准
+- 迟到加入或断线重连的客户端带上已知的 epoch 与版本：最近的编辑仍在历史中时只补发缺少的编辑（delta），
+  否则发送房间内所有被编辑过的单元格（snapshot）；房间已重建（epoch 不同）时才需要重新加载文件
+- 房间没有成员且超过 EXCEL_COLLAB_IDLE_TIMEOUT 秒无活动后被回收，编辑已在日志中持久化，
+  回收后重新打开的房间从文件读取即可
+
+epoch 是文档状态每次创建（或文件被整体保存后重置）时生成的随机标识，版本号只在同一个 epoch 内有意义。
+
+文档状态（epoch、版本号、最近的编辑与被编辑过的单元格）按文件路径保存在 Config.EXCEL_COLLAB_STORE
+选择的存储中：memory（进程内，单个工作进程）或 sqlite:///路径（同一主机上的多个工作进程共享，
+不同进程中的编辑由数据库写锁排序，版本号不会冲突）。房间成员只记录在各自的进程中。
+"""
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from openpyxl.utils import get_column_letter
+from openpyxl.utils.cell import coordinate_to_tuple
+from config import Config
+from services.excel_journal import excel_journal
+
+
+class EditConflict(Exception):
+    """编辑基于的版本已过期，同一单元格已被其他用户修改"""
+
+    def __init__(self, current):
+        super().__init__('单元格已被其他用户修改')
+        self.current = current
+
+
+def _new_epoch():
+    return uuid.uuid4().hex[:12]
+
+
+def _check_conflict(current, user_id, base_version, base_epoch, epoch):
+    """
+    检查编辑是否基于过期的版本
+
+    base_epoch 与当前 epoch 不同时，客户端的版本号不可比，按到达顺序处理
+    """
+    if base_version is None or not current or current['user_id'] == user_id:
+        return
+    if base_epoch and base_epoch != epoch:
+        return
+    if current['version'] > base_version:
+        raise EditConflict(current)
+
+
+def _sync_mode(epoch, oldest, since_version, client_epoch):
+    """
+    选择补发方式
+
+    Args:
+        epoch: 当前 epoch
+        oldest: 历史中最早的版本号（历史为空时为当前版本 + 1）
+        since_version: 客户端已应用的版本
+        client_epoch: 客户端数据所属的 epoch
+
+    Returns:
+        str: reload、delta 或 snapshot
+    """
+    if client_epoch and client_epoch != epoch:
+        # 客户端的数据来自之前的文档状态，版本号不再可比
+        return 'reload'
+    if since_version is not None and client_epoch and since_version >= oldest - 1:
+        return 'delta'
+    # 全新加入或历史已不足以补齐：发送所有被编辑过的单元格
+    return 'snapshot'
+
+
+class _MemoryDocument:
+    """单个文件在进程内的文档状态"""
+
+    def __init__(self):
+        self.epoch = _new_epoch()
+        self.version = 0
+        self.ops = deque(maxlen=Config.EXCEL_COLLAB_HISTORY)  # 最近的编辑，用于增量补发
+        self.cells = {}  # (工作表名称, 行号, 列号) -> 最后一次编辑
+        self.lock = threading.Lock()
+
+
+class MemoryCollabStore:
+    """文档状态保存在进程内（单个工作进程）"""
+
+    def __init__(self):
+        self._documents = {}  # 文件路径 -> _MemoryDocument
+        self._lock = threading.Lock()
+
+    def _document(self, path):
+        with self._lock:
+            document = self._documents.get(path)
+            if document is None:
+                document = self._documents[path] = _MemoryDocument()
+            return document
+
+    def edit(self, path, key, user_id, base_version, base_epoch, make_op):
+        """
+        在文档锁内检查冲突、分配版本号并记录编辑
+
+        Args:
+            make_op: 函数(epoch, version) -> 编辑记录，负责写入编辑日志
+        """
+        document = self._document(path)
+        with document.lock:
+            _check_conflict(document.cells.get(key), user_id, base_version, base_epoch, document.epoch)
+            op = make_op(document.epoch, document.version + 1)
+            document.version = op['version']
+            document.ops.append(op)
+            document.cells[key] = op
+            return op
+
+    def catch_up(self, path, since_version, client_epoch):
+        document = self._document(path)
+        with document.lock:
+            base = {'epoch': document.epoch, 'version': document.version}
+            oldest = document.ops[0]['version'] if document.ops else document.version + 1
+            mode = _sync_mode(document.epoch, oldest, since_version, client_epoch)
+            if mode == 'reload':
+                return dict(base, mode=mode)
+            if mode == 'delta':
+                return dict(base, mode=mode, ops=[op for op in document.ops if op['version'] > since_version])
+            return dict(base, mode=mode, ops=sorted(document.cells.values(), key=lambda op: op['version']))
+
+    def reset(self, path):
+        with self._lock:
+            document = self._documents.get(path)
+        if document:
+            with document.lock:
+                document.epoch = _new_epoch()
+                document.version = 0
+                document.ops.clear()
+                document.cells.clear()
+
+    def discard(self, path, idle_before):
+        """回收房间时丢弃文档状态（进程内的房间空闲即文档空闲）"""
+        with self._lock:
+            self._documents.pop(path, None)
+
+
+class SQLiteCollabStore:
+    """文档状态保存在 SQLite 文件中，由同一主机上的工作进程共享"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+        connection = self._connection()
+        connection.execute('CREATE TABLE IF NOT EXISTS excel_collab_documents '
+                           '(path TEXT PRIMARY KEY, epoch TEXT NOT NULL, version INTEGER NOT NULL, '
+                           'updated REAL NOT NULL)')
+        connection.execute('CREATE TABLE IF NOT EXISTS excel_collab_ops '
+                           '(path TEXT NOT NULL, version INTEGER NOT NULL, op TEXT NOT NULL, '
+                           'PRIMARY KEY (path, version))')
+        connection.execute('CREATE TABLE IF NOT EXISTS excel_collab_cells '
+                           '(path TEXT NOT NULL, sheet TEXT NOT NULL, row INTEGER NOT NULL, col INTEGER NOT NULL, '
+                           'version INTEGER NOT NULL, op TEXT NOT NULL, PRIMARY KEY (path, sheet, row, col))')
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_path, timeout=30, isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    @contextmanager
+    def _transaction(self):
+        """写事务：BEGIN IMMEDIATE 取得数据库写锁，多个进程的编辑依次执行"""
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield connection
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+    @staticmethod
+    def _document(connection, path):
+        """读取（不存在时创建）文档的 epoch 与版本号，并记录活动时间"""
+        row = connection.execute('SELECT epoch, version FROM excel_collab_documents WHERE path = ?',
+                                 (path,)).fetchone()
+        if row is None:
+            row = (_new_epoch(), 0)
+            connection.execute('INSERT INTO excel_collab_documents (path, epoch, version, updated) '
+                               'VALUES (?, ?, ?, ?)', (path, row[0], row[1], time.time()))
+        else:
+            connection.execute('UPDATE excel_collab_documents SET updated = ? WHERE path = ?', (time.time(), path))
+        return row
+
+    def edit(self, path, key, user_id, base_version, base_epoch, make_op):
+        with self._transaction() as connection:
+            epoch, version = self._document(connection, path)
+            row = connection.execute('SELECT op FROM excel_collab_cells WHERE path = ? AND sheet = ? AND row = ? '
+                                     'AND col = ?', (path,) + key).fetchone()
+            _check_conflict(json.loads(row[0]) if row else None, user_id, base_version, base_epoch, epoch)
+            op = make_op(epoch, version + 1)
+            data = json.dumps(op)
+            connection.execute('INSERT INTO excel_collab_ops (path, version, op) VALUES (?, ?, ?)',
+                               (path, op['version'], data))
+            connection.execute('INSERT OR REPLACE INTO excel_collab_cells (path, sheet, row, col, version, op) '
+                               'VALUES (?, ?, ?, ?, ?, ?)', (path,) + key + (op['version'], data))
+            connection.execute('UPDATE excel_collab_documents SET version = ? WHERE path = ?', (op['version'], path))
+            connection.execute('DELETE FROM excel_collab_ops WHERE path = ? AND version <= ?',
+                               (path, op['version'] - Config.EXCEL_COLLAB_HISTORY))
+            return op
+
+    def catch_up(self, path, since_version, client_epoch):
+        with self._transaction() as connection:
+            epoch, version = self._document(connection, path)
+            base = {'epoch': epoch, 'version': version}
+            oldest = connection.execute('SELECT MIN(version) FROM excel_collab_ops WHERE path = ?',
+                                        (path,)).fetchone()[0]
+            mode = _sync_mode(epoch, oldest or version + 1, since_version, client_epoch)
+            if mode == 'reload':
+                return dict(base, mode=mode)
+            if mode == 'delta':
+                rows = connection.execute('SELECT op FROM excel_collab_ops WHERE path = ? AND version > ? '
+                                          'ORDER BY version', (path, since_version))
+            else:
+                rows = connection.execute('SELECT op FROM excel_collab_cells WHERE path = ? ORDER BY version',
+                                          (path,))
+            return dict(base, mode=mode, ops=[json.loads(data) for data, in rows])
+
+    def reset(self, path):
+        with self._transaction() as connection:
+            self._delete(connection, path)
+
+    def discard(self, path, idle_before):
+        """回收房间时，文档在所有进程中都已空闲（idle_before 之后没有编辑或同步）才丢弃"""
+        with self._transaction() as connection:
+            row = connection.execute('SELECT updated FROM excel_collab_documents WHERE path = ?', (path,)).fetchone()
+            if row and row[0] < idle_before:
+                self._delete(connection, path)
+
+    @staticmethod
+    def _delete(connection, path):
+        for table in ('excel_collab_documents', 'excel_collab_ops', 'excel_collab_cells'):
+            connection.execute(f'DELETE FROM {table} WHERE path = ?', (path,))
+
+
+def create_collab_store(url=None):
+    """创建 Config.EXCEL_COLLAB_STORE 选择的文档状态存储"""
+    url = url or Config.EXCEL_COLLAB_STORE
+    if url == 'memory':
+        return MemoryCollabStore()
+    if url.startswith('sqlite:///'):
+        return SQLiteCollabStore(url[len('sqlite:///'):])
+    raise ValueError(f'不支持的协同编辑存储: {url}')
+
+
+class CollabRoom:
+    """单个文件在本进程中的协同编辑房间（文档状态在共享存储中）"""
+
+    def __init__(self, file_id, path, store):
+        self.file_id = file_id
+        self.path = path
+        self.store = store
+        self.members = set()  # 本进程中已加入的连接 sid
+        self.lock = threading.Lock()
+        self.last_active = time.monotonic()
+
+    def join(self, sid, since_version=None, epoch=None):
+        """
+        加入房间
+
+        Returns:
+            dict: 补发数据
+        """
+        with self.lock:
+            self.members.add(sid)
+            self.last_active = time.monotonic()
+        return self.store.catch_up(self.path, since_version, epoch)
+
+    def leave(self, sid):
+        with self.lock:
+            self.members.discard(sid)
+            self.last_active = time.monotonic()
+
+    def catch_up(self, since_version=None, epoch=None):
+        return self.store.catch_up(self.path, since_version, epoch)
+
+    def apply_edit(self, user_id, sheet, cell, value, base_version=None, base_epoch=None):
+        """
+        应用一次单元格编辑
+
+        Args:
+            user_id: 编辑者
+            sheet: 工作表名称或索引（按客户端发送的原样广播）
+            cell: 单元格引用，如 'A1'
+            value: 新值
+            base_version: 客户端已知的版本，用于冲突检测
+            base_epoch: base_version 所属的 epoch
+
+        Returns:
+            dict: 编辑记录（含服务端分配的 epoch 与版本号）
+
+        Raises:
+            ValueError: 工作表或单元格无效
+            EditConflict: 同一单元格在 base_version 之后已被其他用户修改
+        """
+        try:
+            row, col = coordinate_to_tuple(str(cell).upper())
+        except (TypeError, ValueError):
+            raise ValueError(f'无效的单元格引用: {cell}')
+        sheet_name = excel_journal.resolve_sheet(self.path, sheet)
+        key = (sheet_name, row - 1, col - 1)
+
+        def make_op(epoch, version):
+            # 在文档锁内写入日志，日志顺序与版本顺序一致
+            seq = excel_journal.append(self.path, sheet_name, [{'row': row - 1, 'col': col - 1, 'value': value}])
+            return {
+                'epoch': epoch,
+                'version': version,
+                'user_id': user_id,
+                'sheet': sheet,
+                'sheet_name': sheet_name,
+                'cell': f'{get_column_letter(col)}{row}',
+                'row': row - 1,
+                'col': col - 1,
+                'value': value,
+                'seq': seq,
+                'timestamp': time.time()
+            }
+
+        op = self.store.edit(self.path, key, user_id, base_version, base_epoch, make_op)
+        with self.lock:
+            self.last_active = time.monotonic()
+        return op
+
+
+class CollabManager:
+    """协同编辑房间管理器"""
+
+    def __init__(self, store=None):
+        self.store = store or create_collab_store()
+        self._rooms = {}  # file_id -> CollabRoom
+        self._lock = threading.Lock()
+        self._stats = {'rooms_created': 0, 'rooms_evicted': 0, 'edits': 0, 'conflicts': 0,
+                       'delta_syncs': 0, 'snapshot_syncs': 0, 'reload_syncs': 0}
+
+    def open_room(self, file_id):
+        """
+        获取或创建文件对应的房间
+
+        Raises:
+            ValueError: 文件路径无效或不是可编辑的 Excel 文件
+        """
+        self.evict_idle()
+        with self._lock:
+            room = self._rooms.get(file_id)
+        if room:
+            return room
+
+        from api.excel import get_excel_path, validate_excel_file
+        path, error = get_excel_path(file_id)
+        if error:
+            raise ValueError(error)
+        is_valid, error = validate_excel_file(path)
+        if not is_valid:
+            raise ValueError(error)
+
+        with self._lock:
+            room = self._rooms.get(file_id)
+            if room is None:
+                room = self._rooms[file_id] = CollabRoom(file_id, path, self.store)
+                self._stats['rooms_created'] += 1
+            return room
+
+    def get_room(self, file_id):
+        with self._lock:
+            return self._rooms.get(file_id)
+
+    def record(self, counter):
+        with self._lock:
+            self._stats[counter] += 1
+
+    def reset(self, path):
+        """
+        文件被整体改写（完整保存、增删改工作表）后重置文档状态
+
+        所有进程中的客户端在下一次收到的编辑或同步中发现 epoch 已变化，重新加载文件
+        """
+        self.store.reset(path)
+
+    def evict_idle(self):
+        """回收没有成员且长时间无活动的房间"""
+        deadline = time.monotonic() - Config.EXCEL_COLLAB_IDLE_TIMEOUT
+        with self._lock:
+            idle = [room for room in self._rooms.values() if not room.members and room.last_active < deadline]
+            for room in idle:
+                del self._rooms[room.file_id]
+            open_paths = {room.path for room in self._rooms.values()}
+            self._stats['rooms_evicted'] += len(idle)
+        idle_before = time.time() - Config.EXCEL_COLLAB_IDLE_TIMEOUT
+        for path in {room.path for room in idle} - open_paths:
+            try:
+                self.store.discard(path, idle_before)
+            except Exception as e:
+                print(f'[协同编辑] 丢弃文档状态失败 {path}: {e}')
+        return len(idle)
+
+    def get_stats(self):
+        with self._lock:
+            rooms = list(self._rooms.values())
+            stats = dict(self._stats)
+        stats['rooms'] = len(rooms)
+        stats['members'] = sum(len(room.members) for room in rooms)
+        return stats
+
+
+# 创建全局协同编辑管理器实例
+excel_collab = CollabManager()
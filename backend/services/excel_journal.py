@@ -0,0 +1,769 @@
+"""
+Excel 单元格编辑日志（写后合并）
+
+单元格编辑不再每次都用 openpyxl 加载并重写整个工作簿：编辑先追加到按文件划分的操作日志
+（JSON Lines，fsync 后即向客户端确认），由后台线程在编辑停止 EXCEL_JOURNAL_FLUSH_DELAY 秒后
+（最长不超过 EXCEL_JOURNAL_MAX_DELAY 秒）合并写入 xlsx：
+
+- 同一单元格的多次编辑只保留最后一次
+- 只改写受影响工作表在 zip 中的 XML 部件，在原有行/单元格上就地修改（文本写为内联字符串，
+  不改动共享字符串表和样式），其他部件内容保持不变；工作表结构无法就地修改时
+  （缺少行列号、需要同步更新 calcChain 等）回退为 openpyxl 完整保存
+- 写入期间新到的编辑写入新的日志文件，不会阻塞
+- 尚未写入文件的编辑在读取接口中叠加到读取结果上，保证刚保存的内容立即可见
+- 服务异常退出后，启动时由 recover() 重放遗留的日志
+
+多个工作进程（server.py --workers N）共用同一组日志文件：追加与写入 xlsx 各由一把跨进程的
+文件锁（fcntl.flock）串行化，日志中的顺序即全局的编辑顺序。任何进程写入时都按顺序重放日志中
+全部进程的编辑，序号由共享的计数文件分配；各进程叠加到读取结果上的编辑也从日志文件读取，
+日志变化（其他进程追加或写入）后重新加载。没有 fcntl 的平台（Windows）只在进程内加锁，
+只能以单个工作进程运行。
+
+日志文件位于 EXCEL_JOURNAL_DIR，以源文件路径的哈希命名：
+    <哈希>.log         新追加的编辑
+    <哈希>.flushing    正在写入 xlsx 的编辑（写入成功后删除）
+    <哈希>.seq         最后分配的操作序号
+    <哈希>.lock        追加日志的锁
+    <哈希>.write.lock  写入 xlsx 的锁（完整保存工作簿时也需持有，见 exclusive()）
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+import posixpath
+import zipfile
+import xml.etree.ElementTree as ET
+from contextlib import contextmanager
+from xml.sax.saxutils import escape
+import openpyxl
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+from openpyxl.utils import get_column_letter
+from openpyxl.utils.cell import column_index_from_string, coordinate_from_string
+from config import Config
+from services.excel_reader import excel_reader
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+LOCK_POLL_INTERVAL = 0.01  # 等待其他进程释放文件锁时的轮询间隔（秒）
+
+_SHEET_DATA_PATTERN = re.compile(rb'<sheetData\s*/>|<sheetData\b[^>]*>')
+_ROW_PATTERN = re.compile(rb'<row\b([^>]*?)(/?)>')
+_CELL_PATTERN = re.compile(rb'<c\b([^>]*?)(?:/>|>(.*?)</c>)', re.S)
+_DIMENSION_PATTERN = re.compile(rb'<dimension\b[^>]*?\bref="([^"]*)"[^>]*/>')
+_SPANS_PATTERN = re.compile(rb'\s+spans="[^"]*"')
+_ATTR_PATTERN = re.compile(rb'\b(\w+)="([^"]*)"')
+
+_NS_MAIN = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_NS_REL = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+_NS_PACKAGE_REL = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+_OFFICE_DOCUMENT = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument'
+
+
+class UnsupportedSheet(Exception):
+    """工作表结构无法就地修改，需要回退为完整保存"""
+
+
+def _attrs(raw):
+    return dict(_ATTR_PATTERN.findall(raw))
+
+
+def _cell_xml(ref, value, style):
+    """生成单元格 XML，文本写为内联字符串，以 = 开头的文本写为公式（与 openpyxl 一致）"""
+    style_attr = b' s="' + style + b'"' if style else b''
+    ref = ref.encode('ascii')
+    if value is None:
+        return b'<c r="' + ref + b'"' + style_attr + b'/>'
+    if isinstance(value, bool):
+        return b'<c r="' + ref + b'"' + style_attr + b' t="b"><v>' + (b'1' if value else b'0') + b'</v></c>'
+    if isinstance(value, (int, float)):
+        return b'<c r="' + ref + b'"' + style_attr + b'><v>' + repr(value).encode('ascii') + b'</v></c>'
+    text = value if isinstance(value, str) else str(value)
+    if text.startswith('=') and len(text) > 1:
+        return b'<c r="' + ref + b'"' + style_attr + b'><f>' + escape(text[1:]).encode('utf-8') + b'</f></c>'
+    return (b'<c r="' + ref + b'"' + style_attr + b' t="inlineStr"><is><t xml:space="preserve">'
+            + escape(text).encode('utf-8') + b'</t></is></c>')
+
+
+def _patch_row(content, row, cols):
+    """
+    修改一行中的单元格
+
+    Args:
+        content: <row> 与 </row> 之间的内容
+        row: 行号（1-based）
+        cols: {列号(1-based): 值}
+
+    Returns:
+        tuple: (新内容, 是否覆盖了公式)
+    """
+    pieces = []
+    pos = 0
+    targets = sorted(cols)
+    ti = 0
+    replaced_formula = False
+    last_col = 0
+    for match in _CELL_PATTERN.finditer(content):
+        attrs = _attrs(match.group(1))
+        ref = attrs.get(b'r')
+        if not ref:
+            raise UnsupportedSheet('单元格缺少 r 属性')
+        col = column_index_from_string(coordinate_from_string(ref.decode('ascii'))[0])
+        if col <= last_col:
+            raise UnsupportedSheet('单元格未按列排序')
+        last_col = col
+
+        while ti < len(targets) and targets[ti] < col:
+            pieces.append(content[pos:match.start()])
+            pos = match.start()
+            pieces.append(_cell_xml(f'{get_column_letter(targets[ti])}{row}', cols[targets[ti]], None))
+            ti += 1
+        if ti < len(targets) and targets[ti] == col:
+            inner = match.group(2) or b''
+            if b'<f' in inner:
+                replaced_formula = True
+            pieces.append(content[pos:match.start()])
+            pieces.append(_cell_xml(ref.decode('ascii'), cols[col], attrs.get(b's')))
+            pos = match.end()
+            ti += 1
+
+    # 剩余的单元格追加到行末（extLst 等非单元格元素之前）
+    tail = content[pos:]
+    ext = tail.find(b'<extLst')
+    insert_at = ext if ext >= 0 else len(tail)
+    pieces.append(tail[:insert_at])
+    for col in targets[ti:]:
+        pieces.append(_cell_xml(f'{get_column_letter(col)}{row}', cols[col], None))
+    pieces.append(tail[insert_at:])
+    return b''.join(pieces), replaced_formula
+
+
+def _new_row(row, cols):
+    content, _ = _patch_row(b'', row, cols)
+    return b'<row r="' + str(row).encode('ascii') + b'">' + content + b'</row>'
+
+
+def patch_sheet_xml(xml, cells):
+    """
+    就地修改工作表 XML 中的单元格
+
+    Args:
+        xml: 工作表 XML
+        cells: {(行号, 列号): 值}，0-based
+
+    Returns:
+        tuple: (新的 XML, 是否覆盖了公式)
+
+    Raises:
+        UnsupportedSheet: 工作表结构无法就地修改
+    """
+    by_row = {}
+    for (row, col), value in cells.items():
+        by_row.setdefault(row + 1, {})[col + 1] = value
+    targets = sorted(by_row)
+
+    match = _SHEET_DATA_PATTERN.search(xml)
+    if not match:
+        raise UnsupportedSheet('未找到 sheetData')
+
+    replaced_formula = False
+    if match.group().endswith(b'/>'):
+        body = b''.join(_new_row(row, by_row[row]) for row in targets)
+        xml = xml[:match.start()] + b'<sheetData>' + body + b'</sheetData>' + xml[match.end():]
+    else:
+        start = match.end()
+        end = xml.find(b'</sheetData>', start)
+        if end < 0:
+            raise UnsupportedSheet('sheetData 未闭合')
+        pieces = [xml[:start]]
+        pos = start
+        ti = 0
+        last_row = 0
+        for row_match in _ROW_PATTERN.finditer(xml, start, end):
+            if ti >= len(targets):
+                break
+            attrs = row_match.group(1)
+            row_ref = _attrs(attrs).get(b'r')
+            if not row_ref:
+                raise UnsupportedSheet('行缺少 r 属性')
+            row = int(row_ref)
+            if row <= last_row:
+                raise UnsupportedSheet('行未按顺序排列')
+            last_row = row
+
+            while ti < len(targets) and targets[ti] < row:
+                pieces.append(xml[pos:row_match.start()])
+                pos = row_match.start()
+                pieces.append(_new_row(targets[ti], by_row[targets[ti]]))
+                ti += 1
+            if ti < len(targets) and targets[ti] == row:
+                if row_match.group(2):
+                    content = b''
+                    row_end = row_match.end()
+                else:
+                    close = xml.find(b'</row>', row_match.end(), end)
+                    if close < 0:
+                        raise UnsupportedSheet('row 未闭合')
+                    content = xml[row_match.end():close]
+                    row_end = close + len(b'</row>')
+                content, formula = _patch_row(content, row, by_row[row])
+                replaced_formula = replaced_formula or formula
+                pieces.append(xml[pos:row_match.start()])
+                # spans 只是列范围提示，新增单元格后可能不再准确，直接去掉
+                pieces.append(b'<row' + _SPANS_PATTERN.sub(b'', attrs) + b'>' + content + b'</row>')
+                pos = row_end
+                ti += 1
+
+        pieces.append(xml[pos:end])
+        for row in targets[ti:]:
+            pieces.append(_new_row(row, by_row[row]))
+        pieces.append(xml[end:])
+        xml = b''.join(pieces)
+
+    return _update_dimension(xml, max(targets), max(col for cols in by_row.values() for col in cols)), replaced_formula
+
+
+def _update_dimension(xml, max_row, max_col):
+    """编辑超出原有范围时扩大 dimension"""
+    match = _DIMENSION_PATTERN.search(xml)
+    if not match:
+        return xml
+    ref = match.group(1).decode('ascii')
+    start, _, end = ref.partition(':')
+    end = end or start
+    try:
+        end_col, end_row = coordinate_from_string(end.replace('$', ''))
+        end_col = column_index_from_string(end_col)
+    except ValueError:
+        return xml
+    if end_row >= max_row and end_col >= max_col:
+        return xml
+    new_end = f'{get_column_letter(max(end_col, max_col))}{max(end_row, max_row)}'
+    new_ref = f'{start}:{new_end}'.encode('ascii')
+    return xml[:match.start(1)] + new_ref + xml[match.end(1):]
+
+
+def _sheet_parts(archive):
+    """解析工作簿中各工作表对应的 zip 部件，返回 {工作表名称: 部件路径}"""
+    workbook_part = 'xl/workbook.xml'
+    root = ET.fromstring(archive.read('_rels/.rels'))
+    for rel in root.iter(f'{_NS_PACKAGE_REL}Relationship'):
+        if rel.get('Type') == _OFFICE_DOCUMENT:
+            workbook_part = rel.get('Target').lstrip('/')
+
+    base = posixpath.dirname(workbook_part)
+    rels_part = posixpath.join(base, '_rels', posixpath.basename(workbook_part) + '.rels')
+    targets = {}
+    for rel in ET.fromstring(archive.read(rels_part)).iter(f'{_NS_PACKAGE_REL}Relationship'):
+        target = rel.get('Target')
+        targets[rel.get('Id')] = target.lstrip('/') if target.startswith('/') else posixpath.normpath(posixpath.join(base, target))
+
+    parts = {}
+    for sheet in ET.fromstring(archive.read(workbook_part)).iter(f'{_NS_MAIN}sheet'):
+        rel_id = sheet.get(f'{_NS_REL}id')
+        if rel_id in targets:
+            parts[sheet.get('name')] = targets[rel_id]
+    return parts
+
+
+def patch_workbook(path, sheet_cells):
+    """
+    只改写受影响工作表的 XML 部件
+
+    Args:
+        path: xlsx 文件路径
+        sheet_cells: {工作表名称: {(行号, 列号): 值}}，0-based
+
+    Raises:
+        UnsupportedSheet: 无法就地修改，需要回退为完整保存
+    """
+    tmp_path = f'{path}.tmp-{uuid.uuid4().hex[:8]}'
+    try:
+        with zipfile.ZipFile(path) as src:
+            parts = _sheet_parts(src)
+            patched = {}
+            for name, cells in sheet_cells.items():
+                part = parts.get(name)
+                if not part:
+                    raise UnsupportedSheet(f'工作表 "{name}" 不存在')
+                xml, replaced_formula = patch_sheet_xml(src.read(part), cells)
+                if replaced_formula and 'xl/calcChain.xml' in src.namelist():
+                    # 覆盖公式后 calcChain 中的引用会失效，交给 openpyxl 处理
+                    raise UnsupportedSheet('覆盖了公式单元格')
+                patched[part] = xml
+
+            with zipfile.ZipFile(tmp_path, 'w') as dst:
+                for info in src.infolist():
+                    data = patched.get(info.filename)
+                    if data is None:
+                        data = src.read(info.filename)
+                    dst.writestr(info, data)
+
+        shutil.copymode(path, tmp_path)
+        excel_reader.invalidate(path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _save_with_openpyxl(path, sheet_cells):
+    """回退方式：加载完整工作簿后写入"""
+    workbook = openpyxl.load_workbook(path)
+    try:
+        for name, cells in sheet_cells.items():
+            if name not in workbook.sheetnames:
+                print(f'[Excel日志] {path} 工作表 "{name}" 已不存在，丢弃 {len(cells)} 个单元格编辑')
+                continue
+            sheet = workbook[name]
+            for (row, col), value in cells.items():
+                sheet.cell(row=row + 1, column=col + 1, value=value)
+        excel_reader.invalidate(path)
+        workbook.save(path)
+    finally:
+        workbook.close()
+
+
+def _coalesce(ops):
+    """合并操作，返回 {工作表名称: {(行号, 列号): 值}}，同一单元格只保留最后一次"""
+    sheet_cells = {}
+    for op in ops:
+        cells = sheet_cells.setdefault(op['sheet'], {})
+        for row, col, value in op['cells']:
+            cells[(row, col)] = value
+    return sheet_cells
+
+
+class FileLock:
+    """
+    进程内可重入、进程间互斥的文件锁
+
+    以非阻塞方式轮询 flock，等待期间 sleep（协程工作模型下让出），不会阻塞整个进程。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._fd = None
+
+    def __enter__(self):
+        self._lock.acquire()
+        try:
+            if self._depth == 0 and fcntl is not None:
+                self._fd = self._acquire()
+        except BaseException:
+            self._lock.release()
+            raise
+        self._depth += 1
+        return self
+
+    def _acquire(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            while True:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    return fd
+                except BlockingIOError:
+                    time.sleep(LOCK_POLL_INTERVAL)
+        except BaseException:
+            os.close(fd)
+            raise
+
+    def __exit__(self, *exc):
+        self._depth -= 1
+        if self._depth == 0 and self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+        self._lock.release()
+
+
+def _read_ops(path):
+    """读取日志文件中的操作，文件不存在时返回空列表"""
+    ops = []
+    try:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    ops.append(json.loads(line))
+                except ValueError:
+                    # 写入中断留下的不完整行
+                    continue
+    except FileNotFoundError:
+        pass
+    return ops
+
+
+def _file_signature(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+class FileJournal:
+    """单个文件的编辑日志（日志文件由全部工作进程共享）"""
+
+    def __init__(self, path):
+        self.path = path
+        digest = hashlib.sha1(path.encode('utf-8')).hexdigest()
+        base = os.path.join(Config.EXCEL_JOURNAL_DIR, digest)
+        self.log_path = f'{base}.log'
+        self.flushing_path = f'{base}.flushing'
+        self.seq_path = f'{base}.seq'
+        self.lock = FileLock(f'{base}.lock')  # 追加日志、切换日志文件
+        self.write_lock = FileLock(f'{base}.write.lock')  # 写入 xlsx，同一文件同时只有一次写入
+        self.first_pending_at = None  # 本进程追加的编辑等待写入的起始时间
+        self.last_append_at = None
+        self.needs_flush = False  # 有遗留的日志需要写入（启动恢复、上次写入失败）
+        self._ops = []  # 日志文件内容的缓存（.flushing 在前）
+        self._signature = None
+
+    def due_at(self):
+        if self.needs_flush:
+            return 0  # 立即写入
+        if self.first_pending_at is None:
+            return None
+        return min(self.last_append_at + Config.EXCEL_JOURNAL_FLUSH_DELAY,
+                   self.first_pending_at + Config.EXCEL_JOURNAL_MAX_DELAY)
+
+    def next_seq(self):
+        """分配操作序号（调用方持有 self.lock）"""
+        try:
+            with open(self.seq_path, encoding='ascii') as f:
+                seq = int(f.read() or 0) + 1
+        except (FileNotFoundError, ValueError):
+            seq = max((op['seq'] for op in self._read_locked()), default=0) + 1
+        with open(self.seq_path, 'w', encoding='ascii') as f:
+            f.write(str(seq))
+        return seq
+
+    def pending_ops(self):
+        """尚未写入 xlsx 的全部操作（包括其他进程追加的），日志文件变化后重新读取"""
+        signature = (_file_signature(self.flushing_path), _file_signature(self.log_path))
+        if signature == self._signature:
+            return self._ops
+        if signature == (None, None):
+            self._ops, self._signature = [], signature
+            return self._ops
+        with self.lock:
+            return self._read_locked()
+
+    def _read_locked(self):
+        signature = (_file_signature(self.flushing_path), _file_signature(self.log_path))
+        if signature != self._signature:
+            self._ops = _read_ops(self.flushing_path) + _read_ops(self.log_path)
+            self._signature = signature
+        return self._ops
+
+
+class ExcelJournal:
+    """Excel 编辑日志管理器"""
+
+    def __init__(self):
+        self._journals = {}  # path -> FileJournal
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._worker = None
+        self._retry_at = {}  # path -> 写入失败后的重试时间
+        self._stats = {'appends': 0, 'cells': 0, 'flushes': 0, 'patched': 0, 'fallbacks': 0,
+                       'failures': 0, 'last_flush_ms': None}
+
+    def append(self, path, sheet_identifier, cells):
+        """
+        追加单元格编辑，日志落盘后返回
+
+        Args:
+            path: xlsx 文件绝对路径
+            sheet_identifier: 工作表名称或索引
+            cells: [{'row', 'col', 'value'}]，0-based
+
+        Returns:
+            int: 操作序号
+
+        Raises:
+            ValueError: 工作表不存在、单元格位置或值无效
+        """
+        path = os.path.abspath(path)
+        sheet_name = self.resolve_sheet(path, sheet_identifier)
+        normalized = []
+        for cell in cells:
+            try:
+                row = int(cell.get('row', 0))
+                col = int(cell.get('col', 0))
+            except (TypeError, ValueError):
+                raise ValueError('单元格行列号必须是整数')
+            if row < 0 or col < 0:
+                raise ValueError('单元格行列号不能为负数')
+            value = cell.get('value')
+            if value is not None and not isinstance(value, (str, int, float, bool)):
+                value = str(value)
+            if isinstance(value, str) and ILLEGAL_CHARACTERS_RE.search(value):
+                raise ValueError(f'单元格 {get_column_letter(col + 1)}{row + 1} 包含非法字符')
+            normalized.append([row, col, value])
+        if not normalized:
+            raise ValueError('没有需要保存的单元格')
+
+        journal = self._get_journal(path)
+        os.makedirs(Config.EXCEL_JOURNAL_DIR, exist_ok=True)
+        with journal.lock:
+            seq = journal.next_seq()
+            op = {'path': path, 'seq': seq, 'sheet': sheet_name, 'cells': normalized}
+            with open(journal.log_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(op, ensure_ascii=False) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            now = time.monotonic()
+            journal.last_append_at = now
+            if journal.first_pending_at is None:
+                journal.first_pending_at = now
+
+        with self._cond:
+            self._stats['appends'] += 1
+            self._stats['cells'] += len(normalized)
+            self._ensure_worker()
+            self._cond.notify()
+        return seq
+
+    def flush(self, path):
+        """
+        立即把文件的全部待写入编辑写入 xlsx（完整保存、增删改工作表之前调用）
+
+        写入日志中所有进程追加的编辑，不只是本进程的。
+
+        Returns:
+            int: 写入的操作数
+        """
+        journal = self._get_journal(os.path.abspath(path))
+        if not os.path.exists(journal.log_path) and not os.path.exists(journal.flushing_path):
+            # 没有待写入的编辑（或已由其他进程写入）
+            journal.needs_flush = False
+            return 0
+        written = 0
+        with journal.write_lock:
+            # 先处理上次失败遗留的操作，再处理新追加的操作
+            for _ in range(2):
+                with journal.lock:
+                    if not os.path.exists(journal.flushing_path):
+                        if not os.path.exists(journal.log_path):
+                            break
+                        os.replace(journal.log_path, journal.flushing_path)
+                        journal.first_pending_at = None
+                    journal.needs_flush = True
+                # 持有写入锁期间 .flushing 不会变化，新的编辑追加到 .log
+                ops = _read_ops(journal.flushing_path)
+                if ops:
+                    self._write(journal.path, ops)
+                os.remove(journal.flushing_path)
+                written += len(ops)
+            journal.needs_flush = False
+        with self._lock:
+            self._retry_at.pop(journal.path, None)
+        return written
+
+    @contextmanager
+    def exclusive(self, path):
+        """
+        完整保存工作簿期间持有的写入锁（跨进程），进入时先写入日志中的编辑
+
+        用法：
+            with excel_journal.exclusive(full_path):
+                workbook = openpyxl.load_workbook(full_path)
+                ...
+                workbook.save(full_path)
+        """
+        journal = self._get_journal(os.path.abspath(path))
+        with journal.write_lock:
+            self.flush(path)
+            yield
+
+    def flush_all(self):
+        """
+        写入全部文件的待写入编辑（服务退出前调用）
+
+        写入失败的编辑保留在日志中，下次启动时由 recover() 重放。
+
+        Returns:
+            int: 写入的操作数
+        """
+        with self._lock:
+            paths = list(self._journals)
+        written = 0
+        for path in paths:
+            try:
+                written += self.flush(path)
+            except Exception as e:
+                print(f'[Excel日志] 写入 {path} 失败，下次启动时重试: {str(e)}')
+        return written
+
+    def pending_cells(self, path, sheet_name):
+        """
+        尚未写入文件的编辑
+
+        Returns:
+            dict: {(行号, 列号): 值}，0-based；没有待写入编辑时返回 None
+        """
+        ops = self._pending_ops(path)
+        if not ops:
+            return None
+        return _coalesce(ops).get(sheet_name) or None
+
+    def apply_to_page(self, path, page, offset, limit, max_cols):
+        """把尚未写入文件的编辑叠加到 excel_reader.read_page 的结果上"""
+        cells = self.pending_cells(path, page['sheet_name'])
+        if not cells:
+            return page
+        total_rows = max(page['total_rows'] or 0, max(row for row, _ in cells) + 1)
+        total_cols = max(page['total_cols'] or 0, max(col for _, col in cells) + 1)
+        width = min(total_cols, max_cols)
+        end = min(offset + limit, total_rows)
+        rows = [list(row) + [None] * (width - len(row)) for row in page['rows']]
+        rows.extend([None] * width for _ in range(max(end - offset - len(rows), 0)))
+        for (row, col), value in cells.items():
+            if offset <= row < end and col < width:
+                rows[row - offset][col] = value
+        return dict(page, rows=rows, total_rows=total_rows, total_cols=total_cols)
+
+    def pending_extent(self, path):
+        """待写入编辑覆盖的范围，返回 {工作表名称: (行数, 列数)}"""
+        sheet_cells = _coalesce(self._pending_ops(path))
+        return {
+            name: (max(row for row, _ in cells) + 1, max(col for _, col in cells) + 1)
+            for name, cells in sheet_cells.items() if cells
+        }
+
+    def recover(self):
+        """
+        写入上次退出时遗留的日志（启动时调用）
+
+        日志由全部工作进程共享，写入时持有跨进程的锁，仍在运行的其他进程追加的编辑也会按顺序写入。
+        """
+        if not os.path.isdir(Config.EXCEL_JOURNAL_DIR):
+            return 0
+        recovered = 0
+        for entry in sorted(os.scandir(Config.EXCEL_JOURNAL_DIR), key=lambda e: e.name):
+            if not entry.name.endswith(('.log', '.flushing')):
+                continue
+            ops = _read_ops(entry.path)
+            if not ops:
+                continue
+            path = ops[0]['path']
+            journal = self._get_journal(path)
+            if not os.path.exists(path):
+                print(f'[Excel日志] 源文件 {path} 已不存在，丢弃 {len(ops)} 条编辑')
+                with journal.lock:
+                    if os.path.exists(entry.path):
+                        os.remove(entry.path)
+                continue
+            journal.needs_flush = True
+            recovered += len(ops)
+
+        if recovered:
+            print(f'[Excel日志] 恢复 {recovered} 条未写入的编辑')
+            with self._cond:
+                self._ensure_worker()
+                self._cond.notify()
+        return recovered
+
+    def get_stats(self):
+        with self._lock:
+            journals = list(self._journals.values())
+            stats = dict(self._stats)
+        pending = [len(journal.pending_ops()) for journal in journals]
+        stats['pending_files'] = sum(1 for count in pending if count)
+        stats['pending_ops'] = sum(pending)
+        return stats
+
+    def resolve_sheet(self, path, sheet_identifier):
+        """
+        把工作表名称或索引解析为名称
+
+        Raises:
+            ValueError: 不是 xlsx 文件、工作表不存在或索引超出范围
+        """
+        if os.path.splitext(path)[1].lower() != '.xlsx':
+            raise ValueError('仅支持 .xlsx 文件')
+        sheet_names = [sheet['name'] for sheet in excel_reader.get_info(path)]
+        sheet_identifier = str(sheet_identifier)
+        if sheet_identifier.isdigit():
+            sheet_idx = int(sheet_identifier)
+            if sheet_idx < 0 or sheet_idx >= len(sheet_names):
+                raise ValueError('工作表索引超出范围')
+            return sheet_names[sheet_idx]
+        if sheet_identifier not in sheet_names:
+            raise ValueError(f'工作表 "{sheet_identifier}" 不存在')
+        return sheet_identifier
+
+    def _pending_ops(self, path):
+        """尚未写入文件的编辑（日志可能来自其他进程，本进程没有追加过也要读取）"""
+        return self._get_journal(os.path.abspath(path)).pending_ops()
+
+    def _get_journal(self, path):
+        with self._lock:
+            journal = self._journals.get(path)
+            if journal is None:
+                journal = self._journals[path] = FileJournal(path)
+            return journal
+
+    def _write(self, path, ops):
+        """把一批操作写入 xlsx"""
+        sheet_cells = _coalesce(ops)
+        started = time.perf_counter()
+        try:
+            patch_workbook(path, sheet_cells)
+            counter = 'patched'
+        except UnsupportedSheet as e:
+            print(f'[Excel日志] {path} 无法就地修改（{str(e)}），使用完整保存')
+            _save_with_openpyxl(path, sheet_cells)
+            counter = 'fallbacks'
+        with self._lock:
+            self._stats['flushes'] += 1
+            self._stats[counter] += 1
+            self._stats['last_flush_ms'] = round((time.perf_counter() - started) * 1000, 2)
+
+    def _ensure_worker(self):
+        """启动后台写入线程（调用方持有 self._lock）"""
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._worker_loop, name='excel-journal', daemon=True)
+            self._worker.start()
+
+    def _worker_loop(self):
+        while True:
+            with self._cond:
+                now = time.monotonic()
+                due_path, due_at = None, None
+                for path, journal in self._journals.items():
+                    at = journal.due_at()
+                    if at is None:
+                        continue
+                    at = max(at, self._retry_at.get(path, 0))
+                    if due_at is None or at < due_at:
+                        due_path, due_at = path, at
+                if due_path is None:
+                    self._cond.wait()
+                    continue
+                if due_at > now:
+                    self._cond.wait(due_at - now)
+                    continue
+
+            try:
+                self.flush(due_path)
+            except Exception as e:
+                with self._lock:
+                    self._stats['failures'] += 1
+                    self._retry_at[due_path] = time.monotonic() + Config.EXCEL_JOURNAL_MAX_DELAY
+                print(f'[Excel日志] {due_path} 写入失败，稍后重试: {str(e)}')
+
+
+# 创建全局编辑日志实例
+excel_journal = ExcelJournal()
@@ -0,0 +1,399 @@
+"""
+Excel 工作表分页读取
+
+只读模式下 openpyxl 每次访问单元格都会从头解析工作表 XML，逐个 cell() 读取的分页越往后越慢。
+这里按整行读取（iter_rows(values_only=True)），并缓存已打开的工作簿与列式快照：
+
+- 工作簿第一次被访问时在后台生成列式快照（见 services.excel_snapshot），之后的分页读取、
+  工作表信息直接读取快照，任意一页的开销与第 1 页相同，进程重启后快照仍然有效
+- 快照生成完成之前直接用 iter_rows(min_row, max_row) 读取，只解析到所需的最后一行
+- 已打开的工作簿按 (路径, 修改时间, 大小) 缓存，文件变化后自动失效，按 LRU 淘汰，
+  总内存受 EXCEL_CACHE_MAX_BYTES 限制；快照生成后对应的工作簿即被释放
+- 只读模式不提供合并单元格信息，单独扫描工作表 XML 中的 <mergeCell> 获取
+
+仅支持 .xlsx，.xls 文件仍由接口使用 xlrd 读取。
+"""
+import os
+import sys
+import threading
+from collections import OrderedDict
+import openpyxl
+from config import Config
+from services.excel_snapshot import open_snapshot, write_snapshot, prune_snapshots, scan_sheet_layout
+
+
+class SheetState:
+    """直接读取时使用的工作表信息"""
+
+    def __init__(self, sheet):
+        self.sheet = sheet
+        self.name = sheet.title
+        self.max_row = sheet.max_row or 0
+        self.max_column = sheet.max_column or 0
+        self.merge_cells = None
+
+
+class CachedWorkbook:
+    """缓存中的只读工作簿"""
+
+    def __init__(self, key, path):
+        self.key = key
+        self.path = path
+        self.workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+        self.sheetnames = list(self.workbook.sheetnames)
+        self.sheets = {}
+        self.readers = 0
+        self.evicted = False
+        self.lock = threading.Lock()
+        # 共享字符串表常驻内存，计入缓存占用
+        shared_strings = getattr(self.workbook, 'shared_strings', None) or []
+        self.bytes = sum(sys.getsizeof(s) for s in shared_strings)
+
+    def get_sheet(self, sheet_identifier):
+        """
+        按名称或索引获取工作表
+
+        Raises:
+            ValueError: 工作表不存在或索引超出范围
+        """
+        sheet_identifier = str(sheet_identifier)
+        if sheet_identifier.isdigit():
+            sheet_idx = int(sheet_identifier)
+            if sheet_idx < 0 or sheet_idx >= len(self.sheetnames):
+                raise ValueError('工作表索引超出范围')
+            name = self.sheetnames[sheet_idx]
+        else:
+            if sheet_identifier not in self.sheetnames:
+                raise ValueError(f'工作表 "{sheet_identifier}" 不存在')
+            name = sheet_identifier
+
+        with self.lock:
+            state = self.sheets.get(name)
+            if state is None:
+                state = SheetState(self.workbook[name])
+                self.sheets[name] = state
+        return state
+
+    def close(self):
+        try:
+            self.workbook.close()
+        except Exception:
+            pass
+
+
+class ExcelReader:
+    """Excel 工作表分页读取器"""
+
+    def __init__(self):
+        self._entries = OrderedDict()  # key -> CachedWorkbook
+        self._paths = {}  # path -> key
+        self._snapshots = OrderedDict()  # path -> WorkbookSnapshot
+        self._building = set()  # 正在生成快照的 key
+        self._failed = set()  # 生成快照失败的 key，不再重试
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'snapshot_builds': 0,
+                       'snapshot_failures': 0, 'snapshot_reads': 0, 'direct_reads': 0}
+
+    def get_snapshot(self, path, build=True):
+        """
+        获取文件当前版本的列式快照
+
+        Args:
+            path: 文件绝对路径
+            build: 快照不存在时是否在后台生成
+
+        Returns:
+            WorkbookSnapshot: 快照尚未生成时返回 None
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        key = (path, stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            snapshot = self._snapshots.get(path)
+            if snapshot and snapshot.key == key:
+                self._snapshots.move_to_end(path)
+                return snapshot
+
+        snapshot = open_snapshot(path, stat)
+        if snapshot:
+            with self._lock:
+                self._snapshots[path] = snapshot
+                while len(self._snapshots) > Config.EXCEL_CACHE_MAX_WORKBOOKS:
+                    # 映射的数据文件随快照对象回收时释放
+                    self._snapshots.popitem(last=False)
+            return snapshot
+
+        if build:
+            self._start_snapshot(path, key)
+        return None
+
+    def get_info(self, path):
+        """
+        获取工作簿的工作表列表
+
+        Returns:
+            list: [{'name', 'index', 'rows', 'cols'}]，已生成快照时使用扫描得到的真实行列数
+        """
+        snapshot = self.get_snapshot(path, build=False)
+        if snapshot:
+            return [{
+                'name': sheet.name,
+                'index': sheet.index,
+                'rows': sheet.rows,
+                'cols': sheet.cols
+            } for sheet in snapshot.sheets]
+
+        entry = self._acquire(path)
+        try:
+            sheets = []
+            for idx, name in enumerate(entry.sheetnames):
+                state = entry.get_sheet(name)
+                sheets.append({
+                    'name': name,
+                    'index': idx,
+                    'rows': state.max_row,
+                    'cols': state.max_column
+                })
+            return sheets
+        finally:
+            self._release(entry)
+            self._start_snapshot(entry.path, entry.key)
+
+    def read_page(self, path, sheet_identifier, offset, limit, max_cols):
+        """
+        读取工作表的一页数据
+
+        Args:
+            path: 文件绝对路径
+            sheet_identifier: 工作表名称或索引
+            offset: 起始行号（从0开始）
+            limit: 行数
+            max_cols: 每行最多返回的列数
+
+        Returns:
+            dict: sheet_name, total_rows, total_cols, rows, merge_cells, snapshot（是否读取自快照）
+
+        Raises:
+            ValueError: 工作表不存在或索引超出范围
+        """
+        snapshot = self.get_snapshot(path, build=False)
+        if snapshot:
+            sheet = snapshot.get_sheet(sheet_identifier)
+            self._count('snapshot_reads')
+            return {
+                'sheet_name': sheet.name,
+                'total_rows': sheet.rows,
+                'total_cols': sheet.cols,
+                'rows': sheet.read_rows(offset, limit, max_cols),
+                'merge_cells': sheet.merges,
+                'snapshot': True
+            }
+
+        entry = self._acquire(path)
+        try:
+            state = entry.get_sheet(sheet_identifier)
+            if state.merge_cells is None:
+                layout = scan_sheet_layout(path, getattr(state.sheet, '_worksheet_path', None))
+                state.merge_cells = layout['merges']
+            rows = self._read_direct(state, offset, limit, max_cols)
+            self._count('direct_reads')
+
+            # 没有 dimension 信息的工作表按本页实际列数返回
+            width = min(state.max_column or max((len(row) for row in rows), default=0), max_cols)
+            return {
+                'sheet_name': state.name,
+                'total_rows': state.max_row,
+                'total_cols': state.max_column,
+                'rows': [self._fit(row, width) for row in rows],
+                'merge_cells': state.merge_cells,
+                'snapshot': False
+            }
+        finally:
+            self._release(entry)
+            # 先返回本页再生成快照，避免后台转换与本次读取争用解释器
+            self._start_snapshot(entry.path, entry.key)
+
+    def invalidate(self, path):
+        """移除文件的缓存（文件即将被改写时调用）"""
+        path = os.path.abspath(path)
+        with self._lock:
+            self._snapshots.pop(path, None)
+            key = self._paths.pop(path, None)
+            entry = self._entries.pop(key, None) if key else None
+        if entry:
+            self._evict(entry)
+
+    def clear(self):
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+            self._paths.clear()
+            self._snapshots.clear()
+        for entry in entries:
+            self._evict(entry)
+
+    def get_metrics(self):
+        """缓存命中、淘汰与快照统计"""
+        with self._lock:
+            entries = list(self._entries.values())
+            stats = dict(self._stats)
+            building = len(self._building)
+            snapshots = len(self._snapshots)
+        lookups = stats['hits'] + stats['misses']
+        return dict(
+            stats,
+            hit_rate=round(stats['hits'] / lookups, 4) if lookups else None,
+            workbooks=len(entries),
+            cached_bytes=sum(entry.bytes for entry in entries),
+            max_bytes=Config.EXCEL_CACHE_MAX_BYTES,
+            open_snapshots=snapshots,
+            building_snapshots=building
+        )
+
+    def _acquire(self, path):
+        """获取缓存的工作簿，文件变化或未缓存时重新打开"""
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        key = (path, stat.st_mtime_ns, stat.st_size)
+        stale = None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                self._entries.move_to_end(key)
+                self._stats['hits'] += 1
+                with entry.lock:
+                    entry.readers += 1
+                return entry
+            self._stats['misses'] += 1
+            old_key = self._paths.pop(path, None)
+            if old_key:
+                stale = self._entries.pop(old_key, None)
+        if stale:
+            self._evict(stale)
+
+        # 打开工作簿在锁外进行，并发打开同一文件时以先放入缓存的为准
+        opened = CachedWorkbook(key, path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = opened
+                opened = None
+                self._entries[key] = entry
+                self._paths[path] = key
+            with entry.lock:
+                entry.readers += 1
+        if opened:
+            opened.close()
+        self._enforce_limits(keep=entry)
+        return entry
+
+    def _release(self, entry):
+        with entry.lock:
+            entry.readers -= 1
+            close = entry.evicted and entry.readers == 0
+        if close:
+            entry.close()
+
+    def _evict(self, entry):
+        """淘汰工作簿，仍有读取方时由最后一个读取方关闭"""
+        with entry.lock:
+            entry.evicted = True
+            close = entry.readers == 0
+        if close:
+            entry.close()
+
+    def _drop_workbook(self, key):
+        """快照生成后释放对应的工作簿"""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry and self._paths.get(entry.path) == key:
+                del self._paths[entry.path]
+        if entry:
+            self._evict(entry)
+
+    def _enforce_limits(self, keep=None):
+        """按 LRU 淘汰超出数量或内存上限的工作簿"""
+        evicted = []
+        with self._lock:
+            total = sum(entry.bytes for entry in self._entries.values())
+            for key in list(self._entries):
+                if (len(self._entries) <= Config.EXCEL_CACHE_MAX_WORKBOOKS
+                        and total <= Config.EXCEL_CACHE_MAX_BYTES):
+                    break
+                entry = self._entries[key]
+                if entry is keep:
+                    continue
+                del self._entries[key]
+                if self._paths.get(entry.path) == key:
+                    del self._paths[entry.path]
+                total -= entry.bytes
+                evicted.append(entry)
+            self._stats['evictions'] += len(evicted)
+        for entry in evicted:
+            self._evict(entry)
+
+    def _start_snapshot(self, path, key):
+        with self._lock:
+            if key in self._building or key in self._failed:
+                return
+            self._building.add(key)
+        threading.Thread(target=self._build_snapshot, args=(path, key), daemon=True).start()
+
+    def _build_snapshot(self, path, key):
+        """在后台为工作簿生成列式快照"""
+        try:
+            # 排队期间其他请求已生成同一版本的快照
+            if open_snapshot(path):
+                return
+            entry = self._acquire(path)
+            try:
+                # 文件在排队期间又被修改，由下一次访问重新触发
+                if entry.key != key:
+                    return
+                directory = write_snapshot(path, key[1], key[2], entry.workbook)
+            finally:
+                self._release(entry)
+            self._count('snapshot_builds')
+            self._drop_workbook(key)
+            prune_snapshots(keep=directory)
+        except Exception as e:
+            with self._lock:
+                self._failed.add(key)
+                self._stats['snapshot_failures'] += 1
+            print(f'[Excel读取] {path} 生成快照失败: {str(e)}')
+        finally:
+            with self._lock:
+                self._building.discard(key)
+
+    @staticmethod
+    def _read_direct(state, offset, limit, max_cols):
+        end = offset + limit
+        if state.max_row:
+            end = min(end, state.max_row)
+        if end <= offset:
+            return []
+        rows = list(state.sheet.iter_rows(
+            min_row=offset + 1,  # openpyxl 使用 1-based 索引
+            max_row=end,
+            max_col=max_cols,
+            values_only=True
+        ))
+        # dimension 范围内缺失的末尾行按空行返回
+        if state.max_row:
+            rows.extend([()] * (end - offset - len(rows)))
+        return rows
+
+    @staticmethod
+    def _fit(row, width):
+        """截断或补齐到指定列数"""
+        if len(row) >= width:
+            return list(row[:width])
+        return list(row) + [None] * (width - len(row))
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+
+# 创建全局 Excel 读取器实例
+excel_reader = ExcelReader()
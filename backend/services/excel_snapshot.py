@@ -0,0 +1,494 @@
+"""
+Excel 工作表列式快照
+
+xlsx 每次查看都要重新解压 zip 并解析 XML。工作簿第一次被访问后，在后台把每个工作表转换为
+紧凑的列式快照文件，之后的分页读取、工作表信息和 Luckysheet 转换都直接读取快照（mmap），
+不再打开 xlsx。
+
+快照目录按 (文件路径, 修改时间, 大小) 命名，源文件变化后旧快照自然失效，由 prune_snapshots 清理：
+
+    EXCEL_SNAPSHOT_DIR/<路径哈希>-<mtime_ns>-<size>/
+        meta.json      源文件路径、工作表列表、行列数、合并单元格、列宽行高、各列数据段位置
+        sheet_<i>.col  第 i 个工作表的列数据
+
+每列由以下数据段组成（8 字节对齐，本机字节序），全为空的列不写入任何数据段：
+    kinds    每行 1 字节的值类型（KIND_*）
+    values   每行 8 字节：int64 / float64 / 日期时间换算的整数（列中有非文本值时存在）
+    offsets  (行数 + 1) 个 uint64，第 i 行文本在 blob 中的起止位置（列中有文本时存在）
+    blob     UTF-8 文本
+"""
+import hashlib
+import json
+import mmap
+import os
+import re
+import shutil
+import struct
+import sys
+import threading
+import uuid
+import zipfile
+from array import array
+from datetime import datetime, date, time, timedelta
+from openpyxl.utils.cell import range_boundaries
+from openpyxl.worksheet._read_only import ReadOnlyWorksheet
+from config import Config
+
+
+FORMAT_VERSION = 2  # 2: 行列数按实际有值的范围计算
+
+KIND_NONE = 0
+KIND_INT = 1
+KIND_FLOAT = 2
+KIND_STR = 3
+KIND_BOOL = 4
+KIND_DATETIME = 5  # 自 1970-01-01 起的微秒数
+KIND_DATE = 6  # date.toordinal()
+KIND_TIME = 7  # 当天的微秒数
+KIND_TIMEDELTA = 8  # 微秒数
+KIND_BIGINT = 9  # 超出 int64 的整数，以文本保存
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+_INT64 = struct.Struct('=q')
+_FLOAT64 = struct.Struct('=d')
+_ZERO_VALUE = bytes(8)
+_INT64_MIN, _INT64_MAX = -(1 << 63), (1 << 63) - 1
+
+_MERGE_CELL_PATTERN = re.compile(rb'<(?:\w+:)?mergeCell\b[^>]*?\bref="([A-Za-z0-9:$]+)"')
+_COL_PATTERN = re.compile(rb'<(?:\w+:)?col\b([^>]*)>')
+_ROW_HEIGHT_PATTERN = re.compile(rb'<(?:\w+:)?row\b([^>]*\bht="[^"]*"[^>]*)>')
+_ATTR_PATTERN = re.compile(rb'\b(\w+)="([^"]*)"')
+_SCAN_CHUNK_SIZE = 1024 * 1024
+_SCAN_OVERLAP = 4096
+
+
+def snapshot_dir_name(path, mtime_ns, size):
+    """快照目录名"""
+    digest = hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest()
+    return f'{digest}-{mtime_ns}-{size}'
+
+
+def scan_sheet_layout(path, part_name):
+    """
+    扫描工作表 XML 中的合并单元格、列宽和行高
+
+    只读模式的 openpyxl 不提供这些信息，这里直接按字节匹配相应标签，不构建 XML 树。
+
+    Returns:
+        dict: merges（0-based {r, c, rs, cs} 列表）、col_widths（{起始列号: 宽度}）、row_heights（{行号: 高度}）
+    """
+    layout = {'merges': [], 'col_widths': {}, 'row_heights': {}}
+    if not part_name:
+        return layout
+    with zipfile.ZipFile(path) as archive, archive.open(part_name.lstrip('/')) as src:
+        tail = b''
+        while True:
+            chunk = src.read(_SCAN_CHUNK_SIZE)
+            if not chunk:
+                break
+            data = tail + chunk
+            last_end = 0
+            # 先用子串查找跳过不含相应标签的数据块，正则只在必要时执行
+            merge_matches = _MERGE_CELL_PATTERN.finditer(data) if b'mergeCell' in data else ()
+            col_matches = _COL_PATTERN.finditer(data) if b'col' in data else ()
+            row_matches = _ROW_HEIGHT_PATTERN.finditer(data) if b' ht="' in data else ()
+            for match in merge_matches:
+                min_col, min_row, max_col, max_row = range_boundaries(match.group(1).decode('ascii'))
+                layout['merges'].append({
+                    'r': min_row - 1,
+                    'c': min_col - 1,
+                    'rs': max_row - min_row + 1,
+                    'cs': max_col - min_col + 1
+                })
+                last_end = max(last_end, match.end())
+            for match in col_matches:
+                attrs = dict(_ATTR_PATTERN.findall(match.group(1)))
+                if attrs.get(b'min') and attrs.get(b'width'):
+                    layout['col_widths'][int(attrs[b'min'])] = float(attrs[b'width'])
+                last_end = max(last_end, match.end())
+            for match in row_matches:
+                attrs = dict(_ATTR_PATTERN.findall(match.group(1)))
+                if attrs.get(b'r') and attrs.get(b'ht'):
+                    layout['row_heights'][int(attrs[b'r'])] = float(attrs[b'ht'])
+                last_end = max(last_end, match.end())
+            # 保留末尾可能被截断的标签，与下一块拼接后再匹配
+            tail = data[max(last_end, len(data) - _SCAN_OVERLAP):]
+    return layout
+
+
+def iter_sheet_rows(sheet):
+    """
+    逐行读取只读工作表中实际存在的单元格值
+
+    工作表 XML 中的 dimension 可能因为一个带格式的空单元格（如 XFD1048576）被撑大，
+    iter_rows 会按它把每一行补齐到最大列。这里在独立的工作表对象上忽略 dimension，
+    每行只返回到该行最后一个单元格，缺失的行返回空元组；不修改传入的工作表，
+    共享同一工作簿的其他读取方仍使用原有的行列数。
+    """
+    if isinstance(sheet, ReadOnlyWorksheet):
+        sheet = ReadOnlyWorksheet(sheet.parent, sheet.title, sheet._worksheet_path, sheet._shared_strings)
+        sheet.reset_dimensions()
+    return sheet.iter_rows(values_only=True)
+
+
+class _ColumnBuilder:
+    """按行追加单个列的数据"""
+
+    def __init__(self):
+        self.kinds = bytearray()
+        self.values = bytearray()
+        self.offsets = array('Q', [0])
+        self.blob = bytearray()
+        self.has_values = False
+        self.has_strings = False
+
+    def pad(self, rows):
+        """补齐到 rows 行（缺失的行为空值）"""
+        missing = rows - len(self.kinds)
+        if missing > 0:
+            self.kinds.extend(bytes(missing))
+            self.values.extend(bytes(8 * missing))
+            self.offsets.extend([self.offsets[-1]] * missing)
+
+    def set(self, row, value):
+        self.pad(row)
+        text = None
+        number = _ZERO_VALUE
+        if isinstance(value, str):
+            kind, text = KIND_STR, value
+        elif isinstance(value, bool):
+            kind, number = KIND_BOOL, _INT64.pack(int(value))
+        elif isinstance(value, int):
+            if _INT64_MIN <= value <= _INT64_MAX:
+                kind, number = KIND_INT, _INT64.pack(value)
+            else:
+                kind, text = KIND_BIGINT, str(value)
+        elif isinstance(value, float):
+            kind, number = KIND_FLOAT, _FLOAT64.pack(value)
+        elif isinstance(value, datetime) and value.tzinfo is None:
+            kind, number = KIND_DATETIME, _INT64.pack((value - _EPOCH) // _MICROSECOND)
+        elif isinstance(value, date) and not isinstance(value, datetime):
+            kind, number = KIND_DATE, _INT64.pack(value.toordinal())
+        elif isinstance(value, time) and value.tzinfo is None:
+            micros = ((value.hour * 60 + value.minute) * 60 + value.second) * 1000000 + value.microsecond
+            kind, number = KIND_TIME, _INT64.pack(micros)
+        elif isinstance(value, timedelta):
+            kind, number = KIND_TIMEDELTA, _INT64.pack(value // _MICROSECOND)
+        else:
+            kind, text = KIND_STR, str(value)
+
+        self.kinds.append(kind)
+        self.values.extend(number)
+        if text is not None:
+            self.blob.extend(text.encode('utf-8'))
+            self.has_strings = True
+        else:
+            self.has_values = True
+        self.offsets.append(len(self.blob))
+
+
+def _write_segment(f, data):
+    """8 字节对齐写入一个数据段，返回 [偏移, 长度]"""
+    position = f.tell()
+    padding = -position % 8
+    if padding:
+        f.write(bytes(padding))
+        position += padding
+    f.write(data)
+    return [position, len(data)]
+
+
+def _write_sheet(sheet, file_path):
+    """把工作表的所有行写入列式文件，返回 (实际行数, 实际列数, 各列数据段)"""
+    builders = []
+    rows = 0
+    columns = 0
+    for row_idx, row in enumerate(iter_sheet_rows(sheet)):
+        for col, value in enumerate(row):
+            if value is None:
+                continue
+            if col >= len(builders):
+                builders.extend([None] * (col + 1 - len(builders)))
+            builder = builders[col]
+            if builder is None:
+                builder = builders[col] = _ColumnBuilder()
+            builder.set(row_idx, value)
+            rows = row_idx + 1
+            if col >= columns:
+                columns = col + 1
+
+    segments = []
+    with open(file_path, 'wb') as f:
+        for builder in builders[:columns]:
+            if builder is None:
+                segments.append(None)
+                continue
+            builder.pad(rows)
+            column = {'kinds': _write_segment(f, builder.kinds)}
+            if builder.has_values:
+                column['values'] = _write_segment(f, builder.values)
+            if builder.has_strings:
+                column['offsets'] = _write_segment(f, builder.offsets.tobytes())
+                column['blob'] = _write_segment(f, builder.blob)
+            segments.append(column)
+    return rows, columns, segments
+
+
+def write_snapshot(path, mtime_ns, size, workbook):
+    """
+    为工作簿生成列式快照
+
+    先写入临时目录，全部工作表完成后原子重命名，读取方不会看到写了一半的快照。
+
+    Args:
+        path: 源文件绝对路径
+        mtime_ns, size: 打开工作簿时源文件的修改时间与大小
+        workbook: 以 read_only=True, data_only=True 打开的工作簿
+
+    Returns:
+        str: 快照目录
+    """
+    os.makedirs(Config.EXCEL_SNAPSHOT_DIR, exist_ok=True)
+    target = os.path.join(Config.EXCEL_SNAPSHOT_DIR, snapshot_dir_name(path, mtime_ns, size))
+    if os.path.isdir(target):
+        return target
+
+    tmp_dir = f'{target}.tmp-{uuid.uuid4().hex[:8]}'
+    os.makedirs(tmp_dir)
+    try:
+        sheets = []
+        for idx, name in enumerate(workbook.sheetnames):
+            sheet = workbook[name]
+            file_name = f'sheet_{idx}.col'
+            rows, columns, segments = _write_sheet(sheet, os.path.join(tmp_dir, file_name))
+            layout = scan_sheet_layout(path, getattr(sheet, '_worksheet_path', None))
+            sheets.append({
+                'name': name,
+                'index': idx,
+                'rows': rows,
+                'cols': columns,
+                'file': file_name,
+                'columns': segments,
+                'merges': layout['merges'],
+                'col_widths': layout['col_widths'],
+                'row_heights': layout['row_heights']
+            })
+
+        meta = {
+            'format': FORMAT_VERSION,
+            'byteorder': sys.byteorder,
+            'path': path,
+            'mtime_ns': mtime_ns,
+            'size': size,
+            'sheets': sheets
+        }
+        with open(os.path.join(tmp_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+        # 其他进程可能已生成同一快照，此时沿用已有目录
+        if not os.path.isdir(target):
+            os.rename(tmp_dir, target)
+    finally:
+        if os.path.isdir(tmp_dir):
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    return target
+
+
+def open_snapshot(path, stat=None):
+    """
+    打开源文件当前版本的快照
+
+    Returns:
+        WorkbookSnapshot: 快照不存在、格式不兼容或已损坏时返回 None
+    """
+    stat = stat or os.stat(path)
+    directory = os.path.join(Config.EXCEL_SNAPSHOT_DIR,
+                             snapshot_dir_name(path, stat.st_mtime_ns, stat.st_size))
+    meta_path = os.path.join(directory, 'meta.json')
+    if not os.path.exists(meta_path):
+        return None
+    try:
+        with open(meta_path, encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get('format') != FORMAT_VERSION or meta.get('byteorder') != sys.byteorder:
+        return None
+    try:
+        # 记录访问时间，清理时优先删除最久未访问的快照
+        os.utime(directory)
+    except OSError:
+        pass
+    return WorkbookSnapshot(directory, meta)
+
+
+def prune_snapshots(keep=None):
+    """
+    清理快照目录：删除源文件已变化或不存在的快照，总大小超过 EXCEL_SNAPSHOT_MAX_BYTES 时
+    按最久未访问的顺序删除
+
+    Returns:
+        int: 删除的快照数量
+    """
+    root = Config.EXCEL_SNAPSHOT_DIR
+    if not os.path.isdir(root):
+        return 0
+    snapshots = []
+    removed = 0
+    for name in os.listdir(root):
+        directory = os.path.join(root, name)
+        if not os.path.isdir(directory) or '.tmp-' in name:
+            continue
+        try:
+            with open(os.path.join(directory, 'meta.json'), encoding='utf-8') as f:
+                meta = json.load(f)
+            stat = os.stat(meta['path'])
+            current = snapshot_dir_name(meta['path'], stat.st_mtime_ns, stat.st_size) == name
+        except (OSError, ValueError, KeyError):
+            current = False
+        if not current and directory != keep:
+            shutil.rmtree(directory, ignore_errors=True)
+            removed += 1
+            continue
+        size = sum(entry.stat().st_size for entry in os.scandir(directory) if entry.is_file())
+        snapshots.append((os.path.getmtime(directory), size, directory))
+
+    total = sum(size for _, size, _ in snapshots)
+    for _, size, directory in sorted(snapshots):
+        if total <= Config.EXCEL_SNAPSHOT_MAX_BYTES:
+            break
+        if directory == keep:
+            continue
+        shutil.rmtree(directory, ignore_errors=True)
+        total -= size
+        removed += 1
+    return removed
+
+
+class SheetSnapshot:
+    """单个工作表的快照，数据文件在首次读取时映射到内存"""
+
+    def __init__(self, directory, meta):
+        self.name = meta['name']
+        self.index = meta['index']
+        self.rows = meta['rows']
+        self.cols = meta['cols']
+        self.merges = meta['merges']
+        # JSON 的键是字符串
+        self.col_widths = {int(k): v for k, v in meta['col_widths'].items()}
+        self.row_heights = {int(k): v for k, v in meta['row_heights'].items()}
+        self._columns = meta['columns']
+        self._file = os.path.join(directory, meta['file'])
+        self._data = None
+        self._lock = threading.Lock()
+
+    def read_rows(self, offset, limit, max_cols):
+        """
+        读取 [offset, offset + limit) 行的前 max_cols 列
+
+        Returns:
+            list: 行列表，每行固定 min(cols, max_cols) 个值
+        """
+        end = min(offset + limit, self.rows)
+        width = min(self.cols, max_cols)
+        if end <= offset:
+            return []
+        rows = [[None] * width for _ in range(end - offset)]
+        for col in range(width):
+            values = self.read_column(col, offset, end)
+            if values is None:
+                continue
+            for i, value in enumerate(values):
+                if value is not None:
+                    rows[i][col] = value
+        return rows
+
+    def read_column(self, col, start=0, end=None):
+        """
+        读取单列 [start, end) 行的值
+
+        Returns:
+            list: 值列表；整列为空时返回 None
+        """
+        column = self._columns[col] if col < len(self._columns) else None
+        end = self.rows if end is None else end
+        if not column or end <= start:
+            return None
+        data = self._map()
+        count = end - start
+
+        kinds_offset = column['kinds'][0]
+        kinds = data[kinds_offset + start:kinds_offset + end]
+        ints = floats = offsets = None
+        if 'values' in column:
+            position = column['values'][0] + 8 * start
+            ints = struct.unpack_from(f'={count}q', data, position)
+            floats = struct.unpack_from(f'={count}d', data, position)
+        if 'offsets' in column:
+            offsets = struct.unpack_from(f'={count + 1}Q', data, column['offsets'][0] + 8 * start)
+            blob_offset = column['blob'][0]
+
+        values = []
+        for i, kind in enumerate(kinds):
+            if kind == KIND_NONE:
+                values.append(None)
+            elif kind == KIND_INT:
+                values.append(ints[i])
+            elif kind == KIND_FLOAT:
+                values.append(floats[i])
+            elif kind == KIND_STR or kind == KIND_BIGINT:
+                text = data[blob_offset + offsets[i]:blob_offset + offsets[i + 1]].decode('utf-8')
+                values.append(int(text) if kind == KIND_BIGINT else text)
+            elif kind == KIND_BOOL:
+                values.append(bool(ints[i]))
+            elif kind == KIND_DATETIME:
+                values.append(_EPOCH + timedelta(microseconds=ints[i]))
+            elif kind == KIND_DATE:
+                values.append(date.fromordinal(ints[i]))
+            elif kind == KIND_TIME:
+                values.append((datetime.min + timedelta(microseconds=ints[i])).time())
+            elif kind == KIND_TIMEDELTA:
+                values.append(timedelta(microseconds=ints[i]))
+            else:
+                values.append(None)
+        return values
+
+    def _map(self):
+        with self._lock:
+            if self._data is None:
+                with open(self._file, 'rb') as f:
+                    # 空文件无法映射（整个工作表为空时不会有任何数据段）
+                    if os.fstat(f.fileno()).st_size:
+                        self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                    else:
+                        self._data = b''
+            return self._data
+
+
+class WorkbookSnapshot:
+    """工作簿快照"""
+
+    def __init__(self, directory, meta):
+        self.directory = directory
+        self.path = meta['path']
+        self.key = (meta['path'], meta['mtime_ns'], meta['size'])
+        self.sheets = [SheetSnapshot(directory, sheet) for sheet in meta['sheets']]
+        self.sheetnames = [sheet.name for sheet in self.sheets]
+
+    def get_sheet(self, sheet_identifier):
+        """
+        按名称或索引获取工作表快照
+
+        Raises:
+            ValueError: 工作表不存在或索引超出范围
+        """
+        sheet_identifier = str(sheet_identifier)
+        if sheet_identifier.isdigit():
+            sheet_idx = int(sheet_identifier)
+            if sheet_idx < 0 or sheet_idx >= len(self.sheets):
+                raise ValueError('工作表索引超出范围')
+            return self.sheets[sheet_idx]
+        if sheet_identifier not in self.sheetnames:
+            raise ValueError(f'工作表 "{sheet_identifier}" 不存在')
+        return self.sheets[self.sheetnames.index(sheet_identifier)]
@@ -0,0 +1,383 @@
+"""
+执行统计汇总
+
+已结束的执行按（脚本, 日期, 状态, 耗时区间）计入 ExecutionRollup，统计接口只读取汇总表，
+不再对 executions 全表做计数与分组。
+
+- 执行结束时由 record() 在提交状态的同一事务中计入汇总
+- 其他途径结束的执行（以及升级前的历史记录）由 backfill() 分批补齐
+- Execution.rolled_up 标记执行是否已计入，认领时以条件 UPDATE 保证每个执行只计入一次
+- 删除执行前由 forget() 在同一事务中扣除已计入的部分（删除脚本时由 forget_script() 删除其汇总行），
+  汇总与 executions 表中现存的记录保持一致
+
+耗时区间按 BUCKET_BASE 的对数划分，区间内的代表值与实际耗时的相对误差不超过约 2.5%，
+合并任意日期范围内的区间计数即可计算 p50/p95/p99。
+"""
+import math
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta
+from sqlalchemy import bindparam, update, func
+from models import db, Execution, ExecutionRollup, Script
+from config import Config
+
+
+FINAL_STATUSES = ('success', 'failed', 'cancelled')
+LIVE_STATUSES = ('pending', 'running')
+
+BUCKET_BASE = 1.05
+NO_DURATION_BUCKET = -1000  # 没有开始/结束时间的执行（例如脚本不存在）
+
+PERCENTILES = (50, 95, 99)
+
+_KEY_COLUMNS = ('script_id', 'day', 'status', 'bucket')
+
+
+def duration_ms(start_time, end_time, run_ms=None):
+    """执行耗时（毫秒）：优先使用开始到结束时间，其次是解释器运行耗时"""
+    if start_time and end_time:
+        return max(0, int((end_time - start_time).total_seconds() * 1000))
+    return run_ms
+
+
+def bucket_of(ms):
+    """耗时 -> 对数区间"""
+    if ms is None:
+        return NO_DURATION_BUCKET
+    if ms <= 1:
+        return 0
+    return math.ceil(math.log(ms) / math.log(BUCKET_BASE))
+
+
+def bucket_value(bucket):
+    """区间的代表耗时（毫秒）：区间上下界的几何中点"""
+    return BUCKET_BASE ** (bucket - 0.5) if bucket > 0 else 1
+
+
+def _rollup_rows(rows):
+    """执行记录 -> 按汇总键合并后的增量（同一条 INSERT 中不能有重复的键）"""
+    merged = defaultdict(lambda: [0, 0])
+    for row in rows:
+        ms = duration_ms(row.start_time, row.end_time, row.run_ms)
+        day = (row.created_at or row.end_time).date()
+        key = (row.script_id, day, row.status, bucket_of(ms))
+        merged[key][0] += 1
+        merged[key][1] += ms or 0
+    # 固定顺序写入，避免并发更新同一组汇总行时死锁
+    return [dict(zip(_KEY_COLUMNS, key), count=count, duration_ms_sum=total)
+            for key, (count, total) in sorted(merged.items())]
+
+
+def _increment(values):
+    """以 INSERT ... ON CONFLICT DO UPDATE 累加汇总行"""
+    if not values:
+        return
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise ValueError(f'不支持的数据库类型: {dialect}')
+    stmt = insert(ExecutionRollup).values(values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(_KEY_COLUMNS),
+        set_={
+            'count': ExecutionRollup.count + stmt.excluded.count,
+            'duration_ms_sum': ExecutionRollup.duration_ms_sum + stmt.excluded.duration_ms_sum
+        }
+    )
+    db.session.execute(stmt)
+
+
+def _claim(execution_ids):
+    """认领尚未计入汇总的已结束执行，返回认领成功的ID"""
+    if not execution_ids:
+        return set()
+    result = db.session.execute(
+        update(Execution)
+        .where(Execution.id.in_(execution_ids), Execution.rolled_up.is_(False), Execution.status.in_(FINAL_STATUSES))
+        .values(rolled_up=True)
+        .returning(Execution.id)
+        .execution_options(synchronize_session=False)
+    )
+    return {row[0] for row in result}
+
+
+def _decrement(values):
+    """从汇总行中扣除，计数归零的汇总行随之删除"""
+    if not values:
+        return
+    # 按汇总键（而不是主键）批量更新，使用 Core 的表对象
+    table = ExecutionRollup.__table__
+    key_filter = [table.c[column] == bindparam(f'key_{column}') for column in _KEY_COLUMNS]
+    params = [dict({f'key_{column}': value[column] for column in _KEY_COLUMNS},
+                   minus_count=value['count'], minus_duration=value['duration_ms_sum']) for value in values]
+    db.session.execute(
+        update(table).where(*key_filter).values(
+            count=table.c.count - bindparam('minus_count'),
+            duration_ms_sum=table.c.duration_ms_sum - bindparam('minus_duration')
+        ),
+        params
+    )
+    db.session.query(ExecutionRollup).filter(ExecutionRollup.count <= 0).delete(synchronize_session=False)
+
+
+def forget(execution_ids):
+    """
+    删除执行记录前扣除其已计入的汇总（调用方负责删除与提交，与删除在同一事务中）
+
+    以条件 UPDATE 取回计入标记，与 record() 的认领互斥，每个执行只扣除一次。
+
+    Args:
+        execution_ids: 即将删除的执行ID
+    """
+    execution_ids = list(execution_ids)
+    if not execution_ids:
+        return
+    result = db.session.execute(
+        update(Execution)
+        .where(Execution.id.in_(execution_ids), Execution.rolled_up.is_(True))
+        .values(rolled_up=False)
+        .returning(Execution.id, Execution.script_id, Execution.status, Execution.created_at,
+                   Execution.start_time, Execution.end_time, Execution.run_ms)
+        .execution_options(synchronize_session=False)
+    )
+    _decrement(_rollup_rows(result.all()))
+
+
+def forget_script(script_id):
+    """删除脚本（级联删除其全部执行记录）前删除该脚本的汇总行"""
+    db.session.query(ExecutionRollup).filter(
+        ExecutionRollup.script_id == script_id
+    ).delete(synchronize_session=False)
+
+
+def record(executions):
+    """
+    将刚结束的执行计入汇总（调用方负责提交，与执行状态在同一事务中）
+
+    计入失败时只回滚保存点并打印错误，不影响执行状态的提交；未计入的执行由 backfill() 补齐。
+
+    Args:
+        executions: 执行记录或执行记录列表
+    """
+    if isinstance(executions, Execution):
+        executions = [executions]
+    pending = [execution for execution in executions
+               if execution.status in FINAL_STATUSES and not execution.rolled_up]
+    if not pending:
+        return
+    try:
+        with db.session.begin_nested():
+            claimed = _claim([execution.id for execution in pending])
+            _increment(_rollup_rows([execution for execution in pending if execution.id in claimed]))
+        for execution in pending:
+            if execution.id in claimed:
+                execution.rolled_up = True
+    except Exception as e:
+        print(f'[执行统计] 计入汇总失败: {e}')
+
+
+def backfill(batch_size=None):
+    """
+    分批补齐尚未计入汇总的已结束执行
+
+    Returns:
+        int: 计入汇总的执行数
+    """
+    batch_size = batch_size or Config.STATS_BACKFILL_BATCH
+    total = 0
+    last_id = 0
+    while True:
+        rows = db.session.query(
+            Execution.id, Execution.script_id, Execution.status, Execution.created_at,
+            Execution.start_time, Execution.end_time, Execution.run_ms
+        ).filter(
+            Execution.id > last_id,
+            Execution.rolled_up == False,  # 与部分索引 ix_executions_not_rolled_up 的条件一致
+            Execution.status.in_(FINAL_STATUSES)
+        ).order_by(Execution.id).limit(batch_size).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        claimed = _claim([row.id for row in rows])
+        _increment(_rollup_rows([row for row in rows if row.id in claimed]))
+        db.session.commit()
+        total += len(claimed)
+    if total:
+        print(f'[执行统计] 已补齐 {total} 条执行记录的统计汇总')
+    return total
+
+
+def start_backfill(app):
+    """在后台线程中补齐汇总（启动时调用，历史记录较多时不阻塞启动）"""
+    def run():
+        with app.app_context():
+            try:
+                backfill()
+            except Exception as e:
+                print(f'[执行统计] 补齐统计汇总失败: {e}')
+            finally:
+                db.session.remove()
+
+    threading.Thread(target=run, name='execution-stats-backfill', daemon=True).start()
+
+
+def rebuild():
+    """清空并重新计算全部汇总（已被清理删除的执行无法恢复到统计中）"""
+    db.session.query(ExecutionRollup).delete(synchronize_session=False)
+    db.session.query(Execution).filter(Execution.rolled_up.is_(True)).update(
+        {'rolled_up': False}, synchronize_session=False)
+    db.session.commit()
+    return backfill()
+
+
+def _percentiles(buckets):
+    """区间计数 {bucket: count} -> {'p50_ms': ..., 'p95_ms': ..., 'p99_ms': ...}"""
+    result = {f'p{p}_ms': None for p in PERCENTILES}
+    total = sum(buckets.values())
+    if not total:
+        return result
+    ordered = sorted(buckets.items())
+    for p in PERCENTILES:
+        rank = math.ceil(total * p / 100)
+        seen = 0
+        for bucket, count in ordered:
+            seen += count
+            if seen >= rank:
+                result[f'p{p}_ms'] = round(bucket_value(bucket))
+                break
+    return result
+
+
+def _counts():
+    return {'total': 0, 'success': 0, 'failed': 0, 'cancelled': 0}
+
+
+def get_statistics(start_date=None, end_date=None):
+    """
+    汇总统计
+
+    Args:
+        start_date: 起始日期（含），为空时不限
+        end_date: 结束日期（含），为空时不限；未指定日期范围时 by_date 只返回最近7天
+
+    Returns:
+        dict: summary / by_script / by_date / by_status，与原统计接口字段一致，
+              by_script 与 summary 增加耗时平均值与 p50/p95/p99（毫秒）
+    """
+    def in_range(query):
+        if start_date:
+            query = query.filter(ExecutionRollup.day >= start_date)
+        if end_date:
+            query = query.filter(ExecutionRollup.day <= end_date)
+        return query
+
+    # 1. 按脚本、状态与耗时区间合并（summary、by_status、by_script 与分位数都由此得出）
+    script_rows = in_range(db.session.query(
+        ExecutionRollup.script_id,
+        Script.name,
+        ExecutionRollup.status,
+        ExecutionRollup.bucket,
+        func.sum(ExecutionRollup.count).label('count'),
+        func.sum(ExecutionRollup.duration_ms_sum).label('duration_ms_sum')
+    ).outerjoin(Script, Script.id == ExecutionRollup.script_id)).group_by(
+        ExecutionRollup.script_id, Script.name, ExecutionRollup.status, ExecutionRollup.bucket
+    ).all()
+
+    # 2. 按日期与状态
+    if not start_date and not end_date:
+        start_date_daily = (datetime.utcnow() - timedelta(days=7)).date()
+    else:
+        start_date_daily = start_date
+    daily_query = db.session.query(
+        ExecutionRollup.day,
+        ExecutionRollup.status,
+        func.sum(ExecutionRollup.count).label('count')
+    )
+    if start_date_daily:
+        daily_query = daily_query.filter(ExecutionRollup.day >= start_date_daily)
+    if end_date:
+        daily_query = daily_query.filter(ExecutionRollup.day <= end_date)
+    daily_rows = daily_query.group_by(ExecutionRollup.day, ExecutionRollup.status).all()
+
+    # 3. 排队与运行中的执行是实时状态，不在汇总表中
+    #    （状态常量内联到 SQL 中，SQLite 才会使用部分索引 ix_executions_live_status）
+    live = dict(db.session.query(Execution.status, func.count(Execution.id)).filter(
+        Execution.status.in_(bindparam('live_statuses', LIVE_STATUSES, expanding=True, literal_execute=True))
+    ).group_by(Execution.status).all())
+
+    summary = _counts()
+    summary_buckets = defaultdict(int)
+    summary_duration = [0, 0]
+    by_status = defaultdict(int)
+    scripts = {}
+    for row in script_rows:
+        count = int(row.count or 0)
+        script = scripts.setdefault(row.script_id, {
+            'name': row.name, 'counts': _counts(), 'buckets': defaultdict(int), 'duration': [0, 0]
+        })
+        for counts in (summary, script['counts']):
+            counts['total'] += count
+            if row.status in counts:
+                counts[row.status] += count
+        by_status[row.status] += count
+        if row.bucket != NO_DURATION_BUCKET:
+            for buckets, duration in ((summary_buckets, summary_duration), (script['buckets'], script['duration'])):
+                buckets[row.bucket] += count
+                duration[0] += int(row.duration_ms_sum or 0)
+                duration[1] += count
+
+    def duration_stats(buckets, duration):
+        return {'avg_ms': round(duration[0] / duration[1]) if duration[1] else None, **_percentiles(buckets)}
+
+    by_date = defaultdict(_counts)
+    for row in daily_rows:
+        counts = by_date[row.day]
+        counts['total'] += int(row.count or 0)
+        if row.status in counts:
+            counts[row.status] += int(row.count or 0)
+
+    for status in LIVE_STATUSES:
+        by_status[status] += live.get(status, 0)
+    total = summary['total'] + sum(live.values())
+
+    return {
+        'summary': {
+            'total': total,
+            'success': summary['success'],
+            'failed': summary['failed'],
+            'running': live.get('running', 0),
+            'pending': live.get('pending', 0),
+            'success_rate': round(summary['success'] / max(1, total) * 100, 2),
+            **duration_stats(summary_buckets, summary_duration)
+        },
+        'by_script': sorted([
+            {
+                'script_id': script_id,
+                'script_name': script['name'] or f'#{script_id}',
+                'total': script['counts']['total'],
+                'success': script['counts']['success'],
+                'failed': script['counts']['failed'],
+                'success_rate': round(script['counts']['success'] / max(1, script['counts']['total']) * 100, 2),
+                **duration_stats(script['buckets'], script['duration'])
+            }
+            for script_id, script in scripts.items()
+        ], key=lambda item: item['total'], reverse=True),
+        'by_date': [
+            {
+                'date': day.isoformat(),
+                'total': counts['total'],
+                'success': counts['success'],
+                'failed': counts['failed']
+            }
+            for day, counts in sorted(by_date.items())
+        ],
+        'by_status': [
+            {'status': status, 'count': count}
+            for status, count in by_status.items() if count
+        ],
+        'start_date': start_date.isoformat() if start_date else None,
+        'end_date': end_date.isoformat() if end_date else None
+    }
@@ -5,42 +5,74 @@ import os
 import subprocess
 import json
 import shutil
+import sys
 import threading
+import time
 from datetime import datetime
-from models import db, Execution, Script, Environment, GlobalVariable
+from models import db, Execution, Script, Environment
 from config import Config
+from services.log_bus import log_bus
+from services.log_reader import read_range
+from services.log_writer import LogWriter
+from services.warm_pool import warm_pool_manager
+from services.dependency_manager import dependency_manager
+from services.env_builder import env_builder
+from services import space_ledger, execution_stats
 import tempfile
 
 
-def get_global_variables_dict():
-    """获取全局变量字典"""
-    try:
-        variables = GlobalVariable.query.all()
-        return {var.key: var.value for var in variables}
-    except Exception as e:
-        print(f'获取全局变量失败: {str(e)}')
-        return {}
-
+def _pipe_reader(fd):
+    """
+    返回读取管道描述符的函数 read(fd, n)
 
-def stream_output_to_file(pipe, log_file_path):
+    gevent 的 monkey patch 会把子进程管道设为非阻塞，直接 os.read 在没有输出时抛出 EAGAIN；
+    预热池的命名管道则是阻塞打开的，在协程中读取会阻塞整个进程。协程工作模型下统一把描述符
+    设为非阻塞，由 gevent.os.nb_read（eventlet 打补丁后的 os.read）在管道可读时才读取，
+    等待期间让出给其他协程。
+    """
+    gevent_monkey = sys.modules.get('gevent.monkey')
+    if gevent_monkey and gevent_monkey.is_module_patched('os'):
+        from gevent.os import nb_read
+        os.set_blocking(fd, False)
+        return nb_read
+    eventlet_patcher = sys.modules.get('eventlet.patcher')
+    if eventlet_patcher and eventlet_patcher.is_monkey_patched('os'):
+        os.set_blocking(fd, False)
+    return os.read
+
+
+def stream_output_to_file(pipe, log_writer):
     """
     实时读取进程输出并写入日志文件
-    这个函数在单独的线程中运行，确保日志实时刷新到磁盘
+    这个函数在单独的线程中运行，按块读取管道原始字节，由日志写入器批量落盘并发布到日志总线
     """
     try:
-        with open(log_file_path, 'a', encoding='utf-8', buffering=1) as log_f:
-            for line in iter(pipe.readline, b''):
-                if line:
-                    decoded_line = line.decode('utf-8', errors='replace')
-                    log_f.write(decoded_line)
-                    log_f.flush()  # 立即刷新到磁盘
-                    os.fsync(log_f.fileno())  # 强制操作系统写入磁盘
+        fd = pipe.fileno()
+        read = _pipe_reader(fd)
+        while True:
+            chunk = read(fd, Config.LOG_READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            log_writer.write(chunk)
     except Exception as e:
         print(f"流式输出线程错误: {e}")
     finally:
+        log_writer.close()
         pipe.close()
 
 
+def commit_progress(execution):
+    """提交执行进度并发布到日志总线"""
+    db.session.commit()
+    log_bus.publish_progress(execution.id, execution.progress, execution.stage)
+
+
+def commit_status(execution):
+    """提交执行状态并发布到日志总线（已结束的执行同时计入统计汇总）"""
+    execution_stats.record(execution)
+    db.session.commit()
+    log_bus.publish_status(execution.id, execution.status, execution.progress, execution.stage, execution.error)
+
 
 def execute_script(execution_id, custom_cwd=None):
     """执行脚本
@@ -63,7 +95,7 @@ def execute_script(execution_id, custom_cwd=None):
         if not script:
             execution.status = 'failed'
             execution.error = '脚本不存在'
-            db.session.commit()
+            commit_status(execution)
             return
 
         # 更新状态为运行中
@@ -71,7 +103,7 @@ def execute_script(execution_id, custom_cwd=None):
         execution.stage = 'preparing'
         execution.progress = 10
         execution.start_time = datetime.utcnow()
-        db.session.commit()
+        commit_progress(execution)
 
         # 解析参数
         params = {}
@@ -135,6 +167,7 @@ def execute_script(execution_id, custom_cwd=None):
             # 确定使用的执行环境（优先级：execution.environment_id > script.environment_id）
             env_id = execution.environment_id or script.environment_id
 
+            environment = None
             if env_id:
                 environment = Environment.query.get(env_id)
                 if environment:
@@ -148,180 +181,112 @@ def execute_script(execution_id, custom_cwd=None):
 
             # 准备执行命令
             if script.type == 'python':
-                # 安装依赖
-                if script.dependencies:
-                    execution.stage = 'installing_deps'
-                    execution.progress = 30
-                    db.session.commit()
-                    install_dependencies_python(script.dependencies, python_executable)
-
+                executable = python_executable
                 # 构建命令 (-u 参数禁用输出缓冲，确保实时输出)
                 cmd = [python_executable, '-u', script_filename]
-
-                # 准备环境变量，包含所有参数
-                env = os.environ.copy()
-
-                # 注入全局变量
-                global_vars = get_global_variables_dict()
-                for key, value in global_vars.items():
-                    env[key] = str(value)
-
-                # 注入执行参数（执行参数优先级高于全局变量）
-                # 处理不同类型的参数
-                script_params = json.loads(script.parameters) if script.parameters else []
-
-                for key, value in params.items():
-                    # 找到参数定义，获取type
-                    param_def = next((p for p in script_params if p['key'] == key), None)
-                    param_type = param_def.get('type', 'text') if param_def else 'text'
-
-                    # 根据类型处理参数值
-                    if param_type == 'file':
-                        # 文件类型 - 值为文件路径，直接传入
-                        env[key] = str(value)
-                    elif param_type in ['multiselect', 'checkbox']:
-                        # 多选类型 - 值为数组，转为逗号分隔字符串
-                        if isinstance(value, list):
-                            env[key] = ','.join(str(v) for v in value)
-                        else:
-                            env[key] = str(value)
-                    elif param_type == 'switch':
-                        # 开关类型 - 值为布尔，转为true/false字符串
-                        env[key] = 'true' if value else 'false'
-                    elif param_type == 'number':
-                        # 数字类型 - 转为字符串
-                        env[key] = str(value)
-                    elif param_type == 'date':
-                        # 日期类型 - 确保转为字符串格式
-                        env[key] = str(value) if value else ''
-                    else:
-                        # 其他类型 - 直接转为字符串
-                        env[key] = str(value) if value else ''
-
-                # 添加文件路径环境变量（使用相对路径）
-                if execution_files:
-                    file_names = [f['name'] for f in execution_files]
-                    env['FILES'] = json.dumps(file_names)
-
             elif script.type == 'javascript':
-                # 安装依赖
-                if script.dependencies:
-                    execution.stage = 'installing_deps'
-                    execution.progress = 30
-                    db.session.commit()
-                    install_dependencies_node(script.dependencies, node_executable)
-
-                # 构建命令
+                executable = node_executable
                 cmd = [node_executable, script_filename]
-
-                # 准备环境变量，包含所有参数
-                env = os.environ.copy()
-
-                # 注入全局变量
-                global_vars = get_global_variables_dict()
-                for key, value in global_vars.items():
-                    env[key] = str(value)
-
-                # 注入执行参数（执行参数优先级高于全局变量）
-                # 处理不同类型的参数
-                script_params = json.loads(script.parameters) if script.parameters else []
-
-                for key, value in params.items():
-                    # 找到参数定义，获取type
-                    param_def = next((p for p in script_params if p['key'] == key), None)
-                    param_type = param_def.get('type', 'text') if param_def else 'text'
-
-                    # 根据类型处理参数值
-                    if param_type == 'file':
-                        # 文件类型 - 值为文件路径，直接传入
-                        env[key] = str(value)
-                    elif param_type in ['multiselect', 'checkbox']:
-                        # 多选类型 - 值为数组，转为逗号分隔字符串
-                        if isinstance(value, list):
-                            env[key] = ','.join(str(v) for v in value)
-                        else:
-                            env[key] = str(value)
-                    elif param_type == 'switch':
-                        # 开关类型 - 值为布尔，转为true/false字符串
-                        env[key] = 'true' if value else 'false'
-                    elif param_type == 'number':
-                        # 数字类型 - 转为字符串
-                        env[key] = str(value)
-                    elif param_type == 'date':
-                        # 日期类型 - 确保转为字符串格式
-                        env[key] = str(value) if value else ''
-                    else:
-                        # 其他类型 - 直接转为字符串
-                        env[key] = str(value) if value else ''
-
-                # 添加文件路径环境变量（使用相对路径）
-                if execution_files:
-                    file_names = [f['name'] for f in execution_files]
-                    env['FILES'] = json.dumps(file_names)
             else:
                 raise Exception(f'不支持的脚本类型: {script.type}')
 
+            # 安装依赖
+            dependency_env = {}
+            if script.dependencies:
+                execution.stage = 'installing_deps'
+                execution.progress = 30
+                commit_progress(execution)
+                dependency_env = prepare_dependencies(script.type, executable, script.dependencies)
+
+            # 准备环境变量：系统环境变量、全局变量、执行参数、文件列表与依赖目录
+            env = env_builder.build(script, params, execution_files, dependency_env)
+
             # 执行脚本（在工作目录中执行）
             execution.stage = 'running'
             execution.progress = 50
-            db.session.commit()
+            commit_progress(execution)
 
             # 创建空的日志文件
             with open(log_file, 'w', encoding='utf-8') as f:
                 pass  # 只是创建文件
 
-            # 使用 PIPE 捕获输出，通过线程实时写入日志文件
-            process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                env=env,
-                cwd=working_dir,  # 在工作目录中执行
-                bufsize=0  # 无缓冲
-            )
-
-            # 保存进程ID
-            execution.pid = process.pid
-            db.session.commit()
-
-            # 启动线程实时读取输出并写入日志文件
-            output_thread = threading.Thread(
-                target=stream_output_to_file,
-                args=(process.stdout, log_file),
-                daemon=True
-            )
-            output_thread.start()
-
-            # 等待执行完成（带超时）
-            try:
-                process.wait(timeout=Config.EXECUTION_TIMEOUT)
-            except subprocess.TimeoutExpired:
-                process.kill()
-                raise Exception('脚本执行超时')
-
-            # 等待输出线程完成
-            output_thread.join(timeout=5)
+            # Python 脚本优先使用环境的预热进程，没有空闲进程时冷启动
+            warm_pool = warm_pool_manager.get_pool(environment) if script.type == 'python' else None
+            warm_worker = warm_pool.acquire() if warm_pool else None
+            launch_started = time.monotonic()
+
+            if warm_worker:
+                execution.launch_mode = 'warm'
+                execution.pid = warm_worker.pid
+                db.session.commit()
+                log_writer = LogWriter(log_file, execution_id)
+                try:
+                    returncode, _ = warm_worker.run(
+                        script_filename, working_dir, env,
+                        lambda pipe: stream_output_to_file(pipe, log_writer),
+                        Config.EXECUTION_TIMEOUT
+                    )
+                finally:
+                    warm_pool.release(warm_worker)
+                    log_writer.close()
+            else:
+                # 使用 PIPE 捕获输出，通过线程实时写入日志文件
+                process = subprocess.Popen(
+                    cmd,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.STDOUT,
+                    env=env,
+                    cwd=working_dir,  # 在工作目录中执行
+                    bufsize=0  # 无缓冲
+                )
+
+                # 保存进程ID
+                execution.launch_mode = 'cold'
+                execution.pid = process.pid
+                db.session.commit()
+
+                # 启动线程实时读取输出并写入日志文件
+                log_writer = LogWriter(log_file, execution_id)
+                output_thread = threading.Thread(
+                    target=stream_output_to_file,
+                    args=(process.stdout, log_writer),
+                    daemon=True
+                )
+                output_thread.start()
+
+                # 等待执行完成（带超时）
+                try:
+                    process.wait(timeout=Config.EXECUTION_TIMEOUT)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+                    raise Exception('脚本执行超时')
+
+                # 等待输出线程完成
+                output_thread.join(timeout=5)
+                returncode = process.returncode
+
+            execution.run_ms = int((time.monotonic() - launch_started) * 1000)
+            log_stats = log_writer.stats()
+            execution.log_bytes = log_stats['bytes_written']
+            execution.log_lines = log_stats['lines_written']
 
             # 完成阶段
             execution.stage = 'finishing'
             execution.progress = 90
-            db.session.commit()
-
-            # 读取输出
-            with open(log_file, 'r', encoding='utf-8') as log_f:
-                output = log_f.read()
+            commit_progress(execution)
 
-            # 更新执行结果
-            if process.returncode == 0:
+            # 更新执行结果（只读取需要保存的首尾部分，不把整个日志读入内存）
+            if returncode == 0:
                 execution.status = 'success'
                 execution.progress = 100
                 execution.stage = 'completed'
-                execution.output = output[:10000]  # 限制输出长度
+                execution.output = read_range(log_file, 0, 40000)['content'][:10000]  # 限制输出长度
             else:
                 execution.status = 'failed'
                 execution.progress = 100
                 execution.stage = 'failed'
-                execution.error = output[-5000:]  # 保存最后的错误信息
+                log_size = os.path.getsize(log_file)
+                execution.error = read_range(log_file, max(log_size - 20000, 0))['content'][-5000:]  # 保存最后的错误信息
 
         except Exception as e:
             execution.status = 'failed'
@@ -333,9 +298,15 @@ def execute_script(execution_id, custom_cwd=None):
             # 脚本文件保留在工作目录中，供后续查看
             # 对于普通执行，文件在执行空间；对于工作流节点，文件在工作流空间
 
+            # 记录执行空间占用（空间账本），清理与统计时不再遍历目录
+            try:
+                space_ledger.record_execution(execution)
+            except Exception as e:
+                print(f'统计执行空间占用失败: {str(e)}')
+
             # 更新结束时间
             execution.end_time = datetime.utcnow()
-            db.session.commit()
+            commit_status(execution)
 
     except Exception as e:
         print(f'执行脚本时发生错误: {str(e)}')
@@ -343,42 +314,22 @@ def execute_script(execution_id, custom_cwd=None):
             execution.status = 'failed'
             execution.error = str(e)
             execution.end_time = datetime.utcnow()
-            db.session.commit()
+            commit_status(execution)
         except:
             pass
 
 
-def install_dependencies_python(dependencies, python_executable=None):
-    """安装Python依赖"""
-    try:
-        if python_executable is None:
-            python_executable = Config.PYTHON_EXECUTABLE
-
-        deps = json.loads(dependencies) if isinstance(dependencies, str) else dependencies
-        if isinstance(deps, dict):
-            deps = deps.get('packages', [])
-        elif isinstance(deps, str):
-            deps = [d.strip() for d in deps.split(',') if d.strip()]
-
-        if deps:
-            cmd = [python_executable, '-m', 'pip', 'install'] + deps
-            subprocess.run(cmd, check=True, capture_output=True)
-    except Exception as e:
-        print(f'安装Python依赖失败: {str(e)}')
+def prepare_dependencies(script_type, executable, dependencies):
+    """
+    通过依赖管理器准备脚本依赖（已满足的依赖集合直接复用）
 
+    安装失败时只记录错误，继续执行脚本，由脚本自身的导入错误反映缺失的依赖。
 
-def install_dependencies_node(dependencies, node_executable=None):
-    """安装Node.js依赖"""
+    Returns:
+        dict: 需要加入执行环境变量的依赖路径
+    """
     try:
-        deps = json.loads(dependencies) if isinstance(dependencies, str) else dependencies
-        if isinstance(deps, dict):
-            deps = deps.get('packages', [])
-        elif isinstance(deps, str):
-            deps = [d.strip() for d in deps.split(',') if d.strip()]
-
-        if deps:
-            for dep in deps:
-                cmd = ['npm', 'install', '-g', dep]
-                subprocess.run(cmd, check=True, capture_output=True)
+        return dependency_manager.prepare(script_type, executable, dependencies)
     except Exception as e:
-        print(f'安装Node.js依赖失败: {str(e)}')
+        print(f'安装{"Python" if script_type == "python" else "Node.js"}依赖失败: {str(e)}')
+        return {}
@@ -0,0 +1,160 @@
+"""
+执行日志总线
+
+进程内的发布/订阅通道：执行引擎把日志片段、进度和最终状态发布到按执行ID划分的主题，
+SSE 和 Socket.IO 订阅者直接收到推送，无需轮询日志文件或数据库。
+
+日志事件携带字节偏移 (offset, end)，与日志文件中的位置一一对应，
+订阅者可以先从文件补齐历史内容，再从总线接续，并支持按偏移断点续传。
+"""
+import codecs
+import os
+import queue
+import threading
+
+
+class Subscription:
+    """单个订阅者的事件队列"""
+
+    def __init__(self, execution_id):
+        self.execution_id = execution_id
+        self._queue = queue.Queue()
+
+    def put(self, event):
+        self._queue.put(event)
+
+    def get(self, timeout=None):
+        """
+        获取下一个事件
+
+        Returns:
+            dict: 事件，超时返回 None
+        """
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class _Topic:
+    """单个执行的主题"""
+
+    def __init__(self):
+        self.subscribers = set()
+        self.active = False  # 执行引擎已开始发布且尚未结束
+        self.progress = None
+        self.stage = None
+
+
+class LogBus:
+    """执行日志总线"""
+
+    FINAL_STATUSES = ('success', 'failed')
+
+    def __init__(self):
+        self._topics = {}
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, execution_id):
+        """订阅执行的事件"""
+        subscription = Subscription(execution_id)
+        with self._lock:
+            topic = self._topics.setdefault(execution_id, _Topic())
+            topic.subscribers.add(subscription)
+            if topic.progress is not None:
+                subscription.put({'type': 'progress', 'progress': topic.progress, 'stage': topic.stage})
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """取消订阅，主题无订阅者且不在执行中时释放"""
+        with self._lock:
+            topic = self._topics.get(subscription.execution_id)
+            if not topic:
+                return
+            topic.subscribers.discard(subscription)
+            if not topic.subscribers and not topic.active:
+                del self._topics[subscription.execution_id]
+
+    def add_listener(self, listener):
+        """
+        注册全局监听器，所有事件都会以 listener(execution_id, event) 的形式回调
+
+        用于 Socket.IO 等按房间广播的场景，回调在发布者线程中执行，应尽快返回。
+        """
+        with self._lock:
+            self._listeners.append(listener)
+
+    def publish_log(self, execution_id, content, offset, end):
+        """
+        发布日志片段
+
+        Args:
+            execution_id: 执行记录ID
+            content: 日志文本
+            offset: 片段在日志文件中的起始字节偏移
+            end: 片段结束字节偏移（即写入后的文件长度）
+        """
+        self._publish(execution_id, {'type': 'log', 'content': content, 'offset': offset, 'end': end})
+
+    def publish_progress(self, execution_id, progress, stage):
+        """发布进度与阶段变化"""
+        self._publish(execution_id, {'type': 'progress', 'progress': progress or 0, 'stage': stage or 'pending'})
+
+    def publish_status(self, execution_id, status, progress=None, stage=None, error=None):
+        """发布状态变化，最终状态会关闭主题"""
+        self._publish(execution_id, {
+            'type': 'status',
+            'status': status,
+            'progress': progress if progress is not None else 100,
+            'stage': stage or ('completed' if status == 'success' else 'failed'),
+            'error': error or ''
+        })
+
+    def _publish(self, execution_id, event):
+        with self._lock:
+            topic = self._topics.setdefault(execution_id, _Topic())
+            final = event['type'] == 'status' and event['status'] in self.FINAL_STATUSES
+            if event['type'] == 'progress':
+                topic.progress = event['progress']
+                topic.stage = event['stage']
+            topic.active = not final
+            subscribers = list(topic.subscribers)
+            listeners = list(self._listeners)
+            if final:
+                # 已有订阅者仍会收到最终事件；之后的订阅者从数据库读取最终状态
+                del self._topics[execution_id]
+
+        for subscription in subscribers:
+            subscription.put(event)
+        for listener in listeners:
+            try:
+                listener(execution_id, event)
+            except Exception as e:
+                print(f'[日志总线] 监听器处理事件失败: {str(e)}')
+
+
+def read_log_from(log_file, offset, chunk_size=64 * 1024):
+    """
+    从指定字节偏移读取日志文件
+
+    Yields:
+        (content, end): 文本片段及其结束偏移（只在完整的 UTF-8 字符边界处切分）
+    """
+    if not log_file or not os.path.exists(log_file):
+        return
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    with open(log_file, 'rb') as f:
+        f.seek(offset)
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            offset += len(chunk)
+            content = decoder.decode(chunk)
+            if content:
+                yield content, offset - len(decoder.getstate()[0])
+
+
+# 创建全局日志总线实例
+log_bus = LogBus()
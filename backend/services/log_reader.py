@@ -0,0 +1,220 @@
+"""
+执行日志读取
+
+长时间运行的脚本日志可能达到数百MB，接口只按需读取其中一段：
+- 按字节偏移读取（offset/length），用于分段加载和续传
+- 按行号读取（line/lines），借助 LogWriter 生成的 .idx 行偏移索引直接 seek
+- 读取末尾若干行（tail），从文件末尾向前按块扫描
+
+所有读取都只在完整的 UTF-8 字符边界处切分，返回的 end 可直接作为下一次读取的 offset。
+"""
+import codecs
+import gzip
+import os
+import shutil
+import struct
+from config import Config
+
+
+# 索引文件由连续的小端 uint64 组成，第 k 项是第 (k+1)*LOG_INDEX_STRIDE 行（从0计）的起始字节偏移
+INDEX_ENTRY = struct.Struct('<Q')
+
+_SCAN_CHUNK_SIZE = 64 * 1024
+
+
+def index_path(log_file):
+    """行偏移索引文件路径"""
+    return f'{log_file}.idx'
+
+
+def gzip_path(log_file):
+    """压缩副本路径"""
+    return f'{log_file}.gz'
+
+
+def remove_log_files(log_file):
+    """删除日志文件及其索引、压缩副本"""
+    if not log_file:
+        return
+    for path in (log_file, index_path(log_file), gzip_path(log_file)):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def read_range(log_file, offset=0, length=None):
+    """
+    按字节范围读取日志
+
+    Args:
+        log_file: 日志文件路径
+        offset: 起始字节偏移，落在多字节字符中间时自动后移到下一个字符
+        length: 读取字节数，为空或超过 LOG_MAX_READ_BYTES 时按上限截断
+
+    Returns:
+        dict: content, offset, end, size, truncated（end 之后是否还有内容）
+    """
+    size = os.path.getsize(log_file)
+    offset = min(max(offset, 0), size)
+    max_bytes = Config.LOG_MAX_READ_BYTES
+    length = max_bytes if length is None else min(max(length, 0), max_bytes)
+    with open(log_file, 'rb') as f:
+        return _read_decoded(f, offset, min(offset + length, size), size)
+
+
+def read_lines(log_file, start_line=0, count=100):
+    """
+    按行号读取日志
+
+    先通过索引定位到不超过 start_line 的最近一个索引行，再向后扫描不足一个步长的行数。
+
+    Args:
+        log_file: 日志文件路径
+        start_line: 起始行号（从0计）
+        count: 读取行数，返回内容超过 LOG_MAX_READ_BYTES 时截断
+
+    Returns:
+        dict: content, offset, end, size, truncated, start_line
+    """
+    size = os.path.getsize(log_file)
+    start_line = max(start_line, 0)
+    base_line, base_offset = _lookup_index(log_file, start_line)
+    with open(log_file, 'rb') as f:
+        start = _skip_lines(f, base_offset, start_line - base_line, size)
+        end = _skip_lines(f, start, max(count, 0), size)
+        end = min(end, start + Config.LOG_MAX_READ_BYTES)
+        result = _read_decoded(f, start, end, size)
+    result['start_line'] = start_line
+    return result
+
+
+def read_tail(log_file, lines=100):
+    """
+    读取日志末尾若干行
+
+    从文件末尾向前按块查找换行，读取量只与返回内容的大小有关；
+    结果超过 LOG_MAX_READ_BYTES 时只返回最后 LOG_MAX_READ_BYTES 字节。
+
+    Returns:
+        dict: content, offset, end, size, truncated（offset 之前是否还有内容）
+    """
+    size = os.path.getsize(log_file)
+    max_bytes = Config.LOG_MAX_READ_BYTES
+    with open(log_file, 'rb') as f:
+        # 末尾的换行属于最后一行，不作为行分隔计数
+        limit = size
+        if size:
+            f.seek(size - 1)
+            if f.read(1) == b'\n':
+                limit = size - 1
+
+        start = 0
+        found = 0
+        pos = limit
+        while pos > 0 and found < lines and size - pos < max_bytes:
+            read_from = max(0, pos - _SCAN_CHUNK_SIZE)
+            f.seek(read_from)
+            chunk = f.read(pos - read_from)
+            i = len(chunk)
+            while found < lines:
+                i = chunk.rfind(b'\n', 0, i)
+                if i < 0:
+                    break
+                found += 1
+            if found == lines:
+                start = read_from + i + 1
+            pos = read_from
+        start = max(start, size - max_bytes)
+
+        result = _read_decoded(f, start, size, size)
+    result['truncated'] = result['offset'] > 0
+    return result
+
+
+def ensure_gzip(log_file):
+    """
+    获取日志的 gzip 压缩副本，不存在或已过期时重新生成
+
+    先写入临时文件再原子替换，并发下载时不会读到写了一半的压缩包。
+
+    Returns:
+        str: 压缩文件路径
+    """
+    target = gzip_path(log_file)
+    if os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(log_file):
+        return target
+
+    tmp_path = f'{target}.{os.getpid()}.tmp'
+    try:
+        with open(log_file, 'rb') as src, gzip.open(tmp_path, 'wb', compresslevel=6) as dst:
+            shutil.copyfileobj(src, dst, _SCAN_CHUNK_SIZE)
+        os.replace(tmp_path, target)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return target
+
+
+def _lookup_index(log_file, line):
+    """
+    查找不超过 line 的最近索引行
+
+    Returns:
+        (base_line, base_offset): 没有索引（旧日志）时为 (0, 0)
+    """
+    path = index_path(log_file)
+    stride = Config.LOG_INDEX_STRIDE
+    slot = line // stride
+    if slot == 0 or not os.path.exists(path):
+        return 0, 0
+    # 只使用已完整写出的索引项
+    slot = min(slot, os.path.getsize(path) // INDEX_ENTRY.size)
+    if slot == 0:
+        return 0, 0
+    with open(path, 'rb') as f:
+        f.seek((slot - 1) * INDEX_ENTRY.size)
+        (offset,) = INDEX_ENTRY.unpack(f.read(INDEX_ENTRY.size))
+    return slot * stride, offset
+
+
+def _skip_lines(f, pos, count, size):
+    """从 pos 开始向后跳过 count 行，返回下一行的起始偏移（不足时返回文件末尾）"""
+    if count <= 0:
+        return pos
+    f.seek(pos)
+    while pos < size:
+        chunk = f.read(_SCAN_CHUNK_SIZE)
+        if not chunk:
+            break
+        i = -1
+        while count > 0:
+            i = chunk.find(b'\n', i + 1)
+            if i < 0:
+                break
+            count -= 1
+        if count == 0:
+            return pos + i + 1
+        pos += len(chunk)
+    return size
+
+
+def _read_decoded(f, start, end, size):
+    """读取 [start, end) 并解码，起止位置对齐到 UTF-8 字符边界"""
+    f.seek(start)
+    data = f.read(end - start)
+
+    # 跳过起始处的 UTF-8 续字节（0b10xxxxxx）
+    skip = 0
+    while skip < min(len(data), 3) and 0x80 <= data[skip] <= 0xBF:
+        skip += 1
+
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    content = decoder.decode(data[skip:])
+    # 末尾不完整的字符留给下一次读取
+    end = start + len(data) - len(decoder.getstate()[0])
+    return {
+        'content': content,
+        'offset': start + skip,
+        'end': end,
+        'size': size,
+        'truncated': end < size
+    }
@@ -0,0 +1,151 @@
+"""
+执行日志写入器
+
+按时间和大小批量写入进程输出，避免逐行 flush + fsync 让脚本受限于日志 I/O。
+每次落盘后把新内容发布到日志总线，实时订阅不受批量写入影响（最多延迟一个刷新间隔）。
+
+持久化模式（Config.LOG_DURABILITY）：
+- none: 从不主动 fsync，由操作系统决定落盘时机
+- periodic: 每隔 LOG_FSYNC_INTERVAL 秒最多 fsync 一次
+- completion: 仅在日志关闭时 fsync 一次
+
+写入时同步生成行偏移索引（<日志文件>.idx）：每 LOG_INDEX_STRIDE 行记录一次该行起始的字节偏移，
+读取接口据此按行号 seek，无需从头扫描整个日志。
+"""
+import codecs
+import os
+import threading
+import time
+from config import Config
+from services.log_bus import log_bus
+from services.log_reader import index_path, INDEX_ENTRY
+
+
+DURABILITY_MODES = ('none', 'periodic', 'completion')
+
+
+class LogWriter:
+    """批量日志写入器"""
+
+    def __init__(self, log_file_path, execution_id=None, flush_interval=None, flush_bytes=None,
+                 durability=None, fsync_interval=None, index_stride=None):
+        self.log_file_path = log_file_path
+        self.execution_id = execution_id
+        self.flush_interval = flush_interval if flush_interval is not None else Config.LOG_FLUSH_INTERVAL
+        self.flush_bytes = flush_bytes if flush_bytes is not None else Config.LOG_FLUSH_BYTES
+        self.durability = durability or Config.LOG_DURABILITY
+        if self.durability not in DURABILITY_MODES:
+            raise ValueError(f'不支持的日志持久化模式: {self.durability}')
+        self.fsync_interval = fsync_interval if fsync_interval is not None else Config.LOG_FSYNC_INTERVAL
+        self.index_stride = index_stride or Config.LOG_INDEX_STRIDE
+
+        self.bytes_written = 0
+        self.lines_written = 0
+
+        self._file = open(log_file_path, 'ab')
+        self._offset = self._file.tell()  # 已写入文件的字节偏移
+        self._published = self._offset  # 已发布到日志总线的字节偏移
+        self._decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self._buffer = []
+        self._buffered = 0
+        self._index_file = open(index_path(log_file_path), 'wb')
+        self._index_buffer = []
+        self._last_flush = time.monotonic()
+        self._last_fsync = self._last_flush
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+
+        # 读取线程阻塞在管道上时，由刷新线程把缓冲区中的内容按时写出
+        self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+        self._flusher.start()
+
+    def write(self, data):
+        """写入一段原始输出（bytes）"""
+        if not data:
+            return
+        with self._lock:
+            self._index_lines(data, self._offset + self._buffered)
+            self._buffer.append(data)
+            self._buffered += len(data)
+            if self._buffered >= self.flush_bytes or time.monotonic() - self._last_flush >= self.flush_interval:
+                self._flush_locked()
+
+    def flush(self):
+        """立即写出缓冲区"""
+        with self._lock:
+            self._flush_locked()
+
+    def close(self):
+        """
+        写出剩余内容并关闭文件
+
+        Returns:
+            dict: bytes_written, lines_written
+        """
+        if self._closed.is_set():
+            return self.stats()
+        self._closed.set()
+        with self._lock:
+            self._flush_locked(final=True)
+            if self.durability in ('periodic', 'completion'):
+                os.fsync(self._file.fileno())
+            self._file.close()
+            self._index_file.close()
+        return self.stats()
+
+    def stats(self):
+        """写入统计"""
+        return {
+            'bytes_written': self.bytes_written,
+            'lines_written': self.lines_written
+        }
+
+    def _flush_loop(self):
+        while not self._closed.wait(self.flush_interval):
+            with self._lock:
+                if self._buffer and not self._file.closed:
+                    self._flush_locked()
+
+    def _index_lines(self, data, base):
+        """统计换行并记录跨过索引步长的行起始偏移，调用方需持有锁"""
+        total = self.lines_written + data.count(b'\n')
+        next_mark = (self.lines_written // self.index_stride + 1) * self.index_stride
+        seen = self.lines_written
+        pos = -1
+        while total >= next_mark:
+            # 第 next_mark 个换行之后的字节即第 next_mark 行（从0计）的起始位置
+            for _ in range(next_mark - seen):
+                pos = data.index(b'\n', pos + 1)
+            seen = next_mark
+            self._index_buffer.append(INDEX_ENTRY.pack(base + pos + 1))
+            next_mark += self.index_stride
+        self.lines_written = total
+
+    def _flush_locked(self, final=False):
+        """写出缓冲区并发布到日志总线，调用方需持有锁"""
+        self._last_flush = time.monotonic()
+        data = b''.join(self._buffer)
+        if data:
+            self._buffer = []
+            self._buffered = 0
+            self._file.write(data)
+            self._file.flush()
+            if self._index_buffer:
+                # 索引项总是在对应日志内容写出之后写出，读取方看到的偏移一定有效
+                self._index_file.write(b''.join(self._index_buffer))
+                self._index_file.flush()
+                self._index_buffer = []
+            self._offset += len(data)
+            self.bytes_written += len(data)
+
+            if self.durability == 'periodic' and self._last_flush - self._last_fsync >= self.fsync_interval:
+                os.fsync(self._file.fileno())
+                self._last_fsync = self._last_flush
+
+        if self.execution_id is not None and (data or final):
+            content = self._decoder.decode(data, final)
+            if content:
+                # 未解码完的 UTF-8 残余字节留到下一次发布
+                end = self._offset - len(self._decoder.getstate()[0])
+                log_bus.publish_log(self.execution_id, content, self._published, end)
+                self._published = end
@@ -6,6 +6,9 @@ from apscheduler.triggers.cron import CronTrigger
 from apscheduler.jobstores.memory import MemoryJobStore
 from datetime import datetime
 import json
+from config import Config
+
+SYNC_JOB_ID = 'sync_schedules'
 
 
 class SchedulerManager:
@@ -17,6 +20,9 @@ class SchedulerManager:
             timezone='Asia/Shanghai'
         )
         self.app = None  # 保存应用实例
+        # 多个工作进程时只有主进程执行定时任务，其他进程修改的任务由主进程定期同步
+        self.enabled = Config.SERVER_PRIMARY_WORKER
+        self._crons = {}  # schedule_id -> 已添加任务的 Cron 表达式
         self.scheduler.start()
 
     def set_app(self, app):
@@ -25,6 +31,8 @@ class SchedulerManager:
 
     def add_job(self, schedule):
         """添加定时任务"""
+        if not self.enabled:
+            return True
         try:
             # 解析Cron表达式
             # 支持标准Cron格式: 分 时 日 月 周
@@ -52,6 +60,7 @@ class SchedulerManager:
                 args=[schedule.id],
                 replace_existing=True
             )
+            self._crons[schedule.id] = schedule.cron
 
             # 更新下次执行时间
             job = self.scheduler.get_job(f'schedule_{schedule.id}')
@@ -73,7 +82,10 @@ class SchedulerManager:
 
     def remove_job(self, schedule_id):
         """移除定时任务"""
+        if not self.enabled:
+            return True
         try:
+            self._crons.pop(schedule_id, None)
             job_id = f'schedule_{schedule_id}'
             if self.scheduler.get_job(job_id):
                 self.scheduler.remove_job(job_id)
@@ -86,8 +98,7 @@ class SchedulerManager:
     def _execute_scheduled_task(self, schedule_id):
         """执行定时任务"""
         from models import db, Schedule, Execution
-        from services.executor import execute_script
-        from threading import Thread
+        from services.dispatcher import execution_dispatcher
 
         print(f'[定时任务] 准备执行任务 {schedule_id}')
         
@@ -126,6 +137,7 @@ class SchedulerManager:
                 execution = Execution(
                     script_id=schedule.script_id,
                     status='pending',
+                    priority=Execution.PRIORITY_SCHEDULE,
                     params=schedule.params
                 )
                 db.session.add(execution)
@@ -133,16 +145,9 @@ class SchedulerManager:
 
                 print(f'[定时任务] 创建执行记录成功, 执行ID: {execution.id}')
 
-                # 异步执行脚本（在应用上下文中执行）
-                def run_script_with_context():
-                    """在应用上下文中执行脚本"""
-                    with self.app.app_context():
-                        execute_script(execution.id)
-
-                thread = Thread(target=run_script_with_context)
-                thread.daemon = True
-                thread.start()
-                print(f'[定时任务] 脚本执行线程已启动')
+                # 交给执行调度器排队执行
+                execution_dispatcher.submit(execution.id)
+                print(f'[定时任务] 执行 {execution.id} 已加入执行队列')
 
             except Exception as e:
                 print(f'[定时任务] 执行定时任务 {schedule_id} 失败: {str(e)}')
@@ -170,7 +175,10 @@ class SchedulerManager:
 
         try:
             # 清空现有任务
-            self.scheduler.remove_all_jobs()
+            for job in self.scheduler.get_jobs():
+                if job.id.startswith('schedule_'):
+                    job.remove()
+            self._crons.clear()
             print(f'[调度器] 已清空现有任务')
 
             # 加载启用的任务
@@ -186,9 +194,53 @@ class SchedulerManager:
             traceback.print_exc()
             return False
 
-    def shutdown(self):
+    def sync_schedules(self):
+        """
+        按数据库中的定时任务增删调度器中的任务（只处理有变化的任务）
+
+        Returns:
+            int: 发生变化的任务数
+        """
+        from models import Schedule
+
+        desired = {schedule.id: schedule for schedule in Schedule.query.filter_by(enabled=True).all()}
+        changed = 0
+        for schedule_id in list(self._crons):
+            if schedule_id not in desired:
+                self.remove_job(schedule_id)
+                changed += 1
+        for schedule_id, schedule in desired.items():
+            if self._crons.get(schedule_id) != schedule.cron:
+                self.add_job(schedule)
+                changed += 1
+        return changed
+
+    def start_sync(self, interval):
+        """定期与数据库同步定时任务（多个工作进程时由主进程调用）"""
+        if not self.enabled or not interval:
+            return
+
+        def run_sync():
+            from models import db
+
+            if not self.app:
+                return
+            try:
+                with self.app.app_context():
+                    try:
+                        self.sync_schedules()
+                    finally:
+                        db.session.remove()
+            except Exception as e:
+                print(f'[调度器] 同步定时任务失败: {str(e)}')
+
+        self.scheduler.add_job(func=run_sync, trigger='interval', seconds=interval, id=SYNC_JOB_ID,
+                               replace_existing=True)
+        print(f'[调度器] 每 {interval} 秒与数据库同步定时任务')
+
+    def shutdown(self, wait=True):
         """关闭调度器"""
-        self.scheduler.shutdown()
+        self.scheduler.shutdown(wait=wait)
 
 
 # 创建全局调度器实例
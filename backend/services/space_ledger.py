@@ -0,0 +1,114 @@
+"""
+执行空间账本
+
+每个执行空间（及工作流执行空间）的字节数与文件数在执行结束时统计一次，记录在
+Execution / WorkflowExecution 的 space_bytes、space_files 字段上；删除记录时账本随之减少。
+清理统计与按空间大小的清理策略直接对账本求和，不再遍历整个执行空间目录。
+
+升级前遗留的执行记录没有账本值（space_bytes 为空），由 backfill() 分批补齐。
+"""
+import os
+from sqlalchemy import func
+from models import db, Execution, WorkflowExecution
+from config import Config
+
+
+FINAL_STATUSES = ('success', 'failed', 'cancelled')
+
+
+def measure_space(path):
+    """
+    统计目录下文件的总字节数与文件数（不跟随符号链接）
+
+    Returns:
+        tuple: (字节数, 文件数)，目录不存在时为 (0, 0)
+    """
+    total_bytes = 0
+    total_files = 0
+    stack = [path]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        else:
+                            total_bytes += entry.stat(follow_symlinks=False).st_size
+                            total_files += 1
+                    except OSError:
+                        # 忽略无法访问或已被删除的文件
+                        pass
+        except OSError:
+            # 忽略不存在或无法访问的目录
+            pass
+    return total_bytes, total_files
+
+
+def record_execution(execution):
+    """执行结束时记录执行空间占用（调用方负责提交）"""
+    execution.space_bytes, execution.space_files = measure_space(Config.get_execution_space(execution.id))
+
+
+def record_workflow_execution(workflow_execution):
+    """工作流执行结束时记录工作流执行空间占用（调用方负责提交）"""
+    workflow_execution.space_bytes, workflow_execution.space_files = measure_space(
+        Config.get_workflow_execution_space(workflow_execution.id))
+
+
+def backfill(limit=None):
+    """
+    为已结束但没有账本值的记录补齐空间占用
+
+    Args:
+        limit: 本次最多统计的记录数，为空时使用 Config.CLEANUP_LEDGER_BACKFILL_BATCH
+
+    Returns:
+        int: 补齐的记录数
+    """
+    limit = limit or Config.CLEANUP_LEDGER_BACKFILL_BATCH
+    filled = 0
+    for model, space_of in ((Execution, Config.get_execution_space),
+                            (WorkflowExecution, Config.get_workflow_execution_space)):
+        ids = [row.id for row in db.session.query(model.id).filter(
+            model.space_bytes.is_(None),
+            model.status.in_(FINAL_STATUSES)
+        ).order_by(model.id).limit(limit - filled)]
+        for record_id in ids:
+            space_bytes, space_files = measure_space(space_of(record_id))
+            db.session.query(model).filter(model.id == record_id).update(
+                {'space_bytes': space_bytes, 'space_files': space_files}, synchronize_session=False)
+        db.session.commit()
+        filled += len(ids)
+        if filled >= limit:
+            break
+    return filled
+
+
+def totals():
+    """
+    账本汇总
+
+    Returns:
+        dict: 执行空间、工作流执行空间与日志的字节数和文件数，以及尚未统计的记录数
+    """
+    execution_row = db.session.query(
+        func.coalesce(func.sum(Execution.space_bytes), 0),
+        func.coalesce(func.sum(Execution.space_files), 0),
+        func.coalesce(func.sum(Execution.log_bytes), 0),
+        func.count(Execution.id).filter(Execution.space_bytes.is_(None), Execution.status.in_(FINAL_STATUSES))
+    ).one()
+    workflow_row = db.session.query(
+        func.coalesce(func.sum(WorkflowExecution.space_bytes), 0),
+        func.coalesce(func.sum(WorkflowExecution.space_files), 0),
+        func.count(WorkflowExecution.id).filter(
+            WorkflowExecution.space_bytes.is_(None), WorkflowExecution.status.in_(FINAL_STATUSES))
+    ).one()
+    return {
+        'execution_space_bytes': int(execution_row[0]),
+        'execution_space_files': int(execution_row[1]),
+        'log_bytes': int(execution_row[2]),
+        'workflow_space_bytes': int(workflow_row[0]),
+        'workflow_space_files': int(workflow_row[1]),
+        'unmeasured': int(execution_row[3]) + int(workflow_row[2]),
+    }
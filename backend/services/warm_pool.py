@@ -0,0 +1,318 @@
+"""
+Python 解释器预热池
+
+为开启预热的执行环境（Environment.warm_pool_size > 0）预先启动若干常驻工作进程，
+每个进程已导入环境配置的模块（如 pandas、openpyxl），执行时通过管道接收脚本路径、
+工作目录和环境变量，在全新命名空间中运行脚本，输出经命名管道实时写入执行日志。
+
+工作进程运行满 max_runs 次或内存增长超过 WARM_POOL_MAX_RSS_GROWTH_MB 后回收并补充新进程。
+池中没有空闲进程时直接回退到冷启动，不会让执行排队等待预热进程。
+仅支持 POSIX 平台（依赖命名管道）。
+"""
+import json
+import os
+import select
+import shutil
+import subprocess
+import tempfile
+import threading
+from config import Config
+
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'warm_worker.py')
+
+
+def warm_pool_supported():
+    """当前平台是否支持预热池"""
+    return os.name == 'posix' and hasattr(os, 'mkfifo')
+
+
+def parse_modules(value):
+    """解析预加载模块配置（逗号或换行分隔）"""
+    if not value:
+        return []
+    return [m.strip() for m in value.replace('\n', ',').split(',') if m.strip()]
+
+
+class WarmWorker:
+    """单个预热工作进程"""
+
+    def __init__(self, executable, modules):
+        self.process = subprocess.Popen(
+            [executable, '-u', WORKER_SCRIPT, json.dumps(modules)],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            encoding='utf-8'
+        )
+        self.pid = self.process.pid
+        self.runs = 0
+        self.dirty = False  # 导入过依赖目录中的模块，不能再复用
+
+        ready = self._read_message(Config.WARM_POOL_START_TIMEOUT)
+        if not ready or ready.get('type') != 'ready':
+            self.kill()
+            raise RuntimeError(f'预热进程启动失败: {executable}')
+        self.baseline_rss_kb = ready['rss_kb']
+        self.rss_kb = ready['rss_kb']
+        if ready['failed']:
+            print(f'[预热池] 进程 {self.pid} 部分模块预加载失败: {", ".join(ready["failed"])}')
+
+    def alive(self):
+        return self.process.poll() is None
+
+    def kill(self):
+        if self.alive():
+            self.process.kill()
+        try:
+            self.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            pass
+
+    def run(self, script, cwd, env, on_output, timeout):
+        """
+        在工作进程中执行脚本
+
+        Args:
+            script: 脚本文件名（相对于 cwd）
+            cwd: 工作目录
+            env: 完整的环境变量
+            on_output: 输出处理函数，参数为命名管道的读取端，在独立线程中调用直到 EOF
+            timeout: 超时时间（秒），超时后杀死工作进程
+
+        Returns:
+            (exit_code, elapsed_ms): 退出码与脚本自身的运行耗时
+        """
+        fifo_dir = tempfile.mkdtemp(prefix='warm_run_')
+        fifo_path = os.path.join(fifo_dir, 'output')
+        os.mkfifo(fifo_path)
+
+        def pump():
+            with open(fifo_path, 'rb', buffering=0) as pipe:
+                on_output(pipe)
+
+        reader = threading.Thread(target=pump, daemon=True)
+        reader.start()
+        self.runs += 1
+        try:
+            self.process.stdin.write(json.dumps({
+                'script': script,
+                'cwd': cwd,
+                'env': env,
+                'output': fifo_path
+            }) + '\n')
+            self.process.stdin.flush()
+
+            result = self._read_message(timeout)
+            if result is None:
+                self.kill()
+                raise Exception('脚本执行超时')
+            if result.get('type') != 'done':
+                # 工作进程在任务中途退出（脚本调用 os._exit、被中断或崩溃）
+                return self.process.wait(), None
+            self.rss_kb = result['rss_kb']
+            self.dirty = self.dirty or result.get('recycle', False)
+            return result['exit_code'], result['elapsed_ms']
+        finally:
+            reader.join(timeout=5)
+            if reader.is_alive():
+                # 工作进程在打开写端之前就退出了，打开一次写端让读取方收到 EOF
+                try:
+                    os.close(os.open(fifo_path, os.O_WRONLY | os.O_NONBLOCK))
+                except OSError:
+                    pass
+                reader.join(timeout=1)
+            shutil.rmtree(fifo_dir, ignore_errors=True)
+
+    def _read_message(self, timeout):
+        """
+        读取一条控制消息
+
+        Returns:
+            dict: 消息；超时返回 None，进程退出返回 {'type': 'exit'}
+        """
+        try:
+            ready, _, _ = select.select([self.process.stdout], [], [], timeout)
+        except (OSError, ValueError):
+            return {'type': 'exit'}
+        if not ready:
+            return None
+        line = self.process.stdout.readline()
+        if not line:
+            return {'type': 'exit'}
+        return json.loads(line)
+
+
+class WarmPool:
+    """单个执行环境的预热进程池"""
+
+    def __init__(self, environment_id, executable, modules, size, max_runs=None):
+        self.environment_id = environment_id
+        self.executable = executable
+        self.modules = modules
+        self.size = size
+        self.max_runs = max_runs or Config.WARM_POOL_MAX_RUNS
+        self.signature = (executable, tuple(modules), size, self.max_runs)
+        self._idle = []
+        self._busy = 0
+        self._starting = 0
+        self._closed = False
+        self._lock = threading.Lock()
+        self._stats = {'warm_runs': 0, 'cold_fallbacks': 0, 'recycled': 0, 'start_failures': 0}
+
+    def acquire(self):
+        """
+        取出一个空闲工作进程
+
+        Returns:
+            WarmWorker: 没有空闲进程时返回 None（调用方回退到冷启动）
+        """
+        worker = None
+        with self._lock:
+            while self._idle:
+                candidate = self._idle.pop()
+                if candidate.alive():
+                    worker = candidate
+                    break
+            if worker:
+                self._busy += 1
+                self._stats['warm_runs'] += 1
+            else:
+                self._stats['cold_fallbacks'] += 1
+        self.replenish()
+        return worker
+
+    def release(self, worker):
+        """归还工作进程，达到回收条件时销毁并补充新进程"""
+        max_growth_kb = Config.WARM_POOL_MAX_RSS_GROWTH_MB * 1024
+        recycle = (
+            not worker.alive()
+            or worker.dirty
+            or worker.runs >= self.max_runs
+            or worker.rss_kb - worker.baseline_rss_kb > max_growth_kb
+        )
+        with self._lock:
+            self._busy -= 1
+            if recycle or self._closed:
+                self._stats['recycled'] += 1
+            else:
+                self._idle.append(worker)
+                worker = None
+        if worker:
+            worker.kill()
+            self.replenish()
+
+    def replenish(self):
+        """在后台补足进程数量"""
+        with self._lock:
+            missing = self.size - len(self._idle) - self._busy - self._starting
+            if self._closed or missing <= 0:
+                return
+            self._starting += missing
+        for _ in range(missing):
+            threading.Thread(target=self._spawn, daemon=True).start()
+
+    def shutdown(self):
+        """关闭进程池，空闲进程立即销毁，运行中的进程在归还时销毁"""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for worker in idle:
+            worker.kill()
+
+    def get_stats(self):
+        with self._lock:
+            return dict(
+                self._stats,
+                environment_id=self.environment_id,
+                size=self.size,
+                idle=len(self._idle),
+                busy=self._busy,
+                starting=self._starting,
+                modules=self.modules,
+                max_runs=self.max_runs
+            )
+
+    def _spawn(self):
+        worker = None
+        try:
+            worker = WarmWorker(self.executable, self.modules)
+        except Exception as e:
+            print(f'[预热池] 环境 {self.environment_id} 启动预热进程失败: {str(e)}')
+        with self._lock:
+            self._starting -= 1
+            if worker is None:
+                self._stats['start_failures'] += 1
+            elif self._closed:
+                worker.kill()
+            else:
+                self._idle.append(worker)
+
+
+class WarmPoolManager:
+    """按执行环境管理预热池"""
+
+    def __init__(self):
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def get_pool(self, environment):
+        """
+        获取执行环境的预热池，环境配置变化时重建
+
+        Returns:
+            WarmPool: 环境未开启预热或平台不支持时返回 None
+        """
+        if not environment or environment.type != 'python' or not warm_pool_supported():
+            return None
+        size = environment.warm_pool_size or 0
+        stale = None
+        with self._lock:
+            pool = self._pools.get(environment.id)
+            if size <= 0:
+                stale = self._pools.pop(environment.id, None)
+                pool = None
+            else:
+                modules = parse_modules(environment.warm_pool_modules)
+                max_runs = environment.warm_pool_max_runs or Config.WARM_POOL_MAX_RUNS
+                signature = (environment.executable_path, tuple(modules), size, max_runs)
+                if pool is None or pool.signature != signature:
+                    stale = pool
+                    pool = WarmPool(environment.id, environment.executable_path, modules, size, max_runs)
+                    self._pools[environment.id] = pool
+        if stale:
+            stale.shutdown()
+        return pool
+
+    def prewarm(self, environments):
+        """为开启预热的环境提前启动工作进程"""
+        for environment in environments:
+            pool = self.get_pool(environment)
+            if pool:
+                pool.replenish()
+
+    def remove(self, environment_id):
+        """关闭并移除环境的预热池"""
+        with self._lock:
+            pool = self._pools.pop(environment_id, None)
+        if pool:
+            pool.shutdown()
+
+    def shutdown(self):
+        with self._lock:
+            pools, self._pools = list(self._pools.values()), {}
+        for pool in pools:
+            pool.shutdown()
+
+    def get_metrics(self):
+        """各环境预热池的状态与命中统计"""
+        with self._lock:
+            pools = list(self._pools.values())
+        return {
+            'supported': warm_pool_supported(),
+            'pools': [pool.get_stats() for pool in pools]
+        }
+
+
+# 创建全局预热池管理器实例
+warm_pool_manager = WarmPoolManager()
@@ -0,0 +1,156 @@
+"""
+预热解释器工作进程
+
+由 services.warm_pool 使用环境的解释器启动（python -u warm_worker.py <预加载模块JSON>），
+只依赖标准库，不导入后端的任何模块。
+
+控制协议（每行一个 JSON）：
+- 启动完成后输出 {"type": "ready", "pid", "rss_kb", "preloaded", "failed"}
+- 从标准输入读取任务 {"script", "cwd", "env", "output"}，output 为父进程创建的命名管道
+- 任务期间 fd 1/2 重定向到 output，脚本在全新的 __main__ 命名空间中运行
+- 任务结束后输出 {"type": "done", "exit_code", "elapsed_ms", "rss_kb", "recycle"}，
+  recycle 表示本次任务从 PYTHONPATH 中的依赖目录导入了模块，进程应被回收
+"""
+import json
+import os
+import runpy
+import sys
+import time
+import traceback
+
+
+def _rss_kb():
+    """当前常驻内存（KB）"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') // 1024
+    except (OSError, ValueError, IndexError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _exit_code(exc):
+    """按解释器的规则把 SystemExit 转换为退出码"""
+    if exc.code is None:
+        return 0
+    if isinstance(exc.code, int):
+        return exc.code
+    print(exc.code, file=sys.stderr)
+    return 1
+
+
+def _new_modules_under(directories, baseline):
+    """本次任务新导入的、位于指定目录下的模块名"""
+    prefixes = tuple(os.path.join(os.path.realpath(d), '') for d in directories)
+    names = []
+    for name, module in list(sys.modules.items()):
+        if name in baseline:
+            continue
+        path = getattr(module, '__file__', None)
+        if path and os.path.realpath(path).startswith(prefixes):
+            names.append(name)
+    return names
+
+
+def _purge_modules(cwd, baseline):
+    """卸载本次任务从工作目录导入的模块，避免下一次任务拿到旧代码"""
+    for name in _new_modules_under([cwd], baseline):
+        del sys.modules[name]
+
+
+def run_job(job, saved_out, saved_err):
+    """执行一个任务，返回结果消息"""
+    fifo_fd = os.open(job['output'], os.O_WRONLY)
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os.dup2(fifo_fd, 1)
+    os.dup2(fifo_fd, 2)
+    os.close(fifo_fd)
+
+    old_cwd = os.getcwd()
+    old_env = dict(os.environ)
+    old_path = list(sys.path)
+    old_argv = list(sys.argv)
+    baseline = set(sys.modules)
+    # 依赖缓存目录通过 PYTHONPATH 传入，解释器启动后才设置的 PYTHONPATH 不会自动生效
+    extra_paths = [p for p in job['env'].get('PYTHONPATH', '').split(os.pathsep) if p]
+    exit_code = 0
+    started = time.perf_counter()
+    try:
+        os.chdir(job['cwd'])
+        os.environ.clear()
+        os.environ.update(job['env'])
+        sys.argv = [job['script']]
+        sys.path[0:0] = [job['cwd']] + extra_paths
+        runpy.run_path(job['script'], run_name='__main__')
+    except SystemExit as e:
+        exit_code = _exit_code(e)
+    except BaseException:
+        traceback.print_exc()
+        exit_code = 1
+    finally:
+        elapsed_ms = int((time.perf_counter() - started) * 1000)
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        except Exception:
+            pass
+        # 恢复标准输出后命名管道的写端全部关闭，父进程读到 EOF
+        os.dup2(saved_out, 1)
+        os.dup2(saved_err, 2)
+        os.chdir(old_cwd)
+        os.environ.clear()
+        os.environ.update(old_env)
+        sys.path[:] = old_path
+        sys.argv = old_argv
+        _purge_modules(job['cwd'], baseline)
+        # 已加载的扩展模块无法安全卸载，导入过依赖目录模块的进程交由父进程回收
+        recycle = bool(extra_paths and _new_modules_under(extra_paths, baseline))
+
+    return {
+        'type': 'done',
+        'exit_code': exit_code,
+        'elapsed_ms': elapsed_ms,
+        'rss_kb': _rss_kb(),
+        'recycle': recycle
+    }
+
+
+def main():
+    # 控制通道使用原始标准输入/输出的副本，脚本自身的标准输入指向空设备
+    control_in = os.fdopen(os.dup(0), 'r', encoding='utf-8')
+    control_out = os.fdopen(os.dup(1), 'w', encoding='utf-8', buffering=1)
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)
+    os.close(devnull)
+    # 空闲时的输出（如脚本遗留的后台线程）写到标准错误，不会混入控制通道
+    os.dup2(2, 1)
+    saved_out = os.dup(1)
+    saved_err = os.dup(2)
+
+    modules = json.loads(sys.argv[1]) if len(sys.argv) > 1 else []
+    preloaded, failed = [], []
+    for name in modules:
+        try:
+            __import__(name)
+            preloaded.append(name)
+        except Exception as e:
+            failed.append(f'{name}: {e}')
+
+    control_out.write(json.dumps({
+        'type': 'ready',
+        'pid': os.getpid(),
+        'rss_kb': _rss_kb(),
+        'preloaded': preloaded,
+        'failed': failed
+    }) + '\n')
+
+    for line in control_in:
+        if not line.strip():
+            continue
+        result = run_job(json.loads(line), saved_out, saved_err)
+        control_out.write(json.dumps(result) + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -6,10 +6,9 @@ import json
 import time
 from datetime import datetime
 from models import db, Webhook, WebhookLog, Execution
-from services.executor import execute_script
+from services.dispatcher import execution_dispatcher
 from config import Config
-from threading import Thread, Event
-from flask import current_app
+from threading import Event
 
 
 def execute_webhook(webhook_id, request_data, request_context):
@@ -87,30 +86,31 @@ def execute_webhook(webhook_id, request_data, request_context):
             return result['status'], result['data'], result['code']
 
         else:
-            # 异步执行
-            app = current_app._get_current_object()
-
-            def run_async():
-                with app.app_context():
-                    execute_script(execution.id)
-                    # 异步执行完成后更新日志
-                    db.session.refresh(execution)
-                    duration_ms = int((time.time() - start_time) * 1000)
-                    log.status = execution.status
-                    log.duration_ms = duration_ms
-                    log.response_code = 200 if execution.status == 'success' else 500
-                    log.error_message = execution.error
-                    db.session.commit()
-
-                    # 更新统计
-                    if execution.status == 'success':
-                        webhook.success_count += 1
-                    else:
-                        webhook.failed_count += 1
-                    db.session.commit()
-
-            thread = Thread(target=run_async)
-            thread.start()
+            # 异步执行：加入执行队列，完成后由调度器工作线程回调更新日志
+            webhook_id = webhook.id
+            log_id = log.id
+
+            def on_complete(execution_id):
+                finished = Execution.query.get(execution_id)
+                async_log = WebhookLog.query.get(log_id)
+                async_webhook = Webhook.query.get(webhook_id)
+                if not finished or not async_log or not async_webhook:
+                    return
+
+                duration_ms = int((time.time() - start_time) * 1000)
+                async_log.status = finished.status
+                async_log.duration_ms = duration_ms
+                async_log.response_code = 200 if finished.status == 'success' else 500
+                async_log.error_message = finished.error
+
+                # 更新统计
+                if finished.status == 'success':
+                    async_webhook.success_count += 1
+                else:
+                    async_webhook.failed_count += 1
+                db.session.commit()
+
+            execution_dispatcher.submit(execution.id, priority=Execution.PRIORITY_WEBHOOK, on_complete=on_complete)
 
             # 立即返回
             duration_ms = int((time.time() - start_time) * 1000)
@@ -194,15 +194,15 @@ def save_request_info(execution_id, request_data):
 def execute_webhook_sync(execution_id, timeout):
     """
     同步执行webhook（阻塞等待结果）
+
+    执行本身仍由调度器的工作线程完成，受并发上限约束，排队时间计入超时。
     """
     result = {'status': 'failed', 'data': {}, 'code': 500}
     execution_done = Event()
 
-    def run_with_timeout():
+    def on_complete(finished_id):
         try:
-            execute_script(execution_id)
-            execution = Execution.query.get(execution_id)
-            db.session.refresh(execution)
+            execution = Execution.query.get(finished_id)
 
             if execution.status == 'success':
                 result['status'] = 'success'
@@ -225,8 +225,7 @@ def execute_webhook_sync(execution_id, timeout):
         finally:
             execution_done.set()
 
-    thread = Thread(target=run_with_timeout)
-    thread.start()
+    execution_dispatcher.submit(execution_id, priority=Execution.PRIORITY_WEBHOOK, on_complete=on_complete)
 
     # 等待执行完成或超时
     if not execution_done.wait(timeout=timeout):
@@ -0,0 +1,88 @@
+"""
+工作流事件总线
+
+进程内的发布/订阅通道：工作流引擎在节点或工作流状态提交后发布变化通知，
+SSE 订阅者收到通知后只查询发生变化的节点，不再定时轮询全部节点。
+
+事件只是通知（哪个节点、工作流状态），不携带输出等数据，订阅者从数据库读取最新状态。
+脚本节点关联的执行记录的进度与状态由日志总线发布，这里按执行ID转发为对应节点的变化通知。
+"""
+import threading
+from services.log_bus import Subscription, log_bus
+
+
+class WorkflowEventBus:
+    """工作流事件总线"""
+
+    FINAL_STATUSES = ('success', 'failed', 'cancelled')
+
+    def __init__(self):
+        self._subscribers = {}  # workflow_execution_id -> {Subscription}
+        self._active = set()  # 本进程正在执行的工作流
+        self._tracked = {}  # 脚本执行ID -> (workflow_execution_id, node_id)
+        self._lock = threading.Lock()
+
+    def subscribe(self, workflow_execution_id):
+        """订阅工作流执行的事件"""
+        subscription = Subscription(workflow_execution_id)
+        with self._lock:
+            self._subscribers.setdefault(workflow_execution_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """取消订阅"""
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.execution_id)
+            if subscribers is None:
+                return
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.execution_id]
+
+    def is_active(self, workflow_execution_id):
+        """工作流是否正在本进程中执行（状态变化会推送，订阅者无需轮询）"""
+        with self._lock:
+            return workflow_execution_id in self._active
+
+    def track_execution(self, execution_id, workflow_execution_id, node_id):
+        """登记脚本节点的执行记录，其进度与状态变化转发为节点变化通知"""
+        with self._lock:
+            self._tracked[execution_id] = (workflow_execution_id, node_id)
+        self.publish_node(workflow_execution_id, node_id)
+
+    def publish_node(self, workflow_execution_id, node_id):
+        """发布节点状态变化（节点执行记录提交后调用）"""
+        self._publish(workflow_execution_id, {'type': 'node', 'node_id': node_id})
+
+    def publish_status(self, workflow_execution_id, status):
+        """发布工作流状态变化，最终状态结束本进程的执行标记"""
+        with self._lock:
+            if status in self.FINAL_STATUSES:
+                self._active.discard(workflow_execution_id)
+                self._tracked = {execution_id: target for execution_id, target in self._tracked.items()
+                                 if target[0] != workflow_execution_id}
+            else:
+                self._active.add(workflow_execution_id)
+        self._publish(workflow_execution_id, {'type': 'status', 'status': status})
+
+    def _publish(self, workflow_execution_id, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(workflow_execution_id, ()))
+        for subscription in subscribers:
+            subscription.put(event)
+
+    def _on_log_event(self, execution_id, event):
+        """日志总线监听器：脚本节点执行记录的进度与状态变化"""
+        if event['type'] not in ('progress', 'status'):
+            return
+        with self._lock:
+            target = self._tracked.get(execution_id)
+            if target and event['type'] == 'status' and event['status'] in log_bus.FINAL_STATUSES:
+                del self._tracked[execution_id]
+        if target:
+            self.publish_node(*target)
+
+
+# 创建全局工作流事件总线实例
+workflow_events = WorkflowEventBus()
+log_bus.add_listener(workflow_events._on_log_event)
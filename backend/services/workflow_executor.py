@@ -5,24 +5,55 @@ import sys
 import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from app import create_app
+from flask import current_app
+from config import Config
 from models import db
 from models.workflow import Workflow, WorkflowNode, WorkflowEdge, WorkflowExecution, WorkflowNodeExecution
 from models.script import Script
 from models.execution import Execution
 from services.executor import execute_script
+from services import space_ledger
+from services.workflow_events import workflow_events
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from datetime import datetime
 import json
 import logging
+import threading
+import time
 
 # 配置日志
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 
-def execute_workflow_async(workflow_execution_id):
-    """异步执行工作流"""
-    app = create_app()
+def start_workflow_execution(workflow_execution_id, app=None):
+    """
+    在后台线程中执行工作流
+
+    复用已创建的应用实例（默认为当前请求所在的应用），
+    不会为每次执行重新创建应用、重新加载定时任务或触发清理检查。
+
+    Args:
+        workflow_execution_id: 工作流执行记录ID
+        app: Flask 应用实例，在应用上下文之外调用时必须提供
+
+    Returns:
+        threading.Thread: 执行线程
+    """
+    app = app or current_app._get_current_object()
+    thread = threading.Thread(
+        target=execute_workflow_async,
+        args=(workflow_execution_id, app),
+        name=f'workflow-execution-{workflow_execution_id}',
+        daemon=True
+    )
+    thread.start()
+    return thread
+
+
+def execute_workflow_async(workflow_execution_id, app):
+    """异步执行工作流（在工作线程中运行，进入传入应用的上下文）"""
     with app.app_context():
         try:
             execution = WorkflowExecution.query.get(workflow_execution_id)
@@ -34,9 +65,9 @@ def execute_workflow_async(workflow_execution_id):
             execution.status = 'running'
             execution.start_time = datetime.utcnow()
             db.session.commit()
+            workflow_events.publish_status(workflow_execution_id, 'running')
 
             # 创建工作流执行的共享工作空间
-            from config import Config
             workflow_space = Config.ensure_workflow_execution_space(workflow_execution_id)
             logger.info(f"[工作流执行] 工作流执行空间: {workflow_space}")
             sys.stdout.flush()
@@ -64,8 +95,12 @@ def execute_workflow_async(workflow_execution_id):
             # 获取执行参数
             params = json.loads(execution.params) if execution.params else {}
 
+            # 工作流级别的并发上限（workflow.config.max_parallel）
+            workflow_config = json.loads(workflow.config) if workflow.config else {}
+            max_parallel = workflow_config.get('max_parallel')
+
             # 执行工作流（传递工作流执行空间）
-            success = execute_workflow_graph(execution, graph, nodes, params, workflow_space)
+            success = execute_workflow_graph(execution, graph, nodes, params, workflow_space, max_parallel)
 
             # 重新获取执行记录以确保更新生效（因为工作流执行过程中session可能被清理）
             db.session.expire_all()
@@ -75,7 +110,9 @@ def execute_workflow_async(workflow_execution_id):
                 # 更新执行状态
                 execution.status = 'success' if success else 'failed'
                 execution.end_time = datetime.utcnow()
+                space_ledger.record_workflow_execution(execution)
                 db.session.commit()
+                workflow_events.publish_status(workflow_execution_id, execution.status)
                 logger.info(f"[工作流执行] 工作流状态已更新为{execution.status}")
                 sys.stdout.flush()
 
@@ -88,7 +125,9 @@ def execute_workflow_async(workflow_execution_id):
                 execution.status = 'failed'
                 execution.error = str(e)
                 execution.end_time = datetime.utcnow()
+                space_ledger.record_workflow_execution(execution)
                 db.session.commit()
+            workflow_events.publish_status(workflow_execution_id, 'failed')
 
 
 def build_dependency_graph(nodes, edges):
@@ -111,116 +150,202 @@ def build_dependency_graph(nodes, edges):
     return graph
 
 
-def execute_workflow_graph(workflow_execution, graph, nodes, params, workflow_space):
-    """执行工作流图"""
+def execute_workflow_graph(workflow_execution, graph, nodes, params, workflow_space, max_parallel=None):
+    """
+    执行工作流图
+
+    按入度计数做拓扑调度：节点的所有前置节点都结束（成功、失败或跳过）后才会就绪，
+    就绪节点在线程池中并发执行，同时运行的节点数不超过 max_parallel。
+
+    汇合语义：默认（join 为 all）节点的所有入边都处于激活状态时才执行，任一入边的条件不成立
+    或源节点被跳过即跳过该节点（与早期逐条检查入边条件的行为一致），跳过会沿出边向下传递。
+    入边激活的条件是源节点已执行（未被跳过）且边上的条件成立；
+    节点配置 {"join": "any"} 时只要有一条入边激活就执行（例如汇合互斥的条件分支）。
+
+    脚本节点失败且没有配置 failed 条件的出边时终止工作流：不再调度新节点，等待运行中的节点结束。
+
+    Returns:
+        bool: 工作流是否成功
+    """
     # 提取workflow_execution_id以避免session detach
     workflow_execution_id = workflow_execution.id
+    max_parallel = max(int(max_parallel or Config.WORKFLOW_MAX_PARALLEL), 1)
 
-    # 找到入口节点（没有依赖的节点）
-    entry_nodes = [node_id for node_id, info in graph.items() if not info['deps']]
+    # 入度计数（重复的边按条数计算）
+    indegree = {node_id: len(info['deps']) for node_id, info in graph.items()}
+    entry_nodes = [node_id for node_id, count in indegree.items() if count == 0]
 
     if not entry_nodes:
         raise Exception('工作流没有入口节点')
 
-    logger.info(f"[工作流执行] 入口节点: {entry_nodes}")
-    logger.info(f"[工作流执行] 所有节点: {list(nodes.keys())}")
+    logger.info(f"[工作流执行] 入口节点: {entry_nodes}, 并发上限: {max_parallel}")
     logger.info(f"[工作流执行] 依赖关系图: {graph}")
     sys.stdout.flush()
 
-    # 节点执行结果
+    app = current_app._get_current_object()
     node_results = {}
+    node_status = {}
+    timings = {}  # node_id -> (开始时间, 结束时间)
+    resolved_order = []  # 节点结束的顺序，即一个拓扑序
+    ready = deque(entry_nodes)
+    running = {}
+    aborted = False
+    started_at = time.monotonic()
+
+    def run_node(node_id):
+        with app.app_context():
+            return execute_node(workflow_execution_id, nodes[node_id], params, dict(node_results), workflow_space)
+
+    def resolve(node_id):
+        resolved_order.append(node_id)
+        for next_node in graph[node_id]['next']:
+            next_node_id = next_node['node_id']
+            indegree[next_node_id] -= 1
+            if indegree[next_node_id] == 0:
+                ready.append(next_node_id)
+
+    with ThreadPoolExecutor(max_workers=max_parallel, thread_name_prefix=f'workflow-{workflow_execution_id}') as pool:
+        while ready or running:
+            while ready and not aborted and len(running) < max_parallel:
+                node_id = ready.popleft()
+                if not should_run_node(nodes[node_id], graph[node_id]['deps'], node_status, node_results):
+                    logger.info(f"[工作流执行] 节点 {node_id} 没有激活的入边，跳过")
+                    node_status[node_id] = 'skipped'
+                    now = time.monotonic()
+                    timings[node_id] = (now, now)
+                    create_node_execution(workflow_execution_id, node_id, 'skipped', '条件不满足')
+                    resolve(node_id)
+                    continue
 
-    # 已执行的节点
-    executed = set()
+                logger.info(f"[工作流执行] 开始执行节点 {node_id}")
+                node_status[node_id] = 'running'
+                timings[node_id] = (time.monotonic(), None)
+                running[pool.submit(run_node, node_id)] = node_id
 
-    # 待执行队列
-    queue = entry_nodes.copy()
+            if not running:
+                # 终止后剩余的就绪节点不再执行
+                if aborted:
+                    break
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                node_id = running.pop(future)
+                try:
+                    success, result = future.result()
+                except Exception as e:
+                    logger.error(f"[工作流执行] 节点 {node_id} 执行异常: {str(e)}")
+                    success, result = False, {'status': 'failed', 'error': str(e)}
+                timings[node_id] = (timings[node_id][0], time.monotonic())
+                node_status[node_id] = 'success' if success else 'failed'
+                node_results[node_id] = result
+                logger.info(f"[工作流执行] 节点 {node_id} 执行完成，success={success}")
+                sys.stdout.flush()
 
-    while queue:
-        node_id = queue.pop(0)
-        logger.info(f"[工作流执行] 处理节点: {node_id}")
-        sys.stdout.flush()
+                if not success and nodes[node_id]['node_type'] == 'script' and not handles_failure(graph[node_id]):
+                    logger.info(f"[工作流执行] 脚本节点 {node_id} 失败，终止工作流")
+                    aborted = True
+                resolve(node_id)
 
-        if node_id in executed:
-            logger.info(f"[工作流执行] 节点 {node_id} 已执行，跳过")
-            sys.stdout.flush()
-            continue
+    wall_time = time.monotonic() - started_at
+    if not aborted and len(resolved_order) < len(graph):
+        pending = [node_id for node_id in graph if node_id not in node_status]
+        raise Exception(f'工作流存在循环依赖，无法执行的节点: {pending}')
 
-        node = nodes[node_id]
+    report = build_run_report(graph, node_status, timings, resolved_order, wall_time, max_parallel)
+    save_run_report(workflow_execution_id, report)
+    logger.info(f"[工作流执行] 工作流执行完成，关键路径: {report['critical_path']} ({report['critical_path_duration']}s)")
+    sys.stdout.flush()
+    return not aborted
 
-        # 检查依赖是否都已执行
-        deps = graph[node_id]['deps']
-        logger.info(f"[工作流执行] 节点 {node_id} 的依赖: {deps}")
-        sys.stdout.flush()
-        deps_ready = True
-        for dep in deps:
-            dep_node_id = dep['node_id']
-            if dep_node_id not in executed:
-                logger.info(f"[工作流执行] 依赖节点 {dep_node_id} 未执行，等待")
-                sys.stdout.flush()
-                deps_ready = False
-                break
 
-            # 检查条件
-            if dep['condition']:
-                logger.info(f"[工作流执行] 检查条件: {dep['condition']}")
-                logger.info(f"[工作流执行] 当前node_results: {node_results}")
-                sys.stdout.flush()
-                # 传递整个node_results作为context，让evaluate_condition根据condition中的node_id查找
-                if not evaluate_condition(dep['condition'], node_results):
-                    # 条件不满足，跳过此节点
-                    logger.info(f"[工作流执行] 条件不满足，跳过节点 {node_id}")
-                    sys.stdout.flush()
-                    executed.add(node_id)
-                    create_node_execution(workflow_execution_id, node_id, 'skipped', '条件不满足')
-                    deps_ready = False
-                    break
-                else:
-                    logger.info(f"[工作流执行] 条件满足")
-                    sys.stdout.flush()
+def should_run_node(node, deps, node_status, node_results):
+    """
+    判断就绪节点是否执行（所有前置节点均已结束）
 
-        if not deps_ready:
-            logger.info(f"[工作流执行] 节点 {node_id} 依赖未就绪，继续下一个")
-            sys.stdout.flush()
+    入口节点总是执行；其他节点根据激活的入边数量和 join 配置决定。
+    """
+    if not deps:
+        return True
+
+    active = 0
+    for dep in deps:
+        if node_status.get(dep['node_id']) not in ('success', 'failed'):
+            continue
+        if dep['condition'] and not evaluate_condition(dep['condition'], node_results):
             continue
+        active += 1
 
-        # 执行节点
-        logger.info(f"[工作流执行] 开始执行节点 {node_id}")
-        sys.stdout.flush()
-        success, result = execute_node(workflow_execution_id, node, params, node_results, workflow_space)
-        logger.info(f"[工作流执行] 节点 {node_id} 执行完成，success={success}, result={result}")
-        sys.stdout.flush()
-        node_results[node_id] = result
-        executed.add(node_id)
+    config = json.loads(node['config']) if node.get('config') else {}
+    if config.get('join', 'all') == 'any':
+        return active > 0
+    return active == len(deps)
 
-        if not success and node['node_type'] == 'script':
-            # 脚本节点执行失败，终止工作流
-            logger.info(f"[工作流执行] 脚本节点 {node_id} 失败，终止工作流")
-            sys.stdout.flush()
-            return False
 
-        # 将下一个节点加入队列
-        next_nodes = graph[node_id]['next']
-        logger.info(f"[工作流执行] 节点 {node_id} 的下一个节点: {next_nodes}")
-        sys.stdout.flush()
-        for next_node in next_nodes:
-            next_node_id = next_node['node_id']
-            if next_node_id not in executed and next_node_id not in queue:
-                logger.info(f"[工作流执行] 将节点 {next_node_id} 加入队列")
-                sys.stdout.flush()
-                queue.append(next_node_id)
+def handles_failure(graph_info):
+    """节点是否有 failed 条件的出边（失败由下游分支处理，不终止工作流）"""
+    return any(
+        (next_node['condition'] or {}).get('type') == 'failed'
+        for next_node in graph_info['next']
+    )
 
-        logger.info(f"[工作流执行] 当前队列: {queue}, 已执行: {executed}")
-        sys.stdout.flush()
 
-    logger.info(f"[工作流执行] 工作流执行完成")
-    sys.stdout.flush()
-    return True
+def build_run_report(graph, node_status, timings, resolved_order, wall_time, max_parallel):
+    """
+    生成执行报告与关键路径
+
+    关键路径为按节点实际耗时计算的最长依赖链，决定了工作流的最短可能总耗时。
+    """
+    durations = {}
+    for node_id, (start, end) in timings.items():
+        durations[node_id] = round(end - start, 3) if end is not None else 0.0
+
+    # 按拓扑序计算到达每个节点的最长路径
+    finish = {}
+    previous = {}
+    for node_id in resolved_order:
+        best_dep, best = None, 0.0
+        for dep in graph[node_id]['deps']:
+            dep_id = dep['node_id']
+            if dep_id in finish and finish[dep_id] > best:
+                best_dep, best = dep_id, finish[dep_id]
+        finish[node_id] = best + durations.get(node_id, 0.0)
+        previous[node_id] = best_dep
+
+    path = []
+    if finish:
+        node_id = max(finish, key=finish.get)
+        while node_id is not None:
+            path.append(node_id)
+            node_id = previous[node_id]
+        path.reverse()
+
+    total_node_time = sum(durations.values())
+    return {
+        'wall_time': round(wall_time, 3),
+        'max_parallel': max_parallel,
+        'critical_path': path,
+        'critical_path_duration': round(finish[path[-1]], 3) if path else 0.0,
+        'total_node_time': round(total_node_time, 3),
+        'parallelism': round(total_node_time / wall_time, 2) if wall_time > 0 else None,
+        'nodes': {
+            node_id: {'status': node_status[node_id], 'duration': durations.get(node_id, 0.0)}
+            for node_id in node_status
+        }
+    }
+
+
+def save_run_report(workflow_execution_id, report):
+    """保存执行报告到工作流执行记录"""
+    execution = WorkflowExecution.query.get(workflow_execution_id)
+    if execution:
+        execution.run_report = json.dumps(report)
+        db.session.commit()
 
 
 def execute_node(workflow_execution_id, node_dict, params, node_results, workflow_space):
     """执行单个节点"""
-    node_execution = None
+    node_execution_id = None
     try:
         # node_dict 是一个简单字典，包含: node_id, node_type, script_id, config
         node_id = node_dict['node_id']
@@ -247,6 +372,7 @@ def execute_node(workflow_execution_id, node_dict, params, node_results, workflo
         sys.stdout.flush()
 
         db.session.commit()
+        workflow_events.publish_node(workflow_execution_id, node_id)
         logger.info(f"[execute_node] 节点执行记录已提交到数据库")
         sys.stdout.flush()
 
@@ -273,6 +399,10 @@ def execute_node(workflow_execution_id, node_dict, params, node_results, workflo
             # 条件节点（仅评估，不执行）
             result = evaluate_condition_node(node_config, node_results)
 
+        elif node_type == 'parallel':
+            # 并行网关节点（分支的拆分与汇合由调度器完成）
+            result = execute_parallel_node(node_config)
+
         logger.info(f"[execute_node] 准备重新获取节点执行记录")
         sys.stdout.flush()
 
@@ -289,6 +419,7 @@ def execute_node(workflow_execution_id, node_dict, params, node_results, workflo
             node_execution.output = json.dumps(result) if result else None
             node_execution.end_time = datetime.utcnow()
             db.session.commit()
+            workflow_events.publish_node(workflow_execution_id, node_id)
             logger.info(f"[execute_node] 节点状态已更新为success")
             sys.stdout.flush()
 
@@ -300,20 +431,22 @@ def execute_node(workflow_execution_id, node_dict, params, node_results, workflo
         logger.error(f'[execute_node] 异常堆栈:\n{traceback.format_exc()}')
         sys.stdout.flush()
 
-        # 重新获取节点执行记录
-        if node_execution and hasattr(node_execution, 'id') and node_execution.id:
+        # 重新获取节点执行记录（execute_script 会清理 session，不能再访问原对象）
+        if node_execution_id:
             try:
-                db.session.expire_all()
-                node_execution = WorkflowNodeExecution.query.get(node_execution.id)
+                db.session.rollback()
+                node_execution = WorkflowNodeExecution.query.get(node_execution_id)
                 if node_execution:
                     node_execution.status = 'failed'
                     node_execution.error = str(e)
                     node_execution.end_time = datetime.utcnow()
                     db.session.commit()
+                    workflow_events.publish_node(workflow_execution_id, node_dict['node_id'])
             except Exception as e2:
                 logger.error(f'[execute_node] 更新失败状态时出错: {str(e2)}')
                 sys.stdout.flush()
-        return False, None
+        # 失败结果供 failed 条件的出边判断
+        return False, {'status': 'failed', 'error': str(e)}
 
 
 def execute_script_node(script_id, params, node_execution, workflow_space):
@@ -337,8 +470,11 @@ def execute_script_node(script_id, params, node_execution, workflow_space):
     script_execution_id = script_execution.id
 
     # 关联到节点执行
+    workflow_execution_id = node_execution.workflow_execution_id
+    node_id = node_execution.node_id
     node_execution.execution_id = script_execution_id
     db.session.commit()
+    workflow_events.track_execution(script_execution_id, workflow_execution_id, node_id)
 
     # 执行脚本（在工作流空间中执行）
     execute_script(script_execution_id, custom_cwd=workflow_space)
@@ -372,6 +508,17 @@ def execute_delay_node(node_config, node_execution):
     return {'delayed': delay_seconds}
 
 
+def execute_parallel_node(node_config):
+    """
+    执行并行网关节点
+
+    网关本身不做任何工作：它的所有出边在同一时刻就绪，由调度器并发执行；
+    作为汇合点时按入边的 join 配置等待分支结束。
+    """
+    config = json.loads(node_config) if node_config else {}
+    return {'status': 'success', 'join': config.get('join', 'all')}
+
+
 def evaluate_condition_node(node_config, node_results):
     """评估条件节点"""
     config = json.loads(node_config) if node_config else {}
@@ -390,14 +537,14 @@ def evaluate_condition(condition, context):
     if condition_type == 'success':
         # 检查前置节点是否成功
         node_id = condition.get('node_id')
-        if node_id in context:
+        if isinstance(context.get(node_id), dict):
             return context[node_id].get('status') == 'success'
         return False
 
     elif condition_type == 'failed':
         # 检查前置节点是否失败
         node_id = condition.get('node_id')
-        if node_id in context:
+        if isinstance(context.get(node_id), dict):
             return context[node_id].get('status') == 'failed'
         return False
 
@@ -425,3 +572,4 @@ def create_node_execution(workflow_execution_id, node_id, status, message=''):
     )
     db.session.add(node_execution)
     db.session.commit()
+    workflow_events.publish_node(workflow_execution_id, node_id)
@@ -2,215 +2,603 @@
 """
 系统备份工具
 
-功能：备份脚本文件、执行空间、工作流目录、日志文件等
+功能：备份脚本文件、数据文件、执行空间、工作流执行空间、日志文件等
+
+备份为增量快照：
+- 文件按 Config.BACKUP_CHUNK_SIZE 切分为数据块，以 SHA-256 内容寻址存入 BACKUPS_DIR/store/chunks，
+  相同内容的数据块只存一份，每次备份只写入新的数据块
+- 大小与修改时间未变化的文件直接沿用上一个快照的数据块列表，不再读取
+- 哈希与压缩在线程池中并行执行（hashlib 与 zlib 处理大块数据时释放 GIL）
+- 每个快照对应一个清单文件 BACKUPS_DIR/<名称>.snapshot（gzip 压缩的 JSON），记录文件与数据块的对应关系
+- 恢复时可只恢复某个路径（例如单个执行空间），也可按需导出为 tar.gz 流
+
+旧版本生成的 .tar.gz 完整备份仍可列出、下载与删除。
 """
 import os
 import sys
-import shutil
-import datetime
+import json
+import gzip
+import stat
+import zlib
+import uuid
+import time
+import hashlib
 import tarfile
+import datetime
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 # 将backend目录添加到Python路径
-sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from config import Config
 
 
-def get_directory_size(path):
-    """计算目录大小"""
-    total_size = 0
-    try:
-        for dirpath, dirnames, filenames in os.walk(path):
-            for filename in filenames:
-                filepath = os.path.join(dirpath, filename)
-                if os.path.exists(filepath):
-                    total_size += os.path.getsize(filepath)
-    except Exception as e:
-        print(f"  ⚠ 计算大小失败: {e}")
-    return total_size
+SNAPSHOT_SUFFIX = '.snapshot'
+MANIFEST_VERSION = 1
 
+# 数据块文件首字节：压缩后更小时存 zlib 压缩数据，否则存原始数据（已压缩的文件）
+BLOB_ZLIB = b'Z'
+BLOB_RAW = b'R'
 
-def count_files(path):
-    """计算目录中的文件数"""
-    total_files = 0
-    try:
-        for dirpath, dirnames, filenames in os.walk(path):
-            total_files += len(filenames)
-    except:
-        pass
-    return total_files
+# 备份与清理数据块不能同时进行
+_store_lock = threading.Lock()
+
+
+def get_store_dir():
+    """数据块存储目录"""
+    return os.path.join(Config.BACKUPS_DIR, 'store', 'chunks')
+
+
+def _chunk_path(digest):
+    return os.path.join(get_store_dir(), digest[:2], digest)
+
+
+def _manifest_path(name):
+    return os.path.join(Config.BACKUPS_DIR, f'{name}{SNAPSHOT_SUFFIX}')
+
+
+def _snapshot_name(filename):
+    """文件名 -> 快照名称（去掉 .snapshot 后缀）"""
+    return filename[:-len(SNAPSHOT_SUFFIX)] if filename.endswith(SNAPSHOT_SUFFIX) else filename
+
+
+def _store_chunk(data):
+    """
+    存储一个数据块（在线程池中运行）
+
+    Returns:
+        tuple: (SHA-256, 新写入的字节数，已存在时为0)
+    """
+    digest = hashlib.sha256(data).hexdigest()
+    path = _chunk_path(digest)
+    if os.path.exists(path):
+        return digest, 0
+
+    compressed = zlib.compress(data, Config.BACKUP_COMPRESS_LEVEL)
+    if len(compressed) < len(data):
+        header, payload = BLOB_ZLIB, compressed
+    else:
+        header, payload = BLOB_RAW, data
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # 先写临时文件再原子替换，中断的备份不会留下损坏的数据块
+    tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(header)
+        f.write(payload)
+    os.replace(tmp_path, path)
+    return digest, len(payload) + 1
+
+
+def read_chunk(digest):
+    """读取并校验一个数据块"""
+    with open(_chunk_path(digest), 'rb') as f:
+        blob = f.read()
+    data = zlib.decompress(blob[1:]) if blob[:1] == BLOB_ZLIB else blob[1:]
+    if hashlib.sha256(data).hexdigest() != digest:
+        raise ValueError(f'数据块校验失败: {digest}')
+    return data
+
+
+def load_manifest(name):
+    """读取快照清单"""
+    with gzip.open(_manifest_path(_snapshot_name(name)), 'rt', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _write_manifest(manifest):
+    path = _manifest_path(manifest['name'])
+    tmp_path = f'{path}.tmp'
+    with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(tmp_path, path)
+    return path
+
+
+def _list_snapshot_names():
+    if not os.path.exists(Config.BACKUPS_DIR):
+        return []
+    return [_snapshot_name(filename) for filename in os.listdir(Config.BACKUPS_DIR)
+            if filename.endswith(SNAPSHOT_SUFFIX)]
+
+
+def _latest_manifest():
+    """最近一个快照的清单，作为增量备份的基准"""
+    latest = None
+    for name in _list_snapshot_names():
+        try:
+            manifest = load_manifest(name)
+        except Exception as e:
+            print(f"  ⚠ 读取快照清单失败 {name}: {e}")
+            continue
+        if latest is None or manifest['created'] > latest['created']:
+            latest = manifest
+    return latest
+
+
+def get_backup_items(include_logs=False, include_execution_spaces=True):
+    """需要备份的目录列表"""
+    candidates = [
+        (Config.SCRIPTS_DIR, 'scripts', '脚本文件'),
+        (Config.DATA_DIR, 'data', '数据文件'),
+    ]
+    if include_execution_spaces:
+        candidates += [
+            (Config.EXECUTION_SPACES_DIR, 'execution_spaces', '执行空间'),
+            (Config.WORKFLOW_EXECUTION_SPACES_DIR, 'workflow_execution_spaces', '工作流执行空间'),
+            (Config.WORKSPACES_DIR, 'workspaces', '工作空间'),
+        ]
+    if include_logs:
+        candidates.append((Config.LOGS_DIR, 'logs', '日志文件'))
+
+    return [{'path': path, 'arcname': arcname, 'name': name}
+            for path, arcname, name in candidates if os.path.exists(path)]
+
+
+def get_excluded_paths():
+    """
+    备份目录中不需要备份的路径
+
+    Excel 列式快照是可随时重新生成的缓存（上限 EXCEL_SNAPSHOT_MAX_BYTES），
+    备份它只会让每个快照都多出大量无用数据；协同编辑、会话和消息队列的 SQLite
+    文件在服务运行时持续写入，逐块复制得到的副本并不一致，其中的版本号与编辑历史
+    也只对当前运行的服务有意义（未写入的编辑保存在 EXCEL_JOURNAL_DIR 中，照常备份）
+    """
+    excluded = {os.path.realpath(Config.EXCEL_SNAPSHOT_DIR)}
+    databases = [Config.EXCEL_COLLAB_SHARED_DB]
+    for url in (Config.EXCEL_COLLAB_STORE, Config.SOCKETIO_SESSION_STORE, Config.SOCKETIO_MESSAGE_QUEUE):
+        if url and url.startswith('sqlite:///'):
+            databases.append(url[len('sqlite:///'):])
+    for database in databases:
+        database = os.path.realpath(database)
+        excluded.update(database + suffix for suffix in ('', '-wal', '-shm', '-journal'))
+    return excluded
+
+
+def _scan(root, arcname, excluded=()):
+    """
+    遍历目录（不跟随符号链接）
+
+    Args:
+        root: 目录路径
+        arcname: 目录在清单中的路径
+        excluded: 跳过的路径集合（realpath）
+
+    Yields:
+        tuple: (清单路径, 文件路径, os.stat_result)
+    """
+    # 不跟随符号链接，子路径都基于解析后的根目录，可以直接与 excluded 比较
+    stack = [(os.path.realpath(root), arcname)]
+    while stack:
+        path, rel = stack.pop()
+        if path in excluded:
+            continue
+        try:
+            st = os.stat(path, follow_symlinks=False)
+            yield rel, path, st
+            with os.scandir(path) as entries:
+                children = sorted(entries, key=lambda entry: entry.name)
+        except OSError as e:
+            print(f"  ⚠ 无法读取目录 {path}: {e}")
+            continue
+        for entry in children:
+            child_rel = f'{rel}/{entry.name}'
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append((entry.path, child_rel))
+                elif entry.path not in excluded:
+                    yield child_rel, entry.path, entry.stat(follow_symlinks=False)
+            except OSError as e:
+                # 文件在备份过程中被删除
+                print(f"  ⚠ 跳过 {entry.path}: {e}")
 
 
 def backup_system(backup_name=None, include_logs=False, include_execution_spaces=True):
     """
-    备份系统文件
+    创建增量快照
 
     Args:
-        backup_name: 备份文件名（不含扩展名），如果为None则自动生成
+        backup_name: 快照名称（不含扩展名），如果为None则自动生成
         include_logs: 是否包含日志文件
         include_execution_spaces: 是否包含执行空间
 
     Returns:
-        str: 备份文件路径
+        str: 快照清单文件路径
     """
-    # 生成备份文件名
+    # 生成快照名称
     if not backup_name:
         timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
         backup_name = f'system_backup_{timestamp}'
 
-    backup_file = os.path.join(Config.BACKUPS_DIR, f'{backup_name}.tar.gz')
-
-    # 确保备份目录存在
     os.makedirs(Config.BACKUPS_DIR, exist_ok=True)
+    if os.path.exists(_manifest_path(backup_name)):
+        raise ValueError(f'快照已存在: {backup_name}')
 
     print("=" * 70)
     print("系统备份工具")
     print("=" * 70)
     print()
 
-    # 定义需要备份的目录
-    backup_items = []
-
-    # 1. 脚本目录
-    if os.path.exists(Config.SCRIPTS_DIR):
-        backup_items.append({
-            'path': Config.SCRIPTS_DIR,
-            'arcname': 'scripts',
-            'name': '脚本文件'
+    with _store_lock:
+        return _create_snapshot(backup_name, get_backup_items(include_logs, include_execution_spaces), {
+            'include_logs': include_logs,
+            'include_execution_spaces': include_execution_spaces
         })
 
-    # 2. 数据目录
-    if os.path.exists(Config.DATA_DIR):
-        backup_items.append({
-            'path': Config.DATA_DIR,
-            'arcname': 'data',
-            'name': '数据文件'
-        })
 
-    # 3. 执行空间
-    if include_execution_spaces:
-        if os.path.exists(Config.EXECUTION_SPACES_DIR):
-            backup_items.append({
-                'path': Config.EXECUTION_SPACES_DIR,
-                'arcname': 'execution_spaces',
-                'name': '执行空间'
-            })
+def _create_snapshot(backup_name, backup_items, options):
+    started = time.time()
+    parent = _latest_manifest()
+    previous = {}
+    if parent:
+        previous = {entry['path']: entry for entry in parent['entries'] if entry['type'] == 'file'}
+        print(f"增量基准: {parent['name']}（{len(previous)} 个文件）")
+
+    chunk_size = Config.BACKUP_CHUNK_SIZE
+    workers = max(1, Config.BACKUP_WORKERS)
+    # 限制读入内存、尚未处理的数据块数量
+    in_flight = threading.BoundedSemaphore(workers * 2)
+    pending = deque()
+    entries = []
+    stats = {'files': 0, 'total_bytes': 0, 'reused_files': 0, 'new_chunks': 0, 'new_bytes': 0}
+    excluded = get_excluded_paths()
+
+    def submit(data):
+        in_flight.acquire()
+        future = pool.submit(_store_chunk, data)
+        future.add_done_callback(lambda _: in_flight.release())
+        return future
+
+    def resolve(entry):
+        for index, future in enumerate(entry['chunks']):
+            digest, written = future.result()
+            entry['chunks'][index] = digest
+            if written:
+                stats['new_chunks'] += 1
+                stats['new_bytes'] += written
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for item in backup_items:
+            print(f"  正在备份: {item['name']}...")
+            item_files = 0
+            for rel, path, st in _scan(item['path'], item['arcname'], excluded):
+                mode = stat.S_IMODE(st.st_mode)
+                if stat.S_ISDIR(st.st_mode):
+                    entries.append({'path': rel, 'type': 'dir', 'mode': mode, 'mtime_ns': st.st_mtime_ns})
+                    continue
+                if stat.S_ISLNK(st.st_mode):
+                    entries.append({'path': rel, 'type': 'symlink', 'target': os.readlink(path)})
+                    continue
+                if not stat.S_ISREG(st.st_mode):
+                    continue
+
+                entry = {'path': rel, 'type': 'file', 'size': st.st_size, 'mode': mode, 'mtime_ns': st.st_mtime_ns}
+                stats['files'] += 1
+                stats['total_bytes'] += st.st_size
+                item_files += 1
+
+                old = previous.get(rel)
+                if old and old['size'] == st.st_size and old['mtime_ns'] == st.st_mtime_ns:
+                    # 文件未变化，沿用上一个快照的数据块
+                    entry['chunks'] = old['chunks']
+                    stats['reused_files'] += 1
+                    entries.append(entry)
+                    continue
+
+                futures = []
+                size = 0
+                try:
+                    with open(path, 'rb') as f:
+                        while True:
+                            data = f.read(chunk_size)
+                            if not data:
+                                break
+                            size += len(data)
+                            futures.append(submit(data))
+                except OSError as e:
+                    print(f"  ⚠ 读取失败 {path}: {e}")
+                    stats['files'] -= 1
+                    stats['total_bytes'] -= st.st_size
+                    for future in futures:
+                        future.result()
+                    continue
+                # 文件可能在扫描之后被修改：大小以实际读取的字节数为准，与数据块一致
+                entry['size'] = size
+                stats['total_bytes'] += size - st.st_size
+                entry['chunks'] = futures
+                entries.append(entry)
+                pending.append(entry)
+                # 按顺序回收已完成的数据块，避免积累大量 Future
+                while len(pending) > workers * 8:
+                    resolve(pending.popleft())
+            print(f"    ✓ {item_files} 个文件")
+
+        while pending:
+            resolve(pending.popleft())
+
+    stats['elapsed'] = round(time.time() - started, 2)
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'name': backup_name,
+        'created': datetime.datetime.now().isoformat(),
+        'parent': parent['name'] if parent else None,
+        'chunk_size': chunk_size,
+        'options': options,
+        'items': [{'arcname': item['arcname'], 'name': item['name']} for item in backup_items],
+        'entries': entries,
+        'stats': stats
+    }
+    manifest_file = _write_manifest(manifest)
+
+    total_mb = stats['total_bytes'] / (1024 * 1024)
+    new_mb = stats['new_bytes'] / (1024 * 1024)
+    print("-" * 70)
+    print(f"✓ 备份完成")
+    print(f"✓ 快照清单: {manifest_file}")
+    print(f"✓ 文件: {stats['files']} 个, {total_mb:.2f} MB（未变化 {stats['reused_files']} 个）")
+    print(f"✓ 新增数据块: {stats['new_chunks']} 个, {new_mb:.2f} MB")
+    print(f"✓ 耗时: {stats['elapsed']} 秒")
+    print()
 
-        # 工作流执行空间
-        workflow_spaces = os.path.join(os.path.dirname(Config.BASE_DIR), 'workflow_execution_spaces')
-        if os.path.exists(workflow_spaces):
-            backup_items.append({
-                'path': workflow_spaces,
-                'arcname': 'workflow_execution_spaces',
-                'name': '工作流执行空间'
-            })
+    return manifest_file
 
-        # 工作空间
-        workspaces = os.path.join(os.path.dirname(Config.BASE_DIR), 'workspaces')
-        if os.path.exists(workspaces):
-            backup_items.append({
-                'path': workspaces,
-                'arcname': 'workspaces',
-                'name': '工作空间'
-            })
 
-    # 4. 日志文件
-    if include_logs and os.path.exists(Config.LOGS_DIR):
-        backup_items.append({
-            'path': Config.LOGS_DIR,
-            'arcname': 'logs',
-            'name': '日志文件'
-        })
+def _select_entries(manifest, path=None):
+    """按路径前缀筛选清单条目（path 为空时返回全部）"""
+    if not path:
+        return manifest['entries']
+    path = path.strip('/')
+    return [entry for entry in manifest['entries']
+            if entry['path'] == path or entry['path'].startswith(path + '/')]
+
+
+def _safe_target(target_dir, rel):
+    """清单路径 -> 恢复目标路径，拒绝越出目标目录的路径"""
+    target = os.path.normpath(os.path.join(target_dir, rel))
+    if not target.startswith(os.path.normpath(target_dir) + os.sep):
+        raise ValueError(f'非法的快照路径: {rel}')
+    return target
 
-    # 5. 数据库文件
-    if os.path.exists(Config.DATABASE_PATH):
-        backup_items.append({
-            'path': Config.DATABASE_PATH,
-            'arcname': 'database/database.db',
-            'name': '数据库文件'
-        })
 
-    # 显示备份项统计
-    print("备份项目统计:")
-    total_size = 0
-    total_files = 0
+def _restore_file(entry, target):
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with open(target, 'wb') as f:
+        for digest in entry['chunks']:
+            f.write(read_chunk(digest))
+    os.chmod(target, entry['mode'])
+    os.utime(target, ns=(entry['mtime_ns'], entry['mtime_ns']))
+    return entry['size']
 
-    for item in backup_items:
-        if os.path.isfile(item['path']):
-            size = os.path.getsize(item['path'])
-            files = 1
+
+def restore_snapshot(name, target_dir=None, path=None):
+    """
+    从快照恢复文件
+
+    Args:
+        name: 快照名称
+        target_dir: 恢复目录，默认 BACKUPS_DIR/restore/<快照名称>（不会覆盖当前数据）
+        path: 只恢复该路径（例如 execution_spaces/execution_12），为空时恢复全部
+
+    Returns:
+        dict: 恢复目录、文件数与字节数
+    """
+    name = _snapshot_name(name)
+    manifest = load_manifest(name)
+    target_dir = os.path.abspath(target_dir or os.path.join(Config.BACKUPS_DIR, 'restore', name))
+    entries = _select_entries(manifest, path)
+    if not entries:
+        raise ValueError(f'快照 {name} 中不存在: {path}')
+
+    files = []
+    dirs = []
+    for entry in entries:
+        target = _safe_target(target_dir, entry['path'])
+        if entry['type'] == 'dir':
+            os.makedirs(target, exist_ok=True)
+            dirs.append((entry, target))
+        elif entry['type'] == 'symlink':
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            if os.path.lexists(target):
+                os.remove(target)
+            os.symlink(entry['target'], target)
         else:
-            size = get_directory_size(item['path'])
-            files = count_files(item['path'])
+            files.append((entry, target))
 
-        total_size += size
-        total_files += files
+    with ThreadPoolExecutor(max_workers=max(1, Config.BACKUP_WORKERS)) as pool:
+        restored_bytes = sum(pool.map(lambda args: _restore_file(*args), files))
 
-        size_mb = size / (1024 * 1024)
-        print(f"  ✓ {item['name']}: {files} 个文件, {size_mb:.2f} MB")
+    # 写入文件后再恢复目录权限与修改时间
+    for entry, target in reversed(dirs):
+        os.chmod(target, entry['mode'])
+        os.utime(target, ns=(entry['mtime_ns'], entry['mtime_ns']))
 
-    print(f"\n总计: {total_files} 个文件, {total_size / (1024*1024):.2f} MB")
-    print()
+    print(f"✓ 已从快照 {name} 恢复 {len(files)} 个文件到 {target_dir}")
+    return {'target_dir': target_dir, 'files': len(files), 'bytes': restored_bytes}
 
-    # 创建备份
-    print(f"开始创建备份: {backup_file}")
-    print("-" * 70)
 
-    with tarfile.open(backup_file, 'w:gz') as tar:
-        for item in backup_items:
-            print(f"  正在备份: {item['name']}...")
-            try:
-                tar.add(item['path'], arcname=item['arcname'])
-            except Exception as e:
-                print(f"  ⚠ 备份失败: {e}")
+def restore_execution_space(name, execution_id, target_dir=None):
+    """从快照恢复单个执行空间"""
+    rel = os.path.relpath(Config.get_execution_space(execution_id), Config.EXECUTION_SPACES_DIR)
+    return restore_snapshot(name, target_dir, f'execution_spaces/{rel}')
 
-    # 获取备份文件大小
-    backup_size = os.path.getsize(backup_file)
-    backup_size_mb = backup_size / (1024 * 1024)
-    compression_ratio = (1 - backup_size / total_size) * 100 if total_size > 0 else 0
 
-    print("-" * 70)
-    print(f"✓ 备份完成")
-    print(f"✓ 备份文件: {backup_file}")
-    print(f"✓ 备份大小: {backup_size_mb:.2f} MB ({backup_size:,} 字节)")
-    print(f"✓ 压缩率: {compression_ratio:.1f}%")
-    print()
+def iter_snapshot_tar(name, path=None):
+    """
+    将快照以 tar.gz 流的形式逐块输出（用于下载），不在磁盘上生成完整归档
+
+    Yields:
+        bytes: tar.gz 数据
+    """
+    manifest = load_manifest(name)
+    compressor = zlib.compressobj(Config.BACKUP_COMPRESS_LEVEL, zlib.DEFLATED, 31)
+    written = 0
+
+    def emit(data):
+        nonlocal written
+        written += len(data)
+        return compressor.compress(data)
+
+    for entry in _select_entries(manifest, path):
+        info = tarfile.TarInfo(entry['path'])
+        if entry['type'] == 'dir':
+            info.type = tarfile.DIRTYPE
+        elif entry['type'] == 'symlink':
+            info.type = tarfile.SYMTYPE
+            info.linkname = entry['target']
+        else:
+            info.size = entry['size']
+        info.mode = entry.get('mode', 0o777)
+        info.mtime = entry.get('mtime_ns', 0) / 1e9
+        yield emit(info.tobuf(tarfile.PAX_FORMAT, 'utf-8', 'surrogateescape'))
+
+        if entry['type'] == 'file':
+            # 按头部中的大小输出数据（数据块与大小不一致的旧快照截断或补零），保证归档结构完整
+            left = entry['size']
+            for digest in entry['chunks']:
+                if left <= 0:
+                    break
+                data = read_chunk(digest)[:left]
+                left -= len(data)
+                yield emit(data)
+            if left > 0:
+                yield emit(tarfile.NUL * left)
+            remainder = entry['size'] % tarfile.BLOCKSIZE
+            if remainder:
+                yield emit(tarfile.NUL * (tarfile.BLOCKSIZE - remainder))
+
+    # 归档结尾：两个空块，并补齐到记录大小
+    end = tarfile.NUL * (tarfile.BLOCKSIZE * 2)
+    remainder = (written + len(end)) % tarfile.RECORDSIZE
+    if remainder:
+        end += tarfile.NUL * (tarfile.RECORDSIZE - remainder)
+    yield emit(end)
+    yield compressor.flush()
+
+
+def prune_store():
+    """
+    删除不再被任何快照引用的数据块
+
+    Returns:
+        dict: 删除的数据块数与释放的字节数
+    """
+    store_dir = get_store_dir()
+    if not os.path.exists(store_dir):
+        return {'deleted_chunks': 0, 'freed_bytes': 0}
+
+    with _store_lock:
+        referenced = set()
+        for name in _list_snapshot_names():
+            for entry in load_manifest(name)['entries']:
+                if entry['type'] == 'file':
+                    referenced.update(entry['chunks'])
+
+        deleted_chunks = 0
+        freed_bytes = 0
+        for prefix in os.listdir(store_dir):
+            prefix_dir = os.path.join(store_dir, prefix)
+            for filename in os.listdir(prefix_dir):
+                # 未完成的临时文件同样清理
+                if filename in referenced:
+                    continue
+                path = os.path.join(prefix_dir, filename)
+                try:
+                    freed_bytes += os.path.getsize(path)
+                    os.remove(path)
+                    deleted_chunks += 1
+                except OSError as e:
+                    print(f"  ✗ 删除数据块失败: {filename} - {e}")
+
+    if deleted_chunks:
+        print(f"  ✓ 已删除未引用的数据块: {deleted_chunks} 个, {freed_bytes / (1024 * 1024):.2f} MB")
+    return {'deleted_chunks': deleted_chunks, 'freed_bytes': freed_bytes}
 
-    return backup_file
+
+def _is_backup_file(filename):
+    return filename.endswith(('.tar.gz', '.tar', '.sql', SNAPSHOT_SUFFIX))
 
 
 def list_backups():
-    """列出所有备份文件"""
+    """
+    列出所有备份文件
+
+    快照的 size 为该快照新增的数据块大小，total_size 为快照包含的文件总大小
+    """
     if not os.path.exists(Config.BACKUPS_DIR):
         return []
 
     backups = []
     for filename in os.listdir(Config.BACKUPS_DIR):
-        if filename.endswith('.tar.gz') or filename.endswith('.sql'):
-            filepath = os.path.join(Config.BACKUPS_DIR, filename)
-            stat = os.stat(filepath)
-            backups.append({
-                'name': filename,
-                'path': filepath,
-                'size': stat.st_size,
-                'created': datetime.datetime.fromtimestamp(stat.st_mtime)
+        if not _is_backup_file(filename):
+            continue
+        filepath = os.path.join(Config.BACKUPS_DIR, filename)
+        file_stat = os.stat(filepath)
+        backup = {
+            'name': filename,
+            'path': filepath,
+            'size': file_stat.st_size,
+            'created': datetime.datetime.fromtimestamp(file_stat.st_mtime)
+        }
+        if filename.endswith(SNAPSHOT_SUFFIX):
+            try:
+                manifest = load_manifest(filename)
+            except Exception as e:
+                print(f"  ⚠ 读取快照清单失败 {filename}: {e}")
+                continue
+            backup.update({
+                'size': manifest['stats']['new_bytes'],
+                'total_size': manifest['stats']['total_bytes'],
+                'files': manifest['stats']['files'],
+                'parent': manifest['parent'],
+                'snapshot': True
             })
+        backups.append(backup)
 
     # 按创建时间倒序排序
     backups.sort(key=lambda x: x['created'], reverse=True)
     return backups
 
 
+def delete_backup(filename):
+    """删除一个备份文件，快照删除后清理不再引用的数据块"""
+    os.remove(os.path.join(Config.BACKUPS_DIR, filename))
+    if filename.endswith(SNAPSHOT_SUFFIX):
+        prune_store()
+
+
 def delete_old_backups(keep_days=30):
-    """删除旧备份文件"""
+    """删除旧备份文件，并清理不再引用的数据块"""
     if not os.path.exists(Config.BACKUPS_DIR):
         return 0
 
     cutoff_date = datetime.datetime.now() - datetime.timedelta(days=keep_days)
     deleted_count = 0
+    deleted_snapshots = 0
 
     for filename in os.listdir(Config.BACKUPS_DIR):
-        if filename.endswith('.tar.gz') or filename.endswith('.sql'):
+        if _is_backup_file(filename):
             filepath = os.path.join(Config.BACKUPS_DIR, filename)
             file_time = datetime.datetime.fromtimestamp(os.path.getmtime(filepath))
 
@@ -218,10 +606,14 @@ def delete_old_backups(keep_days=30):
                 try:
                     os.remove(filepath)
                     deleted_count += 1
+                    deleted_snapshots += filename.endswith(SNAPSHOT_SUFFIX)
                     print(f"  ✓ 已删除旧备份: {filename}")
                 except Exception as e:
                     print(f"  ✗ 删除失败: {filename} - {e}")
 
+    if deleted_snapshots:
+        prune_store()
+
     return deleted_count
 
 
@@ -230,11 +622,15 @@ def main():
     import argparse
 
     parser = argparse.ArgumentParser(description='系统备份工具')
-    parser.add_argument('--name', help='备份文件名（不含扩展名）')
+    parser.add_argument('--name', help='快照名称（不含扩展名）')
     parser.add_argument('--include-logs', action='store_true', help='包含日志文件')
     parser.add_argument('--exclude-executions', action='store_true', help='排除执行空间')
     parser.add_argument('--list', action='store_true', help='列出所有备份')
     parser.add_argument('--clean', type=int, metavar='DAYS', help='删除N天前的旧备份')
+    parser.add_argument('--prune', action='store_true', help='删除不再被任何快照引用的数据块')
+    parser.add_argument('--restore', metavar='SNAPSHOT', help='从快照恢复')
+    parser.add_argument('--path', help='只恢复该路径，例如 execution_spaces/execution_12')
+    parser.add_argument('--target', help='恢复目录（默认 backups/restore/<快照名称>）')
 
     args = parser.parse_args()
 
@@ -253,7 +649,11 @@ def main():
                 size_mb = backup['size'] / (1024 * 1024)
                 created = backup['created'].strftime('%Y-%m-%d %H:%M:%S')
                 print(f"\n文件名: {backup['name']}")
-                print(f"  大小: {size_mb:.2f} MB")
+                if backup.get('snapshot'):
+                    print(f"  文件: {backup['files']} 个, {backup['total_size'] / (1024 * 1024):.2f} MB")
+                    print(f"  新增数据: {size_mb:.2f} MB")
+                else:
+                    print(f"  大小: {size_mb:.2f} MB")
                 print(f"  创建时间: {created}")
             return 0
 
@@ -264,8 +664,18 @@ def main():
             print(f"\n✓ 已删除 {deleted} 个旧备份文件")
             return 0
 
+        if args.prune:
+            result = prune_store()
+            print(f"\n✓ 已删除 {result['deleted_chunks']} 个未引用的数据块")
+            return 0
+
+        # 从快照恢复
+        if args.restore:
+            restore_snapshot(args.restore, args.target, args.path)
+            return 0
+
         # 执行备份
-        backup_file = backup_system(
+        backup_system(
             backup_name=args.name,
             include_logs=args.include_logs,
             include_execution_spaces=not args.exclude_executions
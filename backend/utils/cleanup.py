@@ -1,12 +1,25 @@
 """
 清理工具模块
 用于管理历史数据的清理，包括执行记录、执行空间目录和日志文件
+
+空间大小来自空间账本（services.space_ledger），统计与按大小的清理策略不再遍历目录；
+要删除的记录由数据库查询选出，分批批量删除，执行空间目录与日志文件由线程池并行删除。
 """
 import os
 import shutil
-from datetime import datetime
-from models import db, Execution, Schedule, WorkflowExecution, WorkflowNodeExecution, Script
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from models import db, Execution, Schedule, WorkflowExecution, WorkflowNodeExecution, Script, WebhookLog
 from config import Config
+from services import execution_stats, space_ledger
+from services.log_reader import remove_log_files
+
+
+# 正在排队或运行的执行不会被清理
+ACTIVE_STATUSES = ('pending', 'running')
+
+MB = 1024 * 1024
 
 
 def get_directory_size(path):
@@ -19,24 +32,102 @@ def get_directory_size(path):
     Returns:
         int: 目录大小（字节），如果目录不存在返回0
     """
-    if not os.path.exists(path):
-        return 0
+    return space_ledger.measure_space(path)[0]
 
-    total_size = 0
-    try:
-        for dirpath, dirnames, filenames in os.walk(path):
-            for filename in filenames:
-                file_path = os.path.join(dirpath, filename)
-                try:
-                    total_size += os.path.getsize(file_path)
-                except (OSError, IOError):
-                    # 忽略无法访问的文件
-                    pass
-    except (OSError, IOError):
-        # 忽略无法访问的目录
-        pass
 
-    return total_size
+def get_whitelisted_script_ids():
+    """白名单脚本ID：Script.preserve=True 或 Schedule.preserve=True 的脚本"""
+    script_whitelist_ids = {row.id for row in db.session.query(Script.id).filter(Script.preserve.is_(True))}
+    schedule_whitelist_ids = {
+        row.script_id for row in db.session.query(Schedule.script_id).filter(Schedule.preserve.is_(True))
+    }
+    return script_whitelist_ids | schedule_whitelist_ids
+
+
+def _record_bytes():
+    """单条执行记录在账本中的占用：执行空间 + 日志"""
+    return func.coalesce(Execution.space_bytes, 0) + func.coalesce(Execution.log_bytes, 0)
+
+
+def _not_whitelisted(query, whitelisted_script_ids):
+    if whitelisted_script_ids:
+        query = query.filter(Execution.script_id.notin_(whitelisted_script_ids))
+    return query
+
+
+def plan_cleanup(whitelisted_script_ids=None, ledger=None):
+    """
+    按清理策略选出要删除的执行记录
+
+    策略（白名单脚本的执行与正在排队/运行的执行除外）：
+    - threshold: 只保留最近 CLEANUP_THRESHOLD 条非白名单执行
+    - age: 早于 CLEANUP_MAX_AGE_DAYS 天的执行
+    - total_bytes: 总占用超过 CLEANUP_MAX_TOTAL_MB 时，从最早的执行开始删除直到低于上限
+    - script_quota: 单个脚本的占用超过 CLEANUP_SCRIPT_QUOTA_MB 时，删除该脚本最早的执行
+
+    Returns:
+        dict: 策略名称 -> 执行记录ID集合
+    """
+    if whitelisted_script_ids is None:
+        whitelisted_script_ids = get_whitelisted_script_ids()
+    plan = {}
+
+    # 保留最近的 CLEANUP_THRESHOLD 条
+    newest_first = _not_whitelisted(
+        db.session.query(Execution.id, Execution.status), whitelisted_script_ids
+    ).order_by(Execution.created_at.desc(), Execution.id.desc()).offset(Config.CLEANUP_THRESHOLD)
+    plan['threshold'] = {row.id for row in newest_first if row.status not in ACTIVE_STATUSES}
+
+    if Config.CLEANUP_MAX_AGE_DAYS:
+        cutoff = datetime.utcnow() - timedelta(days=Config.CLEANUP_MAX_AGE_DAYS)
+        expired = _not_whitelisted(db.session.query(Execution.id), whitelisted_script_ids).filter(
+            Execution.created_at < cutoff,
+            Execution.status.notin_(ACTIVE_STATUSES)
+        )
+        plan['age'] = {row.id for row in expired}
+
+    if Config.CLEANUP_MAX_TOTAL_MB:
+        ledger = ledger or space_ledger.totals()
+        total = ledger['execution_space_bytes'] + ledger['log_bytes'] + ledger['workflow_space_bytes']
+        excess = total - Config.CLEANUP_MAX_TOTAL_MB * MB
+        if excess > 0:
+            # 从最早的执行开始累计占用，删除累计到超出部分为止的记录
+            record_bytes = _record_bytes()
+            freed_before = func.sum(record_bytes).over(order_by=(Execution.created_at, Execution.id)) - record_bytes
+            ranked = _not_whitelisted(
+                db.session.query(Execution.id.label('id'), freed_before.label('freed_before')),
+                whitelisted_script_ids
+            ).filter(Execution.status.notin_(ACTIVE_STATUSES)).subquery()
+            plan['total_bytes'] = {row.id for row in db.session.query(ranked.c.id).filter(ranked.c.freed_before < excess)}
+
+    if Config.CLEANUP_SCRIPT_QUOTA_MB:
+        # 每个脚本从最新的执行开始累计占用，超出配额的部分删除
+        used_upto = func.sum(_record_bytes()).over(
+            partition_by=Execution.script_id,
+            order_by=(Execution.created_at.desc(), Execution.id.desc())
+        )
+        ranked = _not_whitelisted(
+            db.session.query(Execution.id.label('id'), Execution.status.label('status'), used_upto.label('used_upto')),
+            whitelisted_script_ids
+        ).subquery()
+        over_quota = db.session.query(ranked.c.id).filter(
+            ranked.c.used_upto > Config.CLEANUP_SCRIPT_QUOTA_MB * MB,
+            ranked.c.status.notin_(ACTIVE_STATUSES)
+        )
+        plan['script_quota'] = {row.id for row in over_quota}
+
+    return plan
+
+
+def _orphan_workflow_executions():
+    """所有节点关联的脚本执行都已删除（或没有节点执行）的已结束工作流执行"""
+    alive = db.session.query(WorkflowNodeExecution.workflow_execution_id).join(
+        Execution, Execution.id == WorkflowNodeExecution.execution_id
+    )
+    return db.session.query(WorkflowExecution.id, WorkflowExecution.space_bytes).filter(
+        WorkflowExecution.id.notin_(alive),
+        WorkflowExecution.status.notin_(ACTIVE_STATUSES)
+    ).all()
 
 
 def get_cleanup_stats():
@@ -47,24 +138,16 @@ def get_cleanup_stats():
         dict: 包含以下字段的字典
             - total_executions: 总执行记录数
             - whitelisted_executions: 白名单执行记录数
-            - to_cleanup: 需要清理的记录数
+            - to_cleanup: 需要清理的记录数（各策略的并集）
+            - to_cleanup_by_policy: 各策略选出的记录数
             - execution_spaces_size_mb: 执行空间目录大小（MB）
             - workflow_spaces_size_mb: 工作流执行空间目录大小（MB）
+            - logs_size_mb: 执行日志大小（MB）
+            - execution_space_files: 执行空间文件数
+            - unmeasured_spaces: 尚未计入空间账本的记录数（下次清理时补齐）
             - threshold: 清理阈值
     """
-    # 获取白名单脚本ID（两个来源）
-    # 1. Script.preserve=True的脚本
-    script_whitelist_ids = set(
-        s.id for s in Script.query.filter_by(preserve=True).all()
-    )
-
-    # 2. Schedule.preserve=True的定时任务脚本
-    schedule_whitelist_ids = set(
-        s.script_id for s in Schedule.query.filter_by(preserve=True).all()
-    )
-
-    # 合并白名单脚本ID
-    whitelisted_script_ids = script_whitelist_ids | schedule_whitelist_ids
+    whitelisted_script_ids = get_whitelisted_script_ids()
 
     # 获取所有执行记录
     total_executions = Execution.query.count()
@@ -76,251 +159,191 @@ def get_cleanup_stats():
             Execution.script_id.in_(whitelisted_script_ids)
         ).count()
 
-    # 计算需要清理的记录数
-    # 逻辑：总记录数 - 白名单记录数 - 阈值保留数
-    threshold = Config.CLEANUP_THRESHOLD
-    non_whitelisted_count = total_executions - whitelisted_executions
-    to_cleanup = max(0, non_whitelisted_count - threshold)
-
-    # 计算执行空间目录大小
-    execution_spaces_size = get_directory_size(Config.EXECUTION_SPACES_DIR)
-    workflow_spaces_size = get_directory_size(Config.WORKFLOW_EXECUTION_SPACES_DIR)
+    ledger = space_ledger.totals()
+    plan = plan_cleanup(whitelisted_script_ids, ledger)
 
     return {
         'total_executions': total_executions,
         'whitelisted_executions': whitelisted_executions,
-        'to_cleanup': to_cleanup,
-        'execution_spaces_size_mb': round(execution_spaces_size / (1024 * 1024), 2),
-        'workflow_spaces_size_mb': round(workflow_spaces_size / (1024 * 1024), 2),
-        'threshold': threshold
+        'to_cleanup': len(set().union(*plan.values())),
+        'to_cleanup_by_policy': {policy: len(ids) for policy, ids in plan.items()},
+        'execution_spaces_size_mb': round(ledger['execution_space_bytes'] / MB, 2),
+        'workflow_spaces_size_mb': round(ledger['workflow_space_bytes'] / MB, 2),
+        'logs_size_mb': round(ledger['log_bytes'] / MB, 2),
+        'execution_space_files': ledger['execution_space_files'] + ledger['workflow_space_files'],
+        'unmeasured_spaces': ledger['unmeasured'],
+        'threshold': Config.CLEANUP_THRESHOLD
     }
 
 
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _remove_execution_files(execution_id, log_file, ledger_bytes, log_bytes):
+    """
+    删除执行空间与日志文件（在线程池中运行）
+
+    Returns:
+        tuple: (是否删除了执行空间, 是否删除了日志, 释放的字节数)
+    """
+    space_path = Config.get_execution_space(execution_id)
+    freed = 0
+    space_deleted = log_deleted = False
+    if os.path.exists(space_path):
+        if ledger_bytes is None:
+            # 没有账本值的旧记录，删除前统计
+            ledger_bytes = space_ledger.measure_space(space_path)[0]
+        try:
+            shutil.rmtree(space_path)
+            space_deleted = True
+            freed = ledger_bytes
+        except Exception as e:
+            print(f"[Cleanup] 删除执行空间失败 {space_path}: {e}")
+    if log_file:
+        log_path = os.path.join(Config.LOGS_DIR, os.path.basename(log_file))
+        if os.path.exists(log_path):
+            try:
+                remove_log_files(log_path)
+                log_deleted = True
+                freed += log_bytes or 0
+            except Exception as e:
+                print(f"[Cleanup] 删除日志文件失败 {log_path}: {e}")
+    return space_deleted, log_deleted, freed
+
+
+def _remove_workflow_space(workflow_execution_id, ledger_bytes):
+    space_path = Config.get_workflow_execution_space(workflow_execution_id)
+    if not os.path.exists(space_path):
+        return False, 0
+    freed = ledger_bytes if ledger_bytes is not None else space_ledger.measure_space(space_path)[0]
+    try:
+        shutil.rmtree(space_path)
+        return True, freed
+    except Exception as e:
+        print(f"[Cleanup] 删除工作流执行空间失败 {space_path}: {e}")
+        return False, 0
+
+
 def run_cleanup():
     """
     执行清理操作
 
     清理逻辑：
-    1. 获取白名单脚本ID（Script.preserve=True 或 Schedule.preserve=True）
-    2. 获取所有Execution记录，按创建时间倒序排列
-    3. 构建保留ID集合：白名单执行 + 最近CLEANUP_THRESHOLD条非白名单执行
-    4. 删除不在保留集合中的执行记录（数据库记录 + 目录 + 日志）
-    5. 清理WorkflowExecution中所有节点执行都已删除的记录
+    1. 为升级前的记录分批补齐空间账本
+    2. 按清理策略（见 plan_cleanup）选出要删除的执行记录
+    3. 分批提交：解除工作流节点与 Webhook 日志的外键关联，批量删除执行记录
+    4. 每批提交后，由线程池并行删除对应的执行空间目录与日志文件
+    5. 清理所有节点执行都已删除的 WorkflowExecution 及其工作流执行空间
 
     Returns:
         dict: 包含以下字段
             - deleted_executions: 删除的执行记录数
             - deleted_execution_spaces: 删除的执行空间目录数
             - deleted_workflow_spaces: 删除的工作流执行空间目录数
-            - freed_space_mb: 释放的空间大小（MB）
+            - freed_space_mb: 释放的空间大小（MB，执行空间 + 日志 + 工作流执行空间）
+            - by_policy: 各策略选出的记录数
     """
     print("[Cleanup] 开始清理历史数据...")
 
-    # 计算清理前的空间大小
-    space_before = (
-        get_directory_size(Config.EXECUTION_SPACES_DIR) +
-        get_directory_size(Config.WORKFLOW_EXECUTION_SPACES_DIR)
-    )
+    backfilled = space_ledger.backfill()
+    if backfilled:
+        print(f"[Cleanup] 补齐空间账本: {backfilled} 条记录")
 
-    # 1. 获取白名单脚本ID（两个来源）
-    # Script.preserve=True的脚本
-    script_whitelist_ids = set(
-        s.id for s in Script.query.filter_by(preserve=True).all()
-    )
-    # Schedule.preserve=True的定时任务脚本
-    schedule_whitelist_ids = set(
-        s.script_id for s in Schedule.query.filter_by(preserve=True).all()
-    )
-    # 合并白名单脚本ID
-    whitelisted_script_ids = script_whitelist_ids | schedule_whitelist_ids
+    whitelisted_script_ids = get_whitelisted_script_ids()
     print(f"[Cleanup] 白名单脚本ID: {whitelisted_script_ids}")
-    print(f"[Cleanup] - Script白名单: {script_whitelist_ids}")
-    print(f"[Cleanup] - Schedule白名单: {schedule_whitelist_ids}")
-
-    # 2. 获取所有Execution记录，按创建时间倒序
-    all_executions = Execution.query.order_by(Execution.created_at.desc()).all()
-
-    # 3. 构建保留ID集合
-    preserve_ids = set()
-    non_whitelisted_count = 0
-
-    for exec in all_executions:
-        if exec.script_id in whitelisted_script_ids:
-            # 白名单执行全部保留
-            preserve_ids.add(exec.id)
-        else:
-            # 非白名单执行保留最近的CLEANUP_THRESHOLD条
-            if non_whitelisted_count < Config.CLEANUP_THRESHOLD:
-                preserve_ids.add(exec.id)
-                non_whitelisted_count += 1
-
-    print(f"[Cleanup] 保留执行记录数: {len(preserve_ids)}")
-
-    # 4. 识别要删除的执行记录
-    executions_to_delete = [exec for exec in all_executions if exec.id not in preserve_ids]
-
-    if not executions_to_delete:
-        print("[Cleanup] 无需清理的执行记录")
-        return {
-            'deleted_executions': 0,
-            'deleted_execution_spaces': 0,
-            'deleted_workflow_spaces': 0,
-            'freed_space_mb': 0
-        }
-
-    # 收集要删除的执行记录ID
-    execution_ids_to_delete = {exec.id for exec in executions_to_delete}
-
-    # 收集要删除的文件路径（稍后删除，在DB提交成功后）
-    execution_space_paths = []
-    log_file_paths = []
-
-    for exec in executions_to_delete:
-        # 收集执行空间目录路径
-        space_path = Config.get_execution_space(exec.id)
-        if os.path.exists(space_path):
-            execution_space_paths.append(space_path)
-
-        # 收集日志文件路径
-        if exec.log_file:
-            log_path = os.path.join(Config.LOGS_DIR, os.path.basename(exec.log_file))
-            if os.path.exists(log_path):
-                log_file_paths.append(log_path)
-
-    # 5. 处理外键关系：设置WorkflowNodeExecution.execution_id为NULL
-    # 批量更新，避免N+1查询
-    db.session.query(WorkflowNodeExecution).filter(
-        WorkflowNodeExecution.execution_id.in_(execution_ids_to_delete)
-    ).update(
-        {WorkflowNodeExecution.execution_id: None},
-        synchronize_session=False
-    )
-    print(f"[Cleanup] 已清除 {len(execution_ids_to_delete)} 个执行记录的WorkflowNodeExecution外键关联")
 
-    # 6. 删除数据库记录
-    for exec in executions_to_delete:
-        db.session.delete(exec)
+    plan = plan_cleanup(whitelisted_script_ids)
+    execution_ids_to_delete = sorted(set().union(*plan.values()))
+    by_policy = {policy: len(ids) for policy, ids in plan.items()}
+    print(f"[Cleanup] 各策略选出的执行记录: {by_policy}")
 
-    # 7. 提交数据库事务（先提交，确保数据一致性）
-    try:
-        db.session.commit()
-        print(f"[Cleanup] 数据库事务提交成功，删除执行记录: {len(executions_to_delete)}")
-    except Exception as e:
-        db.session.rollback()
-        print(f"[Cleanup] 数据库提交失败: {e}")
-        return {
-            'deleted_executions': 0,
-            'deleted_execution_spaces': 0,
-            'deleted_workflow_spaces': 0,
-            'freed_space_mb': 0
-        }
-
-    # 8. 数据库提交成功后，删除文件系统资源
+    deleted_executions = 0
     deleted_execution_spaces = 0
     deleted_logs = 0
-
-    for space_path in execution_space_paths:
-        try:
-            shutil.rmtree(space_path)
-            deleted_execution_spaces += 1
-            print(f"[Cleanup] 删除执行空间: {space_path}")
-        except Exception as e:
-            print(f"[Cleanup] 删除执行空间失败 {space_path}: {e}")
-
-    for log_path in log_file_paths:
-        try:
-            os.remove(log_path)
-            deleted_logs += 1
-            print(f"[Cleanup] 删除日志文件: {log_path}")
-        except Exception as e:
-            print(f"[Cleanup] 删除日志文件失败 {log_path}: {e}")
-
-    # 9. 清理WorkflowExecution中所有节点执行都已删除的记录
-    # 批量加载所有WorkflowExecution和WorkflowNodeExecution，避免N+1查询
-    deleted_workflow_spaces = 0
-    workflow_executions = WorkflowExecution.query.all()
-
-    # 预加载所有WorkflowNodeExecution，按workflow_execution_id分组
-    all_node_executions = WorkflowNodeExecution.query.all()
-    node_executions_by_wf = {}
-    for ne in all_node_executions:
-        if ne.workflow_execution_id not in node_executions_by_wf:
-            node_executions_by_wf[ne.workflow_execution_id] = []
-        node_executions_by_wf[ne.workflow_execution_id].append(ne)
-
-    # 获取所有存在的Execution ID（用于检查关联）
-    existing_execution_ids = set(e.id for e in Execution.query.with_entities(Execution.id).all())
-
-    workflow_space_paths = []
-
-    for wf_exec in workflow_executions:
-        node_executions = node_executions_by_wf.get(wf_exec.id, [])
-
-        # 如果没有节点执行记录，或者所有节点执行的execution_id都无效
-        should_delete = False
-        if not node_executions:
-            should_delete = True
-        else:
-            # 检查是否所有关联的Execution都已删除
-            all_deleted = all(
-                ne.execution_id is None or
-                ne.execution_id not in existing_execution_ids
-                for ne in node_executions
-            )
-            should_delete = all_deleted
-
-        if should_delete:
-            # 收集工作流执行空间路径
-            space_path = Config.get_workflow_execution_space(wf_exec.id)
-            if os.path.exists(space_path):
-                workflow_space_paths.append((wf_exec, space_path))
-            else:
-                # 即使没有空间目录，也要删除数据库记录
-                db.session.delete(wf_exec)
-                print(f"[Cleanup] 删除工作流执行记录（无空间目录）: {wf_exec.id}")
-
-    # 提交工作流清理的数据库更改
-    workflow_db_deleted = 0
-    try:
-        for wf_exec, space_path in workflow_space_paths:
-            db.session.delete(wf_exec)
-            workflow_db_deleted += 1
-        db.session.commit()
-        print(f"[Cleanup] 删除工作流执行记录: {workflow_db_deleted}")
-    except Exception as e:
-        db.session.rollback()
-        print(f"[Cleanup] 工作流清理数据库提交失败: {e}")
-
-    # 删除工作流执行空间（DB提交成功后）
-    for wf_exec, space_path in workflow_space_paths:
-        try:
-            shutil.rmtree(space_path)
-            deleted_workflow_spaces += 1
-            print(f"[Cleanup] 删除工作流执行空间: {space_path}")
-        except Exception as e:
-            print(f"[Cleanup] 删除工作流执行空间失败 {space_path}: {e}")
-
-    # 计算释放的空间
-    space_after = (
-        get_directory_size(Config.EXECUTION_SPACES_DIR) +
-        get_directory_size(Config.WORKFLOW_EXECUTION_SPACES_DIR)
-    )
-    freed_space_mb = round((space_before - space_after) / (1024 * 1024), 2)
-    # 确保不会出现负数（如果有新文件创建）
-    freed_space_mb = max(0, freed_space_mb)
+    freed_bytes = 0
+
+    with ThreadPoolExecutor(max_workers=Config.CLEANUP_DELETE_WORKERS) as pool:
+        # 1. 执行记录：每批一个事务，提交后再删除文件
+        file_jobs = []
+        for chunk in _chunks(execution_ids_to_delete, Config.CLEANUP_DELETE_CHUNK):
+            rows = db.session.query(
+                Execution.id, Execution.log_file, Execution.space_bytes, Execution.log_bytes
+            ).filter(Execution.id.in_(chunk)).all()
+            try:
+                db.session.query(WorkflowNodeExecution).filter(
+                    WorkflowNodeExecution.execution_id.in_(chunk)
+                ).update({WorkflowNodeExecution.execution_id: None}, synchronize_session=False)
+                db.session.query(WebhookLog).filter(
+                    WebhookLog.execution_id.in_(chunk)
+                ).update({WebhookLog.execution_id: None}, synchronize_session=False)
+                execution_stats.forget(chunk)
+                deleted = db.session.query(Execution).filter(
+                    Execution.id.in_(chunk)
+                ).delete(synchronize_session=False)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                print(f"[Cleanup] 数据库提交失败: {e}")
+                break
+            deleted_executions += deleted
+            for row in rows:
+                file_jobs.append(pool.submit(_remove_execution_files, row.id, row.log_file, row.space_bytes, row.log_bytes))
+
+        if deleted_executions:
+            print(f"[Cleanup] 数据库事务提交成功，删除执行记录: {deleted_executions}")
+
+        # 2. 工作流执行：所有节点关联的执行都已删除
+        orphans = _orphan_workflow_executions()
+        workflow_jobs = []
+        workflow_db_deleted = 0
+        for chunk in _chunks(orphans, Config.CLEANUP_DELETE_CHUNK):
+            chunk_ids = [row.id for row in chunk]
+            try:
+                db.session.query(WorkflowNodeExecution).filter(
+                    WorkflowNodeExecution.workflow_execution_id.in_(chunk_ids)
+                ).delete(synchronize_session=False)
+                workflow_db_deleted += db.session.query(WorkflowExecution).filter(
+                    WorkflowExecution.id.in_(chunk_ids)
+                ).delete(synchronize_session=False)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                print(f"[Cleanup] 工作流清理数据库提交失败: {e}")
+                break
+            for row in chunk:
+                workflow_jobs.append(pool.submit(_remove_workflow_space, row.id, row.space_bytes))
+        if workflow_db_deleted:
+            print(f"[Cleanup] 删除工作流执行记录: {workflow_db_deleted}")
+
+        for job in file_jobs:
+            space_deleted, log_deleted, freed = job.result()
+            deleted_execution_spaces += space_deleted
+            deleted_logs += log_deleted
+            freed_bytes += freed
+
+        deleted_workflow_spaces = 0
+        for job in workflow_jobs:
+            space_deleted, freed = job.result()
+            deleted_workflow_spaces += space_deleted
+            freed_bytes += freed
+
+    freed_space_mb = round(freed_bytes / MB, 2)
 
     print(f"[Cleanup] 清理完成:")
-    print(f"  - 删除执行记录: {len(executions_to_delete)}")
+    print(f"  - 删除执行记录: {deleted_executions}")
     print(f"  - 删除执行空间: {deleted_execution_spaces}")
     print(f"  - 删除工作流执行空间: {deleted_workflow_spaces}")
     print(f"  - 删除日志文件: {deleted_logs}")
     print(f"  - 释放空间: {freed_space_mb} MB")
 
     return {
-        'deleted_executions': len(executions_to_delete),
+        'deleted_executions': deleted_executions,
         'deleted_execution_spaces': deleted_execution_spaces,
         'deleted_workflow_spaces': deleted_workflow_spaces,
-        'freed_space_mb': freed_space_mb
+        'freed_space_mb': freed_space_mb,
+        'by_policy': by_policy
     }
 
 
@@ -328,7 +351,7 @@ def run_cleanup_if_needed():
     """
     在应用启动时检查并执行清理
 
-    如果需要清理的记录数超过阈值的一半，则执行清理
+    如果需要清理的记录数超过阈值的一半，或大小/时间策略选出了需要清理的记录，则执行清理
 
     Returns:
         dict or None: 如果执行了清理返回清理结果，否则返回None
@@ -336,11 +359,13 @@ def run_cleanup_if_needed():
     print("[Cleanup] 检查是否需要清理...")
 
     stats = get_cleanup_stats()
+    by_policy = stats['to_cleanup_by_policy']
+    other_policies = sum(count for policy, count in by_policy.items() if policy != 'threshold')
 
     # 如果需要清理的记录数超过阈值的一半，执行清理
-    if stats['to_cleanup'] > Config.CLEANUP_THRESHOLD // 2:
-        print(f"[Cleanup] 需要清理的记录数 ({stats['to_cleanup']}) 超过阈值的一半 ({Config.CLEANUP_THRESHOLD // 2})，开始清理...")
+    if by_policy['threshold'] > Config.CLEANUP_THRESHOLD // 2 or other_policies:
+        print(f"[Cleanup] 需要清理的记录数: {by_policy}，开始清理...")
         return run_cleanup()
     else:
         print(f"[Cleanup] 无需清理，当前需要清理的记录数: {stats['to_cleanup']}")
-        return None
\ No newline at end of file
+        return None
@@ -1,44 +1,259 @@
 """
 Excel 文件与 Luckysheet 格式转换工具
+
+两种输出模式：
+- 完整模式（excel_to_luckysheet 默认）：每个工作表同时包含二维数组 data 与 celldata，
+  行列数取工作表的 dimension
+- 稀疏模式（sparse=True / iter_luckysheet_sheets / stream_luckysheet_json）：只输出 celldata，
+  行列数按实际有值的单元格计算，逐个工作表转换，可只转换指定的工作表。
+  dimension 被一个带格式的空单元格（如 XFD1048576）撑大时，完整模式会分配巨大的二维数组，
+  稀疏模式的内存只与有值的单元格数量相关
 """
 import json
 import os
 import openpyxl
 from openpyxl.utils import get_column_letter
 from datetime import datetime
+from services.excel_reader import excel_reader
+from services.excel_snapshot import iter_sheet_rows, scan_sheet_layout
+
+# 单元格格式（ct）只读，所有单元格共用同一个对象，大表转换时节省内存
+_CT_NUMBER = {'fa': 'General', 't': 'n'}
+_CT_DATE = {'fa': 'yyyy-mm-dd', 't': 'd'}
+_CT_GENERAL = {'fa': 'General', 't': 'g'}
 
 
-def excel_to_luckysheet(file_path):
+def excel_to_luckysheet(file_path, sparse=False, sheet=None):
     """
     将 Excel 文件转换为 Luckysheet 格式
 
     Args:
         file_path: Excel 文件路径
+        sparse: 是否使用稀疏模式（只输出 celldata）
+        sheet: 只转换指定的工作表（名称或索引），None 表示全部
 
     Returns:
         list: Luckysheet sheet 数据列表
+
+    Raises:
+        ValueError: 指定的工作表不存在
     """
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"文件不存在: {file_path}")
 
+    if sparse:
+        return list(iter_luckysheet_sheets(file_path, sheet))
+
     # 加载工作簿
     ext = os.path.splitext(file_path)[1].lower()
     if ext == '.xls':
         # 旧版 xls 格式，使用 xlrd 读取后转换
         import xlrd
         workbook = xlrd.open_workbook(file_path)
-        return _xlrd_to_luckysheet(workbook, file_path)
+        indexes = _selected_indexes(workbook.sheet_names(), sheet)
+        sheets = _xlrd_to_luckysheet(workbook, file_path, indexes)
     else:
-        # xlsx 格式
-        workbook = openpyxl.load_workbook(file_path, data_only=True)
-        return _openpyxl_to_luckysheet(workbook, file_path)
+        # xlsx 格式，优先使用列式快照（没有快照时在后台生成，供下次打开使用）
+        snapshot = excel_reader.get_snapshot(file_path)
+        if snapshot:
+            indexes = _selected_indexes(snapshot.sheetnames, sheet)
+            sheets = _snapshot_to_luckysheet(snapshot, indexes)
+        else:
+            workbook = openpyxl.load_workbook(file_path, data_only=True)
+            indexes = _selected_indexes(workbook.sheetnames, sheet)
+            sheets = _openpyxl_to_luckysheet(workbook, file_path, indexes)
+
+    if sheet is not None:
+        # 只返回一个工作表时将其设为激活状态
+        sheets[0]['status'] = 1
+    return sheets
+
+
+def resolve_sheet_index(sheet_names, sheet):
+    """
+    按名称或索引查找工作表
+
+    Returns:
+        int: 工作表索引
+
+    Raises:
+        ValueError: 工作表不存在或索引超出范围
+    """
+    sheet = str(sheet)
+    if sheet in sheet_names:
+        return sheet_names.index(sheet)
+    if sheet.isdigit():
+        if int(sheet) >= len(sheet_names):
+            raise ValueError('工作表索引超出范围')
+        return int(sheet)
+    raise ValueError(f'工作表 "{sheet}" 不存在')
+
+
+def iter_luckysheet_sheets(file_path, sheet=None):
+    """
+    稀疏模式逐个转换工作表
+
+    每次只在内存中保留一个工作表的 celldata，适合配合 stream_luckysheet_json 流式输出。
+    指定 sheet 时只转换该工作表，返回的工作表 status 为 1（激活）。
+
+    Args:
+        file_path: Excel 文件路径
+        sheet: 工作表名称或索引，None 表示全部
+
+    Yields:
+        dict: Luckysheet sheet 数据（不含 data）
+
+    Raises:
+        ValueError: 指定的工作表不存在（在开始转换前检查）
+    """
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"文件不存在: {file_path}")
+
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext == '.xls':
+        import xlrd
+        # on_demand 模式按需加载工作表，转换完成后立即释放
+        workbook = xlrd.open_workbook(file_path, on_demand=True)
+        sheet_names = workbook.sheet_names()
+        indexes = _selected_indexes(sheet_names, sheet)
+        return _iter_xlrd_sparse(workbook, indexes, single=sheet is not None)
+
+    snapshot = excel_reader.get_snapshot(file_path)
+    if snapshot:
+        indexes = _selected_indexes(snapshot.sheetnames, sheet)
+        return _iter_snapshot_sparse(snapshot, indexes, single=sheet is not None)
+
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        indexes = _selected_indexes(workbook.sheetnames, sheet)
+    except ValueError:
+        workbook.close()
+        raise
+    return _iter_openpyxl_sparse(workbook, file_path, indexes, single=sheet is not None)
 
 
-def _openpyxl_to_luckysheet(workbook, file_path):
-    """使用 openpyxl 转换"""
+def stream_luckysheet_json(sheets):
+    """
+    把 iter_luckysheet_sheets 的结果编码为 JSON 数组片段，逐个工作表输出
+
+    Yields:
+        str: JSON 文本片段，拼接后为完整的工作表数组
+    """
+    yield '['
+    for idx, sheet_data in enumerate(sheets):
+        if idx:
+            yield ','
+        yield json.dumps(sheet_data, ensure_ascii=False)
+    yield ']'
+
+
+def _selected_indexes(sheet_names, sheet):
+    if sheet is None:
+        return list(range(len(sheet_names)))
+    return [resolve_sheet_index(sheet_names, sheet)]
+
+
+def _sparse_sheet(name, index, cell_data, rows, cols, single, merges=None, col_widths=None, row_heights=None):
+    """组装稀疏模式的工作表结构"""
+    col_info = [
+        {'w': int(col_widths[col_idx] * 8)}
+        for col_idx in range(1, cols + 1)
+        if col_widths and col_widths.get(col_idx)
+    ]
+    row_info = [
+        {'h': int(row_heights[row_idx])}
+        for row_idx in sorted(row_heights or {})
+        if row_idx <= rows and row_heights[row_idx]
+    ]
+    return {
+        'name': name,
+        'index': index,
+        'order': index,
+        'status': 1 if single or index == 0 else 0,
+        'celldata': cell_data,
+        'config': {
+            'merge': merges if merges else None,
+            'columnlen': col_info if col_info else None,
+            'rowlen': row_info if row_info else None
+        },
+        # 实际有值的范围，至少 1 行 1 列
+        'row': max(rows, 1),
+        'column': max(cols, 1)
+    }
+
+
+def _iter_openpyxl_sparse(workbook, file_path, indexes, single):
+    """使用只读模式的 openpyxl 逐行读取，只保留有值的单元格"""
+    try:
+        for sheet_index in indexes:
+            sheet = workbook[workbook.sheetnames[sheet_index]]
+            cell_data = []
+            rows = 0
+            cols = 0
+            for row_idx, row in enumerate(iter_sheet_rows(sheet)):
+                for col_idx, value in enumerate(row):
+                    if value is None:
+                        continue
+                    cell_data.append({'r': row_idx, 'c': col_idx, 'v': _convert_cell_value(value)})
+                    rows = row_idx + 1
+                    if col_idx >= cols:
+                        cols = col_idx + 1
+
+            # 只读模式不提供合并单元格、列宽和行高，从工作表 XML 中扫描
+            layout = scan_sheet_layout(file_path, getattr(sheet, '_worksheet_path', None))
+            yield _sparse_sheet(sheet.title, sheet_index, cell_data, rows, cols, single,
+                                layout['merges'], layout['col_widths'], layout['row_heights'])
+    finally:
+        workbook.close()
+
+
+def _iter_snapshot_sparse(snapshot, indexes, single):
+    """使用列式快照转换，按列读取后整理为按行的顺序"""
+    for sheet_index in indexes:
+        sheet = snapshot.sheets[sheet_index]
+        cell_data = []
+        for col_idx in range(sheet.cols):
+            values = sheet.read_column(col_idx)
+            if values is None:
+                continue
+            for row_idx, value in enumerate(values):
+                if value is not None:
+                    cell_data.append({'r': row_idx, 'c': col_idx, 'v': _convert_cell_value(value)})
+        cell_data.sort(key=lambda cell: (cell['r'], cell['c']))
+        yield _sparse_sheet(sheet.name, sheet.index, cell_data, sheet.rows, sheet.cols, single,
+                            sheet.merges, sheet.col_widths, sheet.row_heights)
+
+
+def _iter_xlrd_sparse(workbook, indexes, single):
+    """使用 xlrd 转换旧版 xls 文件，只保留非空单元格"""
+    try:
+        for sheet_index in indexes:
+            sheet = workbook.sheet_by_index(sheet_index)
+            cell_data = []
+            rows = 0
+            cols = 0
+            for row_idx in range(sheet.nrows):
+                for col_idx, cell in enumerate(sheet.row(row_idx)):
+                    if cell.ctype in (0, 6):  # 0 = empty, 6 = blank
+                        continue
+                    cell_data.append({'r': row_idx, 'c': col_idx, 'v': _convert_xlrd_value(cell)})
+                    rows = row_idx + 1
+                    if col_idx >= cols:
+                        cols = col_idx + 1
+            name = sheet.name
+            workbook.unload_sheet(sheet_index)
+            yield _sparse_sheet(name, sheet_index, cell_data, rows, cols, single)
+    finally:
+        workbook.release_resources()
+
+
+def _openpyxl_to_luckysheet(workbook, file_path, indexes=None):
+    """使用 openpyxl 转换（indexes 为要转换的工作表索引，None 表示全部）"""
     sheets = []
 
     for sheet_index, sheet_name in enumerate(workbook.sheetnames):
+        if indexes is not None and sheet_index not in indexes:
+            continue
         sheet = workbook[sheet_name]
 
         # 构建单元格数据
@@ -112,11 +327,72 @@ def _openpyxl_to_luckysheet(workbook, file_path):
     return sheets
 
 
-def _xlrd_to_luckysheet(workbook, file_path):
+def _snapshot_to_luckysheet(snapshot, indexes=None):
+    """使用列式快照转换，输出与 _openpyxl_to_luckysheet 相同的结构"""
+    sheets = []
+
+    for sheet in snapshot.sheets:
+        if indexes is not None and sheet.index not in indexes:
+            continue
+        # 与完整加载一致，空工作表按 1 行 1 列处理
+        max_row = max(sheet.rows, 1)
+        max_col = max(sheet.cols, 1)
+
+        # 按列读取快照，填充二维数组 data
+        data = [[None for _ in range(max_col)] for _ in range(max_row)]
+        for col_idx in range(max_col):
+            values = sheet.read_column(col_idx)
+            if values is None:
+                continue
+            for row_idx, value in enumerate(values):
+                if value is not None:
+                    data[row_idx][col_idx] = _convert_cell_value(value)
+
+        # celldata 保持按行的顺序
+        cell_data = [
+            {'r': row_idx, 'c': col_idx, 'v': cell_value}
+            for row_idx, row in enumerate(data)
+            for col_idx, cell_value in enumerate(row)
+            if cell_value is not None
+        ]
+
+        col_info = [
+            {'w': int(sheet.col_widths[col_idx] * 8)}
+            for col_idx in range(1, max_col + 1)
+            if sheet.col_widths.get(col_idx)
+        ]
+        row_info = [
+            {'h': int(sheet.row_heights[row_idx])}
+            for row_idx in sorted(sheet.row_heights)
+            if row_idx <= max_row and sheet.row_heights[row_idx]
+        ]
+
+        sheets.append({
+            'name': sheet.name,
+            'index': sheet.index,
+            'order': sheet.index,
+            'status': 1 if sheet.index == 0 else 0,
+            'celldata': cell_data,
+            'config': {
+                'merge': sheet.merges if sheet.merges else None,
+                'columnlen': col_info if col_info else None,
+                'rowlen': row_info if row_info else None
+            },
+            'data': data,
+            'row': max_row,
+            'column': max_col
+        })
+
+    return sheets
+
+
+def _xlrd_to_luckysheet(workbook, file_path, indexes=None):
     """使用 xlrd 转换旧版 xls 文件"""
     sheets = []
 
     for sheet_index in range(workbook.nsheets):
+        if indexes is not None and sheet_index not in indexes:
+            continue
         sheet = workbook.sheet_by_index(sheet_index)
         cell_data = []
 
@@ -163,26 +439,26 @@ def _convert_cell_value(value):
         return {
             'v': value,
             'm': str(value),
-            'ct': {'fa': 'General', 't': 'n'}
+            'ct': _CT_NUMBER
         }
     elif isinstance(value, datetime):
         # 日期
         return {
             'v': value.strftime('%Y-%m-%d'),
             'm': value.strftime('%Y-%m-%d'),
-            'ct': {'fa': 'yyyy-mm-dd', 't': 'd'}
+            'ct': _CT_DATE
         }
     elif isinstance(value, str):
         return {
             'v': value,
             'm': value,
-            'ct': {'fa': 'General', 't': 'g'}
+            'ct': _CT_GENERAL
         }
     else:
         return {
             'v': str(value),
             'm': str(value),
-            'ct': {'fa': 'General', 't': 'g'}
+            'ct': _CT_GENERAL
         }
 
 
@@ -194,13 +470,13 @@ def _convert_xlrd_value(cell):
         return {
             'v': cell.value,
             'm': cell.value,
-            'ct': {'fa': 'General', 't': 'g'}
+            'ct': _CT_GENERAL
         }
     elif cell.ctype == xlrd.XL_CELL_NUMBER:
         return {
             'v': cell.value,
             'm': str(cell.value),
-            'ct': {'fa': 'General', 't': 'n'}
+            'ct': _CT_NUMBER
         }
     elif cell.ctype == xlrd.XL_CELL_DATE:
         date_tuple = xlrd.xldate_as_tuple(cell.value, 0)
@@ -208,7 +484,7 @@ def _convert_xlrd_value(cell):
         return {
             'v': date_str,
             'm': date_str,
-            'ct': {'fa': 'yyyy-mm-dd', 't': 'd'}
+            'ct': _CT_DATE
         }
     else:
         return {
@@ -306,12 +582,18 @@ def get_excel_info(file_path):
                 'sheet_count': workbook.nsheets
             }
         else:
-            workbook = openpyxl.load_workbook(file_path, read_only=True)
+            snapshot = excel_reader.get_snapshot(file_path, build=False)
+            if snapshot:
+                sheet_names = snapshot.sheetnames
+            else:
+                workbook = openpyxl.load_workbook(file_path, read_only=True)
+                sheet_names = workbook.sheetnames
+                workbook.close()
             return {
                 'filename': os.path.basename(file_path),
                 'size': stat.st_size,
-                'sheets': workbook.sheetnames,
-                'sheet_count': len(workbook.sheetnames)
+                'sheets': sheet_names,
+                'sheet_count': len(sheet_names)
             }
     except Exception as e:
         return {
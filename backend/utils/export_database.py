@@ -2,117 +2,382 @@
 """
 数据库导出工具
 
-功能：导出SQLite数据库的建表语句和数据为SQL文件
+功能：导出数据库（PostgreSQL，或本地测试用的 SQLite）的表结构与数据为一个 tar 归档：
+- schema.sql: 建表与索引语句（源数据库方言）
+- tables/<表名>.csv.gz: 每个表一个 gzip 压缩的 CSV 文件（带表头，空值为不加引号的空字段）
+- sequences.sql: 序列当前值（仅 PostgreSQL）
+- manifest.json: 表的导入顺序（按外键依赖）、行数与文件大小
+
+PostgreSQL 下每个表由一个连接通过 COPY ... TO STDOUT 导出，多个表并行；各连接通过
+pg_export_snapshot / SET TRANSACTION SNAPSHOT 共享同一个快照，导出结果在所有表之间一致。
+SQLite 在同一个读事务中依次导出各表。
+
+归档写入 <名称>.tar.part，每个表导出完成后立即追加到归档，全部完成后重命名为 <名称>.tar；
+导出过程中即可通过 iter_export_file 边生成边下载。
+
+导入 PostgreSQL：
+    psql -f schema.sql
+    按 manifest.json 中的顺序：gunzip -c tables/<表名>.csv.gz | psql -c "COPY <表名> FROM STDIN WITH (FORMAT csv, HEADER true)"
+    psql -f sequences.sql
 """
+import io
 import os
 import sys
-import sqlite3
+import csv
+import gzip
+import json
+import time
+import tarfile
 import datetime
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # 将backend目录添加到Python路径
-sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from sqlalchemy import create_engine, MetaData, text
+from sqlalchemy.pool import NullPool
+from sqlalchemy.schema import CreateTable, CreateIndex
 from config import Config
 
 
-def export_database(output_file=None):
+PART_SUFFIX = '.part'
+
+# 写入 gzip 前合并 COPY 输出的小块（COPY 每行回调一次写入）
+WRITE_BUFFER_SIZE = 1024 * 1024
+FETCH_SIZE = 1000
+
+# 边生成边下载时，等待归档增长的间隔（秒）
+FOLLOW_INTERVAL = 0.2
+
+
+def _create_engine():
+    return create_engine(Config.SQLALCHEMY_DATABASE_URI, poolclass=NullPool)
+
+
+def _describe(engine):
+    """数据库描述（不含密码）"""
+    return engine.url.render_as_string(hide_password=True)
+
+
+def _schema_sql(engine, metadata):
+    """按外键依赖顺序生成建表与索引语句"""
+    statements = []
+    for table in metadata.sorted_tables:
+        statements.append(str(CreateTable(table).compile(dialect=engine.dialect)).strip() + ';')
+        for index in sorted(table.indexes, key=lambda index: index.name or ''):
+            statements.append(str(CreateIndex(index).compile(dialect=engine.dialect)).strip() + ';')
+    return '\n\n'.join(statements) + '\n'
+
+
+class _SnapshotExporter:
+    """PostgreSQL：协调连接导出快照，各工作连接在该快照中 COPY 各自的表"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.coordinator = engine.raw_connection()
+        connection = self.coordinator.driver_connection
+        connection.rollback()
+        connection.set_session(isolation_level='REPEATABLE READ', readonly=True)
+        cursor = connection.cursor()
+        cursor.execute('SELECT pg_export_snapshot()')
+        self.snapshot_id = cursor.fetchone()[0]
+
+    def copy_table(self, table, path):
+        raw = self.engine.raw_connection()
+        try:
+            connection = raw.driver_connection
+            connection.rollback()
+            connection.set_session(isolation_level='REPEATABLE READ', readonly=True)
+            cursor = connection.cursor()
+            # 必须是事务中的第一条语句
+            cursor.execute('SET TRANSACTION SNAPSHOT %s', (self.snapshot_id,))
+            name = self.engine.dialect.identifier_preparer.format_table(table)
+            with gzip.open(path, 'wb', compresslevel=Config.BACKUP_COMPRESS_LEVEL) as gz:
+                with io.BufferedWriter(gz, WRITE_BUFFER_SIZE) as out:
+                    cursor.copy_expert(f'COPY {name} TO STDOUT WITH (FORMAT csv, HEADER true)', out)
+            return cursor.rowcount
+        finally:
+            raw.rollback()
+            raw.close()
+
+    def sequences_sql(self):
+        cursor = self.coordinator.driver_connection.cursor()
+        cursor.execute(
+            "SELECT schemaname, sequencename, last_value FROM pg_sequences WHERE last_value IS NOT NULL "
+            "ORDER BY schemaname, sequencename"
+        )
+        return ''.join(
+            f"SELECT setval('{schema}.{sequence}', {value}, true);\n" for schema, sequence, value in cursor.fetchall()
+        )
+
+    def close(self):
+        self.coordinator.rollback()
+        self.coordinator.close()
+
+
+class _SQLiteExporter:
+    """SQLite：同一个读事务中依次导出（仅用于本地测试）"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.connection = engine.raw_connection()
+        self.connection.driver_connection.execute('BEGIN')
+
+    def copy_table(self, table, path):
+        name = self.engine.dialect.identifier_preparer.format_table(table)
+        cursor = self.connection.cursor()
+        cursor.execute(f'SELECT * FROM {name}')
+        rows = 0
+        with gzip.open(path, 'wt', encoding='utf-8', newline='', compresslevel=Config.BACKUP_COMPRESS_LEVEL) as out:
+            writer = csv.writer(out, lineterminator='\n')
+            writer.writerow([column[0] for column in cursor.description])
+            # 与 PostgreSQL COPY CSV 一致：空值为空字段，空字符串为 ""
+            while True:
+                batch = cursor.fetchmany(FETCH_SIZE)
+                if not batch:
+                    break
+                for row in batch:
+                    out.write(','.join(_sqlite_csv_field(value) for value in row) + '\n')
+                rows += len(batch)
+        return rows
+
+    def sequences_sql(self):
+        return ''
+
+    def close(self):
+        self.connection.rollback()
+        self.connection.close()
+
+
+def _sqlite_csv_field(value):
+    if value is None:
+        return ''
+    if isinstance(value, bytes):
+        value = '\\x' + value.hex()
+    value = str(value)
+    return '"' + value.replace('"', '""') + '"'
+
+
+def _add_bytes(tar, name, data):
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    info.mtime = time.time()
+    tar.addfile(info, io.BytesIO(data))
+
+
+def export_database(output_file=None, workers=None):
     """
-    导出数据库为SQL文件
+    导出数据库为 tar 归档
 
     Args:
         output_file: 输出文件路径，如果为None则自动生成
+        workers: 并行导出的表数，默认 Config.DB_EXPORT_WORKERS
 
     Returns:
         str: 导出的文件路径
     """
     # 生成输出文件名
     if output_file is None:
-        timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
-        output_file = os.path.join(Config.BACKUPS_DIR, f'database_export_{timestamp}.sql')
+        output_file = new_export_path()
 
     # 确保备份目录存在
     os.makedirs(os.path.dirname(output_file), exist_ok=True)
 
-    # 连接数据库
-    db_path = Config.DATABASE_PATH
+    engine = _create_engine()
+    part_file = output_file + PART_SUFFIX
+    started = time.time()
 
-    if not os.path.exists(db_path):
-        raise FileNotFoundError(f"数据库文件不存在: {db_path}")
-
-    conn = sqlite3.connect(db_path)
-
-    print(f"开始导出数据库: {db_path}")
+    print(f"开始导出数据库: {_describe(engine)}")
     print(f"输出文件: {output_file}")
     print("-" * 70)
 
-    # 打开输出文件
-    with open(output_file, 'w', encoding='utf-8') as f:
-        # 写入文件头注释
-        f.write("-- " + "=" * 68 + "\n")
-        f.write(f"-- 数据库导出文件\n")
-        f.write(f"-- 导出时间: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-        f.write(f"-- 数据库: {db_path}\n")
-        f.write("-- " + "=" * 68 + "\n\n")
-
-        # 导出所有内容
-        for line in conn.iterdump():
-            # 过滤掉一些不需要的语句
-            if line.startswith('BEGIN TRANSACTION') or line.startswith('COMMIT'):
-                continue
-
-            f.write(f"{line}\n")
-
-        f.write("\n-- 导出完成\n")
-
-    conn.close()
+    try:
+        if engine.dialect.name == 'postgresql':
+            exporter = _SnapshotExporter(engine)
+            workers = workers or Config.DB_EXPORT_WORKERS
+        elif engine.dialect.name == 'sqlite':
+            exporter = _SQLiteExporter(engine)
+            workers = 1
+        else:
+            raise ValueError(f'不支持的数据库类型: {engine.dialect.name}')
+
+        try:
+            metadata = MetaData()
+            metadata.reflect(bind=engine)
+            tables = metadata.sorted_tables
+
+            with open(part_file, 'wb') as archive, tarfile.open(fileobj=archive, mode='w') as tar, \
+                    tempfile.TemporaryDirectory(dir=os.path.dirname(output_file)) as tmp_dir:
+                _add_bytes(tar, 'schema.sql', _schema_sql(engine, metadata).encode('utf-8'))
+                archive.flush()
+
+                results = {}
+                with ThreadPoolExecutor(max_workers=workers) as pool:
+                    futures = {
+                        pool.submit(exporter.copy_table, table, os.path.join(tmp_dir, f'{table.name}.csv.gz')): table
+                        for table in tables
+                    }
+                    # 按完成顺序追加到归档，下载方可以立即读到已完成的表
+                    for future in as_completed(futures):
+                        table = futures[future]
+                        path = os.path.join(tmp_dir, f'{table.name}.csv.gz')
+                        rows = future.result()
+                        size = os.path.getsize(path)
+                        tar.add(path, arcname=f'tables/{table.name}.csv.gz')
+                        archive.flush()
+                        os.remove(path)
+                        results[table.name] = {'rows': rows, 'size': size}
+                        print(f"  ✓ {table.name}: {rows} 条记录, {size / 1024:.1f} KB")
+
+                sequences = exporter.sequences_sql()
+                if sequences:
+                    _add_bytes(tar, 'sequences.sql', sequences.encode('utf-8'))
+
+                manifest = {
+                    'dialect': engine.dialect.name,
+                    'database': _describe(engine),
+                    'created': datetime.datetime.now().isoformat(),
+                    'format': 'csv',
+                    'tables': [
+                        {'name': table.name, 'file': f'tables/{table.name}.csv.gz', **results[table.name]}
+                        for table in tables
+                    ]
+                }
+                _add_bytes(tar, 'manifest.json', json.dumps(manifest, ensure_ascii=False, indent=2).encode('utf-8'))
+        finally:
+            exporter.close()
+    except Exception:
+        if os.path.exists(part_file):
+            os.remove(part_file)
+        raise
+    finally:
+        engine.dispose()
+
+    # 写入完成后再重命名，下载方据此判断归档已完整
+    os.replace(part_file, output_file)
 
     # 获取文件大小
     file_size = os.path.getsize(output_file)
     file_size_mb = file_size / (1024 * 1024)
 
     print("-" * 70)
-    print(f"✓ 导出完成")
+    print(f"✓ 导出完成，耗时 {time.time() - started:.2f} 秒")
     print(f"✓ 文件大小: {file_size_mb:.2f} MB ({file_size:,} 字节)")
     print(f"✓ 保存位置: {output_file}")
 
     return output_file
 
 
-def get_database_info():
-    """获取数据库信息"""
-    db_path = Config.DATABASE_PATH
+def new_export_path():
+    """生成新的导出文件路径"""
+    timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+    return os.path.join(Config.BACKUPS_DIR, f'database_export_{timestamp}.tar')
 
-    if not os.path.exists(db_path):
-        return None
 
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+def start_export(output_file=None):
+    """
+    在后台线程中导出数据库，立即返回导出文件路径
 
-    # 获取所有表
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' ORDER BY name")
-    tables = cursor.fetchall()
+    导出完成前可通过 iter_export_file 下载正在生成的归档。
+    """
+    output_file = output_file or new_export_path()
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+    # 先创建 .part 文件，下载请求在导出线程启动前到达也能找到
+    open(output_file + PART_SUFFIX, 'wb').close()
 
-    info = {
-        'path': db_path,
-        'size': os.path.getsize(db_path),
-        'tables': []
-    }
+    def run():
+        try:
+            export_database(output_file)
+        except Exception as e:
+            print(f"[数据库导出] 导出失败: {e}")
+
+    threading.Thread(target=run, name='database-export', daemon=True).start()
+    return output_file
 
-    # 获取每个表的记录数
-    for (table_name,) in tables:
-        cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
-        count = cursor.fetchone()[0]
-        info['tables'].append({
-            'name': table_name,
-            'count': count
-        })
 
-    conn.close()
-    return info
+def is_exporting(output_file):
+    """导出是否仍在进行"""
+    return os.path.exists(output_file + PART_SUFFIX) and not os.path.exists(output_file)
+
+
+def iter_export_file(output_file, chunk_size=64 * 1024):
+    """
+    读取导出归档；导出仍在进行时跟随文件增长，直到导出完成
+
+    导出失败（.part 文件被删除且没有生成归档）时结束，下载方得到不完整的归档。
+
+    Yields:
+        bytes: 归档数据
+    """
+    part_file = output_file + PART_SUFFIX
+    try:
+        f = open(part_file, 'rb')
+    except FileNotFoundError:
+        # 已经导出完成
+        f = open(output_file, 'rb')
+
+    with f:
+        while True:
+            data = f.read(chunk_size)
+            if data:
+                yield data
+                continue
+            if os.path.exists(output_file):
+                # 重命名前已写完全部数据，读到末尾即完成
+                while True:
+                    data = f.read(chunk_size)
+                    if not data:
+                        return
+                    yield data
+            if not os.path.exists(part_file):
+                print(f"[数据库导出] 归档未完成即中止: {output_file}")
+                return
+            time.sleep(FOLLOW_INTERVAL)
+
+
+def get_database_info():
+    """获取数据库信息（PostgreSQL 的记录数为统计信息中的估计值）"""
+    engine = _create_engine()
+    try:
+        with engine.connect() as conn:
+            if engine.dialect.name == 'postgresql':
+                size = conn.execute(text('SELECT pg_database_size(current_database())')).scalar()
+                rows = conn.execute(text(
+                    'SELECT relname, n_live_tup FROM pg_stat_user_tables ORDER BY relname'
+                )).all()
+                tables = [{'name': name, 'count': count} for name, count in rows]
+            else:
+                database = engine.url.database
+                size = os.path.getsize(database) if database and os.path.exists(database) else 0
+                names = conn.execute(text(
+                    "SELECT name FROM sqlite_master WHERE type='table' ORDER BY name"
+                )).scalars().all()
+                preparer = engine.dialect.identifier_preparer
+                tables = [{
+                    'name': name,
+                    'count': conn.execute(text(f'SELECT COUNT(*) FROM {preparer.quote(name)}')).scalar()
+                } for name in names]
+    finally:
+        engine.dispose()
+
+    return {
+        'path': _describe(engine),
+        'size': size,
+        'tables': tables
+    }
 
 
 def main():
     """主函数"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='数据库导出工具')
+    parser.add_argument('--output', help='输出文件路径（.tar）')
+    parser.add_argument('--workers', type=int, help='并行导出的表数')
+    args = parser.parse_args()
+
     print("=" * 70)
     print("数据库导出工具")
     print("=" * 70)
@@ -121,16 +386,15 @@ def main():
     try:
         # 显示数据库信息
         info = get_database_info()
-        if info:
-            print(f"数据库路径: {info['path']}")
-            print(f"数据库大小: {info['size'] / (1024*1024):.2f} MB")
-            print(f"\n数据表统计:")
-            for table in info['tables']:
-                print(f"  - {table['name']}: {table['count']} 条记录")
-            print()
+        print(f"数据库: {info['path']}")
+        print(f"数据库大小: {info['size'] / (1024*1024):.2f} MB")
+        print(f"\n数据表统计:")
+        for table in info['tables']:
+            print(f"  - {table['name']}: {table['count']} 条记录")
+        print()
 
         # 执行导出
-        output_file = export_database()
+        export_database(args.output, args.workers)
 
         print("\n" + "=" * 70)
         print("导出成功完成!")
@@ -3,7 +3,10 @@ WebSocket module for real-time collaboration
 """
 from flask_socketio import SocketIO
 from config import Config
+from .backends import queue_options
 
-socketio = SocketIO(cors_allowed_origins=Config.CORS_ORIGINS)
+socketio = SocketIO(cors_allowed_origins=Config.CORS_ORIGINS, async_mode=Config.SOCKETIO_ASYNC_MODE, **queue_options())
+
+from . import execution_ws, excel_ws
 
 __all__ = ['socketio']
\ No newline at end of file
@@ -0,0 +1,213 @@
+"""
+Pluggable backends for running Socket.IO in several worker processes
+
+Two pieces of state must be shared once more than one process serves WebSocket
+clients:
+
+- Broadcasts: an emit to a room has to reach clients connected to every worker.
+  This is python-socketio's client manager. Config.SOCKETIO_MESSAGE_QUEUE selects it:
+  empty (in-process, the default), sqlite:///path (SQLiteManager below, a
+  single-host stand-in for tests and small deployments) or any URL Flask-SocketIO
+  understands (redis://, amqp://, kafka://, zmq+tcp://).
+- Sessions and room membership (who is in a room, their name and cursor color).
+  Config.SOCKETIO_SESSION_STORE selects it: memory (the default) or sqlite:///path.
+
+Edit ordering for a file (services.excel_collab) uses its own store,
+Config.EXCEL_COLLAB_STORE (memory or sqlite:///path, defaulting to the session
+store), so clients of one file may be connected to different workers.
+"""
+import json
+import sqlite3
+import threading
+import time
+import socketio as python_socketio
+from config import Config
+
+
+def sqlite_path(url):
+    """sqlite:///relative/path or sqlite:////absolute/path -> file path"""
+    if not url.startswith('sqlite:///'):
+        raise ValueError(f'Not a sqlite URL: {url}')
+    return url[len('sqlite:///'):]
+
+
+def _connect(path):
+    connection = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('PRAGMA synchronous=NORMAL')
+    return connection
+
+
+class MemorySessionStore:
+    """Sessions in a process-local dict (single worker)"""
+
+    def __init__(self):
+        self._sessions = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def set(self, sid, session):
+        with self._lock:
+            self._sessions[sid] = dict(session)
+
+    def get(self, sid):
+        with self._lock:
+            session = self._sessions.get(sid)
+            return dict(session) if session else None
+
+    def pop(self, sid):
+        """Remove and return a session (None if it did not exist)"""
+        with self._lock:
+            return self._sessions.pop(sid, None)
+
+    def room_members(self, room):
+        """Sessions in a room as a list of dicts including 'sid'"""
+        with self._lock:
+            return [dict(session, sid=sid) for sid, session in self._sessions.items()
+                    if session.get('room') == room]
+
+    def next_index(self, name):
+        """Shared counter, e.g. for assigning cursor colors in turn"""
+        with self._lock:
+            value = self._counters.get(name, 0)
+            self._counters[name] = value + 1
+            return value
+
+    def count(self):
+        with self._lock:
+            return len(self._sessions)
+
+
+class SQLiteSessionStore:
+    """Sessions in a SQLite file shared by the worker processes of one host"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        connection = self._connection()
+        connection.execute('CREATE TABLE IF NOT EXISTS socketio_sessions '
+                           '(sid TEXT PRIMARY KEY, room TEXT, data TEXT NOT NULL, updated REAL NOT NULL)')
+        connection.execute('CREATE INDEX IF NOT EXISTS ix_socketio_sessions_room ON socketio_sessions (room)')
+        connection.execute('CREATE TABLE IF NOT EXISTS socketio_counters '
+                           '(name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = _connect(self.path)
+        return connection
+
+    def set(self, sid, session):
+        self._connection().execute(
+            'INSERT OR REPLACE INTO socketio_sessions (sid, room, data, updated) VALUES (?, ?, ?, ?)',
+            (sid, session.get('room'), json.dumps(session), time.time()))
+
+    def get(self, sid):
+        row = self._connection().execute('SELECT data FROM socketio_sessions WHERE sid = ?', (sid,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def pop(self, sid):
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute('SELECT data FROM socketio_sessions WHERE sid = ?', (sid,)).fetchone()
+            if row:
+                connection.execute('DELETE FROM socketio_sessions WHERE sid = ?', (sid,))
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        return json.loads(row[0]) if row else None
+
+    def room_members(self, room):
+        rows = self._connection().execute('SELECT sid, data FROM socketio_sessions WHERE room = ?', (room,))
+        return [dict(json.loads(data), sid=sid) for sid, data in rows]
+
+    def next_index(self, name):
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.execute('INSERT OR IGNORE INTO socketio_counters (name, value) VALUES (?, 0)', (name,))
+            value = connection.execute('SELECT value FROM socketio_counters WHERE name = ?', (name,)).fetchone()[0]
+            connection.execute('UPDATE socketio_counters SET value = value + 1 WHERE name = ?', (name,))
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        return value
+
+    def count(self):
+        return self._connection().execute('SELECT COUNT(*) FROM socketio_sessions').fetchone()[0]
+
+
+def create_session_store(url=None):
+    """Create the session store selected by Config.SOCKETIO_SESSION_STORE"""
+    url = url or Config.SOCKETIO_SESSION_STORE
+    if url == 'memory':
+        return MemorySessionStore()
+    if url.startswith('sqlite:///'):
+        return SQLiteSessionStore(sqlite_path(url))
+    raise ValueError(f'Unsupported Socket.IO session store: {url}')
+
+
+class SQLiteManager(python_socketio.PubSubManager):
+    """
+    Socket.IO client manager that passes messages between processes through a SQLite table
+
+    Every worker appends the messages it publishes and polls for rows written by
+    the others. Meant for running several workers on one host without a broker
+    (tests, small deployments); use Redis or another broker across hosts.
+    """
+    name = 'sqlite'
+
+    def __init__(self, url, channel='socketio', write_only=False, logger=None, json=None,
+                 poll_interval=None, retention=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger, json=json)
+        self.path = sqlite_path(url)
+        self.poll_interval = poll_interval if poll_interval is not None else Config.SOCKETIO_QUEUE_POLL_INTERVAL
+        self.retention = retention if retention is not None else Config.SOCKETIO_QUEUE_RETENTION
+        self._local = threading.local()
+        self._last_prune = 0
+        connection = self._connection()
+        connection.execute('CREATE TABLE IF NOT EXISTS socketio_messages '
+                           '(id INTEGER PRIMARY KEY AUTOINCREMENT, channel TEXT NOT NULL, '
+                           'payload TEXT NOT NULL, created REAL NOT NULL)')
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = _connect(self.path)
+        return connection
+
+    def _publish(self, data):
+        now = time.time()
+        connection = self._connection()
+        connection.execute('INSERT INTO socketio_messages (channel, payload, created) VALUES (?, ?, ?)',
+                           (self.channel, self.json.dumps(data), now))
+        if now - self._last_prune > self.retention:
+            self._last_prune = now
+            connection.execute('DELETE FROM socketio_messages WHERE created < ?', (now - self.retention,))
+
+    def _listen(self):
+        connection = self._connection()
+        # Only messages published after this worker started
+        last_id = connection.execute('SELECT COALESCE(MAX(id), 0) FROM socketio_messages').fetchone()[0]
+        while True:
+            rows = connection.execute(
+                'SELECT id, payload FROM socketio_messages WHERE id > ? AND channel = ? ORDER BY id',
+                (last_id, self.channel)).fetchall()
+            for message_id, payload in rows:
+                last_id = message_id
+                yield payload
+            if not rows:
+                self.server.sleep(self.poll_interval)
+
+
+def queue_options(url=None):
+    """SocketIO keyword arguments for the message queue selected by Config.SOCKETIO_MESSAGE_QUEUE"""
+    url = url if url is not None else Config.SOCKETIO_MESSAGE_QUEUE
+    if not url:
+        return {}
+    if url.startswith('sqlite:///'):
+        return {'client_manager': SQLiteManager(url, channel=Config.SOCKETIO_CHANNEL)}
+    return {'message_queue': url, 'channel': Config.SOCKETIO_CHANNEL}
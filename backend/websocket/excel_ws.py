@@ -1,18 +1,29 @@
 """
 Excel WebSocket handlers for real-time collaboration
+
+Document state is held on the server (services.excel_collab): edits are ordered
+and versioned per room, persisted through the edit journal and then broadcast.
+Clients that join late or reconnect send the epoch/version they already have and
+receive only the missing edits ('sync' event) instead of reloading the file.
+Every broadcast edit carries the room epoch; a client that sees another epoch or
+a gap in the versions asks for a 'sync' instead of applying it.
+
+Sessions and room membership live in the configured session store
+(websocket.backends), so the user list is complete when several workers share
+a message queue.
 """
 import logging
 import time
-import threading
 from flask import request
 from flask_socketio import emit, join_room, leave_room
+from services.excel_collab import excel_collab, EditConflict
 from . import socketio
+from .backends import create_session_store
 
 logger = logging.getLogger(__name__)
 
-# Thread-safe session storage
-user_sessions = {}
-user_sessions_lock = threading.Lock()
+# Session storage (sid -> room, user and color), shared between workers when configured
+session_store = create_session_store()
 
 # Colors for cursor/selection highlighting
 CURSOR_COLORS = [
@@ -20,17 +31,11 @@ CURSOR_COLORS = [
     '#FFEAA7', '#DDA0DD', '#98D8C8', '#F7DC6F',
     '#BB8FCE', '#85C1E9', '#F8B500', '#00CED1'
 ]
-color_index = 0
-color_lock = threading.Lock()
 
 
 def get_next_color():
     """Get next available cursor color"""
-    global color_index
-    with color_lock:
-        color = CURSOR_COLORS[color_index % len(CURSOR_COLORS)]
-        color_index += 1
-        return color
+    return CURSOR_COLORS[session_store.next_index('color') % len(CURSOR_COLORS)]
 
 
 @socketio.on('connect', namespace='/excel')
@@ -41,29 +46,30 @@ def handle_connect():
 
 
 @socketio.on('disconnect', namespace='/excel')
-def handle_disconnect():
+def handle_disconnect(reason=None):
     """Handle client disconnection"""
     sid = request.sid
 
-    with user_sessions_lock:
-        if sid in user_sessions:
-            session = user_sessions[sid]
-            room = session.get('room')
-            user_id = session.get('user_id')
+    session = session_store.pop(sid)
+    if session:
+        room = session.get('room')
+        user_id = session.get('user_id')
+
+        collab_room = excel_collab.get_room(session.get('file_id'))
+        if collab_room:
+            collab_room.leave(sid)
 
-            if room:
-                # Notify others in the room
-                emit('user_left', {
-                    'user_id': user_id,
-                    'message': f'User {user_id} left'
-                }, room=room, include_self=False)
+        if room:
+            # Notify others in the room
+            emit('user_left', {
+                'user_id': user_id,
+                'message': f'User {user_id} left'
+            }, room=room, include_self=False)
 
-                # Leave the room
-                leave_room(room)
+            # Leave the room
+            leave_room(room)
 
-            # Clean up session
-            del user_sessions[sid]
-            logger.info(f'User {user_id} disconnected from room {room}')
+        logger.info(f'User {user_id} disconnected from room {room}')
 
 
 @socketio.on('join', namespace='/excel')
@@ -74,8 +80,13 @@ def handle_join(data):
     Expected data: {
         'file_id': str,
         'user_id': str,
-        'user_name': str (optional)
+        'user_name': str (optional),
+        'epoch': str (optional, room epoch the client's data belongs to),
+        'since_version': int (optional, last version the client has applied)
     }
+
+    After 'joined' (which carries the current epoch/version and the users already
+    in the room) the client receives a 'sync' event with the edits it is missing.
     """
     file_id = data.get('file_id')
     user_id = data.get('user_id')
@@ -85,24 +96,36 @@ def handle_join(data):
         emit('error', {'message': 'file_id and user_id are required'})
         return
 
+    try:
+        collab_room = excel_collab.open_room(file_id)
+    except ValueError as e:
+        emit('error', {'message': str(e), 'file_id': file_id})
+        return
+
     room = f'excel_{file_id}'
     sid = request.sid
 
     # Assign a color to this user
     color = get_next_color()
 
-    # Store session info (thread-safe)
-    with user_sessions_lock:
-        user_sessions[sid] = {
-            'room': room,
-            'file_id': file_id,
-            'user_id': user_id,
-            'user_name': user_name,
-            'color': color
-        }
+    # Users already in the room (on any worker)
+    users = [{'sid': member['sid'], 'user_id': member['user_id'], 'user_name': member['user_name'],
+              'color': member['color']} for member in session_store.room_members(room) if member['sid'] != sid]
+
+    # Store session info
+    session_store.set(sid, {
+        'room': room,
+        'file_id': file_id,
+        'user_id': user_id,
+        'user_name': user_name,
+        'color': color
+    })
 
-    # Join the room
+    # Join the room before the catch-up, so every edit after it is delivered through
+    # the room broadcast (edits in both are applied once by version on the client)
     join_room(room)
+    sync = collab_room.join(sid, _as_int(data.get('since_version')), data.get('epoch'))
+    excel_collab.record(f"{sync['mode']}_syncs")
 
     # Notify the user they've joined
     emit('joined', {
@@ -110,8 +133,12 @@ def handle_join(data):
         'file_id': file_id,
         'user_id': user_id,
         'color': color,
+        'epoch': sync['epoch'],
+        'version': sync['version'],
+        'users': users,
         'message': f'Successfully joined {room}'
     })
+    emit('sync', dict(sync, file_id=file_id))
 
     # Notify others in the room
     emit('user_joined', {
@@ -149,25 +176,64 @@ def handle_leave(data):
     # Leave the room
     leave_room(room)
 
-    # Clean up session (thread-safe)
-    with user_sessions_lock:
-        if sid in user_sessions:
-            del user_sessions[sid]
+    # Clean up session
+    session_store.pop(sid)
+
+    collab_room = excel_collab.get_room(file_id)
+    if collab_room:
+        collab_room.leave(sid)
 
     logger.info(f'User {user_id} left room {room}')
 
 
+@socketio.on('sync', namespace='/excel')
+def handle_sync(data):
+    """
+    Request the edits missed since a known version (e.g. after a reconnect)
+
+    Expected data: {
+        'file_id': str,
+        'epoch': str,
+        'since_version': int
+    }
+    """
+    file_id = data.get('file_id')
+    collab_room = excel_collab.get_room(file_id) if file_id else None
+    if not collab_room:
+        emit('error', {'message': 'Room not found, join first', 'file_id': file_id})
+        return
+
+    sync = collab_room.catch_up(_as_int(data.get('since_version')), data.get('epoch'))
+    excel_collab.record(f"{sync['mode']}_syncs")
+    emit('sync', dict(sync, file_id=file_id))
+
+
+def _as_int(value):
+    try:
+        return int(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
 @socketio.on('edit', namespace='/excel')
 def handle_edit(data):
     """
     Handle cell edit event
 
+    The server assigns the edit a version, appends it to the file's edit journal
+    (services.excel_journal) and broadcasts it to the room. The sender receives
+    'edit_ack' with the version, or 'edit_rejected' with the current value when
+    the cell was changed by someone else after base_version.
+
     Expected data: {
         'file_id': str,
         'user_id': str,
         'sheet': str,
         'cell': str,       # e.g., 'A1'
         'value': any,
+        'base_version': int (optional, version the edit is based on),
+        'epoch': str (optional, epoch of base_version),
+        'op_id': str (optional, echoed back in the ack),
         'previous_value': any (optional)
     }
     """
@@ -176,6 +242,7 @@ def handle_edit(data):
     sheet = data.get('sheet')
     cell = data.get('cell')
     value = data.get('value')
+    op_id = data.get('op_id')
 
     if not all([file_id, user_id, sheet, cell]):
         emit('error', {'message': 'file_id, user_id, sheet, and cell are required'})
@@ -184,22 +251,38 @@ def handle_edit(data):
     room = f'excel_{file_id}'
     sid = request.sid
 
-    # Get user color (thread-safe read)
-    with user_sessions_lock:
-        session = user_sessions.get(sid, {})
-        color = session.get('color', '#000000')
+    try:
+        collab_room = excel_collab.open_room(file_id)
+        op = collab_room.apply_edit(user_id, sheet, cell, value, _as_int(data.get('base_version')),
+                                     data.get('epoch'))
+    except EditConflict as e:
+        excel_collab.record('conflicts')
+        emit('edit_rejected', {
+            'op_id': op_id,
+            'sheet': sheet,
+            'cell': cell,
+            'value': e.current['value'],
+            'version': e.current['version'],
+            'user_id': e.current['user_id'],
+            'message': str(e)
+        })
+        return
+    except ValueError as e:
+        emit('error', {'message': str(e), 'file_id': file_id, 'cell': cell})
+        return
+    excel_collab.record('edits')
+
+    # Get user color
+    session = session_store.get(sid) or {}
+    color = session.get('color', '#000000')
+
+    emit('edit_ack', {'op_id': op_id, 'epoch': op['epoch'], 'version': op['version'], 'cell': op['cell'],
+                      'sheet': sheet})
 
     # Broadcast the edit to all other users in the room
-    emit('cell_update', {
-        'user_id': user_id,
-        'sheet': sheet,
-        'cell': cell,
-        'value': value,
-        'color': color,
-        'timestamp': time.time()
-    }, room=room, include_self=False)
+    emit('cell_update', dict(op, color=color), room=room, include_self=False)
 
-    logger.debug(f'User {user_id} edited {sheet}!{cell} in {room}')
+    logger.debug(f'User {user_id} edited {sheet}!{cell} in {room} (version {op["version"]})')
 
 
 @socketio.on('cursor_move', namespace='/excel')
@@ -230,11 +313,10 @@ def handle_cursor_move(data):
     room = f'excel_{file_id}'
     sid = request.sid
 
-    # Get user info (thread-safe read)
-    with user_sessions_lock:
-        session = user_sessions.get(sid, {})
-        color = session.get('color', '#000000')
-        user_name = session.get('user_name', user_id)
+    # Get user info
+    session = session_store.get(sid) or {}
+    color = session.get('color', '#000000')
+    user_name = session.get('user_name', user_id)
 
     # Broadcast cursor position to others
     emit('cursor_update', {
@@ -304,11 +386,10 @@ def handle_selection_change(data):
     room = f'excel_{file_id}'
     sid = request.sid
 
-    # Get user info (thread-safe read)
-    with user_sessions_lock:
-        session = user_sessions.get(sid, {})
-        color = session.get('color', '#000000')
-        user_name = session.get('user_name', user_id)
+    # Get user info
+    session = session_store.get(sid) or {}
+    color = session.get('color', '#000000')
+    user_name = session.get('user_name', user_id)
 
     # Broadcast selection to others
     emit('selection_update', {
@@ -0,0 +1,114 @@
+"""
+Execution log WebSocket handlers
+
+Clients subscribe to an execution room in the /executions namespace and receive
+'log', 'progress' and 'status' events pushed from the in-process log bus.
+Log events carry byte offsets ('offset', 'end') so clients can drop any chunk
+they already received while the backlog was being replayed.
+"""
+import logging
+import os
+from flask_socketio import emit, join_room, leave_room
+from config import Config
+from models import db, Execution
+from services.log_bus import log_bus, read_log_from
+from . import socketio
+
+logger = logging.getLogger(__name__)
+
+NAMESPACE = '/executions'
+
+
+def _room(execution_id):
+    return f'execution_{execution_id}'
+
+
+def _broadcast(execution_id, event):
+    """Forward log bus events to the execution room"""
+    socketio.emit(event['type'], dict(event, execution_id=execution_id),
+                  to=_room(execution_id), namespace=NAMESPACE)
+
+
+log_bus.add_listener(_broadcast)
+
+
+@socketio.on('subscribe', namespace=NAMESPACE)
+def handle_subscribe(data):
+    """
+    Subscribe to an execution's log stream
+
+    Expected data: {
+        'execution_id': int,
+        'offset': int (optional, byte offset to resume from)
+    }
+    """
+    execution_id = data.get('execution_id')
+    if not execution_id:
+        emit('error', {'message': 'execution_id is required'})
+        return
+
+    try:
+        offset = max(int(data.get('offset') or 0), 0)
+    except (TypeError, ValueError):
+        offset = 0
+
+    # Join first so nothing published during the backlog replay is missed
+    join_room(_room(execution_id))
+
+    execution = Execution.query.get(execution_id)
+    if not execution:
+        emit('error', {'message': 'Execution not found', 'execution_id': execution_id})
+        return
+    status, progress, stage, error = execution.status, execution.progress, execution.stage, execution.error
+    log_file = execution.log_file or os.path.join(Config.LOGS_DIR, f'execution_{execution_id}.log')
+    db.session.remove()
+
+    for content, end in read_log_from(log_file, offset):
+        emit('log', {
+            'execution_id': execution_id,
+            'type': 'log',
+            'content': content,
+            'offset': offset,
+            'end': end
+        })
+        offset = end
+
+    if status in log_bus.FINAL_STATUSES:
+        emit('status', {
+            'execution_id': execution_id,
+            'type': 'status',
+            'status': status,
+            'progress': progress or 100,
+            'stage': stage or ('completed' if status == 'success' else 'failed'),
+            'error': error or ''
+        })
+    else:
+        emit('progress', {
+            'execution_id': execution_id,
+            'type': 'progress',
+            'progress': progress or 0,
+            'stage': stage or 'pending'
+        })
+
+    logger.info(f'Client subscribed to execution {execution_id} logs from offset {offset}')
+
+
+@socketio.on('unsubscribe', namespace=NAMESPACE)
+def handle_unsubscribe(data):
+    """
+    Unsubscribe from an execution's log stream
+
+    Expected data: {
+        'execution_id': int
+    }
+    """
+    execution_id = data.get('execution_id')
+    if execution_id:
+        leave_room(_room(execution_id))
+
+
+@socketio.on_error(NAMESPACE)
+def error_handler(e):
+    """Handle errors in the executions namespace"""
+    logger.error(f'WebSocket error in {NAMESPACE} namespace: {e}')
+    emit('error', {'message': str(e)})
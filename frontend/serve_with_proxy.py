@@ -4,18 +4,21 @@ Usage:
     python serve_with_proxy.py --dir dist --port 3000 --proxy-path /api --backend http://localhost:8000
 
 This serves static files from --dir and proxies requests starting with --proxy-path to --backend.
+Backend responses are streamed through, so SSE log streams work. For pooled upstream connections,
+precompressed static files and WebSocket (/excel) support use ../simple_proxy.py (async mode).
 """
 import argparse
 import io
 import sys
 import urllib.request
 import urllib.error
-from http.server import SimpleHTTPRequestHandler, HTTPServer
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
 from urllib.parse import urljoin, urlsplit
 
 class ProxyAndStaticHandler(SimpleHTTPRequestHandler):
     backend = "http://localhost:8000"
     proxy_path = "/api"
+    chunk_size = 64 * 1024
 
     def _should_proxy(self):
         # proxy if path starts with proxy_path
@@ -43,18 +46,27 @@ class ProxyAndStaticHandler(SimpleHTTPRequestHandler):
         req = urllib.request.Request(target, data=data, headers=headers, method=self.command)
         try:
             with urllib.request.urlopen(req, timeout=20) as resp:
-                resp_body = resp.read()
                 self.send_response(resp.getcode())
-                # copy headers
+                # copy headers; without Content-Length the body ends when the connection closes
                 for key, val in resp.getheaders():
-                    # prevent overriding content-length by double-setting; we'll set it from body
                     if key.lower() in ("transfer-encoding", "connection", "keep-alive"):
                         continue
                     self.send_header(key, val)
-                self.send_header("Content-Length", str(len(resp_body)))
+                self.send_header("Connection", "close")
                 self.end_headers()
-                if resp_body:
-                    self.wfile.write(resp_body)
+                # stream the body instead of buffering it: SSE log streams are delivered as
+                # they arrive and large downloads are not held in memory
+                streaming = resp.headers.get("Content-Type", "").startswith("text/event-stream")
+                while True:
+                    chunk = resp.read1(self.chunk_size) if streaming else resp.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    self.wfile.write(chunk)
+                    if streaming:
+                        self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # client went away (e.g. closed the log page)
+            pass
         except urllib.error.HTTPError as e:
             body = e.read() if hasattr(e, 'read') else b''
             self.send_response(e.code)
@@ -101,7 +113,8 @@ def run(port, directory, backend, proxy_path):
     handler_class.proxy_path = proxy_path
     # Python 3.7+: SimpleHTTPRequestHandler accepts directory arg
     try:
-        server = HTTPServer(("", port), handler_class)
+        # one thread per connection so a long-lived SSE stream does not block other requests
+        server = ThreadingHTTPServer(("", port), handler_class)
         handler_class.directory = directory
         print(f"Serving directory '{directory}' on :{port}, proxying '{proxy_path}' to {backend}")
         server.serve_forever()
@@ -31,7 +31,7 @@ export const previewExecutionFile = (id, filePath) => request.get(`/executions/$
 
 // 批量管理
 export const batchManageExecutions = (data) => request.post('/executions/batch', data)
-export const getExecutionsStatistics = () => request.get('/executions/statistics')
+export const getExecutionsStatistics = (params) => request.get('/executions/statistics', { params })
 
 // 定时任务
 export const getSchedules = () => request.get('/schedules')
@@ -101,7 +101,7 @@ export const reExecuteScript = (executionId) => request.post(`/executions/${exec
 
 // Excel 文件操作
 export const getExcelFile = (executionId, filePath) =>
-  request.get(`/executions/${executionId}/files/${encodeURIComponent(filePath)}?excel=true`)
+  request.get(`/executions/${executionId}/files/${encodeURIComponent(filePath)}?excel=true&mode=sparse`)
 
 export const saveExcelFile = (executionId, filePath, data) =>
   request.post(`/executions/${executionId}/files/${encodeURIComponent(filePath)}?excel=true`, data)
@@ -10,6 +10,13 @@ class ExcelSocket {
     this.userId = null
     this.callbacks = {}
     this.connected = false
+    // Server document state this client has applied (sent on reconnect for catch-up)
+    this.fileId = null
+    this.epoch = null
+    this.version = null
+    // Broadcast edits received ahead of a missing version (or before the first sync), by version
+    this.pendingOps = {}
+    this.syncing = false
   }
 
   /**
@@ -21,6 +28,12 @@ class ExcelSocket {
     if (this.socket) {
       this.disconnect()
     }
+    if (this.fileId !== fileId) {
+      this.epoch = null
+      this.version = null
+    }
+    this.fileId = fileId
+    this.pendingOps = {}
 
     // Connect to /excel namespace
     this.socket = io('/excel', {
@@ -45,6 +58,37 @@ class ExcelSocket {
       this.trigger('joined', data)
     })
 
+    // Catch-up after join/reconnect or a detected gap: delta or snapshot ops, or reload when the room was reset
+    this.socket.on('sync', (data) => {
+      this.syncing = false
+      if (data.mode === 'reload') {
+        this.version = data.version
+      } else {
+        (data.ops || []).forEach(op => {
+          if (this.version === null || op.version > this.version) {
+            this.applyOp(op)
+          }
+        })
+        this.version = Math.max(this.version || 0, data.version)
+      }
+      this.epoch = data.epoch
+      this.trigger('sync', data)
+      this.applyPendingOps()
+    })
+
+    // Own edits are not broadcast back: the ack takes their place in the version order,
+    // so earlier edits from others still in flight are not skipped
+    this.socket.on('edit_ack', (data) => {
+      this.applyRemoteOp({ ...data, own: true })
+      this.trigger('edit_ack', data)
+    })
+
+    this.socket.on('edit_rejected', (data) => {
+      // The server value wins; show it in place of the local edit
+      this.trigger('edit_rejected', data)
+      this.trigger('cell_update', data)
+    })
+
     this.socket.on('user_joined', (data) => {
       console.log('[ExcelSocket] User joined:', data.user_name)
       this.trigger('user_joined', data)
@@ -56,7 +100,7 @@ class ExcelSocket {
     })
 
     this.socket.on('cell_update', (data) => {
-      this.trigger('cell_update', data)
+      this.applyRemoteOp(data)
     })
 
     this.socket.on('cursor_update', (data) => {
@@ -74,6 +118,7 @@ class ExcelSocket {
 
     this.socket.on('error', (data) => {
       console.error('[ExcelSocket] Error:', data.message)
+      this.syncing = false
       this.trigger('error', data)
     })
 
@@ -100,10 +145,91 @@ class ExcelSocket {
       return
     }
 
+    this.syncing = true
     this.socket.emit('join', {
       file_id: fileId,
       user_id: this.userId,
-      user_name: userName
+      user_name: userName,
+      epoch: this.epoch,
+      since_version: this.version
+    })
+  }
+
+  /**
+   * Apply an edit from the server once, in version order
+   *
+   * Edits from other workers may arrive out of order, and versions of another
+   * epoch (the room was reset) are not comparable: hold the edit and ask the
+   * server for the missing ones instead of applying or dropping it.
+   * @param {object} op - Edit with server-assigned epoch and version
+   */
+  applyRemoteOp(op) {
+    if (!op.version) {
+      this.trigger('cell_update', op)
+      return
+    }
+    if (this.syncing || this.version === null) {
+      this.pendingOps[op.version] = op
+      return
+    }
+    if (op.epoch && op.epoch !== this.epoch) {
+      this.pendingOps[op.version] = op
+      this.requestSync()
+      return
+    }
+    if (op.version <= this.version) return
+    if (op.version > this.version + 1) {
+      this.pendingOps[op.version] = op
+      this.requestSync()
+      return
+    }
+    this.applyOp(op)
+    this.applyPendingOps()
+  }
+
+  /**
+   * Record an edit as applied and show it (own edits are already shown locally)
+   * @param {object} op - Edit with server-assigned version
+   */
+  applyOp(op) {
+    this.version = op.version
+    if (!op.own) {
+      this.trigger('cell_update', op)
+    }
+  }
+
+  /**
+   * Apply held edits that now follow the current version; resync if a gap remains
+   */
+  applyPendingOps() {
+    let next = this.pendingOps[this.version + 1]
+    while (next && (!next.epoch || next.epoch === this.epoch)) {
+      delete this.pendingOps[next.version]
+      this.applyOp(next)
+      next = this.pendingOps[this.version + 1]
+    }
+    // Drop edits already applied and edits of another epoch (covered by the reload)
+    Object.keys(this.pendingOps).forEach(version => {
+      const op = this.pendingOps[version]
+      if ((op.epoch && op.epoch !== this.epoch) || op.version <= this.version) {
+        delete this.pendingOps[version]
+      }
+    })
+    if (Object.keys(this.pendingOps).length) {
+      this.requestSync()
+    }
+  }
+
+  /**
+   * Ask the server for the edits after the current version (one request at a time)
+   */
+  requestSync() {
+    if (this.syncing || !this.socket || !this.connected) return
+    this.syncing = true
+    this.socket.emit('sync', {
+      file_id: this.fileId,
+      epoch: this.epoch,
+      since_version: this.version
     })
   }
 
@@ -135,7 +261,9 @@ class ExcelSocket {
       user_id: this.userId,
       sheet: sheet,
       cell: cell,
-      value: value
+      value: value,
+      base_version: this.version,
+      epoch: this.epoch
     })
   }
 
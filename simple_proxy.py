@@ -2,13 +2,26 @@
 """
 简单的反向代理服务器
 同时提供静态文件服务和API代理功能
+
+两种模式：
+- async（默认）：asyncio 事件循环，后端连接池，SSE 与文件下载流式转发，支持 WebSocket，
+  静态文件从内存提供（预压缩 + ETag）
+- threaded：每个请求一个线程，每次转发新建后端连接
+
+使用方法：
+    python simple_proxy.py [--mode async|threaded] [--port 3000] [--backend http://localhost:5001] [--dir frontend/dist]
 """
+import argparse
+import asyncio
+import gzip
+import hashlib
 import http.server
 import http.client
+import mimetypes
 import socketserver
 import urllib.request
 import urllib.error
-from urllib.parse import urlparse, parse_qs
+from urllib.parse import urlparse, parse_qs, unquote
 import os
 import sys
 
@@ -17,6 +30,10 @@ FRONTEND_DIR = os.path.join(os.path.dirname(__file__), 'frontend', 'dist')
 BACKEND_URL = 'http://localhost:5001'
 PORT = 3000
 
+# 静态资源扩展名：不存在时返回404，其他路径回退到 index.html（SPA 路由）
+STATIC_EXTENSIONS = ('.js', '.css', '.png', '.jpg', '.jpeg', '.gif', '.svg',
+                     '.ico', '.woff', '.woff2', '.ttf', '.eot', '.map', '.json')
+
 
 class ProxyHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
     def __init__(self, *args, **kwargs):
@@ -45,10 +62,7 @@ class ProxyHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
                 else:
                     # 文件不存在，检查是否是静态资源请求
                     # 静态资源（有扩展名）返回404，其他请求返回 index.html（SPA fallback）
-                    static_extensions = ['.js', '.css', '.png', '.jpg', '.jpeg', '.gif', '.svg',
-                                       '.ico', '.woff', '.woff2', '.ttf', '.eot', '.map', '.json']
-
-                    has_extension = any(parsed_path.endswith(ext) for ext in static_extensions)
+                    has_extension = parsed_path.endswith(STATIC_EXTENSIONS)
 
                     if has_extension:
                         # 静态资源不存在，返回404
@@ -256,13 +270,469 @@ class ThreadingTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
     daemon_threads = True
 
 
+# ---------------------------------------------------------------------------
+# asyncio 模式：单线程事件循环处理全部连接
+# - /api/ 与 /socket.io/ 转发到后端，后端连接保持长连接并复用（连接池）
+# - 响应体按块转发，不整体缓存：SSE 日志流实时送达，大文件下载不占用额外内存
+# - WebSocket 升级请求（/excel 协同编辑）建立双向隧道
+# - 静态文件启动时载入内存，预先压缩（gzip，安装 brotli 时同时生成 br），带 ETag
+# ---------------------------------------------------------------------------
+
+PROXY_PREFIXES = ('/api/', '/socket.io/')
+CHUNK_SIZE = 64 * 1024
+CLIENT_IDLE_TIMEOUT = 75  # 客户端长连接空闲超时（秒）
+UPSTREAM_TIMEOUT = 300  # 等待后端响应头的超时（秒），响应体（SSE）不限时
+UPSTREAM_MAX_IDLE = 32  # 连接池中保留的空闲后端连接数
+MIN_COMPRESS_SIZE = 1024  # 小于该大小的静态文件不压缩
+
+HOP_BY_HOP_HEADERS = {'connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization',
+                      'te', 'trailers', 'transfer-encoding', 'upgrade', 'expect'}
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'application/xml',
+                      'image/svg+xml', 'application/manifest+json')
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def get_header(headers, name, default=None):
+    """从 [(名称, 值)] 中取第一个同名请求头（不区分大小写）"""
+    name = name.lower()
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return default
+
+
+def header_tokens(headers, name):
+    """逗号分隔的请求头取值，如 Connection: keep-alive, Upgrade"""
+    return {token.strip().lower() for token in get_header(headers, name, '').split(',') if token.strip()}
+
+
+async def read_head(reader):
+    """读取请求行/状态行与头部"""
+    data = await reader.readuntil(b'\r\n\r\n')
+    lines = data[:-4].decode('latin-1').split('\r\n')
+    headers = []
+    for line in lines[1:]:
+        name, _, value = line.partition(':')
+        headers.append((name.strip(), value.strip()))
+    return lines[0], headers
+
+
+def format_head(start_line, headers):
+    return (start_line + '\r\n' + ''.join(f'{name}: {value}\r\n' for name, value in headers) + '\r\n').encode('latin-1')
+
+
+async def relay_chunked(reader, writer):
+    """按原样转发 chunked 编码的消息体"""
+    while True:
+        size_line = await reader.readline()
+        if not size_line:
+            raise ConnectionError('连接在 chunked 消息体中途关闭')
+        writer.write(size_line)
+        size = int(size_line.split(b';', 1)[0].strip(), 16)
+        if size == 0:
+            # 尾部头部，以空行结束
+            while True:
+                line = await reader.readline()
+                writer.write(line)
+                if line in (b'\r\n', b'\n', b''):
+                    break
+            await writer.drain()
+            return
+        await relay_exactly(reader, writer, size + 2)
+
+
+async def relay_exactly(reader, writer, length):
+    """转发固定长度的消息体"""
+    remaining = length
+    while remaining:
+        data = await reader.read(min(CHUNK_SIZE, remaining))
+        if not data:
+            raise ConnectionError('连接在消息体中途关闭')
+        remaining -= len(data)
+        writer.write(data)
+        await writer.drain()
+
+
+async def relay_until_eof(reader, writer, chunked):
+    """转发以关闭连接结束的消息体，chunked=True 时重新编码为 chunked（客户端连接可以继续复用）"""
+    while True:
+        data = await reader.read(CHUNK_SIZE)
+        if not data:
+            break
+        writer.write(b'%x\r\n%s\r\n' % (len(data), data) if chunked else data)
+        await writer.drain()
+    if chunked:
+        writer.write(b'0\r\n\r\n')
+        await writer.drain()
+
+
+class UpstreamPool:
+    """后端长连接池"""
+
+    def __init__(self, host, port, max_idle=UPSTREAM_MAX_IDLE):
+        self.host = host
+        self.port = port
+        self.max_idle = max_idle
+        self._idle = []
+        self.stats = {'opened': 0, 'reused': 0}
+
+    async def acquire(self):
+        """
+        取出一个后端连接
+
+        Returns:
+            tuple: (reader, writer, 是否为复用的连接)
+        """
+        while self._idle:
+            reader, writer = self._idle.pop()
+            if not writer.is_closing() and not reader.at_eof():
+                self.stats['reused'] += 1
+                return reader, writer, True
+            writer.close()
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        self.stats['opened'] += 1
+        return reader, writer, False
+
+    def release(self, reader, writer):
+        """归还完整读取了响应的连接"""
+        if len(self._idle) < self.max_idle and not writer.is_closing() and not reader.at_eof():
+            self._idle.append((reader, writer))
+        else:
+            writer.close()
+
+
+class StaticFiles:
+    """内存中的静态文件（index.html 变化后自动重新载入，例如重新构建前端之后）"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._files = {}  # URL 路径 -> 文件信息
+        self._index_mtime = None
+        self._reload_if_changed()
+
+    def _reload_if_changed(self):
+        try:
+            mtime = os.stat(os.path.join(self.directory, 'index.html')).st_mtime
+        except OSError:
+            mtime = None
+        if mtime == self._index_mtime and self._files:
+            return
+        files = {}
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                # 预压缩文件作为原文件的压缩版本载入
+                if name.endswith(('.gz', '.br')) and os.path.exists(path[:-3]):
+                    continue
+                url = '/' + os.path.relpath(path, self.directory).replace(os.sep, '/')
+                try:
+                    files[url] = self._load(path, url)
+                except OSError as e:
+                    print(f"Error loading {path}: {e}", file=sys.stderr)
+        self._files = files
+        self._index_mtime = mtime
+        total = sum(len(f['body']) for f in files.values())
+        print(f"已载入 {len(files)} 个静态文件（{total / 1024:.0f} KB）", file=sys.stderr)
+
+    @staticmethod
+    def _load(path, url):
+        with open(path, 'rb') as f:
+            body = f.read()
+        content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        if content_type.startswith('text/') or content_type in ('application/javascript', 'application/json'):
+            content_type += '; charset=utf-8'
+        encoded = {}
+        if content_type.startswith(COMPRESSIBLE_TYPES) and len(body) >= MIN_COMPRESS_SIZE:
+            for encoding, suffix, compress in (('br', '.br', brotli.compress if brotli else None),
+                                               ('gzip', '.gz', lambda data: gzip.compress(data, 9))):
+                if os.path.exists(path + suffix):
+                    with open(path + suffix, 'rb') as f:
+                        data = f.read()
+                elif compress:
+                    data = compress(body)
+                else:
+                    continue
+                if len(data) < len(body):
+                    encoded[encoding] = data
+        return {
+            'body': body,
+            'encoded': encoded,
+            'content_type': content_type,
+            'etag': '"%s"' % hashlib.sha1(body).hexdigest()[:20],
+            # 构建产物的文件名带内容哈希，可以长期缓存；index.html 每次校验
+            'cache_control': 'public, max-age=31536000, immutable' if url.startswith('/assets/') else 'no-cache',
+        }
+
+    def lookup(self, target):
+        """按请求路径查找文件，找不到的页面路由返回 index.html"""
+        self._reload_if_changed()
+        path = unquote(target.split('?', 1)[0])
+        if path.endswith('/'):
+            path += 'index.html'
+        entry = self._files.get(path) or self._files.get(path + '/index.html')
+        if entry or path.endswith(STATIC_EXTENSIONS):
+            return entry
+        return self._files.get('/index.html')
+
+    def response(self, method, target, headers):
+        """
+        生成静态文件响应
+
+        Returns:
+            tuple: (状态行, 响应头列表, 响应体)
+        """
+        if method not in ('GET', 'HEAD'):
+            return 'HTTP/1.1 404 Not Found', [('Content-Length', '0')], b''
+        entry = self.lookup(target)
+        if entry is None:
+            body = b'File not found'
+            return 'HTTP/1.1 404 Not Found', [('Content-Type', 'text/plain'), ('Content-Length', str(len(body)))], body
+
+        response_headers = [('ETag', entry['etag']), ('Cache-Control', entry['cache_control']),
+                            ('Vary', 'Accept-Encoding')]
+        if entry['etag'] in header_tokens(headers, 'if-none-match'):
+            return 'HTTP/1.1 304 Not Modified', response_headers, b''
+
+        accepted = {token.split(';', 1)[0].strip() for token in header_tokens(headers, 'accept-encoding')
+                    if not token.replace(' ', '').endswith(';q=0')}
+        body = entry['body']
+        for encoding in ('br', 'gzip'):
+            if encoding in accepted and encoding in entry['encoded']:
+                body = entry['encoded'][encoding]
+                response_headers.append(('Content-Encoding', encoding))
+                break
+        response_headers += [('Content-Type', entry['content_type']), ('Content-Length', str(len(body)))]
+        return 'HTTP/1.1 200 OK', response_headers, b'' if method == 'HEAD' else body
+
+
+class AsyncProxy:
+    """asyncio 反向代理"""
+
+    def __init__(self, backend_url, frontend_dir):
+        parsed = urlparse(backend_url)
+        self.backend_host = parsed.netloc
+        self.pool = UpstreamPool(parsed.hostname, parsed.port or 80)
+        self.static = StaticFiles(frontend_dir)
+
+    async def handle_client(self, reader, writer):
+        """处理一个客户端连接（HTTP/1.1 长连接上的多个请求）"""
+        try:
+            while True:
+                try:
+                    start_line, headers = await asyncio.wait_for(read_head(reader), CLIENT_IDLE_TIMEOUT)
+                    method, target, version = start_line.split(' ', 2)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                        ValueError, ConnectionError):
+                    break
+
+                keep_alive = version == 'HTTP/1.1' and 'close' not in header_tokens(headers, 'connection')
+                if target.startswith(PROXY_PREFIXES):
+                    if get_header(headers, 'upgrade', '').lower() == 'websocket':
+                        await self.tunnel(method, target, headers, reader, writer)
+                        break
+                    keep_alive = await self.proxy(method, target, headers, reader, writer, keep_alive)
+                else:
+                    await self.discard_body(headers, reader)
+                    status_line, response_headers, body = self.static.response(method, target, headers)
+                    response_headers.append(('Connection', 'keep-alive' if keep_alive else 'close'))
+                    writer.write(format_head(status_line, response_headers) + body)
+                    await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            # 客户端断开连接，静默处理
+            pass
+        except Exception as e:
+            print(f"Async proxy error: {e}", file=sys.stderr)
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def discard_body(headers, reader):
+        """读掉不需要转发的请求体，保证长连接上的下一个请求从正确的位置开始"""
+        if 'chunked' in header_tokens(headers, 'transfer-encoding'):
+            await relay_chunked(reader, _NullWriter())
+        else:
+            length = int(get_header(headers, 'content-length', 0) or 0)
+            if length:
+                await reader.readexactly(length)
+
+    def _upstream_head(self, method, target, headers, client_writer, chunked):
+        forwarded = [(name, value) for name, value in headers
+                     if name.lower() not in HOP_BY_HOP_HEADERS and name.lower() != 'host']
+        peer = client_writer.get_extra_info('peername')
+        forwarded += [('Host', self.backend_host), ('Connection', 'keep-alive')]
+        if peer:
+            forwarded.append(('X-Forwarded-For', peer[0]))
+        if chunked:
+            forwarded.append(('Transfer-Encoding', 'chunked'))
+        return format_head(f'{method} {target} HTTP/1.1', forwarded)
+
+    async def proxy(self, method, target, headers, client_reader, client_writer, keep_alive):
+        """
+        转发一个请求，响应体按块转发
+
+        Returns:
+            bool: 客户端连接是否可以继续使用
+        """
+        chunked = 'chunked' in header_tokens(headers, 'transfer-encoding')
+        length = int(get_header(headers, 'content-length', 0) or 0)
+        head = self._upstream_head(method, target, headers, client_writer, chunked)
+
+        # 复用的连接可能恰好被后端关闭，没有请求体的请求换一个新连接重试一次
+        for attempt in range(2):
+            try:
+                up_reader, up_writer, reused = await self.pool.acquire()
+            except OSError as e:
+                return await self.bad_gateway(client_writer, e)
+            try:
+                up_writer.write(head)
+                if chunked:
+                    await relay_chunked(client_reader, up_writer)
+                elif length:
+                    await relay_exactly(client_reader, up_writer, length)
+                await up_writer.drain()
+                status_line, response_headers = await asyncio.wait_for(read_head(up_reader), UPSTREAM_TIMEOUT)
+                break
+            except (ConnectionError, asyncio.IncompleteReadError) as e:
+                up_writer.close()
+                if reused and attempt == 0 and not chunked and not length:
+                    continue
+                return await self.bad_gateway(client_writer, e)
+            except asyncio.TimeoutError as e:
+                up_writer.close()
+                return await self.bad_gateway(client_writer, e)
+
+        _, status, _ = (status_line.split(' ', 2) + [''])[:3]
+        status = int(status)
+        upstream_tokens = header_tokens(response_headers, 'connection')
+        upstream_reusable = status_line.startswith('HTTP/1.1') and 'close' not in upstream_tokens
+        no_body = method == 'HEAD' or status in (204, 304) or 100 <= status < 200
+        response_chunked = 'chunked' in header_tokens(response_headers, 'transfer-encoding')
+        response_length = get_header(response_headers, 'content-length')
+
+        out_headers = [(name, value) for name, value in response_headers if name.lower() not in HOP_BY_HOP_HEADERS]
+        until_eof = not no_body and not response_chunked and response_length is None
+        if until_eof:
+            # 后端以关闭连接结束响应：对 HTTP/1.1 客户端改用 chunked 编码，客户端连接仍可复用
+            upstream_reusable = False
+            if keep_alive:
+                response_chunked = True
+        if response_chunked and not no_body:
+            out_headers.append(('Transfer-Encoding', 'chunked'))
+        out_headers.append(('Connection', 'keep-alive' if keep_alive else 'close'))
+
+        complete = False
+        try:
+            client_writer.write(format_head('HTTP/1.1 ' + status_line.split(' ', 1)[1], out_headers))
+            await client_writer.drain()
+            if no_body:
+                pass
+            elif until_eof:
+                await relay_until_eof(up_reader, client_writer, chunked=keep_alive)
+            elif response_chunked:
+                await relay_chunked(up_reader, client_writer)
+            else:
+                await relay_exactly(up_reader, client_writer, int(response_length))
+            complete = True
+        finally:
+            # 中途断开（例如用户关闭了 SSE 日志页面）的后端连接不能复用
+            if complete and upstream_reusable:
+                self.pool.release(up_reader, up_writer)
+            else:
+                up_writer.close()
+        return keep_alive
+
+    async def tunnel(self, method, target, headers, client_reader, client_writer):
+        """WebSocket 升级：原样转发握手，之后在两端之间双向复制数据"""
+        try:
+            up_reader, up_writer = await asyncio.open_connection(self.pool.host, self.pool.port)
+        except OSError as e:
+            await self.bad_gateway(client_writer, e)
+            return
+        forwarded = [(name, value) for name, value in headers if name.lower() != 'host']
+        forwarded.append(('Host', self.backend_host))
+        up_writer.write(format_head(f'{method} {target} HTTP/1.1', forwarded))
+
+        async def pipe(reader, writer):
+            try:
+                while True:
+                    data = await reader.read(CHUNK_SIZE)
+                    if not data:
+                        break
+                    writer.write(data)
+                    await writer.drain()
+            except (ConnectionError, asyncio.IncompleteReadError):
+                pass
+
+        tasks = [asyncio.ensure_future(pipe(client_reader, up_writer)),
+                 asyncio.ensure_future(pipe(up_reader, client_writer))]
+        try:
+            # 任意一端关闭后结束隧道
+            _, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in pending:
+                task.cancel()
+        finally:
+            up_writer.close()
+
+    @staticmethod
+    async def bad_gateway(writer, error):
+        print(f"Upstream error: {error}", file=sys.stderr)
+        body = f"Proxy error: {error}".encode('utf-8')
+        writer.write(format_head('HTTP/1.1 502 Bad Gateway', [
+            ('Content-Type', 'text/plain; charset=utf-8'), ('Content-Length', str(len(body))), ('Connection', 'close')
+        ]) + body)
+        await writer.drain()
+        return False
+
+
+class _NullWriter:
+    """丢弃写入内容的 writer（读掉请求体时使用）"""
+
+    def write(self, data):
+        pass
+
+    async def drain(self):
+        pass
+
+
+async def serve_async(port, backend_url, frontend_dir):
+    proxy = AsyncProxy(backend_url, frontend_dir)
+    server = await asyncio.start_server(proxy.handle_client, host='', port=port)
+    async with server:
+        await server.serve_forever()
+
+
 def main():
+    global FRONTEND_DIR, BACKEND_URL
+
+    parser = argparse.ArgumentParser(description='静态文件服务与 API 反向代理')
+    parser.add_argument('--mode', choices=['async', 'threaded'], default='async',
+                        help='async: asyncio 事件循环（连接池、流式转发、WebSocket）；threaded: 每个请求一个线程')
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--backend', default=BACKEND_URL)
+    parser.add_argument('--dir', default=FRONTEND_DIR, help='静态文件目录')
+    args = parser.parse_args()
+    FRONTEND_DIR, BACKEND_URL = args.dir, args.backend
+
+    print(f"反向代理服务器启动在 http://localhost:{args.port}（{args.mode}）")
+    print(f"静态文件目录: {FRONTEND_DIR}")
+    print(f"API代理到: {BACKEND_URL}")
+    print("按 Ctrl+C 停止服务器")
+
+    if args.mode == 'async':
+        try:
+            asyncio.run(serve_async(args.port, BACKEND_URL, FRONTEND_DIR))
+        except KeyboardInterrupt:
+            print("\n服务器已停止")
+        return
+
     # 使用 ThreadingTCPServer 支持并发请求
-    with ThreadingTCPServer(("", PORT), ProxyHTTPRequestHandler) as httpd:
-        print(f"反向代理服务器启动在 http://localhost:{PORT}")
-        print(f"静态文件目录: {FRONTEND_DIR}")
-        print(f"API代理到: {BACKEND_URL}")
-        print("按 Ctrl+C 停止服务器")
+    with ThreadingTCPServer(("", args.port), ProxyHTTPRequestHandler) as httpd:
         try:
             httpd.serve_forever()
         except KeyboardInterrupt:
@@ -270,4 +740,4 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()